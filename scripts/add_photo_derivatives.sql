@@ -0,0 +1,24 @@
+-- capture_real_photos 파생 이미지 컬럼 추가
+-- 생성일: 2025-10-28
+-- transcode_derivatives.py --upload가 원본 크기와 파생 이미지(derived/{variant}/...) 정보를 기록
+
+-- 1. 원본 크기 (Galaxy S21 원본, 백필 시 Storage 다운로드 기준)
+ALTER TABLE capture_real_photos
+    ADD COLUMN IF NOT EXISTS original_bytes INTEGER,
+    ADD COLUMN IF NOT EXISTS original_width INTEGER,
+    ADD COLUMN IF NOT EXISTS original_height INTEGER;
+
+-- 2. 파생 이미지 정보
+-- {"model": {"path": "derived/model/CS_1_single/K-030864/....jpg", "bytes": 6200, "width": 200, "height": 200, "format": "jpeg"},
+--  "thumb": {"path": "derived/thumb/CS_1_single/K-030864/....webp", "bytes": 1400, "width": 256, "height": 192, "format": "webp"}}
+ALTER TABLE capture_real_photos
+    ADD COLUMN IF NOT EXISTS derivatives JSONB DEFAULT '{}';
+
+-- 3. photo_url 기준 행 갱신(PATCH ?photo_url=eq.)용 인덱스
+CREATE INDEX IF NOT EXISTS idx_capture_real_photos_photo_url ON capture_real_photos (photo_url);
+
+-- 4. 백필 대상 조회 (파생 이미지가 아직 없는 세션별 행 수)
+-- SELECT split_part(photo_url, '/', 1) AS session, COUNT(*)
+-- FROM capture_real_photos
+-- WHERE derivatives IS NULL OR derivatives = '{}'::jsonb
+-- GROUP BY 1 ORDER BY 1;
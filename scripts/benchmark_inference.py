@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+추론 API 오픈 루프 부하 테스트
+요청을 정해진 도착 시각(Poisson 또는 일정 간격)에 보내고, 응답을 기다리지 않고 다음 요청을 보냄
+(N개를 동시에 보내고 평균을 내는 closed-loop 방식은 서버가 느려지면 요청도 줄어 큐잉 지연이 가려짐)
+
+- 도착: --arrival poisson(지수 분포 간격) / constant, 시드 고정
+- 지연은 예정 도착 시각부터 측정 (연결 풀 대기 포함, coordinated omission 방지)
+- 연결: httpx.AsyncClient keep-alive 풀 (--connections)
+- 트래픽: /predict와 /batch_predict(2~--max-batch-images장)를 --batch-ratio 비율로 섞음
+    요청마다 JPEG 끝에 고유 바이트를 붙여 서버 예측 캐시에 걸리지 않게 함 (--allow-cache-hits로 끔)
+- 지연 히스토그램: HdrHistogram 방식 로그-선형 버킷 (상대 오차 < 1%), 백분위 분포를 JSON에 저장
+- 포화점: RPS 단계를 올리며 달성 처리량 < 목표의 95%, p99 > --slo-ms, 오류율 > 1% 중 하나면 포화
+
+Created: 2025-10-28
+Purpose: 추론서버의 지속 가능한 최대 RPS와 큐잉 지연 측정
+Usage:
+    python stub_inference_server.py --port 8080 &
+    python benchmark_inference.py --url http://127.0.0.1:8080 --rps 10,20,40,80,160 --duration 20
+    python benchmark_inference.py --url http://localhost:8080 --rps 30 --arrival constant \\
+        --images /data/test_photos --batch-ratio 0.2 --output artifacts/benchmarks/load.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import httpx
+except ImportError:
+    print("❌ httpx가 필요합니다: pip install httpx")
+    sys.exit(1)
+
+PREDICT_PATH = '/v1/narrow/predict'
+BATCH_PREDICT_PATH = '/v1/narrow/batch_predict'
+MAX_BATCH_FILES = 10
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+SATURATION_THROUGHPUT = 0.95   # 달성 처리량 / 목표 RPS
+SATURATION_ERROR_RATE = 0.01
+WARMUP_SECONDS = 3.0
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+
+
+# ============================================================
+# 1. 지연 히스토그램
+# ============================================================
+
+class LatencyHistogram:
+    """HdrHistogram 방식 로그-선형 히스토그램 (값: 마이크로초 정수)
+
+    2^k 구간마다 sub_buckets/2개의 선형 버킷 → 상대 오차 < 2/sub_buckets, 메모리 고정.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 8, max_value_us: int = 120_000_000):
+        self.bits = sub_bucket_bits
+        self.half = 1 << (sub_bucket_bits - 1)
+        self.counts = np.zeros(self._index(max_value_us) + 1, dtype=np.int64)
+        self.max_value_us = max_value_us
+        self.total = 0
+        self.max_seen = 0
+
+    def _index(self, value: int) -> int:
+        bucket = max(0, value.bit_length() - self.bits)
+        return (value >> bucket) + bucket * self.half
+
+    def _lowest(self, index: int) -> int:
+        if index < 2 * self.half:
+            return index
+        bucket = index // self.half - 1
+        return (index - bucket * self.half) << bucket
+
+    def record(self, seconds: float):
+        value = min(int(seconds * 1e6), self.max_value_us)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        self.max_seen = max(self.max_seen, value)
+
+    def merge(self, other: 'LatencyHistogram'):
+        self.counts += other.counts
+        self.total += other.total
+        self.max_seen = max(self.max_seen, other.max_seen)
+
+    def value_at(self, percentile: float) -> float:
+        """백분위 값 (ms, 해당 버킷의 상한)"""
+        if not self.total:
+            return 0.0
+        target = max(1, int(np.ceil(percentile / 100 * self.total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), target))
+        return min(self._lowest(index + 1) - 1, self.max_seen) / 1000
+
+    def percentiles(self) -> Dict[str, float]:
+        stats = {f'p{q:g}': round(self.value_at(q), 2) for q in REPORT_PERCENTILES}
+        stats['max'] = round(self.max_seen / 1000, 2)
+        return stats
+
+    def distribution(self) -> List[Dict]:
+        """HdrHistogram 출력 형식의 백분위 분포 (50, 75, 87.5, ... → 100)"""
+        rows, percentile = [], 0.0
+        while self.total:
+            rows.append({'percentile': round(percentile, 5), 'value_ms': round(self.value_at(percentile), 3),
+                         'inverse': round(1 / (1 - percentile / 100), 1) if percentile < 100 else None})
+            if percentile >= 100 or self.total * (1 - percentile / 100) < 1:
+                break
+            percentile = 100 - (100 - percentile) / 2
+        if rows and rows[-1]['percentile'] < 100:
+            rows.append({'percentile': 100.0, 'value_ms': round(self.max_seen / 1000, 3), 'inverse': None})
+        return rows
+
+
+# ============================================================
+# 2. 요청 생성
+# ============================================================
+
+def load_images(image_dir: Optional[str], n: int = 32) -> List[bytes]:
+    """부하에 쓸 JPEG 바이트 (--images 폴더 앞 n장, 없으면 합성 이미지)"""
+    if image_dir:
+        paths = sorted(p for p in Path(image_dir).rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)[:n]
+        if not paths:
+            print(f"❌ 이미지가 없습니다: {image_dir}")
+            sys.exit(1)
+        return [p.read_bytes() for p in paths]
+
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(n):
+        pixels = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels).resize((640, 480), Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def arrival_offsets(rps: float, duration: float, arrival: str, rng: np.random.Generator) -> np.ndarray:
+    """시작 시점 기준 요청 도착 시각 (초)"""
+    if arrival == 'constant':
+        return np.arange(0, duration, 1 / rps)
+    # Poisson: 간격 ~ Exp(rps), 여유 있게 뽑고 duration 이내만
+    intervals = rng.exponential(1 / rps, int(rps * duration * 1.5) + 16)
+    offsets = np.cumsum(intervals)
+    return offsets[offsets < duration]
+
+
+class LoadGenerator:
+    def __init__(self, args, images: List[bytes]):
+        self.args = args
+        self.images = images
+        self.rng = np.random.default_rng(args.seed)
+        self.sequence = 0
+
+    def _image(self) -> bytes:
+        image = self.images[self.sequence % len(self.images)]
+        self.sequence += 1
+        if self.args.allow_cache_hits:
+            return image
+        # JPEG EOI 뒤의 바이트는 디코더가 무시 → 내용은 같고 해시만 다름
+        return image + self.sequence.to_bytes(8, 'little')
+
+    def next_request(self) -> Tuple[str, list, int]:
+        """(경로, multipart files, 이미지 수)"""
+        if self.rng.random() < self.args.batch_ratio:
+            n = int(self.rng.integers(2, self.args.max_batch_images + 1))
+            files = [('files', (f'{i}.jpg', self._image(), 'image/jpeg')) for i in range(n)]
+            return BATCH_PREDICT_PATH, files, n
+        return PREDICT_PATH, [('file', ('test.jpg', self._image(), 'image/jpeg'))], 1
+
+    async def run_step(self, client: httpx.AsyncClient, rps: float, duration: float) -> Dict:
+        """목표 RPS로 duration초 동안 오픈 루프 부하"""
+        args = self.args
+        offsets = arrival_offsets(rps, duration, args.arrival, self.rng)
+        histograms = {PREDICT_PATH: LatencyHistogram(), BATCH_PREDICT_PATH: LatencyHistogram()}
+        counters = {'sent': 0, 'ok': 0, 'errors': 0, 'dropped': 0, 'images': 0}
+        status_codes: Dict[str, int] = {}
+        in_flight = set()
+        max_lag = 0.0
+
+        async def send(path, files, n_images, scheduled):
+            try:
+                response = await client.post(path, files=files)
+                key = str(response.status_code)
+                ok = response.status_code == 200
+            except httpx.HTTPError as e:
+                key, ok = type(e).__name__, False
+            done = time.perf_counter()
+            status_codes[key] = status_codes.get(key, 0) + 1
+            if ok:
+                histograms[path].record(done - scheduled)
+                counters['ok'] += 1
+                counters['images'] += n_images
+            else:
+                counters['errors'] += 1
+            return done
+
+        started = time.perf_counter()
+        last_done = started
+        for offset in offsets:
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            max_lag = max(max_lag, time.perf_counter() - scheduled)
+
+            if len(in_flight) >= args.max_in_flight:
+                counters['dropped'] += 1   # 클라이언트 보호: 이미 너무 많이 밀림 (오류로 집계)
+                continue
+            path, files, n_images = self.next_request()
+            task = asyncio.create_task(send(path, files, n_images, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            counters['sent'] += 1
+
+        if in_flight:
+            done, pending = await asyncio.wait(in_flight, timeout=args.timeout)
+            last_done = max([task.result() for task in done], default=last_done)
+            for task in pending:   # 다음 단계로 넘어가지 않도록 취소 후 오류로 집계
+                task.cancel()
+            counters['errors'] += len(pending)
+        elapsed = max(last_done, started + duration) - started
+
+        overall = LatencyHistogram()
+        for histogram in histograms.values():
+            overall.merge(histogram)
+        attempted = counters['sent'] + counters['dropped']
+        return {
+            'target_rps': rps,
+            'offered_rps': round(len(offsets) / duration, 2),
+            'achieved_rps': round(counters['ok'] / elapsed, 2),
+            'images_per_second': round(counters['images'] / elapsed, 2),
+            **counters,
+            'error_rate': round((counters['errors'] + counters['dropped']) / attempted, 4) if attempted else 0.0,
+            'status_codes': status_codes,
+            'max_schedule_lag_ms': round(max_lag * 1000, 2),
+            'latency_ms': overall.percentiles(),
+            'latency_ms_by_endpoint': {path: histogram.percentiles()
+                                       for path, histogram in histograms.items() if histogram.total},
+            'distribution': overall.distribution(),
+        }
+
+
+def is_saturated(step: Dict, slo_ms: float) -> List[str]:
+    reasons = []
+    if step['achieved_rps'] < step['offered_rps'] * SATURATION_THROUGHPUT:
+        reasons.append('throughput')
+    if step['latency_ms']['p99'] > slo_ms:
+        reasons.append(f'p99>{slo_ms:g}ms')
+    if step['error_rate'] > SATURATION_ERROR_RATE:
+        reasons.append('errors')
+    return reasons
+
+
+# ============================================================
+# 3. 실행
+# ============================================================
+
+async def run(args, rps_steps: List[float]) -> Dict:
+    generator = LoadGenerator(args, load_images(args.images))
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    timeout = httpx.Timeout(args.timeout)
+    steps, sustainable, saturated_at = [], None, None
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        health = await client.get('/health')
+        health.raise_for_status()
+
+        if args.warmup:
+            # 연결 풀 채우기 + 서버 워밍업 (결과 제외)
+            await generator.run_step(client, rps_steps[0], min(args.duration, WARMUP_SECONDS))
+
+        print(f"  {'target':>7} {'offered':>8} {'achieved':>9} {'err%':>6} {'p50':>8} {'p90':>8} "
+              f"{'p99':>8} {'p99.9':>8} {'max':>8}  (ms)")
+        for rps in rps_steps:
+            step = await generator.run_step(client, rps, args.duration)
+            reasons = is_saturated(step, args.slo_ms)
+            step['saturated'] = reasons
+            steps.append(step)
+            latency = step['latency_ms']
+            print(f"  {rps:>7g} {step['offered_rps']:>8.1f} {step['achieved_rps']:>9.1f} "
+                  f"{step['error_rate'] * 100:>5.1f}% {latency['p50']:>8.1f} {latency['p90']:>8.1f} "
+                  f"{latency['p99']:>8.1f} {latency['p99.9']:>8.1f} {latency['max']:>8.1f}"
+                  f"{'  ❗ ' + ', '.join(reasons) if reasons else ''}")
+            if step['max_schedule_lag_ms'] > 100:
+                print(f"    ⚠️  부하 생성기가 예정 시각보다 최대 {step['max_schedule_lag_ms']:.0f}ms 늦음 "
+                      f"(클라이언트 CPU 부족 - 결과가 낙관적일 수 있음)")
+            if reasons:
+                saturated_at = rps
+                if not args.no_stop:
+                    break
+            elif saturated_at is None:
+                sustainable = rps
+
+        try:
+            server_metrics = (await client.get('/v1/narrow/metrics')).json()
+        except (httpx.HTTPError, ValueError):
+            server_metrics = None
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'steps': steps,
+        'saturation': {'sustainable_rps': sustainable, 'saturated_rps': saturated_at, 'slo_ms': args.slo_ms},
+        'server_metrics': server_metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='추론 API 오픈 루프 부하 테스트')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--rps', default='5,10,20,40,80', help='목표 RPS 단계 (쉼표 구분, 포화 시 중단)')
+    parser.add_argument('--duration', type=float, default=20, help='단계별 시간 (초)')
+    parser.add_argument('--arrival', choices=['poisson', 'constant'], default='poisson')
+    parser.add_argument('--batch-ratio', type=float, default=0.2, help='/batch_predict 요청 비율')
+    parser.add_argument('--max-batch-images', type=int, default=4, help=f'배치 요청당 최대 이미지 (≤{MAX_BATCH_FILES})')
+    parser.add_argument('--images', help='요청 이미지 폴더 (없으면 합성 JPEG)')
+    parser.add_argument('--allow-cache-hits', action='store_true', help='같은 이미지 바이트 반복 (예측 캐시 적중 허용)')
+    parser.add_argument('--connections', type=int, default=64, help='keep-alive 연결 풀 크기')
+    parser.add_argument('--max-in-flight', type=int, default=2000, help='초과 시 요청을 보내지 않고 drop으로 집계')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--slo-ms', type=float, default=500.0, help='포화 판정 p99 기준')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false')
+    parser.add_argument('--no-stop', action='store_true', help='포화 후에도 남은 단계 계속')
+    parser.add_argument('--output', help='결과 JSON 경로')
+    args = parser.parse_args()
+
+    if not 2 <= args.max_batch_images <= MAX_BATCH_FILES:
+        parser.error(f'--max-batch-images는 2~{MAX_BATCH_FILES}')
+    rps_steps = [float(value) for value in args.rps.split(',')]
+
+    print(f"⏱️  오픈 루프 부하 테스트: {args.url} ({args.arrival}, 단계 {args.duration:g}초, "
+          f"batch_predict {args.batch_ratio:.0%}, 연결 {args.connections})")
+    try:
+        report = asyncio.run(run(args, rps_steps))
+    except httpx.HTTPError as e:
+        print(f"❌ 서버에 연결할 수 없습니다: {args.url} ({e})")
+        sys.exit(1)
+
+    saturation = report['saturation']
+    if saturation['saturated_rps'] is None:
+        print(f"\n✅ 포화 없음 (최대 {rps_steps[-1]:g} RPS까지 SLO p99 ≤ {args.slo_ms:g}ms)")
+    else:
+        print(f"\n📊 포화점: {saturation['saturated_rps']:g} RPS에서 포화, "
+              f"지속 가능 {saturation['sustainable_rps'] or 0:g} RPS")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
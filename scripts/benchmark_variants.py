@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+ONNX export 변형별 오프라인 CPU 벤치마크
+FP32 / 최적화 / 동적 INT8 양자화 모델을 배치 크기 × 스레드 수로 측정하고 JSON으로 저장
+(ModelExporter.benchmark_performance는 배치 1, 한 설정만 100회 측정)
+
+- 변형: --model(FP32 기준) + --optimized / --quantized (없으면 --output 폴더에 생성)
+    optimized: ORT 오프라인 그래프 최적화 (ORT_ENABLE_EXTENDED, 하드웨어 독립 수준까지)
+    quantized: quantize_dynamic(QUInt8) - FP32 모델에서 양자화 (최적화 모델의 fused 연산은 양자화 대상이 아님)
+- 입력: 고정 이미지 세트 (--images 폴더의 앞 N장, 없으면 시드 고정 합성 이미지) → UnifiedPreprocessor
+    전처리 텐서의 SHA-256을 기록하여 결과 비교 시 같은 입력인지 확인
+- 측정: (변형, 스레드 수)마다 새 프로세스 → 세션 로드 시간, 배치 크기별 지연 분위수/처리량,
+    최대 RSS, FP32 대비 Top-1 일치율 / Top-5 포함률
+- 세션 그래프 최적화 수준은 변형별 (fp32 기준은 ORT_DISABLE_ALL로 export 그래프 그대로,
+    optimized/quantized는 서빙과 같은 ORT_ENABLE_ALL) - 결과 행마다 graph_optimization 기록
+- --compare: 이전 결과 JSON과 같은 (변형, 스레드, 배치) 항목끼리 비교, 허용 범위를 넘으면 종료 코드 1
+
+Created: 2025-10-28
+Purpose: 모델 버전 간 속도/메모리/정확도 회귀를 재현 가능하게 비교
+Usage:
+    python scripts/benchmark_variants.py --model artifacts/export/pillsnap_narrow_model.onnx \\
+        --output artifacts/benchmarks/1.0.0 --batch-sizes 1,2,4,8,16,32,64 --threads 1,2,4
+    python scripts/benchmark_variants.py --model artifacts/export/pillsnap_narrow_model.onnx \\
+        --images /data/test_photos --output artifacts/benchmarks/1.0.1 \\
+        --compare artifacts/benchmarks/1.0.0/benchmark.json
+"""
+
+import argparse
+import hashlib
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / 'src'))
+
+from inference.serving import available_cores, session_options  # noqa: E402
+from inference.startup import parse_batch_sizes  # noqa: E402
+
+RESULT_VERSION = 2   # 2: 변형별 graph_optimization (1은 모든 변형 ORT_ENABLE_ALL)
+REFERENCE = 'fp32'
+VARIANTS = ('fp32', 'optimized', 'quantized')
+GRAPH_OPTIMIZATION_LEVELS = ('ORT_DISABLE_ALL', 'ORT_ENABLE_BASIC', 'ORT_ENABLE_EXTENDED', 'ORT_ENABLE_ALL')
+SERVING_OPTIMIZATION = 'ORT_ENABLE_ALL'        # narrow_model 세션과 동일
+DEFAULT_REFERENCE_OPTIMIZATION = 'ORT_DISABLE_ALL'
+DEFAULT_BATCH_SIZES = '1,2,4,8,16,32,64'
+DEFAULT_NUM_IMAGES = 64
+PERCENTILES = (50, 90, 95, 99)
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    print("❌ onnxruntime이 필요합니다: pip install onnxruntime")
+    sys.exit(1)
+
+
+# ============================================================
+# 1. 변형 모델 준비
+# ============================================================
+
+def optimize_model(model_path: Path, output_path: Path) -> Path:
+    """ORT 오프라인 그래프 최적화 결과 저장 (EXTENDED: 다른 CPU에서도 로드 가능한 수준)"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = str(output_path)
+    ort.InferenceSession(str(model_path), sess_options=options, providers=['CPUExecutionProvider'])
+    return output_path
+
+
+def quantize_model(model_path: Path, output_path: Path) -> Path:
+    """동적 INT8 양자화 (ModelExporter.quantize_model과 같은 설정)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(model_path), str(output_path), weight_type=QuantType.QUInt8)
+    return output_path
+
+
+def prepare_variants(args, output_dir: Path) -> Dict[str, Path]:
+    """변형 이름 → 모델 경로 (지정하지 않은 변형은 생성, 이미 최신이면 재사용)"""
+    model_path = Path(args.model)
+    variants = {REFERENCE: model_path}
+    builders = {'optimized': (args.optimized, optimize_model), 'quantized': (args.quantized, quantize_model)}
+    variant_dir = output_dir / 'variants'
+
+    for name in args.variants:
+        if name == REFERENCE:
+            continue
+        given, build = builders[name]
+        if given:
+            variants[name] = Path(given)
+            continue
+        path = variant_dir / f'{model_path.stem}_{name}.onnx'
+        if not path.exists() or path.stat().st_mtime < model_path.stat().st_mtime:
+            variant_dir.mkdir(parents=True, exist_ok=True)
+            print(f"🔧 {name} 모델 생성: {path}")
+            build(model_path, path)
+        variants[name] = path
+    return {name: variants[name] for name in VARIANTS if name in variants}
+
+
+def file_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def variant_info(path: Path) -> Dict:
+    data_path = path.with_name(path.name + '.data')
+    size = path.stat().st_size + (data_path.stat().st_size if data_path.exists() else 0)
+    return {'path': str(path), 'size_mb': round(size / 1e6, 2), 'sha256': file_sha256(path)}
+
+
+# ============================================================
+# 2. 고정 입력 세트
+# ============================================================
+
+def model_input_size(model_path: Path) -> int:
+    session = ort.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+    size = session.get_inputs()[0].shape[-1]
+    return size if isinstance(size, int) else 512
+
+
+def load_images(image_dir: Optional[str], n: int) -> Tuple[List[np.ndarray], str]:
+    """--images 폴더의 앞 n장 (파일명 정렬), 없으면 시드 고정 합성 이미지"""
+    from preprocessing.unified_preprocessor import synthetic_images
+
+    if not image_dir:
+        return synthetic_images(n, seed=0), f'synthetic(seed=0, n={n})'
+
+    import cv2
+    paths = sorted(p for p in Path(image_dir).rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)[:n]
+    if not paths:
+        print(f"❌ 이미지가 없습니다: {image_dir}")
+        sys.exit(1)
+    images = [cv2.cvtColor(cv2.imread(str(p)), cv2.COLOR_BGR2RGB) for p in paths]
+    return images, f'{image_dir} (n={len(images)})'
+
+
+def build_inputs(args, input_size: int, path: Path) -> Dict:
+    """전처리 텐서 (N,3,S,S) float32를 .npy로 저장 → 자식 프로세스가 같은 입력 사용"""
+    from preprocessing import UnifiedPreprocessor
+
+    images, source = load_images(args.images, args.num_images)
+    preprocessing = {}
+    if args.metadata and Path(args.metadata).exists():
+        with open(args.metadata, 'r', encoding='utf-8') as f:
+            preprocessing = dict(json.load(f).get('preprocessing', {}))
+        preprocessing.pop('version', None)
+    preprocessing['target_size'] = input_size
+
+    batch = UnifiedPreprocessor(**preprocessing).process_batch_numpy(images)
+    np.save(path, batch)
+    return {
+        'source': source,
+        'num_images': len(batch),
+        'input_size': input_size,
+        'sha256': hashlib.sha256(batch.tobytes()).hexdigest(),
+    }
+
+
+# ============================================================
+# 3. 측정 (자식 프로세스: 변형 1개 × 스레드 수 1개)
+# ============================================================
+
+def peak_rss_mb() -> float:
+    """최대 RSS (VmHWM) - ru_maxrss는 exec 전 부모 프로세스 값을 이어받으므로 /proc 우선"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # Linux: KB
+
+
+def latency_stats(times: np.ndarray) -> Dict:
+    stats = {'mean': float(times.mean()), 'std': float(times.std()), 'min': float(times.min())}
+    stats.update({f'p{q}': float(v) for q, v in zip(PERCENTILES, np.percentile(times, PERCENTILES))})
+    return {key: round(value, 3) for key, value in stats.items()}
+
+
+def measure(args) -> Dict:
+    inputs = np.load(args.inputs)
+    baseline_rss = peak_rss_mb()
+
+    options = session_options(workers=1, cores=args.threads, shared_weights=False)
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, args.graph_optimization)
+    started = time.perf_counter()
+    session = ort.InferenceSession(args.variant_path, sess_options=options, providers=['CPUExecutionProvider'])
+    load_s = time.perf_counter() - started
+    input_name = session.get_inputs()[0].name
+
+    # 고정 입력 세트 예측 (FP32 대비 일치율 계산용)
+    chunk = max(parse_batch_sizes(args.batch_sizes))
+    logits = np.concatenate([session.run(None, {input_name: inputs[i:i + chunk]})[0]
+                             for i in range(0, len(inputs), chunk)])
+    top5 = np.argsort(logits, axis=1)[:, ::-1][:, :5]
+
+    batches = []
+    for batch_size in parse_batch_sizes(args.batch_sizes):
+        batch = np.ascontiguousarray(np.resize(inputs, (batch_size, *inputs.shape[1:])))   # 부족하면 반복
+        for _ in range(args.warmup):
+            session.run(None, {input_name: batch})
+        times = np.empty(args.runs)
+        for i in range(args.runs):
+            started = time.perf_counter()
+            session.run(None, {input_name: batch})
+            times[i] = time.perf_counter() - started
+        batches.append({
+            'batch_size': batch_size,
+            'latency_ms': latency_stats(times * 1000),
+            'throughput': round(batch_size * args.runs / times.sum(), 2),   # 이미지/초
+        })
+
+    return {
+        'load_s': round(load_s, 3),
+        'baseline_rss_mb': round(baseline_rss, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'top5': top5.tolist(),
+        'batches': batches,
+    }
+
+
+def graph_optimization(args, variant: str) -> str:
+    """변형별 세션 그래프 최적화 수준 (fp32 기준만 --reference-optimization)"""
+    return args.reference_optimization if variant == REFERENCE else SERVING_OPTIMIZATION
+
+
+def run_child(args, variant_path: Path, threads: int, inputs_path: Path, level: str) -> Dict:
+    command = [sys.executable, __file__, '--child', '--model', str(variant_path),
+               '--variant-path', str(variant_path), '--threads', str(threads), '--inputs', str(inputs_path),
+               '--batch-sizes', args.batch_sizes, '--warmup', str(args.warmup), '--runs', str(args.runs),
+               '--graph-optimization', level]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def agreement(top5: np.ndarray, reference: np.ndarray) -> Dict:
+    """FP32 기준 Top-1 일치율, FP32 Top-1이 이 변형의 Top-5에 포함되는 비율"""
+    return {
+        'top1_agreement': round(float((top5[:, 0] == reference[:, 0]).mean()), 4),
+        'top5_contains_reference_top1': round(float((top5 == reference[:, :1]).any(axis=1).mean()), 4),
+    }
+
+
+# ============================================================
+# 4. 결과 저장 / 비교
+# ============================================================
+
+def environment() -> Dict:
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    return {
+        'cpu': cpu,
+        'cores': available_cores(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'onnxruntime': ort.__version__,
+    }
+
+
+def result_key(row: Dict) -> tuple:
+    return row['variant'], row['threads'], row['batch_size']
+
+
+def row_optimization(row: Dict, report: Dict) -> str:
+    """결과 행의 그래프 최적화 수준 (버전 1 결과는 config의 단일 값)"""
+    return row.get('graph_optimization') or report['config'].get('graph_optimization', SERVING_OPTIMIZATION)
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """같은 (변형, 스레드, 배치) 항목 비교 → 회귀 목록 (처리량/p99 tolerance 초과, 일치율 하락)
+
+    그래프 최적화 수준이 다른 항목은 속도를 비교하지 않는다.
+    """
+    if current['inputs']['sha256'] != baseline['inputs']['sha256']:
+        print("⚠️  입력 세트가 다릅니다 (일치율 비교는 참고용)")
+
+    previous = {result_key(row): row for row in baseline['results']}
+    regressions = []
+    print(f"\n📊 비교: {baseline.get('model_version') or baseline['created_at']} → "
+          f"{current.get('model_version') or current['created_at']}")
+    print(f"  {'variant':>9} {'thr':>3} {'batch':>5} {'img/s':>16} {'p99 ms':>18} {'top1 agree':>16}")
+    for row in current['results']:
+        old = previous.get(result_key(row))
+        if old is None:
+            continue
+        speed = row['throughput'] / old['throughput'] - 1
+        p99 = row['latency_ms']['p99'] / old['latency_ms']['p99'] - 1
+        agree = row['top1_agreement'] - old['top1_agreement']
+        same_level = row_optimization(row, current) == row_optimization(old, baseline)
+        flags = []
+        if same_level and speed < -tolerance:
+            flags.append('throughput')
+        if same_level and p99 > tolerance:
+            flags.append('p99')
+        if agree < 0:
+            flags.append('agreement')
+        note = '' if same_level else (f"  (최적화 수준 변경: {row_optimization(old, baseline)} → "
+                                      f"{row_optimization(row, current)}, 속도 비교 제외)")
+        if flags:
+            regressions.append(f"{row['variant']} threads={row['threads']} batch={row['batch_size']}: "
+                               f"{', '.join(flags)}")
+        print(f"  {row['variant']:>9} {row['threads']:>3} {row['batch_size']:>5} "
+              f"{row['throughput']:>8.1f} ({speed:+6.1%}) {row['latency_ms']['p99']:>9.1f} ({p99:+6.1%}) "
+              f"{row['top1_agreement']:>8.3f} ({agree:+.3f}){'  ❗' if flags else ''}{note}")
+    return regressions
+
+
+def print_results(results: List[Dict]):
+    print(f"\n  {'variant':>9} {'graph opt':>19} {'thr':>3} {'batch':>5} {'p50 ms':>8} {'p99 ms':>8} {'img/s':>8} "
+          f"{'peak RSS':>9} {'top1 agree':>10}")
+    for row in results:
+        print(f"  {row['variant']:>9} {row['graph_optimization']:>19} {row['threads']:>3} {row['batch_size']:>5} "
+              f"{row['latency_ms']['p50']:>8.1f} {row['latency_ms']['p99']:>8.1f} {row['throughput']:>8.1f} "
+              f"{row['peak_rss_mb']:>7.0f}MB {row['top1_agreement']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ONNX export 변형별 CPU 벤치마크 (JSON 결과)')
+    parser.add_argument('--model', required=True, help='FP32 기준 ONNX 모델')
+    parser.add_argument('--optimized', help='최적화 모델 (없으면 생성)')
+    parser.add_argument('--quantized', help='동적 INT8 양자화 모델 (없으면 생성)')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='측정할 변형 (쉼표 구분)')
+    parser.add_argument('--metadata', default='models/model_metadata.json', help='전처리 설정/모델 버전')
+    parser.add_argument('--images', help='고정 이미지 세트 폴더 (없으면 합성 이미지)')
+    parser.add_argument('--num-images', type=int, default=DEFAULT_NUM_IMAGES)
+    parser.add_argument('--batch-sizes', default=DEFAULT_BATCH_SIZES, help='예: 1,2,4,8 또는 1-64')
+    parser.add_argument('--threads', default=None, help='intra-op 스레드 수 (예: 1,2,4, 기본: 1과 전체 코어)')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=20, help='배치 크기별 측정 횟수')
+    parser.add_argument('--output', default='artifacts/benchmarks', help='결과 폴더 (benchmark.json, 생성한 변형)')
+    parser.add_argument('--compare', help='이전 benchmark.json과 비교')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='회귀 판정 허용 범위 (처리량/p99 비율)')
+    parser.add_argument('--reference-optimization', choices=GRAPH_OPTIMIZATION_LEVELS,
+                        default=DEFAULT_REFERENCE_OPTIMIZATION,
+                        help=f'fp32 기준 세션의 그래프 최적화 수준 (다른 변형은 {SERVING_OPTIMIZATION})')
+    parser.add_argument('--graph-optimization', choices=GRAPH_OPTIMIZATION_LEVELS, help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--variant-path', help=argparse.SUPPRESS)
+    parser.add_argument('--inputs', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.threads = int(args.threads)
+        print(json.dumps(measure(args)))
+        return
+
+    args.variants = [name.strip() for name in args.variants.split(',')]
+    unknown = set(args.variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"알 수 없는 변형: {', '.join(sorted(unknown))} (가능: {', '.join(VARIANTS)})")
+    if REFERENCE not in args.variants:
+        args.variants.insert(0, REFERENCE)   # 일치율 기준
+    thread_counts = (parse_batch_sizes(args.threads) if args.threads
+                     else sorted({1, available_cores()}))
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    variants = prepare_variants(args, output_dir)
+
+    inputs_path = output_dir / 'inputs.npy'
+    inputs = build_inputs(args, model_input_size(variants[REFERENCE]), inputs_path)
+    print(f"⏱️  변형 벤치마크: {', '.join(variants)} × 스레드 {thread_counts} × 배치 {args.batch_sizes}")
+    print(f"  입력: {inputs['source']}, {inputs['input_size']}px, sha256 {inputs['sha256'][:12]}")
+
+    results, reference = [], {}
+    for threads in thread_counts:
+        for name, path in variants.items():
+            level = graph_optimization(args, name)
+            print(f"  - {name} (threads={threads}, {level}) ...", flush=True)
+            measured = run_child(args, path, threads, inputs_path, level)
+            top5 = np.array(measured['top5'])
+            if name == REFERENCE:
+                reference[threads] = top5
+            for batch in measured['batches']:
+                results.append({
+                    'variant': name,
+                    'graph_optimization': level,
+                    'threads': threads,
+                    **batch,
+                    'load_s': measured['load_s'],
+                    'peak_rss_mb': measured['peak_rss_mb'],
+                    'model_rss_mb': round(measured['peak_rss_mb'] - measured['baseline_rss_mb'], 1),
+                    **agreement(top5, reference[threads]),
+                })
+    inputs_path.unlink()
+
+    model_version = None
+    if args.metadata and Path(args.metadata).exists():
+        with open(args.metadata, 'r', encoding='utf-8') as f:
+            model_version = json.load(f).get('model_version')
+    report = {
+        'version': RESULT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'model_version': model_version,
+        'environment': environment(),
+        'config': {'batch_sizes': parse_batch_sizes(args.batch_sizes), 'threads': thread_counts,
+                   'warmup': args.warmup, 'runs': args.runs,
+                   'graph_optimization': {name: graph_optimization(args, name) for name in variants}},
+        'inputs': inputs,
+        'variants': {name: variant_info(path) for name, path in variants.items()},
+        'results': results,
+    }
+    report_path = output_dir / 'benchmark.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print_results(results)
+    print(f"\n✅ 결과 저장: {report_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ 회귀 {len(regressions)}건 (허용 범위 {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n✅ 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""
+drugs_master 대량 로더
+선정 약품(100개) 또는 전체 카탈로그(4,523개)를 청크 단위로 DB에 적재
+
+- PostgreSQL/Supabase: 연결 풀 + COPY → staging 테이블 → merge (또는 execute_values)
+- SQLite: 로컬 테스트용 stand-in (같은 staging → merge 흐름)
+- dry-run: 기존처럼 SQL 파일만 생성
+
+Usage:
+    python bulk_load_drugs.py --dry-run
+    python bulk_load_drugs.py --source catalog.csv --sqlite /tmp/drugs.db
+    SUPABASE_DB_URL=postgresql://... python bulk_load_drugs.py --source catalog.csv --chunk-size 1000
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from load_drugs_to_supabase import json_path, sql_str
+from prepare_drug_selection import normalize_kcode  # load_drugs_to_supabase가 data_prep 경로를 추가
+
+# dry-run 기본 출력 (커밋된 scripts/supabase_load_drugs.sql을 덮어쓰지 않도록 분리)
+DRY_RUN_OUTPUT_PATH = Path(__file__).resolve().parent.parent / 'artifacts' / 'bulk_load_drugs_dry_run.sql'
+
+COLUMNS = ('kcode', 'edi_code', 'drug_name', 'manufacturer', 'usage_count', 'shootable')
+
+# CSV 카탈로그 컬럼 별칭 (drug_selection_workspace / drugs_master.csv 형식 모두 허용)
+COLUMN_ALIASES = {
+    'kcode': ('kcode', 'K-CODE', 'k_code'),
+    'edi_code': ('edi_code', 'EDI', 'edi'),
+    'drug_name': ('drug_name', 'Drug_Name', 'item_name'),
+    'manufacturer': ('manufacturer', 'Manufacturer', 'entp_name'),
+    'usage_count': ('usage_count', 'Usage_Count'),
+    'shootable': ('shootable', 'Shootable'),
+}
+
+MERGE_SET = """
+  edi_code = EXCLUDED.edi_code,
+  drug_name = EXCLUDED.drug_name,
+  manufacturer = EXCLUDED.manufacturer,
+  usage_count = EXCLUDED.usage_count"""
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def parse_usage(value):
+    """사용량 값을 정수로 변환 (빈 값/숫자가 아닌 값/NaN·inf는 NULL)"""
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        print(f"Warning: Invalid usage_count: {value!r}")
+        return None
+
+
+def drug_row(drug):
+    """약품 dict → drugs_master 컬럼 순서의 튜플 (빈 문자열은 NULL, drug_name은 NOT NULL이므로 '')
+
+    K-CODE는 prepare_drug_selection.normalize_kcode로 K-000000 형식 정규화 (무효 값은 None)
+    """
+    return (
+        normalize_kcode(drug.get('kcode')),
+        drug.get('edi_code') or None,
+        drug.get('drug_name') or '',
+        drug.get('manufacturer') or None,
+        parse_usage(drug.get('usage_count')),
+        drug.get('shootable') or None,
+    )
+
+
+def iter_drugs(source):
+    """JSON(top_100_metadata 형식) 또는 CSV 카탈로그에서 약품 dict 스트리밍"""
+    source = Path(source)
+    if source.suffix.lower() == '.json':
+        with open(source, 'r', encoding='utf-8') as f:
+            for drug in json.load(f)['drugs']:
+                # 선정 약품은 기존 로드 스크립트와 같이 기본 촬영 난이도 Y
+                yield {**drug, 'shootable': drug.get('shootable') or 'Y'}
+        return
+
+    with open(source, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        mapping = {
+            column: next((alias for alias in aliases if alias in fields), None)
+            for column, aliases in COLUMN_ALIASES.items()
+        }
+        for record in reader:
+            yield {column: record[alias] if alias else None for column, alias in mapping.items()}
+
+
+def dedupe_rows(drugs):
+    """정규화된 K-CODE 기준 전체 중복 제거 (마지막 값 유지, 순서는 첫 등장 기준)
+
+    청크 경계를 넘는 중복이 남으면 병렬 적재 시 어느 값이 남을지 정해지지 않으므로
+    청크로 나누기 전에 소스 전체에서 제거한다.
+    """
+    rows = {}
+    for drug in drugs:
+        row = drug_row(drug)
+        if row[0]:
+            rows[row[0]] = row
+    return list(rows.values())
+
+
+def iter_chunks(drugs, chunk_size):
+    """K-CODE 중복 제거 후 청크 단위 행 리스트 생성"""
+    rows = dedupe_rows(drugs)
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+class PostgresLoader:
+    """psycopg2 연결 풀 기반 로더 (COPY → staging → merge, 또는 execute_values)"""
+
+    def __init__(self, dsn, pool_size=4, method='copy'):
+        try:
+            from psycopg2.pool import ThreadedConnectionPool
+        except ImportError:
+            print("❌ psycopg2 패키지가 설치되지 않았습니다.")
+            print("설치: pip install psycopg2-binary")
+            sys.exit(1)
+
+        self.pool = ThreadedConnectionPool(1, pool_size, dsn)
+        self.method = method
+
+    def load_chunk(self, rows):
+        conn = self.pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                if self.method == 'copy':
+                    self._copy_merge(cur, rows)
+                else:
+                    self._execute_values(cur, rows)
+        finally:
+            self.pool.putconn(conn)
+        return len(rows)
+
+    def _copy_merge(self, cur, rows):
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS drugs_master_staging (
+                kcode VARCHAR(20), edi_code VARCHAR(20), drug_name VARCHAR(200),
+                manufacturer VARCHAR(200), usage_count INTEGER, shootable VARCHAR(1)
+            ) ON COMMIT DELETE ROWS
+        """)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if value is None else value for value in row])
+        buffer.seek(0)
+
+        cur.copy_expert(
+            f"COPY drugs_master_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+        cur.execute(f"""
+            INSERT INTO drugs_master ({', '.join(COLUMNS)})
+            SELECT {', '.join(COLUMNS)} FROM drugs_master_staging
+            ON CONFLICT (kcode) DO UPDATE SET{MERGE_SET}
+        """)
+
+    def _execute_values(self, cur, rows):
+        from psycopg2.extras import execute_values
+
+        execute_values(
+            cur,
+            f"INSERT INTO drugs_master ({', '.join(COLUMNS)}) VALUES %s "
+            f"ON CONFLICT (kcode) DO UPDATE SET{MERGE_SET}",
+            rows,
+            page_size=len(rows)
+        )
+
+    def close(self):
+        self.pool.closeall()
+
+
+class SQLiteLoader:
+    """로컬 테스트용 SQLite stand-in (staging 테이블 → upsert merge)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS drugs_master (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kcode VARCHAR(20) UNIQUE NOT NULL,
+            edi_code VARCHAR(20),
+            drug_name VARCHAR(200) NOT NULL,
+            manufacturer VARCHAR(200),
+            usage_count INTEGER,
+            shootable VARCHAR(1) CHECK (shootable IN ('Y', 'M', 'N')),
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(self.SCHEMA)
+        self.conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS drugs_master_staging ({', '.join(COLUMNS)})")
+        self.conn.commit()
+
+    def load_chunk(self, rows):
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO drugs_master_staging VALUES ({', '.join('?' * len(COLUMNS))})", rows
+            )
+            self.conn.execute(f"""
+                INSERT INTO drugs_master ({', '.join(COLUMNS)})
+                SELECT {', '.join(COLUMNS)} FROM drugs_master_staging WHERE true
+                ON CONFLICT (kcode) DO UPDATE SET{MERGE_SET}
+            """)
+            self.conn.execute("DELETE FROM drugs_master_staging")
+        return len(rows)
+
+    def close(self):
+        self.conn.close()
+
+
+def write_dry_run_sql(chunks, sql_path):
+    """DB 연결 없이 청크별 INSERT ... ON CONFLICT 문을 SQL 파일로 저장"""
+    def literal(value):
+        if value is None:
+            return 'NULL'
+        if isinstance(value, int):
+            return str(value)
+        return sql_str(value) if value != '' else "''"
+
+    total = 0
+    with open(sql_path, 'w', encoding='utf-8') as f:
+        f.write("-- drugs_master 대량 로드 스크립트 (bulk_load_drugs.py --dry-run)\n\n")
+        for i, rows in enumerate(chunks, start=1):
+            f.write(f"-- chunk {i}: {len(rows)}개\n")
+            f.write(f"INSERT INTO drugs_master ({', '.join(COLUMNS)})\nVALUES\n")
+            f.write(",\n".join(f"  ({', '.join(literal(v) for v in row)})" for row in rows))
+            f.write(f"\nON CONFLICT (kcode) DO UPDATE SET{MERGE_SET};\n\n")
+            total += len(rows)
+    return total
+
+
+def run_load(loader, chunks, workers=1):
+    """청크를 로더에 전달하고 rows/sec 리포트"""
+    started = time.perf_counter()
+    total = 0
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for loaded in executor.map(loader.load_chunk, chunks):
+                total += loaded
+    else:
+        for i, rows in enumerate(chunks, start=1):
+            total += loader.load_chunk(rows)
+            print(f"  chunk {i}: {len(rows)}개 적재 (누적 {total:,})")
+
+    elapsed = time.perf_counter() - started
+    return total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='drugs_master 청크 단위 대량 적재')
+    parser.add_argument('--source', default=str(json_path),
+                        help='top_100_metadata 형식 JSON 또는 카탈로그 CSV (기본: top_100_metadata_final.json)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='청크당 행 수')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--dsn', default=os.environ.get('SUPABASE_DB_URL'),
+                        help='PostgreSQL 접속 문자열 (기본: $SUPABASE_DB_URL)')
+    target.add_argument('--sqlite', help='SQLite stand-in DB 파일 경로')
+    target.add_argument('--dry-run', action='store_true', help='DB 적재 없이 SQL 파일만 생성')
+    parser.add_argument('--method', choices=['copy', 'values'], default='copy',
+                        help='PostgreSQL 적재 방식: COPY+merge 또는 execute_values')
+    parser.add_argument('--pool-size', type=int, default=4, help='PostgreSQL 연결 풀 크기')
+    parser.add_argument('--workers', type=int, default=1, help='동시 적재 청크 수 (연결 풀 사용)')
+    parser.add_argument('--output', default=str(DRY_RUN_OUTPUT_PATH),
+                        help='dry-run SQL 파일 경로 (기본: artifacts/bulk_load_drugs_dry_run.sql)')
+    args = parser.parse_args()
+
+    print(f"📊 약품 데이터 소스: {args.source}")
+    chunks = iter_chunks(iter_drugs(args.source), args.chunk_size)
+
+    if args.dry_run:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        total = write_dry_run_sql(chunks, args.output)
+        elapsed = time.perf_counter() - started
+        print(f"\n✅ SQL 파일 생성 완료: {args.output}")
+    else:
+        if args.sqlite:
+            print(f"🗄️  SQLite stand-in: {args.sqlite}")
+            loader = SQLiteLoader(args.sqlite)
+            workers = 1
+        elif args.dsn:
+            print(f"🔗 PostgreSQL 적재 (method={args.method}, pool={args.pool_size}, workers={args.workers})")
+            loader = PostgresLoader(args.dsn, pool_size=args.pool_size, method=args.method)
+            workers = min(args.workers, args.pool_size)
+        else:
+            print("❌ --dsn (또는 SUPABASE_DB_URL), --sqlite, --dry-run 중 하나가 필요합니다.")
+            sys.exit(1)
+
+        try:
+            total, elapsed = run_load(loader, chunks, workers=workers)
+        finally:
+            loader.close()
+        print(f"\n✅ drugs_master 적재 완료")
+
+    print(f"  - 총 행 수: {total:,}개")
+    print(f"  - 소요 시간: {elapsed:.2f}s")
+    print(f"  - 처리 속도: {total / max(elapsed, 1e-9):,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+"""
+학습 manifest 생성 (스튜디오:실사진 3:7 통합 + train/val/test 분할)
+integrate_datasets / split_dataset / create_manifest(planning/phase4_training.md Task 7-9)를 한 단계로 대체
+
+- 스캔: capture_catalog.build_catalog (K-CODE 폴더 단위 병렬 스캔) 결과를 .npz로 저장해 두고
+    재분할 시에는 다시 스캔하지 않음 (--rescan으로 갱신)
+- 분할: 약품 + 촬영 조건(세션/배경/LED/면/제형/각도)의 안정 해시 → 같은 조건 그룹은 항상 같은 split
+    (회전각만 다른 사진이 train/test에 나뉘는 누수 방지, 사진이 추가돼도 기존 사진의 split은 불변)
+- 3:7 비율: 클래스별 필요 스튜디오 수를 벡터 연산으로 계산하고, 파일 해시 순서의 앞에서부터 선택
+    (실사진이 늘면 스튜디오 선택은 기존 선택에 추가만 됨)
+- 출력: Parquet manifest (경로/레이블/split/출처/촬영 조건, 문자열 컬럼은 dictionary 인코딩) + 요약 JSON
+    --splits-json으로 기존 splits.json 형식도 저장 (training_shards 등 호환)
+
+Created: 2025-10-28
+Purpose: 230만 장 스튜디오 + 2.4만 장 실사진 manifest를 재현 가능하고 빠르게 재생성
+Usage:
+    python build_manifest.py --roots /mnt/windows/pillsnap_data/train /data/captures --workers 8
+    python build_manifest.py --splits-json artifacts/datasets/splits.json          # 저장된 카탈로그로 재분할
+    python build_manifest.py --previous artifacts/datasets/manifest.parquet.prev     # 이전 manifest와 split 비교
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from capture_catalog import STUDIO_SESSION, CaptureCatalog, build_catalog, format_filename, kcode_numbers
+
+try:
+    import pandas as pd
+    import pyarrow  # noqa: F401  (pandas.to_parquet 엔진)
+except ImportError:
+    print("❌ pandas와 pyarrow가 필요합니다: pip install pandas pyarrow")
+    sys.exit(1)
+
+BASE = Path(__file__).resolve().parents[2]
+DATASET_DIR = BASE / 'artifacts' / 'datasets'
+DEFAULT_CATALOG_PATH = DATASET_DIR / 'manifest_catalog.npz'
+DEFAULT_CLASS_MAPPING_PATH = DATASET_DIR / 'class_mapping.json'
+DEFAULT_MANIFEST_PATH = DATASET_DIR / 'manifest.parquet'
+DEFAULT_SUMMARY_PATH = DATASET_DIR / 'manifest.json'
+
+SPLITS = ('train', 'val', 'test')
+SPLIT_RATIOS = (0.8, 0.1, 0.1)
+STUDIO_RATIO = 0.3
+REAL_RATIO = 0.7
+MIN_IMAGES_PER_CLASS = 50
+DEFAULT_SALT = 'pillsnap-narrow-v1'
+DEFAULT_TARGET_SIZE = 512
+MANIFEST_VERSION = 1
+
+# 분할 그룹: 회전각/크기/확장자만 다른 사진은 같은 그룹
+GROUP_FIELDS = ('kcode', 'session', 'bg', 'led', 'side', 'form', 'angle')
+FILE_FIELDS = GROUP_FIELDS + ('rot', 'size', 'ext')
+
+
+# ============================================================
+# 1. 안정 해시 (NumPy 벡터 연산, 실행/플랫폼과 무관)
+# ============================================================
+
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def splitmix64(x):
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * _MIX1
+    x = (x ^ (x >> np.uint64(27))) * _MIX2
+    return x ^ (x >> np.uint64(31))
+
+
+def salt_value(salt):
+    """문자열 salt → uint64 (Python hash()는 실행마다 달라 사용하지 않음)"""
+    value = np.uint64(0)
+    for byte in salt.encode('utf-8'):
+        value = splitmix64(value ^ np.uint64(byte))
+    return value
+
+
+def stable_hash(records, fields, salt=DEFAULT_SALT):
+    """카탈로그 행의 필드 조합 → uint64 해시"""
+    with np.errstate(over='ignore'):
+        h = np.full(len(records), salt_value(salt), dtype=np.uint64)
+        for field in fields:
+            h = splitmix64(h ^ records[field].astype(np.int64).astype(np.uint64))
+    return h
+
+
+def hash_to_unit(h):
+    """uint64 해시 → [0, 1) 균등 분포"""
+    return (h >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def assign_splits(group_hash, ratios=SPLIT_RATIOS):
+    """그룹 해시 → split 번호 (SPLITS 인덱스)"""
+    bounds = np.cumsum(ratios)[:-1] / np.sum(ratios)
+    return np.searchsorted(bounds, hash_to_unit(group_hash), side='right').astype(np.int8)
+
+
+# ============================================================
+# 2. 3:7 비율 샘플링
+# ============================================================
+
+def studio_targets(real_counts, studio_ratio=STUDIO_RATIO, min_images=MIN_IMAGES_PER_CLASS):
+    """클래스별 필요 스튜디오 수 (integrate_datasets와 같은 규칙: 전체 = max(실사진 / 0.7, 최소 수))"""
+    total_needed = np.maximum(real_counts / (1 - studio_ratio), min_images)
+    return (total_needed * studio_ratio).astype(np.int64)
+
+
+def select_studio(labels, file_hash, targets):
+    """클래스별로 파일 해시 순서 앞의 targets[label]개 선택 (벡터 연산)
+
+    Returns:
+        선택 마스크 (labels와 같은 길이)
+    """
+    order = np.lexsort((file_hash, labels))
+    sorted_labels = labels[order]
+    group_start = np.searchsorted(sorted_labels, sorted_labels, side='left')
+    rank = np.arange(len(order)) - group_start
+    selected = np.zeros(len(labels), dtype=bool)
+    selected[order[rank < targets[sorted_labels]]] = True
+    return selected
+
+
+# ============================================================
+# 3. manifest 생성
+# ============================================================
+
+def load_class_mapping(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    if 'class_to_idx' in mapping:
+        return mapping['class_to_idx']
+    return {kcode: int(idx) for idx, kcode in mapping['idx_to_class'].items()}
+
+
+def load_or_build_catalog(roots, catalog_path, workers, rescan=False):
+    catalog_path = Path(catalog_path)
+    if catalog_path.exists() and not (rescan and roots):
+        try:
+            return CaptureCatalog.load(catalog_path), False
+        except ValueError as e:
+            # 이전 형식의 카탈로그: --roots가 있으면 다시 스캔
+            if not roots:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print(f"⚠️  {e} → 다시 스캔")
+    if not roots:
+        print(f"❌ 카탈로그가 없습니다: {catalog_path} (--roots로 스캔할 폴더를 지정하세요)")
+        sys.exit(1)
+    records, dirs, invalid = build_catalog(roots, workers=workers)
+    if invalid:
+        print(f"⚠️  파일명 규칙 위반 {len(invalid):,}개 제외 (예: {invalid[0]})")
+    catalog = CaptureCatalog(records, dirs)
+    catalog.save(catalog_path)
+    return catalog, True
+
+
+def build_manifest(catalog, class_to_idx, salt=DEFAULT_SALT, ratios=SPLIT_RATIOS,
+                   studio_ratio=STUDIO_RATIO, min_images=MIN_IMAGES_PER_CLASS):
+    """카탈로그 → manifest DataFrame (선택된 사진만)"""
+    records = catalog.records
+    kcodes = sorted(class_to_idx, key=class_to_idx.get)
+    numbers = kcode_numbers(kcodes)
+
+    # 매핑된 클래스만 (K-CODE 번호 → 레이블 조회 테이블)
+    selected = records[np.isin(records['kcode'], numbers)]
+    lookup = np.zeros(int(numbers.max()) + 1, dtype=np.int64)
+    lookup[numbers] = [class_to_idx[f'K-{int(n):06d}'] for n in numbers]
+    labels = lookup[selected['kcode']]
+    is_real = selected['session'] != STUDIO_SESSION
+
+    group_hash = stable_hash(selected, GROUP_FIELDS, salt)
+    file_hash = stable_hash(selected, FILE_FIELDS, salt)
+
+    # 실사진은 전부, 스튜디오는 클래스별 3:7 비율만큼
+    real_counts = np.bincount(labels[is_real], minlength=len(kcodes))
+    targets = studio_targets(real_counts, studio_ratio, min_images)
+    keep = is_real.copy()
+    studio = np.flatnonzero(~is_real)
+    keep[studio[select_studio(labels[studio], file_hash[studio], targets)]] = True
+
+    kept = selected[keep]
+    paths = [os.path.join(catalog.dirs[record['dir_id']], format_filename(record)) for record in kept]
+    frame = pd.DataFrame({
+        'path': paths,
+        'label': labels[keep].astype(np.int16),
+        'kcode': pd.Categorical([f'K-{int(n):06d}' for n in kept['kcode']], categories=kcodes),
+        'split': pd.Categorical.from_codes(assign_splits(group_hash[keep], ratios), SPLITS),
+        'source': pd.Categorical.from_codes(is_real[keep].astype(np.int8), ['studio', 'real']),
+        'session': kept['session'],
+        'bg': kept['bg'],
+        'led': kept['led'],
+        'side': kept['side'],
+        'rot': kept['rot'],
+        'group_hash': group_hash[keep],
+    })
+    return frame.sort_values(['split', 'label', 'path'], kind='stable').reset_index(drop=True), targets
+
+
+def summarize(frame, targets, kcodes, args):
+    """manifest.json 요약 (create_manifest 형식 + 출처/비율)"""
+    summary = {
+        'dataset_name': 'PillSnap Narrow Model Dataset',
+        'version': MANIFEST_VERSION,
+        'created_date': datetime.now().isoformat(timespec='seconds'),
+        'manifest': Path(args.output).name,
+        'num_classes': len(kcodes),
+        'total_images': len(frame),
+        'split_salt': args.salt,
+        'split_ratios': dict(zip(SPLITS, SPLIT_RATIOS)),
+        'studio_ratio': STUDIO_RATIO,
+        'preprocessing': {'target_size': args.target_size},
+        'splits': {},
+    }
+    for split in SPLITS:
+        part = frame[frame['split'] == split]
+        summary['splits'][split] = {
+            'num_images': len(part),
+            'sources': part['source'].value_counts().to_dict(),
+            'class_distribution': {k: int(v) for k, v in part['kcode'].value_counts(sort=False).items() if v},
+        }
+
+    studio_counts = frame[frame['source'] == 'studio'].groupby('label', observed=True).size()
+    short = [kcodes[label] for label in np.flatnonzero(targets)
+             if studio_counts.get(label, 0) < targets[label]]
+    summary['studio_shortfall'] = short   # 스튜디오 사진이 모자라 3:7을 못 맞춘 클래스
+    return summary
+
+
+def load_splits(path):
+    """manifest.parquet 또는 splits.json → {split: [{'path', 'label', 'kcode'}, ...]}"""
+    path = Path(path)
+    if path.suffix != '.parquet':
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    frame = pd.read_parquet(path, columns=['path', 'label', 'kcode', 'split'])
+    return {
+        split: [{'path': p, 'label': int(label), 'kcode': kcode}
+                for p, label, kcode in zip(part['path'], part['label'], part['kcode'].astype(str))]
+        for split, part in frame.groupby('split', observed=True, sort=False)
+    }
+
+
+def compare_previous(frame, previous_path):
+    """이전 manifest 대비 추가/제거/split 변경 수 (같은 salt면 변경 0이어야 함)"""
+    previous = pd.read_parquet(previous_path, columns=['path', 'split'])
+    merged = frame[['path', 'split']].merge(previous, on='path', how='outer', suffixes=('', '_prev'),
+                                            indicator=True)
+    both = merged[merged['_merge'] == 'both']
+    return {
+        'added': int((merged['_merge'] == 'left_only').sum()),
+        'removed': int((merged['_merge'] == 'right_only').sum()),
+        'moved': int((both['split'].astype(str) != both['split_prev'].astype(str)).sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='학습 manifest 생성 (3:7 통합 + 안정 해시 분할)')
+    parser.add_argument('--roots', nargs='+', help='스캔할 루트 (스튜디오 train/, 촬영 세션 폴더)')
+    parser.add_argument('--rescan', action='store_true', help='저장된 카탈로그가 있어도 다시 스캔')
+    parser.add_argument('--catalog', default=str(DEFAULT_CATALOG_PATH), help='스캔 결과 .npz')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--class-mapping', default=str(DEFAULT_CLASS_MAPPING_PATH))
+    parser.add_argument('--salt', default=DEFAULT_SALT, help='분할 해시 salt (바꾸면 전체 재분할)')
+    parser.add_argument('--target-size', type=int, default=DEFAULT_TARGET_SIZE, help='요약 JSON의 학습 해상도')
+    parser.add_argument('--output', default=str(DEFAULT_MANIFEST_PATH))
+    parser.add_argument('--summary', default=str(DEFAULT_SUMMARY_PATH))
+    parser.add_argument('--splits-json', help='기존 splits.json 형식으로도 저장')
+    parser.add_argument('--previous', help='비교할 이전 manifest.parquet')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    catalog, scanned = load_or_build_catalog(args.roots, args.catalog, args.workers, args.rescan)
+    scan_s = time.perf_counter() - started
+    print(f"📂 카탈로그: {len(catalog):,}개 ({'스캔' if scanned else '저장본'} {scan_s:.1f}초, {args.catalog})")
+
+    class_to_idx = load_class_mapping(args.class_mapping)
+    kcodes = sorted(class_to_idx, key=class_to_idx.get)
+    started = time.perf_counter()
+    frame, targets = build_manifest(catalog, class_to_idx, salt=args.salt)
+    build_s = time.perf_counter() - started
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_parquet(output, index=False, compression='zstd')
+    summary = summarize(frame, targets, kcodes, args)
+    with open(args.summary, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Manifest: {output} ({output.stat().st_size / 1e6:.2f} MB, {build_s:.2f}초)")
+    for split in SPLITS:
+        info = summary['splits'][split]
+        sources = info['sources']
+        print(f"  {split:>5}: {info['num_images']:,}개 (스튜디오 {sources.get('studio', 0):,} / "
+              f"실사진 {sources.get('real', 0):,})")
+    studio_share = (frame['source'] == 'studio').mean() if len(frame) else 0.0
+    print(f"  - 스튜디오 비율: {studio_share:.1%} (목표 {STUDIO_RATIO:.0%})")
+    if summary['studio_shortfall']:
+        print(f"⚠️  스튜디오 사진 부족 클래스 {len(summary['studio_shortfall'])}개: "
+              f"{', '.join(summary['studio_shortfall'][:10])}")
+
+    if args.splits_json:
+        with open(args.splits_json, 'w', encoding='utf-8') as f:
+            json.dump(load_splits(output), f, ensure_ascii=False)
+        print(f"✅ splits.json: {args.splits_json}")
+
+    if args.previous:
+        diff = compare_previous(frame, args.previous)
+        print(f"📊 이전 manifest 대비: 추가 {diff['added']:,}, 제거 {diff['removed']:,}, "
+              f"split 변경 {diff['moved']:,}")
+
+
+if __name__ == "__main__":
+    main()
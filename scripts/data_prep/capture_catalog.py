@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+"""
+촬영 사진 파일명 파서 + 컬럼형 카탈로그 인덱스
+K-{KCODE}_{BG}_{LED}_{SIDE}_{FORM}_{ANGLE}_{ROT}_{SIZE}.jpg 규칙(docs/20251024_storage_structure.md)을
+파싱하여 NumPy structured array로 저장하고, 촬영 커버리지(약품 × BG × LED × ROT) 조회
+
+- 신규 촬영(CS_{N}_single/K-XXXXXX/*.jpg)과 기존 스튜디오 세트(train/K-XXXXXX/*.png, 230만 장) 모두 지원
+- K-CODE 폴더 단위로 os.scandir + 파싱을 프로세스 풀에서 병렬 처리
+- 파일명은 필드로 복원 가능하므로 경로 문자열 대신 폴더 ID만 저장 (행당 21바이트)
+  복원 결과가 원래 이름과 다른 비정규 표기(_45_, 앙각 090 등)와 필드 범위 초과 값은 스캔 시 규칙 위반 처리
+
+Created: 2025-10-28
+Purpose: 파일명 규칙 자동 검증, 누락 촬영 셀 조회, 업로드 메타데이터 자동 채움
+Usage:
+    python capture_catalog.py --build /data/captures /mnt/windows/pillsnap_data/train --workers 8
+    python capture_catalog.py --coverage --session 1
+    python capture_catalog.py --coverage --kcodes artifacts/top_100_metadata_final.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+BASE = Path(__file__).resolve().parents[2]
+DEFAULT_INDEX_PATH = BASE / 'artifacts' / 'capture_catalog.npz'
+
+# format_filename으로 그대로 복원되는 표기만 허용 (숫자는 앞자리 0 없음, 회전각은 3자리, 숫자형 면은 한 자리)
+_NUM = r'(0|[1-9]\d*)'
+FILENAME_PATTERN = re.compile(
+    rf'^K-(\d{{6}})_{_NUM}_{_NUM}_(front|back|\d)_{_NUM}_{_NUM}_(\d{{3}}|[1-9]\d{{3,}})_{_NUM}\.(jpg|png)$'
+)
+KCODE_DIR_PATTERN = re.compile(r'^K-\d{6}$')
+SESSION_DIR_PATTERN = re.compile(r'^CS_(\d+)_single$')
+
+# 코드표 (docs/20251024_storage_structure.md)
+BACKGROUNDS = ('skin_palm', 'wood_table', 'white', 'black', 'pattern_check')
+LED_LEVELS = (3, 5, 8)
+SIDES = ('front', 'back')
+ROTATIONS = tuple(range(0, 360, 45))
+EXTENSIONS = ('jpg', 'png')
+
+LED_LOOKUP = np.full(256, -1, dtype=np.int16)
+LED_LOOKUP[list(LED_LEVELS)] = np.arange(len(LED_LEVELS))
+
+SIDE_UNKNOWN = -1   # 기존 스튜디오 파일명 (면 구분 없음)
+SIDE_WORD = -1      # side_num: 면이 front/back 단어로 표기된 파일명
+STUDIO_SESSION = 0  # CS_{N}_single 밖의 폴더
+
+CATALOG_DTYPE = np.dtype([
+    ('kcode', '<u4'),     # K-030864 → 30864
+    ('session', '<u2'),   # CS_{N}_single의 N (스튜디오 0)
+    ('dir_id', '<u4'),    # dirs 배열 인덱스
+    ('bg', 'u1'),
+    ('led', 'u1'),        # 기존 스튜디오 파일명은 0
+    ('side', 'i1'),       # 0=front, 1=back, -1=구분 없음
+    ('side_num', 'i1'),   # 숫자형 면 표기(0~9) 원래 값, 단어 표기는 -1 (파일명 복원용)
+    ('form', 'u1'),
+    ('angle', 'u1'),
+    ('rot', '<u2'),
+    ('size', '<u2'),
+    ('ext', 'u1'),        # EXTENSIONS 인덱스
+])
+
+# 필드별 최대값 (이를 넘는 파일명은 카탈로그에 담을 수 없으므로 규칙 위반 처리)
+FIELD_MAX = {name: np.iinfo(CATALOG_DTYPE[name]).max for name in ('bg', 'led', 'form', 'angle', 'rot', 'size')}
+
+
+# ============================================================
+# 1. 파일명 파서
+# ============================================================
+
+def _scan_row(groups):
+    """정규식 그룹 → 카탈로그 필드 튜플 (kcode, bg, led, side, side_num, form, angle, rot, size, ext)
+
+    필드 범위를 넘으면 None
+    """
+    kcode, bg, led, side, form, angle, rot, size, ext = groups
+    bg, led, form, angle, rot, size = int(bg), int(led), int(form), int(angle), int(rot), int(size)
+    if (bg > FIELD_MAX['bg'] or led > FIELD_MAX['led'] or form > FIELD_MAX['form']
+            or angle > FIELD_MAX['angle'] or rot > FIELD_MAX['rot'] or size > FIELD_MAX['size']):
+        return None
+    if side in SIDES:
+        side, side_num = SIDES.index(side), SIDE_WORD
+    else:
+        side, side_num = SIDE_UNKNOWN, int(side)
+    return int(kcode), bg, led, side, side_num, form, angle, rot, size, 0 if ext == 'jpg' else 1
+
+
+def parse_filename(filename):
+    """파일명 → 필드 dict (규칙에 맞지 않으면 None)
+
+    format_filename(parse_filename(name)) == name 이 항상 성립한다.
+    """
+    match = FILENAME_PATTERN.match(filename)
+    row = _scan_row(match.groups()) if match else None
+    if row is None:
+        return None
+    kcode, bg, led, side, side_num, form, angle, rot, size, ext = row
+    return {
+        'kcode': f'K-{kcode:06d}',
+        'bg': bg,
+        'led': led,
+        'side': side,
+        'side_num': side_num,
+        'form': form,
+        'angle': angle,
+        'rot': rot,
+        'size': size,
+        'ext': EXTENSIONS[ext],
+    }
+
+
+def format_filename(record):
+    """카탈로그 행(또는 parse_filename 결과) → 파일명 (parse_filename의 역변환)"""
+    kcode = str(record['kcode']).replace('K-', '')
+    side = SIDES[record['side']] if record['side_num'] < 0 else record['side_num']
+    ext = record['ext'] if isinstance(record['ext'], str) else EXTENSIONS[record['ext']]
+    return (f"K-{int(kcode):06d}_{record['bg']}_{record['led']}_{side}_{record['form']}_"
+            f"{record['angle']}_{int(record['rot']):03d}_{record['size']}.{ext}")
+
+
+def metadata_fields(filename):
+    """파일명에서 capture_real_photos 컬럼 값 추출 (build_metadata 입력)
+
+    Returns:
+        {'capture_angle', 'turntable_angle', 'background_color', 'led_brightness'} 또는 None
+    """
+    fields = parse_filename(filename)
+    if fields is None or fields['side'] == SIDE_UNKNOWN or fields['bg'] >= len(BACKGROUNDS):
+        return None
+    return {
+        'capture_angle': SIDES[fields['side']],
+        'turntable_angle': fields['rot'],
+        'background_color': BACKGROUNDS[fields['bg']],
+        'led_brightness': fields['led'],
+    }
+
+
+# ============================================================
+# 2. 병렬 디렉토리 스캔
+# ============================================================
+
+def find_kcode_dirs(roots):
+    """루트들에서 K-XXXXXX 폴더 탐색 (K-CODE 폴더 안으로는 내려가지 않음)
+
+    Returns:
+        [(dir_path, session), ...] - 경로순 정렬
+    """
+    found = []
+    stack = [(str(Path(root)), STUDIO_SESSION) for root in roots]
+    while stack:
+        path, session = stack.pop()
+        name = os.path.basename(path)
+        if KCODE_DIR_PATTERN.match(name):
+            found.append((path, session))
+            continue
+        match = SESSION_DIR_PATTERN.match(name)
+        if match:
+            session = int(match.group(1))
+        with os.scandir(path) as entries:
+            stack.extend((entry.path, session) for entry in entries if entry.is_dir())
+    return sorted(found)
+
+
+def scan_dirs(batch):
+    """K-CODE 폴더 묶음 스캔 (워커 프로세스)
+
+    Args:
+        batch: [(dir_id, dir_path, session), ...]
+
+    Returns:
+        (structured array, 규칙 위반 파일 경로 리스트)
+    """
+    rows = []
+    invalid = []
+    match = FILENAME_PATTERN.match
+    for dir_id, dir_path, session in batch:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                m = match(entry.name)
+                row = _scan_row(m.groups()) if m else None
+                if row is None:
+                    if entry.is_file():
+                        invalid.append(entry.path)
+                    continue
+                kcode, *fields = row
+                rows.append((kcode, session, dir_id, *fields))
+    return np.array(rows, dtype=CATALOG_DTYPE), invalid
+
+
+def build_catalog(roots, workers=None, dirs_per_task=16):
+    """루트들을 스캔하여 카탈로그 생성
+
+    Returns:
+        (records, dirs, invalid)
+    """
+    kcode_dirs = find_kcode_dirs(roots)
+    dirs = [path for path, _ in kcode_dirs]
+    tasks = [(i, path, session) for i, (path, session) in enumerate(kcode_dirs)]
+    batches = [tasks[i:i + dirs_per_task] for i in range(0, len(tasks), dirs_per_task)]
+
+    workers = workers or os.cpu_count()
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(scan_dirs, batches))
+    else:
+        results = [scan_dirs(batch) for batch in batches]
+
+    records = np.concatenate([r for r, _ in results]) if results else np.empty(0, dtype=CATALOG_DTYPE)
+    invalid = [path for _, paths in results for path in paths]
+    return records, dirs, invalid
+
+
+# ============================================================
+# 3. 저장 / 로드
+# ============================================================
+
+class CaptureCatalog:
+    """카탈로그 인덱스 (records: structured array, dirs: 폴더 경로)"""
+
+    def __init__(self, records, dirs):
+        self.records = records
+        self.dirs = np.asarray(dirs, dtype=str)
+        self._drugs = None
+        self._cells = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, records=self.records, dirs=self.dirs)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        with np.load(path) as data:
+            records, dirs = data['records'], data['dirs']
+        if records.dtype != CATALOG_DTYPE:
+            raise ValueError(f"인덱스 형식이 현재 버전과 다릅니다: {path} (--build로 다시 생성)")
+        return cls(records, dirs)
+
+    def path_of(self, i):
+        record = self.records[i]
+        return os.path.join(self.dirs[record['dir_id']], format_filename(record))
+
+    def select(self, session=None, side=None, kcodes=None):
+        """조건에 맞는 행 마스크"""
+        mask = np.ones(len(self.records), dtype=bool)
+        if session is not None:
+            mask &= self.records['session'] == session
+        if side is not None:
+            mask &= self.records['side'] == SIDES.index(side)
+        if kcodes is not None:
+            mask &= np.isin(self.records['kcode'], kcode_numbers(kcodes))
+        return mask
+
+    def _cell_index(self):
+        """행별 (약품, BG, LED, ROT) 격자 셀 번호 (처음 조회 시 한 번 계산, 격자 밖 값은 -1)"""
+        if self._cells is None:
+            records = self.records
+            self._drugs, drug_idx = np.unique(records['kcode'], return_inverse=True)
+            led_idx = LED_LOOKUP[records['led']]
+            rot_idx = records['rot'] // 45
+
+            # 격자 밖 값(기존 스튜디오 LED 0, 비표준 회전각 등)은 제외
+            valid = (
+                (records['bg'] < len(BACKGROUNDS)) & (led_idx >= 0)
+                & (records['rot'] % 45 == 0) & (rot_idx < len(ROTATIONS))
+            )
+            cells = ((drug_idx.astype(np.int64) * len(BACKGROUNDS) + records['bg']) * len(LED_LEVELS)
+                     + led_idx) * len(ROTATIONS) + rot_idx
+            self._cells = np.where(valid, cells, -1)
+        return self._drugs, self._cells
+
+    def coverage(self, kcodes=None, session=None, side=None):
+        """약품 × BG × LED × ROT 촬영 수
+
+        Returns:
+            (kcode 번호 배열, counts[n_drugs, len(BACKGROUNDS), len(LED_LEVELS), len(ROTATIONS)])
+        """
+        all_drugs, cells = self._cell_index()
+        if session is not None or side is not None:
+            cells = cells[self.select(session=session, side=side)]
+
+        grid = (len(BACKGROUNDS), len(LED_LEVELS), len(ROTATIONS))
+        counts = np.bincount(cells[cells >= 0], minlength=len(all_drugs) * int(np.prod(grid)))
+        counts = counts.reshape((len(all_drugs),) + grid)
+        if kcodes is None:
+            return all_drugs, counts
+
+        # 기준 목록에 있지만 인덱스에 없는 약품은 전부 0
+        drugs = kcode_numbers(kcodes)
+        pos = np.minimum(np.searchsorted(all_drugs, drugs), max(len(all_drugs) - 1, 0))
+        present = (all_drugs[pos] == drugs) if len(all_drugs) else np.zeros(len(drugs), dtype=bool)
+        result = np.zeros((len(drugs),) + grid, dtype=counts.dtype)
+        result[present] = counts[pos[present]]
+        return drugs, result
+
+    def missing_cells(self, kcodes=None, session=None, side=None):
+        """촬영 수가 0인 (K-CODE, 배경, LED, 회전각) 목록"""
+        return missing_cells(*self.coverage(kcodes=kcodes, session=session, side=side))
+
+
+def missing_cells(drugs, counts):
+    """coverage() 결과에서 촬영 수가 0인 셀 목록"""
+    return [
+        (f'K-{int(drugs[d]):06d}', BACKGROUNDS[b], LED_LEVELS[l], ROTATIONS[r])
+        for d, b, l, r in zip(*np.nonzero(counts == 0))
+    ]
+
+
+def kcode_numbers(kcodes):
+    """['K-030864', ...] → 정렬된 uint32 배열"""
+    return np.unique(np.array([int(str(k).replace('K-', '')) for k in kcodes], dtype='<u4'))
+
+
+def load_kcodes(path):
+    """top_100_metadata 형식 JSON 또는 한 줄당 K-CODE 텍스트 파일"""
+    path = Path(path)
+    if path.suffix == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            return [drug['kcode'] for drug in json.load(f)['drugs']]
+    return [line.strip() for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+# ============================================================
+# 4. 리포트
+# ============================================================
+
+def print_catalog_summary(catalog):
+    records = catalog.records
+    print(f"  - 파일: {len(records):,}개 (폴더 {len(catalog.dirs):,}개)")
+    print(f"  - 약품: {len(np.unique(records['kcode'])):,}개")
+    sessions, counts = np.unique(records['session'], return_counts=True)
+    for session, count in zip(sessions, counts):
+        label = '스튜디오' if session == STUDIO_SESSION else f'CS_{session}_single'
+        print(f"    {label}: {count:,}개")
+
+
+def print_coverage(drugs, counts, missing, limit=30):
+    n_cells = counts.size
+    filled = int(np.count_nonzero(counts))
+    print(f"\n📊 커버리지: {filled:,}/{n_cells:,} 셀 ({filled / max(n_cells, 1) * 100:.1f}%)")
+    print(f"  - 약품 {len(drugs)}개 × BG {len(BACKGROUNDS)} × LED {len(LED_LEVELS)} × ROT {len(ROTATIONS)}")
+    print(f"  - 누락 셀: {len(missing):,}개")
+
+    per_drug = (counts == 0).reshape(len(drugs), -1).sum(axis=1)
+    incomplete = np.nonzero(per_drug)[0]
+    if len(incomplete):
+        print(f"\n⚠️  누락이 있는 약품: {len(incomplete)}개")
+        for d in incomplete[np.argsort(-per_drug[incomplete], kind='stable')][:10]:
+            print(f"    K-{int(drugs[d]):06d}: {per_drug[d]}셀 누락")
+    for cell in missing[:limit]:
+        print(f"    - {cell[0]} bg={cell[1]} led={cell[2]} rot={cell[3]:03d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='촬영 사진 카탈로그 인덱스')
+    parser.add_argument('--build', nargs='+', metavar='ROOT', help='스캔할 루트 폴더 (촬영 세션/스튜디오)')
+    parser.add_argument('--index', default=str(DEFAULT_INDEX_PATH), help='인덱스 파일 (.npz)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='스캔 프로세스 수')
+    parser.add_argument('--coverage', action='store_true', help='약품 × BG × LED × ROT 누락 셀 조회')
+    parser.add_argument('--session', type=int, help='세션 번호 필터 (CS_{N}_single, 스튜디오=0)')
+    parser.add_argument('--side', choices=SIDES, help='면 필터')
+    parser.add_argument('--kcodes', help='기준 K-CODE 목록 (JSON 또는 텍스트). 없으면 인덱스에 있는 약품')
+    args = parser.parse_args()
+
+    if args.build:
+        print(f"📂 카탈로그 생성: {', '.join(args.build)} (workers={args.workers})")
+        started = time.perf_counter()
+        records, dirs, invalid = build_catalog(args.build, workers=args.workers)
+        elapsed = time.perf_counter() - started
+
+        catalog = CaptureCatalog(records, dirs)
+        catalog.save(args.index)
+        print(f"✅ 인덱스 저장: {args.index} ({os.path.getsize(args.index) / 1e6:.1f} MB)")
+        print_catalog_summary(catalog)
+        print(f"  - 스캔 시간: {elapsed:.2f}s ({len(records) / max(elapsed, 1e-9):,.0f} files/s)")
+        if invalid:
+            print(f"\n⚠️  파일명 규칙 위반: {len(invalid):,}개")
+            for path in invalid[:10]:
+                print(f"    - {path}")
+    else:
+        if not Path(args.index).exists():
+            print(f"❌ 인덱스 파일이 없습니다: {args.index} (--build 먼저 실행)")
+            sys.exit(1)
+        catalog = CaptureCatalog.load(args.index)
+        print(f"📒 인덱스: {args.index}")
+        print_catalog_summary(catalog)
+
+    if args.coverage:
+        kcodes = load_kcodes(args.kcodes) if args.kcodes else None
+        started = time.perf_counter()
+        drugs, counts = catalog.coverage(kcodes=kcodes, session=args.session, side=args.side)
+        missing = missing_cells(drugs, counts)
+        elapsed = time.perf_counter() - started
+        print_coverage(drugs, counts, missing)
+        print(f"\n  (조회 시간: {elapsed * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
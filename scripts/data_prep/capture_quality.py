@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+"""
+촬영 사진 품질 점수 (선명도 / 노출 / 중앙 정렬 / 반사광)
+docs/20251024_capture_protocol.md "품질 검증 상세" 알고리즘을 NumPy 배치 연산으로 구현
+
+- 이미지 묶음을 (N, H, W, 3) uint8 배열로 쌓아 한 번에 점수 계산
+- 파일 묶음 단위로 프로세스 풀에서 디코딩 + 점수 계산 (코어 수만큼 병렬)
+- 원본(Galaxy S21 4000×3000)은 디코딩 단계에서 긴 변 ANALYSIS_SIZE로 축소하고,
+  배치는 픽셀 수 상한(MAX_BATCH_PIXELS)으로 나눠 워커당 메모리를 일정하게 유지
+- 결과는 capture_real_photos 컬럼(quality_grade, blur_score, exposure_score, centering_score) 형식
+
+Created: 2025-10-28
+Purpose: 24,000장 촬영분 실측 품질 점수, 약품 촬영 직후 재촬영(C등급) 판정
+Usage:
+    python capture_quality.py /data/captures/CS_1_single/K-030864 --workers 8
+    python capture_quality.py /data/captures/CS_1_single --csv artifacts/quality_cs1.csv
+    python capture_quality.py --benchmark 2000            # 200×200 배열 + 4000×3000 JPEG 파일 처리량
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# 프로토콜 기준값
+BLUR_VARIANCE_REF = 200.0    # 라플라시안 분산 200 이상이면 1.0
+OVEREXPOSED_LEVEL = 240
+UNDEREXPOSED_LEVEL = 15
+BRIGHT_SPOT_LEVEL = 250
+FOREGROUND_THRESHOLD = 40    # 배경색과의 채널 최대 차이 (알약 마스크)
+BORDER_WIDTH = 4             # 배경색 추정에 쓰는 테두리 폭
+CENTERING_STRIDE = 2         # 중심 계산용 픽셀 샘플링 간격
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)  # cv2 RGB→GRAY와 동일
+SCORE_KEYS = ('blur_score', 'exposure_score', 'centering_score', 'reflection_score')
+METADATA_KEYS = ('quality_grade', 'blur_score', 'exposure_score', 'centering_score')  # capture_real_photos 컬럼
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+DEFAULT_BATCH_SIZE = 64
+
+# 점수는 긴 변 ANALYSIS_SIZE 기준 (원본 해상도와 무관하게 같은 크기에서 계산, 더 작은 이미지는 그대로)
+ANALYSIS_SIZE = 1024
+MAX_BATCH_PIXELS = 16_000_000   # score_batch 1회 입력 상한 (N × H × W), 1024×768 기준 20장
+REAL_RESOLUTION = (4000, 3000)  # 벤치마크용 실제 촬영 해상도
+
+
+# ============================================================
+# 1. 배치 점수 계산
+# ============================================================
+
+def to_gray(images):
+    """(N, H, W, 3) uint8 → (N, H, W) float32"""
+    return images.astype(np.float32) @ GRAY_WEIGHTS
+
+
+def blur_scores(gray):
+    """라플라시안 분산 (cv2.Laplacian ksize=1, BORDER_REFLECT_101과 같은 커널/경계)"""
+    padded = np.pad(gray, ((0, 0), (1, 1), (1, 1)), mode='reflect')
+    laplacian = (padded[:, :-2, 1:-1] + padded[:, 2:, 1:-1]
+                 + padded[:, 1:-1, :-2] + padded[:, 1:-1, 2:]
+                 - 4.0 * gray)
+    variance = laplacian.reshape(len(gray), -1).var(axis=1)
+    return np.minimum(1.0, variance / BLUR_VARIANCE_REF), variance
+
+
+def exposure_scores(gray):
+    """1 - max(과노출 비율, 노출 부족 비율)"""
+    flat = gray.reshape(len(gray), -1)
+    overexposed = (flat > OVEREXPOSED_LEVEL).mean(axis=1)
+    underexposed = (flat < UNDEREXPOSED_LEVEL).mean(axis=1)
+    return 1.0 - np.maximum(overexposed, underexposed)
+
+
+def reflection_scores(gray):
+    """1 - 밝은 스팟(> 250) 비율"""
+    return 1.0 - (gray.reshape(len(gray), -1) > BRIGHT_SPOT_LEVEL).mean(axis=1)
+
+
+def foreground_masks(images):
+    """테두리 중앙값을 배경색으로 보고, 배경색과 차이가 큰 픽셀을 알약으로 분리
+
+    채널별 |픽셀 - 배경색| > FOREGROUND_THRESHOLD 인 채널이 하나라도 있으면 알약 픽셀.
+    """
+    n = len(images)
+    b = BORDER_WIDTH
+    border = np.concatenate([
+        images[:, :b].reshape(n, -1, 3), images[:, -b:].reshape(n, -1, 3),
+        images[:, b:-b, :b].reshape(n, -1, 3), images[:, b:-b, -b:].reshape(n, -1, 3),
+    ], axis=1)
+    background = np.median(border, axis=1).astype(np.int16)               # (N, 3)
+
+    # uint8 그대로 범위 비교 (int16 변환/abs 없이)
+    low = np.clip(background - FOREGROUND_THRESHOLD, 0, 255).astype(np.uint8)[:, None, None, :]
+    high = np.clip(background + FOREGROUND_THRESHOLD, 0, 255).astype(np.uint8)[:, None, None, :]
+    outside = ((images < low) | (images > high)).view(np.uint8)
+    return (outside[..., 0] | outside[..., 1] | outside[..., 2]).view(bool)
+
+
+def centering_scores(images):
+    """1 - (알약 중심과 프레임 중심 거리 / 최대 거리), 알약을 못 찾으면 0
+
+    중심 좌표만 필요하므로 CENTERING_STRIDE 간격으로 샘플링한 픽셀에서 계산.
+    """
+    n, h, w, _ = images.shape
+    stride = CENTERING_STRIDE
+    mask = foreground_masks(images[:, ::stride, ::stride])
+    area = mask.sum(axis=(1, 2))
+    ys = np.arange(0, h, stride, dtype=np.float64)
+    xs = np.arange(0, w, stride, dtype=np.float64)
+    cy = (mask.sum(axis=2) @ ys) / np.maximum(area, 1)
+    cx = (mask.sum(axis=1) @ xs) / np.maximum(area, 1)
+
+    distance = np.hypot(cx - (w - 1) / 2, cy - (h - 1) / 2)
+    max_distance = np.hypot(w / 2, h / 2)
+    return np.where(area > 0, 1.0 - distance / max_distance, 0.0)
+
+
+def calculate_grades(scores):
+    """프로토콜 등급 판정 (평균 ≥ 0.85 & 최소 ≥ 0.7 → A, 평균 ≥ 0.65 & 최소 ≥ 0.5 → B, 나머지 C)
+
+    Args:
+        scores: (N, len(SCORE_KEYS)) 배열
+    """
+    avg = scores.mean(axis=1)
+    low = scores.min(axis=1)
+    return np.where((avg >= 0.85) & (low >= 0.7), 'A', np.where((avg >= 0.65) & (low >= 0.5), 'B', 'C'))
+
+
+def score_batch(images):
+    """(N, H, W, 3) uint8 이미지 묶음 점수
+
+    Returns:
+        (scores[N, len(SCORE_KEYS)], grades[N])
+    """
+    gray = to_gray(images)
+    blur, _ = blur_scores(gray)
+    scores = np.stack([
+        blur,
+        exposure_scores(gray),
+        centering_scores(images),
+        reflection_scores(gray),
+    ], axis=1)
+    return scores, calculate_grades(scores)
+
+
+def to_metadata(scores, grade):
+    """점수 1행 → capture_real_photos 컬럼 값 (반사광은 등급에만 반영)"""
+    return {
+        'quality_grade': str(grade),
+        'blur_score': round(float(scores[0]), 4),
+        'exposure_score': round(float(scores[1]), 4),
+        'centering_score': round(float(scores[2]), 4),
+    }
+
+
+# ============================================================
+# 2. 파일 단위 병렬 처리
+# ============================================================
+
+def _load_rgb(path, size=ANALYSIS_SIZE):
+    """긴 변 size 이하로 축소해 디코딩 (JPEG은 draft로 DCT 단계에서 먼저 1/2~1/8 축소)"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.draft('RGB', (size, size))
+        img = img.convert('RGB')
+        if max(img.size) > size:
+            img.thumbnail((size, size), Image.BILINEAR)
+        return np.asarray(img)
+
+
+def score_paths(paths, size=ANALYSIS_SIZE, max_pixels=MAX_BATCH_PIXELS):
+    """파일 묶음 디코딩 + 점수 계산 (워커 프로세스)
+
+    크기가 같은 이미지끼리 묶어 max_pixels 이하 단위로 계산한다.
+    디코딩할 수 없는 파일(잘림/손상)은 점수 0, C등급과 오류 메시지로 반환하고 나머지는 계속 계산.
+
+    Returns:
+        [(path, scores, grade, error), ...]  - error는 정상 파일이면 None
+    """
+    from PIL import Image
+
+    by_shape = {}
+    results = []
+    for path in paths:
+        try:
+            image = _load_rgb(path, size)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            results.append((path, np.zeros(len(SCORE_KEYS)), 'C', f'디코딩 실패: {e}'))
+            continue
+        by_shape.setdefault(image.shape, []).append((path, image))
+
+    for shape, group in by_shape.items():
+        step = max(1, max_pixels // (shape[0] * shape[1]))
+        for i in range(0, len(group), step):
+            chunk = group[i:i + step]
+            scores, grades = score_batch(np.stack([image for _, image in chunk]))
+            results.extend((path, s, g, None) for (path, _), s, g in zip(chunk, scores, grades))
+    return results
+
+
+def score_files(paths, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """파일 목록 점수 계산
+
+    Returns:
+        {path: capture_real_photos 컬럼 dict + reflection_score, error (디코딩 실패 사유, 정상이면 None)}
+    """
+    paths = [str(p) for p in paths]
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    workers = workers or os.cpu_count()
+
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = [r for batch in executor.map(score_paths, batches) for r in batch]
+    else:
+        results = [r for batch in batches for r in score_paths(batch)]
+
+    return {path: {**to_metadata(scores, grade), 'reflection_score': round(float(scores[3]), 4), 'error': error}
+            for path, scores, grade, error in results}
+
+
+def find_images(target):
+    """파일/폴더(재귀)에서 이미지 경로 목록"""
+    target = Path(target)
+    if target.is_file():
+        return [target]
+    return sorted(p for p in target.rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+# ============================================================
+# 3. 벤치마크
+# ============================================================
+
+def synthetic_stack(n, size=200, seed=0):
+    """배경 + 타원형 알약 합성 이미지 (N, size, size, 3)"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:size, :size]
+    images = np.empty((n, size, size, 3), dtype=np.uint8)
+    backgrounds = rng.integers(20, 235, size=(n, 3))
+    for i in range(n):
+        cx, cy = rng.uniform(0.35, 0.65, 2) * size
+        rx, ry = rng.uniform(0.12, 0.25, 2) * size
+        pill = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1
+        image = np.empty((size, size, 3), dtype=np.int16)
+        image[:] = backgrounds[i]
+        image[pill] = 255 - backgrounds[i]
+        image += rng.integers(-8, 9, size=image.shape, dtype=np.int16)
+        images[i] = np.clip(image, 0, 255)
+    return images
+
+
+def _score_chunk(images):
+    return score_batch(images)[0]
+
+
+def _peak_rss_mb():
+    """현재 프로세스와 종료된 자식 프로세스 중 최대 RSS (MB, Linux 기준 ru_maxrss는 KB)"""
+    import resource
+
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+def run_file_benchmark(n, workers, batch_size, resolution=REAL_RESOLUTION):
+    """실제 촬영 해상도 JPEG 파일로 score_files 처리량 / 최대 메모리 측정"""
+    import tempfile
+    from PIL import Image
+
+    width, height = resolution
+    print(f"\n⏱️  파일 벤치마크: {n:,}장 ({width}×{height} JPEG → 분석 {ANALYSIS_SIZE}), batch={batch_size}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, image in enumerate(synthetic_stack(n, size=height // 10, seed=1)):
+            path = os.path.join(tmp, f'{i:05d}.jpg')
+            Image.fromarray(image).resize((width, height), Image.BILINEAR).save(path, quality=95)
+            paths.append(path)
+
+        started = time.perf_counter()
+        score_files(paths, workers=workers, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+    print(f"  - score_files (workers={workers}): {n / elapsed:,.1f} images/sec")
+    print(f"  - 최대 RSS: {_peak_rss_mb():,.0f} MB (프로세스당)")
+
+
+def run_benchmark(n, workers, batch_size):
+    print(f"⏱️  품질 점수 벤치마크: {n:,}장 (200×200), batch={batch_size}")
+    images = synthetic_stack(n)
+
+    started = time.perf_counter()
+    for i in range(0, n, batch_size):
+        score_batch(images[i:i + batch_size])
+    single = time.perf_counter() - started
+    print(f"  - 단일 프로세스: {n / single:,.0f} images/sec")
+
+    started = time.perf_counter()
+    for i in range(min(n, 500)):
+        score_batch(images[i:i + 1])
+    per_image = time.perf_counter() - started
+    print(f"  - 이미지 1장씩: {min(n, 500) / per_image:,.0f} images/sec")
+
+    if workers > 1:
+        chunks = [images[i:i + batch_size] for i in range(0, n, batch_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_score_chunk, chunks[:workers]))  # 워커 기동
+            started = time.perf_counter()
+            list(executor.map(_score_chunk, chunks))
+            pooled = time.perf_counter() - started
+        print(f"  - 프로세스 풀 ({workers}): {n / pooled:,.0f} images/sec")
+
+    run_file_benchmark(min(n, workers * batch_size, 256), workers, batch_size)
+    print(f"  (CPU 코어: {os.cpu_count()})")
+
+
+# ============================================================
+# 4. CLI
+# ============================================================
+
+def print_quality_report(results, limit=20):
+    grades = [r['quality_grade'] for r in results.values()]
+    total = len(grades)
+    print("\n📊 품질 등급:")
+    for grade in 'ABC':
+        count = grades.count(grade)
+        print(f"  - {grade}: {count:,}개 ({count / max(total, 1) * 100:.1f}%)")
+
+    retake = [(path, r) for path, r in results.items() if r['quality_grade'] == 'C']
+    if retake:
+        print(f"\n⚠️  재촬영 필요 (C등급): {len(retake):,}개")
+        for path, r in retake[:limit]:
+            if r.get('error'):
+                print(f"    - {Path(path).name}: {r['error']}")
+                continue
+            print(f"    - {Path(path).name}: blur={r['blur_score']:.2f} exposure={r['exposure_score']:.2f} "
+                  f"centering={r['centering_score']:.2f} reflection={r['reflection_score']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='촬영 사진 품질 점수')
+    parser.add_argument('target', nargs='?', help='이미지 파일 또는 폴더 (약품 폴더/세션 폴더)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='프로세스 수')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='작업당 이미지 수')
+    parser.add_argument('--csv', help='점수 CSV 저장 경로')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='합성 이미지 N장으로 처리량 측정')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.benchmark, args.workers, args.batch_size)
+        return
+    if not args.target:
+        parser.error('target 또는 --benchmark가 필요합니다')
+
+    paths = find_images(args.target)
+    print(f"🔍 품질 검사: {args.target} ({len(paths):,}장, workers={args.workers})")
+    started = time.perf_counter()
+    results = score_files(paths, workers=args.workers, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"  - 소요 시간: {elapsed:.2f}s ({len(paths) / max(elapsed, 1e-9):,.0f} images/sec)")
+
+    print_quality_report(results)
+
+    if args.csv:
+        Path(args.csv).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.csv, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'quality_grade', *SCORE_KEYS, 'error'])
+            for path, r in results.items():
+                writer.writerow([path, r['quality_grade'], *(r[key] for key in SCORE_KEYS), r['error'] or ''])
+        print(f"\n✅ CSV 저장: {args.csv}")
+
+    # C등급이 있으면 실패 코드 (촬영 세션 게이트)
+    if any(r['quality_grade'] == 'C' for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
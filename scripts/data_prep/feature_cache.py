@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+"""
+Frozen backbone 특징 캐시 + 분류 헤드 학습
+백본을 고정하고 헤드만 파인튜닝할 때 매 epoch 백본 forward를 반복하지 않도록
+manifest의 전체 이미지를 한 번만 백본에 통과시켜 penultimate 특징을 저장하고, 헤드는 캐시에서 바로 학습
+
+- 백본: export된 ONNX 모델의 'embedding' 출력 (embedding_index.add_embedding_output 또는 LogitsAndEmbedding export)
+    CPU 워커 프로세스마다 스레드 고정 세션(serving.session_options)으로 배치 추론
+- 증강: train은 seed별로 한 벌씩 (seed 0 = 원본, 1.. = 회전/ColorJitter/RandomErasing, (seed, 행) 결정적)
+    val/test는 원본(seed 0)만
+- 헤드: 100-class softmax 회귀 (AdamW + cosine, label smoothing), epoch마다 샘플별로 증강 버전 무작위 선택
+    --lr / --weight-decay 여러 값을 주면 그리드 스윕 후 val Top-1 최고 헤드 저장
+
+캐시 구조 (artifacts/datasets/features/):
+    index.json             모델 식별자(model_fingerprint), 특징 차원, split별 샘플 수/경로 목록 해시/완료된 seed
+    {split}/labels.npy     (N,) int16
+    {split}/seed-{s}.npy   (N, D) float16 memmap
+
+Created: 2025-10-28
+Purpose: GPU 없이 헤드 학습 epoch를 수 시간 → 수 초로, 하이퍼파라미터 스윕 가능하게
+Usage:
+    python feature_cache.py --build --model models/pillsnap_narrow_model_embedding.onnx --seeds 0 1 2 3 --workers 8
+    python feature_cache.py --build --shards artifacts/datasets/shards --model ...   # 디코딩된 샤드 사용
+    python feature_cache.py --train --lr 1e-3 3e-3 1e-2 --weight-decay 0 5e-4 --epochs 30
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'src'))
+
+try:
+    import cv2
+except ImportError:
+    print("❌ OpenCV가 필요합니다: pip install opencv-python")
+    sys.exit(1)
+
+from training_shards import DEFAULT_SHARD_DIR, ShardDataset, load_resized  # noqa: E402
+
+BASE = Path(__file__).resolve().parents[2]
+DATASET_DIR = BASE / 'artifacts' / 'datasets'
+DEFAULT_SPLITS_PATH = DATASET_DIR / 'manifest.parquet'
+DEFAULT_FEATURE_DIR = DATASET_DIR / 'features'
+DEFAULT_HEAD_PATH = BASE / 'artifacts' / 'heads' / 'head.npz'
+DEFAULT_MODEL_PATH = 'models/pillsnap_narrow_model_embedding.onnx'
+DEFAULT_BATCH_SIZE = 32
+CACHE_VERSION = 1
+
+# 학습 설정 (configs/train_config.yaml 기본값)
+DEFAULT_LR = 1e-3
+DEFAULT_WEIGHT_DECAY = 5e-4
+DEFAULT_EPOCHS = 30
+DEFAULT_HEAD_BATCH_SIZE = 256
+DEFAULT_LABEL_SMOOTHING = 0.1
+ADAM_BETAS = (0.9, 0.999)
+
+# 증강 (create_dataloaders의 train_transform과 같은 범위)
+ROTATION_DEGREES = 30
+JITTER = (0.2, 0.2, 0.2, 0.1)                        # brightness, contrast, saturation, hue
+ERASING_P = 0.2
+ERASING_SCALE = (0.02, 0.33)
+ERASING_RATIO = (0.3, 3.3)
+FILL_RGB = (124, 116, 104)                           # 정규화 후 0 (ImageNet 평균)
+
+
+# ============================================================
+# 1. 결정적 증강
+# ============================================================
+
+def augment(image, seed, row):
+    """uint8 RGB (S, S, 3) 증강 - 같은 (seed, row)면 항상 같은 결과 (seed 0은 원본)"""
+    if seed == 0:
+        return image
+    rng = np.random.default_rng([seed, row])
+    size = image.shape[0]
+
+    # RandomRotation(30): 바깥 영역은 0
+    matrix = cv2.getRotationMatrix2D((size / 2, size / 2), rng.uniform(-ROTATION_DEGREES, ROTATION_DEGREES), 1.0)
+    image = cv2.warpAffine(image, matrix, (size, size), flags=cv2.INTER_LINEAR, borderValue=(0, 0, 0))
+
+    # ColorJitter: 밝기 → 대비 → 채도 → 색조
+    brightness, contrast, saturation, hue = JITTER
+    out = image.astype(np.float32) * rng.uniform(1 - brightness, 1 + brightness)
+    gray = cv2.cvtColor(np.clip(out, 0, 255).astype(np.uint8), cv2.COLOR_RGB2GRAY)
+    out = (out - gray.mean()) * rng.uniform(1 - contrast, 1 + contrast) + gray.mean()
+    gray = cv2.cvtColor(np.clip(out, 0, 255).astype(np.uint8), cv2.COLOR_RGB2GRAY).astype(np.float32)
+    out = (out - gray[..., None]) * rng.uniform(1 - saturation, 1 + saturation) + gray[..., None]
+    hsv = cv2.cvtColor(np.clip(out, 0, 255).astype(np.uint8), cv2.COLOR_RGB2HSV)
+    shift = int(round(rng.uniform(-hue, hue) * 180))
+    hsv[..., 0] = ((hsv[..., 0].astype(np.int16) + shift) % 180).astype(np.uint8)
+    image = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+
+    # RandomErasing(p=0.2): 정규화 전 이미지이므로 평균색으로 채움
+    if rng.random() < ERASING_P:
+        area = size * size * rng.uniform(*ERASING_SCALE)
+        ratio = np.exp(rng.uniform(*np.log(ERASING_RATIO)))
+        h = min(size, int(round(np.sqrt(area * ratio))))
+        w = min(size, int(round(np.sqrt(area / ratio))))
+        top = rng.integers(0, size - h + 1)
+        left = rng.integers(0, size - w + 1)
+        image[top:top + h, left:left + w] = FILL_RGB
+    return image
+
+
+# ============================================================
+# 2. 특징 추출 워커
+# ============================================================
+
+_ENGINE = None
+_SOURCE = None
+
+
+def _init_worker(engine_kwargs, workers, source):
+    """워커 초기화: 스레드 고정 세션 + 이미지 소스 (파일 경로 목록 또는 샤드 폴더)"""
+    global _ENGINE, _SOURCE
+    from inference.narrow_model import NarrowModelInference
+    from inference.serving import session_options
+
+    _ENGINE = NarrowModelInference(**engine_kwargs, providers=['CPUExecutionProvider'],
+                                   sess_options=session_options(workers, shared_weights=False))
+    if _ENGINE.embedding_output is None:
+        raise ValueError(f"모델에 'embedding' 출력이 없습니다: {engine_kwargs['model_path']} "
+                         f"(python src/inference/embedding_index.py --add-output 로 추가)")
+    _SOURCE = source
+
+
+def _release_worker():
+    """메인 프로세스의 프로브용 세션 해제 (워커 풀을 띄우기 전에 ORT 세션/스레드 풀을 남기지 않도록)"""
+    global _ENGINE, _SOURCE
+    _ENGINE = _SOURCE = None
+
+
+def _load_image(split, row):
+    kind, value = _SOURCE
+    if kind == 'shards':
+        if split not in value:
+            value[split] = ShardDataset(split, shard_dir=value['_dir'])
+        return np.array(value[split][row][0])
+    return load_resized(value[split][row], _ENGINE.preprocessor.target_size)
+
+
+def _embed(split, seed, rows):
+    images = np.stack([augment(_load_image(split, row), seed, row) for row in rows])
+    batch = _ENGINE.preprocessor.process_batch_numpy(images)
+    return _ENGINE.session.run(['embedding'], {_ENGINE.input_name: batch})[0]
+
+
+def _fill_features(task):
+    """워커: seed-{s}.npy의 [start, end) 행을 채움"""
+    feature_path, split, seed, start, end = task
+    features = np.load(feature_path, mmap_mode='r+')
+    features[start:end] = _embed(split, seed, range(start, end)).astype(np.float16)
+    features.flush()
+    del features
+    return end - start
+
+
+# ============================================================
+# 3. 캐시 생성 / 로드
+# ============================================================
+
+def load_index(feature_dir):
+    path = Path(feature_dir) / 'index.json'
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_index(feature_dir, index):
+    with open(Path(feature_dir) / 'index.json', 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+
+def paths_digest(paths):
+    """순서 있는 이미지 경로 목록의 SHA-256 (같은 수/레이블이라도 샘플이 바뀌면 seed 캐시 무효화)"""
+    return hashlib.sha256('\n'.join(str(path) for path in paths).encode('utf-8')).hexdigest()
+
+
+def load_split_items(args):
+    """{split: [{'path', 'label', 'kcode'}, ...]} - 샤드를 쓰면 샤드 index.json 기준"""
+    if args.shards:
+        splits = {}
+        for split_dir in sorted(Path(args.shards).iterdir()):
+            if (split_dir / 'index.json').exists():
+                dataset = ShardDataset(split_dir.name, shard_dir=args.shards)
+                splits[split_dir.name] = [{'path': path, 'label': int(label), 'kcode': kcode} for path, label, kcode
+                                          in zip(dataset.index['sources'], dataset.labels, dataset.index['kcodes'])]
+        return splits
+    if Path(args.splits).suffix == '.parquet':
+        from build_manifest import load_splits   # pandas/pyarrow 필요
+        return load_splits(args.splits)
+    with open(args.splits, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_cache(args):
+    splits = load_split_items(args)
+    feature_dir = Path(args.output)
+    feature_dir.mkdir(parents=True, exist_ok=True)
+
+    engine_kwargs = {'model_path': args.model, 'class_mapping_path': args.class_mapping,
+                     'metadata_path': args.metadata}
+    if args.shards:
+        source = ('shards', {'_dir': args.shards})
+    else:
+        source = ('files', {split: [item['path'] for item in items] for split, items in splits.items()})
+
+    # 특징 차원 확인 (메인 프로세스에서 1장 추론, workers=1이면 이 엔진으로 계속 진행)
+    _init_worker(engine_kwargs, args.workers, source)
+    first_split = next(split for split, items in splits.items() if items)
+    dim = int(_embed(first_split, 0, [0]).shape[1])
+    model_key = _ENGINE.model_key
+    target_size = _ENGINE.preprocessor.target_size
+
+    index = load_index(feature_dir)
+    if index is None or index['model_key'] != model_key or index['dim'] != dim:
+        if index is not None:
+            print(f"⚠️  모델이 바뀌어 캐시를 다시 만듭니다 ({index['model_key']} → {model_key})")
+        index = {'version': CACHE_VERSION, 'model_key': model_key, 'model_path': str(args.model),
+                 'dim': dim, 'target_size': target_size, 'splits': {}}
+
+    # 워커 풀은 모든 split/seed에 공유 (워커마다 모델 로드는 한 번)
+    # 프로브 세션은 먼저 해제하고, serving.WorkerPool처럼 spawn으로 시작 (ORT 스레드 풀 fork 문제 회피)
+    executor = None
+    if args.workers > 1:
+        _release_worker()
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(engine_kwargs, args.workers, source))
+
+    print(f"📦 특징 캐시: {args.model} → {feature_dir}")
+    print(f"  - 모델: {model_key}, 특징 {dim}차원, 입력 {target_size}px, "
+          f"workers={args.workers}, 배치 {args.batch_size}")
+
+    for split, items in splits.items():
+        split_dir = feature_dir / split
+        split_dir.mkdir(exist_ok=True)
+        labels = np.array([item['label'] for item in items], dtype=np.int16)
+        digest = paths_digest(item['path'] for item in items)
+        info = index['splits'].get(split)
+        if info is None or info['num_samples'] != len(items) or info.get('paths_sha256') != digest or \
+                not np.array_equal(np.load(split_dir / 'labels.npy'), labels):
+            if info is not None and info['seeds']:
+                print(f"⚠️  {split}: 샘플 목록이 바뀌어 seed {info['seeds']} 캐시를 다시 만듭니다")
+            info = {'num_samples': len(items), 'paths_sha256': digest, 'seeds': [],
+                    'kcodes': sorted({item['kcode'] for item in items})}
+        np.save(split_dir / 'labels.npy', labels)
+        index['splits'][split] = info
+
+        seeds = args.seeds if split == 'train' else [0]
+        for seed in seeds:
+            if seed in info['seeds']:
+                print(f"  ⏭️  {split} seed {seed}: 이미 있음")
+                continue
+            started = time.perf_counter()
+            feature_path = split_dir / f'seed-{seed}.npy'
+            np.lib.format.open_memmap(feature_path, mode='w+', dtype=np.float16, shape=(len(items), dim)).flush()
+            tasks = [(str(feature_path), split, seed, start, min(start + args.batch_size, len(items)))
+                     for start in range(0, len(items), args.batch_size)]
+            if executor is not None:
+                written = sum(executor.map(_fill_features, tasks))
+            else:
+                written = sum(_fill_features(task) for task in tasks)
+            elapsed = time.perf_counter() - started
+            info['seeds'] = sorted(info['seeds'] + [seed])
+            save_index(feature_dir, index)   # seed 단위로 기록 (중단 후 재실행 시 이어서)
+            print(f"  ✅ {split} seed {seed}: {written:,}개 ({elapsed:.1f}s, {written / max(elapsed, 1e-9):,.0f} img/s, "
+                  f"{written * dim * 2 / 1e6:,.1f} MB)")
+    save_index(feature_dir, index)
+    if executor is not None:
+        executor.shutdown()
+
+
+class FeatureCache:
+    """split 1개의 캐시 (seed별 memmap)"""
+
+    def __init__(self, split='train', feature_dir=DEFAULT_FEATURE_DIR):
+        self.index = load_index(feature_dir)
+        if self.index is None or split not in self.index['splits']:
+            raise FileNotFoundError(f"특징 캐시가 없습니다: {feature_dir}/{split} (--build로 생성)")
+        split_dir = Path(feature_dir) / split
+        self.seeds = self.index['splits'][split]['seeds']
+        self.labels = np.load(split_dir / 'labels.npy').astype(np.int64)
+        self.features = [np.load(split_dir / f'seed-{seed}.npy', mmap_mode='r') for seed in self.seeds]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def batch(self, rows, versions=None):
+        """rows의 특징 (B, D) float32 - versions[i]는 rows[i]에 쓸 seed 위치 (None이면 seed 0)"""
+        if versions is None:
+            return self.features[0][rows].astype(np.float32)
+        out = np.empty((len(rows), self.index['dim']), dtype=np.float32)
+        for v, features in enumerate(self.features):
+            mask = versions == v
+            if mask.any():
+                out[mask] = features[rows[mask]]
+        return out
+
+
+# ============================================================
+# 4. 헤드 학습 (softmax 회귀, NumPy AdamW)
+# ============================================================
+
+def evaluate_head(weight, bias, cache, batch_size=4096):
+    """Top-1 / Top-5 정확도"""
+    top1 = top5 = 0
+    for start in range(0, len(cache), batch_size):
+        rows = np.arange(start, min(start + batch_size, len(cache)))
+        logits = cache.batch(rows) @ weight.T + bias
+        labels = cache.labels[rows]
+        top = np.argpartition(-logits, min(5, logits.shape[1] - 1), axis=1)[:, :5]
+        top1 += int((logits.argmax(axis=1) == labels).sum())
+        top5 += int((top == labels[:, None]).any(axis=1).sum())
+    return top1 / max(len(cache), 1), top5 / max(len(cache), 1)
+
+
+def train_head(train, num_classes, lr, weight_decay, epochs, batch_size=DEFAULT_HEAD_BATCH_SIZE,
+               label_smoothing=DEFAULT_LABEL_SMOOTHING, seed=0):
+    """캐시 특징으로 Linear(D, C) 학습 (nn.Linear와 같은 weight (C, D) 배치)
+
+    Returns:
+        (weight (C, D), bias (C,), 마지막 epoch 평균 loss)
+    """
+    rng = np.random.default_rng(seed)
+    dim = train.index['dim']
+    weight = np.zeros((num_classes, dim), dtype=np.float32)
+    bias = np.zeros(num_classes, dtype=np.float32)
+    moments = [[np.zeros_like(p), np.zeros_like(p)] for p in (weight, bias)]
+    beta1, beta2 = ADAM_BETAS
+    steps_per_epoch = -(-len(train) // batch_size)
+    total_steps = epochs * steps_per_epoch
+    step = 0
+    loss_sum = 0.0
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(train))
+        versions = rng.integers(len(train.features), size=len(train))   # 샘플별 증강 버전
+        loss_sum = 0.0
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            x = train.batch(rows, versions[rows])
+            y = train.labels[rows]
+
+            logits = x @ weight.T + bias
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            target = np.full_like(probs, label_smoothing / num_classes)
+            target[np.arange(len(y)), y] += 1 - label_smoothing
+            loss_sum += float(-(target * np.log(probs + 1e-12)).sum(axis=1).mean())
+
+            grad_logits = (probs - target) / len(y)
+            grads = (grad_logits.T @ x, grad_logits.sum(axis=0))
+
+            # AdamW + cosine (eta_min 0)
+            step += 1
+            step_lr = 0.5 * lr * (1 + np.cos(np.pi * (step - 1) / total_steps))
+            for param, grad, (m, v), decay in zip((weight, bias), grads, moments, (weight_decay, 0.0)):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                m_hat = m / (1 - beta1 ** step)
+                v_hat = v / (1 - beta2 ** step)
+                param *= 1 - step_lr * decay
+                param -= step_lr * m_hat / (np.sqrt(v_hat) + 1e-8)
+    return weight, bias, loss_sum / max(steps_per_epoch, 1)
+
+
+def run_sweep(args):
+    train = FeatureCache('train', args.output)
+    val = FeatureCache('val', args.output)
+    with open(args.class_mapping, 'r', encoding='utf-8') as f:
+        num_classes = len(json.load(f)['idx_to_class'])
+    print(f"🧠 헤드 학습: train {len(train):,}개 × seed {train.seeds}, val {len(val):,}개, "
+          f"{train.index['dim']}→{num_classes}, {args.epochs} epochs")
+
+    best = None
+    for lr, weight_decay in product(args.lr, args.weight_decay):
+        started = time.perf_counter()
+        weight, bias, loss = train_head(train, num_classes, lr, weight_decay, args.epochs,
+                                        batch_size=args.batch_size_head, label_smoothing=args.label_smoothing,
+                                        seed=args.seed)
+        elapsed = time.perf_counter() - started
+        top1, top5 = evaluate_head(weight, bias, val)
+        print(f"  lr={lr:g} wd={weight_decay:g}: loss {loss:.4f}, val Top-1 {top1:.2%} / Top-5 {top5:.2%} "
+              f"({elapsed:.1f}s, {elapsed / args.epochs:.2f}s/epoch)")
+        if best is None or top1 > best['val_top1']:
+            best = {'weight': weight, 'bias': bias, 'lr': lr, 'weight_decay': weight_decay,
+                    'val_top1': top1, 'val_top5': top5}
+
+    head_path = Path(args.head_output)
+    head_path.parent.mkdir(parents=True, exist_ok=True)
+    meta = {key: best[key] for key in ('lr', 'weight_decay', 'val_top1', 'val_top5')}
+    meta.update(model_key=train.index['model_key'], epochs=args.epochs, seeds=train.seeds)
+    np.savez(head_path, weight=best['weight'], bias=best['bias'], meta=json.dumps(meta))
+    print(f"✅ 최고 헤드 (lr={best['lr']:g}, wd={best['weight_decay']:g}, val Top-1 {best['val_top1']:.2%}) "
+          f"→ {head_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frozen backbone 특징 캐시 + 헤드 학습')
+    parser.add_argument('--build', action='store_true', help='특징 캐시 생성 (완료된 seed는 건너뜀)')
+    parser.add_argument('--train', action='store_true', help='캐시로 헤드 학습 / 스윕')
+    parser.add_argument('--splits', default=str(DEFAULT_SPLITS_PATH), help='manifest.parquet 또는 splits.json')
+    parser.add_argument('--shards', nargs='?', const=str(DEFAULT_SHARD_DIR), help='디코딩된 샤드 폴더 사용')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="'embedding' 출력이 있는 ONNX 모델")
+    parser.add_argument('--class-mapping', default='models/class_mapping.json')
+    parser.add_argument('--metadata', default='models/model_metadata.json')
+    parser.add_argument('--output', default=str(DEFAULT_FEATURE_DIR), help='캐시 폴더')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2, 3], help='train 증강 seed (0 = 원본)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='백본 추론 배치')
+    parser.add_argument('--lr', type=float, nargs='+', default=[DEFAULT_LR])
+    parser.add_argument('--weight-decay', type=float, nargs='+', default=[DEFAULT_WEIGHT_DECAY])
+    parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS)
+    parser.add_argument('--batch-size-head', type=int, default=DEFAULT_HEAD_BATCH_SIZE)
+    parser.add_argument('--label-smoothing', type=float, default=DEFAULT_LABEL_SMOOTHING)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--head-output', default=str(DEFAULT_HEAD_PATH))
+    args = parser.parse_args()
+
+    if not (args.build or args.train):
+        parser.error('--build 또는 --train 필요')
+    if args.build:
+        build_cache(args)
+    if args.train:
+        run_sweep(args)
+
+
+if __name__ == "__main__":
+    main()
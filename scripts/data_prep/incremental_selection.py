@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+증분 약품 재선정
+이전 실행의 순위 테이블을 보관하고, 사용량이 바뀐 EDI만 재배치하여 상위 N개 변경분(changeset) 생성
+
+Created: 2025-10-28
+Purpose: 월간 사용량 갱신 시 drugs_master 전체 재적재 대신 변경분만 반영
+Usage: prepare_drug_selection.py --incremental 에서 사용
+"""
+
+import bisect
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from input_cache import file_sha256
+
+STATE_VERSION = 1
+STATE_COLUMNS = ['K-CODE', 'EDI', 'Drug_Name', 'Manufacturer', 'Usage_Count', 'Mapping_Source', 'In_Dataset']
+
+
+def input_fingerprint(paths):
+    """매핑 입력 파일들의 SHA-256 (없는 파일은 None)"""
+    return {name: file_sha256(path) if Path(path).exists() else None for name, path in paths.items()}
+
+
+def load_state(state_path):
+    """이전 실행의 순위 테이블과 입력 fingerprint 로드 (없으면 None)"""
+    state_path = Path(state_path)
+    if not state_path.exists():
+        return None
+
+    with open(state_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        return None
+
+    state['ranking'] = pd.DataFrame(state['ranking'], columns=STATE_COLUMNS)
+    state['ranking']['Usage_Count'] = state['ranking']['Usage_Count'].astype('int64')
+    return state
+
+
+def save_state(state_path, ranking_df, fingerprint, removed_duplicates):
+    """순위 테이블 저장 (다음 증분 실행의 기준)"""
+    state_path = Path(state_path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state = {
+        'version': STATE_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'inputs': fingerprint,
+        'removed_duplicates': int(removed_duplicates),
+        'ranking': ranking_df[STATE_COLUMNS].to_dict(orient='records'),
+    }
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+
+
+def _rank_key(usage, edi, kcode):
+    """전체 재계산과 같은 순서: 사용량 내림차순 → EDI 있는 행 우선 → K-CODE 오름차순"""
+    return (-int(usage), edi == '', kcode)
+
+
+def rerank_incremental(previous_df, edi_usage):
+    """이전 순위 테이블에서 사용량이 바뀐 행만 다시 배치
+
+    K-CODE 목록과 매핑이 그대로일 때 전체 재계산 결과와 동일한 순서를 만든다.
+    바뀌지 않은 행은 상대 순서를 유지하고, 바뀐 행만 이진 탐색으로 삽입한다.
+
+    Args:
+        previous_df: 이전 순위 테이블 (정렬된 상태)
+        edi_usage: compute_edi_usage_vectorized() 결과 (index=EDI)
+
+    Returns:
+        (새 순위 테이블, 사용량이 바뀐 행 수)
+    """
+    new_usage = previous_df['EDI'].map(edi_usage).fillna(0).astype('int64')
+    new_usage[previous_df['EDI'] == ''] = 0
+    changed = (new_usage != previous_df['Usage_Count']).to_numpy()
+
+    updated = previous_df.copy()
+    updated['Usage_Count'] = new_usage.to_numpy()
+    if not changed.any():
+        return updated, 0
+
+    kept = updated[~changed]
+    moved = updated[changed]
+
+    kept_keys = [_rank_key(u, e, k) for u, e, k in zip(kept['Usage_Count'], kept['EDI'], kept['K-CODE'])]
+    moved_keys = [_rank_key(u, e, k) for u, e, k in zip(moved['Usage_Count'], moved['EDI'], moved['K-CODE'])]
+    moved_order = sorted(range(len(moved_keys)), key=moved_keys.__getitem__)
+
+    # 삽입 위치 계산 후 한 번에 재구성
+    positions = [bisect.bisect_left(kept_keys, moved_keys[i]) for i in moved_order]
+    order = np.insert(np.arange(len(kept)), positions, len(kept) + np.asarray(moved_order))
+    result = pd.concat([kept, moved]).iloc[order]
+    return result, int(changed.sum())
+
+
+def _to_drug(row):
+    return {
+        'kcode': row['K-CODE'],
+        'edi_code': row['EDI'] or None,
+        'drug_name': row['Drug_Name'],
+        'manufacturer': row['Manufacturer'],
+        'usage_count': int(row['Usage_Count']),
+    }
+
+
+def ranking_to_drugs(ranking_df, top_n):
+    """순위 테이블 상위 N개를 top_100_metadata 형식의 약품 dict 리스트로 변환"""
+    return [_to_drug(row) for _, row in ranking_df.head(top_n).iterrows()]
+
+
+def diff_drug_lists(previous_drugs, current_drugs):
+    """두 약품 리스트의 변경분 계산 (K-CODE 기준)
+
+    Returns:
+        {'entering': [...], 'leaving': [...], 'usage_changed': [...]}
+    """
+    previous = {drug['kcode']: drug for drug in previous_drugs}
+    current = {drug['kcode']: drug for drug in current_drugs}
+
+    entering = [drug for kcode, drug in current.items() if kcode not in previous]
+    leaving = [drug for kcode, drug in previous.items() if kcode not in current]
+    usage_changed = [
+        {
+            'kcode': kcode,
+            'edi_code': drug.get('edi_code'),
+            'old_usage_count': previous[kcode].get('usage_count'),
+            'usage_count': drug.get('usage_count'),
+        }
+        for kcode, drug in current.items()
+        if kcode in previous and previous[kcode].get('usage_count') != drug.get('usage_count')
+    ]
+
+    return {'entering': entering, 'leaving': leaving, 'usage_changed': usage_changed}
+
+
+def write_changeset(changeset_path, changeset, top_n, base_created_at):
+    """changeset JSON 저장 (load_drugs_to_supabase.py --changeset 입력)"""
+    changeset_path = Path(changeset_path)
+    changeset_path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        'created_at': datetime.now().isoformat(),
+        'base_created_at': base_created_at,
+        'top_n': top_n,
+        **changeset,
+    }
+    with open(changeset_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def print_changeset(changeset):
+    print("\n🔁 상위 목록 변경분:")
+    print(f"  진입: {len(changeset['entering'])}개")
+    for drug in changeset['entering'][:10]:
+        print(f"    + {drug['kcode']} {drug['drug_name'][:20]} (사용량: {drug['usage_count']:,})")
+    print(f"  이탈: {len(changeset['leaving'])}개")
+    for drug in changeset['leaving'][:10]:
+        print(f"    - {drug['kcode']} {drug['drug_name'][:20]}")
+    print(f"  사용량 변경: {len(changeset['usage_changed'])}개")
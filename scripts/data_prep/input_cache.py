@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+약품 선정 입력 파일 캐시
+Excel/CSV 파싱 결과(정규화된 DataFrame)를 Parquet으로 저장하여 반복 실행 시 openpyxl 파싱 생략
+
+Created: 2025-10-28
+Purpose: prepare_drug_selection.py 반복 실행 시간 단축
+Usage:
+    cache = InputCache(Path('artifacts/cache/inputs'))
+    df = cache.load('drugs_master', source_path, lambda: pd.read_csv(source_path, dtype=str))
+    cache.print_report()
+"""
+
+import hashlib
+import json
+import time
+import pandas as pd
+from pathlib import Path
+
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """파일 내용의 SHA-256 해시"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_parquet_safe(df):
+    """Parquet 저장 가능한 형태로 변환 (컬럼명 문자열화, 혼합 타입 object 컬럼은 str/None)"""
+    df = df.copy()
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+    return df
+
+
+class InputCache:
+    """원본 파일의 mtime/SHA-256으로 무효화되는 Parquet DataFrame 캐시"""
+
+    def __init__(self, cache_dir, enabled=True, refresh=False):
+        self.cache_dir = Path(cache_dir)
+        self.refresh = refresh
+        self.enabled = enabled
+        self.stats = []
+
+        if enabled:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print("⚠️  pyarrow 패키지가 없어 입력 캐시를 비활성화합니다. (설치: pip install pyarrow)")
+                self.enabled = False
+
+    def load(self, name, source_path, loader):
+        """캐시된 DataFrame 반환, 없거나 원본이 바뀌었으면 loader() 실행 후 저장
+
+        Args:
+            name: 캐시 항목 이름 (예: 'single_list')
+            source_path: 원본 파일 경로
+            loader: DataFrame 또는 DataFrame 리스트를 반환하는 함수
+
+        Returns:
+            loader()와 같은 형태의 DataFrame 또는 DataFrame 리스트
+        """
+        if not self.enabled:
+            return loader()
+
+        source_path = Path(source_path)
+        meta_path = self.cache_dir / f'{name}.json'
+        meta = self._read_meta(meta_path)
+        stat = source_path.stat()
+
+        if meta and not self.refresh:
+            fresh = meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size
+            # mtime이 바뀌었어도 내용이 같으면 재사용 (git checkout, 파일 복사 등)
+            if not fresh and meta['size'] == stat.st_size and meta['sha256'] == file_sha256(source_path):
+                meta['mtime_ns'] = stat.st_mtime_ns
+                self._write_meta(meta_path, meta)
+                fresh = True
+
+            if fresh:
+                started = time.perf_counter()
+                frames = [pd.read_parquet(self.cache_dir / file) for file in meta['files']]
+                elapsed = time.perf_counter() - started
+                self._record(name, 'hit', elapsed, meta['parse_seconds'])
+                return frames if meta['is_list'] else frames[0]
+
+        started = time.perf_counter()
+        result = loader()
+        parse_seconds = time.perf_counter() - started
+
+        self._store(name, meta_path, meta, source_path, stat, result, parse_seconds)
+        self._record(name, 'miss', parse_seconds, parse_seconds)
+        return result
+
+    def _store(self, name, meta_path, old_meta, source_path, stat, result, parse_seconds):
+        """DataFrame을 content-hash 이름의 Parquet으로 저장하고 이전 항목 정리"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        sha256 = file_sha256(source_path)
+        is_list = isinstance(result, list)
+        frames = result if is_list else [result]
+
+        files = []
+        for i, frame in enumerate(frames):
+            file = f'{name}-{sha256[:16]}-{i}.parquet'
+            _to_parquet_safe(frame).to_parquet(self.cache_dir / file, index=False)
+            files.append(file)
+
+        if old_meta:
+            for file in old_meta.get('files', []):
+                if file not in files:
+                    (self.cache_dir / file).unlink(missing_ok=True)
+
+        self._write_meta(meta_path, {
+            'version': CACHE_VERSION,
+            'source': str(source_path),
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': sha256,
+            'parse_seconds': parse_seconds,
+            'is_list': is_list,
+            'files': files,
+        })
+
+    def _read_meta(self, meta_path):
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if meta.get('version') != CACHE_VERSION:
+            return None
+        if not all((self.cache_dir / file).exists() for file in meta.get('files', [])):
+            return None
+        return meta
+
+    def _write_meta(self, meta_path, meta):
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    def _record(self, name, status, seconds, parse_seconds):
+        self.stats.append({
+            'name': name,
+            'status': status,
+            'seconds': seconds,
+            'saved_seconds': max(parse_seconds - seconds, 0.0) if status == 'hit' else 0.0,
+        })
+
+    def status(self, name):
+        """마지막 load(name) 결과 ('hit'/'miss', 캐시 비활성이면 'off')"""
+        for item in reversed(self.stats):
+            if item['name'] == name:
+                return item['status']
+        return 'off'
+
+    def print_report(self):
+        """항목별 hit/miss와 절약 시간 출력"""
+        if not self.enabled or not self.stats:
+            return
+
+        print("\n🗄️  입력 캐시:")
+        for item in self.stats:
+            icon = '✅' if item['status'] == 'hit' else '🔄'
+            line = f"  {icon} {item['name']}: {item['status']} ({item['seconds']:.2f}s"
+            if item['status'] == 'hit':
+                line += f", 절약 {item['saved_seconds']:.2f}s"
+            print(line + ")")
+
+        hits = sum(1 for item in self.stats if item['status'] == 'hit')
+        saved = sum(item['saved_seconds'] for item in self.stats)
+        print(f"  hit {hits}/{len(self.stats)}, 총 절약 시간 {saved:.2f}s")
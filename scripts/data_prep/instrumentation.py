@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+"""
+단계별 계측 (span 타이머 + 카운터)
+각 단계를 context manager/decorator span으로 감싸 소요 시간과 처리량(rows/bytes per s)을
+JSONL로 남기고, 실행 끝에 단계별 요약 리포트(summary.json)를 저장
+--profile을 주지 않으면 span은 아무것도 기록하지 않는 no-op (계측 코드는 그대로 둬도 됨)
+
+Created: 2025-10-28
+Purpose: 데이터 준비/로드/업로드 스크립트의 파싱·매핑·SQL 생성·업로드·insert 소요 시간 기록,
+         데이터 규모가 커질 때 어느 단계에서 회귀가 생기는지 비교
+Usage:
+    from instrumentation import Profiler, add_profile_arguments, span, timed
+
+    @timed('mapping')
+    def build_mapping(...): ...
+
+    with Profiler.from_args('prepare_drug_selection', args):
+        with span('parse.single_list') as s:
+            df = load(...)
+            s.add(rows=len(df), bytes=path.stat().st_size)
+
+    # CLI
+    python prepare_drug_selection.py --profile                        # artifacts/profiles/{스크립트}/{시각}/
+    python prepare_drug_selection.py --profile /tmp/prof --profile-cprofile --profile-memory
+    python prepare_drug_selection.py --profile --profile-compare artifacts/profiles/.../summary.json
+"""
+
+import functools
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_ROOT = Path(__file__).resolve().parent.parent.parent / 'artifacts' / 'profiles'
+CPROFILE_TOP = 30
+TRACEMALLOC_TOP = 15
+TRACEMALLOC_FRAMES = 5
+
+# --profile-compare에서 이 비율 이상 느려진 단계를 회귀로 표시
+REGRESSION_RATIO = 1.2
+
+_active = None
+
+
+# ============================================================
+# 1. Span
+# ============================================================
+
+class Span:
+    """단계 1회 실행 기록 - add()로 처리한 행/바이트 수, set()으로 속성 추가"""
+
+    __slots__ = ('profiler', 'stage', 'attrs', 'rows', 'bytes', 'started', 'depth', 'parent',
+                 'peak_before', 'child_peak')
+
+    def __init__(self, profiler, stage, attrs):
+        self.profiler = profiler
+        self.stage = stage
+        self.attrs = attrs
+        self.rows = 0
+        self.bytes = 0
+        self.child_peak = 0
+
+    def add(self, rows=0, bytes=0):
+        self.rows += rows
+        self.bytes += bytes
+        return self
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._exit(self, exc)
+        return False
+
+
+class _NullSpan:
+    """비활성 상태의 span (기록 없음)"""
+
+    __slots__ = ()
+
+    def add(self, rows=0, bytes=0):
+        return self
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(stage, **attrs):
+    """활성 Profiler가 있으면 Span, 없으면 no-op"""
+    if _active is None:
+        return NULL_SPAN
+    return Span(_active, stage, attrs)
+
+
+def timed(stage=None, rows=None):
+    """함수 호출을 span으로 감싸는 decorator
+
+    Args:
+        stage: span 이름 (기본: 함수 이름)
+        rows: 반환값 → 처리 행 수 함수 (예: len)
+    """
+    def decorator(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with Span(_active, name, {}) as s:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    s.add(rows=rows(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def count(key, n=1):
+    """활성 Profiler의 카운터 증가 (없으면 무시)"""
+    if _active is not None:
+        _active.count(key, n)
+
+
+# ============================================================
+# 2. Profiler
+# ============================================================
+
+def _rate(amount, seconds):
+    return round(amount / seconds, 2) if amount and seconds > 0 else None
+
+
+class Profiler:
+    """span을 JSONL로 기록하고 단계별 요약을 만드는 실행 단위 계측기
+
+    - span은 스레드별 스택으로 중첩 (stage 경로: 'load_inputs/parse.single_list')
+    - cprofile: 메인 스레드 전체를 cProfile로 기록 → profile.pstats + cprofile.txt
+    - memory: tracemalloc으로 span별 최대 메모리 + 상위 할당 위치 → memory.txt
+      (tracemalloc peak는 프로세스 전체 값이므로 스레드가 동시에 span을 열면 서로 섞임)
+    """
+
+    def __init__(self, name, output_dir=None, cprofile=False, memory=False, compare=None):
+        self.name = name
+        self.output_dir = Path(output_dir) if output_dir else PROFILE_ROOT / name / datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.cprofile = cprofile
+        self.memory = memory
+        self.compare = compare
+        self.lock = threading.Lock()
+        self.stages = {}     # stage 경로 → 집계
+        self.counters = {}
+        self._local = threading.local()
+        self._spans_file = None
+        self._profile = None
+
+    @classmethod
+    def from_args(cls, name, args):
+        """add_profile_arguments()로 받은 인자로 생성 (프로파일 인자가 하나도 없으면 비활성 context)"""
+        if args.profile is None and not (args.profile_cprofile or args.profile_memory or args.profile_compare):
+            return _NullProfiler()
+        return cls(name, output_dir=args.profile or None, cprofile=args.profile_cprofile,
+                   memory=args.profile_memory, compare=args.profile_compare)
+
+    # -- 수명 ----------------------------------------------------------------
+    def __enter__(self):
+        global _active
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._spans_file = open(self.output_dir / 'spans.jsonl', 'w', encoding='utf-8')
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.started = time.perf_counter()
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = None
+        self.wall = time.perf_counter() - self.started
+        if self._profile is not None:
+            self._profile.disable()
+        self._spans_file.close()
+
+        # sys.exit(0)으로 끝난 실행은 정상 종료
+        failed = exc is not None and not (isinstance(exc, SystemExit) and not exc.code)
+        summary = self.summary(error=f"{exc_type.__name__}: {exc}" if failed else None)
+        with open(self.output_dir / 'summary.json', 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        if self._profile is not None:
+            self._write_cprofile()
+        if self.memory:
+            self._write_memory()
+
+        print_summary(summary)
+        if self.compare:
+            with open(self.compare, 'r', encoding='utf-8') as f:
+                print_comparison(summary, json.load(f))
+        print(f"💾 프로파일 저장: {self.output_dir}")
+        return False
+
+    # -- span 기록 -----------------------------------------------------------
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, s):
+        stack = self._stack()
+        s.parent = stack[-1].stage if stack else None
+        s.depth = len(stack)
+        if s.parent:
+            s.stage = f"{s.parent}/{s.stage}"
+        if self.memory:
+            import tracemalloc
+            s.peak_before = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        stack.append(s)
+        s.started = time.perf_counter()
+
+    def _exit(self, s, error):
+        duration = time.perf_counter() - s.started
+        stack = self._stack()
+        stack.pop()
+
+        record = {
+            'script': self.name,
+            'stage': s.stage,
+            'parent': s.parent,
+            'depth': s.depth,
+            'start_s': round(s.started - self.started, 6),
+            'duration_s': round(duration, 6),
+        }
+        if s.rows:
+            record['rows'] = s.rows
+            record['rows_per_s'] = _rate(s.rows, duration)
+        if s.bytes:
+            record['bytes'] = s.bytes
+            record['mb_per_s'] = _rate(s.bytes / 1024 / 1024, duration)
+        peak = None
+        if self.memory:
+            import tracemalloc
+            # 하위 span이 reset_peak()로 지운 최대값을 부모로 전달
+            peak = max(tracemalloc.get_traced_memory()[1], s.child_peak)
+            record['mem_peak_kb'] = round(peak / 1024, 1)
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, s.peak_before, peak)
+        if error is not None:
+            record['error'] = f"{type(error).__name__}: {error}"
+        record.update(s.attrs)
+
+        with self.lock:
+            self._spans_file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            stage = self.stages.setdefault(s.stage, {
+                'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'rows': 0, 'bytes': 0,
+                'depth': s.depth, 'first_start': s.started, 'errors': 0, 'mem_peak_kb': None,
+            })
+            stage['calls'] += 1
+            stage['total_s'] += duration
+            stage['max_s'] = max(stage['max_s'], duration)
+            stage['rows'] += s.rows
+            stage['bytes'] += s.bytes
+            stage['errors'] += error is not None
+            if peak is not None:
+                stage['mem_peak_kb'] = max(stage['mem_peak_kb'] or 0, record['mem_peak_kb'])
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    # -- 요약 ----------------------------------------------------------------
+    def summary(self, error=None):
+        """단계별 합계/평균/처리량 (top-level span 합계와 wall 시간의 차이 = 미계측 구간)"""
+        stages = []
+        # 처음 시작한 순서 = span 트리 순서 (부모가 자식보다 먼저)
+        for name, stage in sorted(self.stages.items(), key=lambda kv: kv[1]['first_start']):
+            item = {
+                'stage': name,
+                'depth': stage['depth'],
+                'calls': stage['calls'],
+                'total_s': round(stage['total_s'], 4),
+                'mean_ms': round(1000 * stage['total_s'] / stage['calls'], 3),
+                'max_ms': round(1000 * stage['max_s'], 3),
+                'share': round(stage['total_s'] / self.wall, 4) if self.wall else None,
+            }
+            if stage['rows']:
+                item['rows'] = stage['rows']
+                item['rows_per_s'] = _rate(stage['rows'], stage['total_s'])
+            if stage['bytes']:
+                item['bytes'] = stage['bytes']
+                item['mb_per_s'] = _rate(stage['bytes'] / 1024 / 1024, stage['total_s'])
+            if stage['mem_peak_kb'] is not None:
+                item['mem_peak_kb'] = stage['mem_peak_kb']
+            if stage['errors']:
+                item['errors'] = stage['errors']
+            stages.append(item)
+
+        top_level = sum(stage['total_s'] for stage in self.stages.values() if stage['depth'] == 0)
+        return {
+            'script': self.name,
+            'argv': sys.argv[1:],
+            'started_at': self.started_at,
+            'wall_s': round(self.wall, 4),
+            'unaccounted_s': round(max(self.wall - top_level, 0.0), 4),
+            'error': error,
+            'stages': stages,
+            'counters': dict(self.counters),
+        }
+
+    def _write_cprofile(self):
+        import io
+        import pstats
+
+        self._profile.dump_stats(str(self.output_dir / 'profile.pstats'))
+        buffer = io.StringIO()
+        pstats.Stats(self._profile, stream=buffer).sort_stats('cumulative').print_stats(CPROFILE_TOP)
+        (self.output_dir / 'cprofile.txt').write_text(buffer.getvalue(), encoding='utf-8')
+
+    def _write_memory(self):
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        lines = [f"current={current / 1024 / 1024:.1f}MB (마지막 reset 이후 peak={peak / 1024 / 1024:.1f}MB)", '']
+        for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+            lines.append(f"{stat.size / 1024:10.1f} KB  {stat.count:8d} blocks  {stat.traceback}")
+        (self.output_dir / 'memory.txt').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+class _NullProfiler:
+    """--profile 미지정 시 Profiler 대신 쓰는 빈 context"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+# ============================================================
+# 3. 리포트 / CLI
+# ============================================================
+
+def print_summary(summary):
+    """단계별 소요 시간 표 (span 트리 순서)"""
+    print("\n" + "=" * 60)
+    print(f"⏱️  단계별 프로파일: {summary['script']} (wall {summary['wall_s']:.3f}s, "
+          f"미계측 {summary['unaccounted_s']:.3f}s)")
+    print("=" * 60)
+    for item in summary['stages']:
+        name = '  ' * item['depth'] + item['stage'].rsplit('/', 1)[-1]
+        line = (f"  {name:<32} {item['total_s']:>9.3f}s {100 * (item['share'] or 0):>5.1f}%"
+                f"  ×{item['calls']:<5}")
+        if 'rows_per_s' in item:
+            line += f" {item['rows']:>10,} rows {item['rows_per_s']:>12,.0f}/s"
+        if 'mb_per_s' in item:
+            line += f" {item['bytes'] / 1024 / 1024:>8.2f} MB {item['mb_per_s']:>8.2f} MB/s"
+        if 'mem_peak_kb' in item:
+            line += f" peak {item['mem_peak_kb'] / 1024:.1f}MB"
+        if item.get('errors'):
+            line += f" ❌{item['errors']}"
+        print(line)
+    if summary['counters']:
+        print("  카운터: " + ", ".join(f"{k}={v:,}" for k, v in summary['counters'].items()))
+
+
+def print_comparison(current, previous):
+    """이전 summary.json 대비 단계별 소요 시간 변화 (REGRESSION_RATIO 이상 느려지면 표시)"""
+    before = {item['stage']: item for item in previous['stages']}
+    print(f"\n📈 이전 실행 대비 ({previous.get('started_at')}, wall {previous['wall_s']:.3f}s → {current['wall_s']:.3f}s)")
+    for item in current['stages']:
+        old = before.pop(item['stage'], None)
+        if old is None:
+            print(f"  🆕 {item['stage']}: {item['total_s']:.3f}s")
+            continue
+        ratio = item['total_s'] / old['total_s'] if old['total_s'] > 0 else float('inf')
+        icon = '🔺' if ratio >= REGRESSION_RATIO else ('🔻' if ratio <= 1 / REGRESSION_RATIO else '  ')
+        line = f"  {icon} {item['stage']}: {old['total_s']:.3f}s → {item['total_s']:.3f}s (×{ratio:.2f})"
+        if item.get('rows') != old.get('rows'):
+            line += f", rows {old.get('rows', 0):,} → {item.get('rows', 0):,}"
+        print(line)
+    for stage in before:
+        print(f"  ➖ {stage}: 이번 실행에 없음")
+
+
+def add_profile_arguments(parser):
+    """--profile 관련 CLI 인자 추가"""
+    group = parser.add_argument_group('프로파일링')
+    group.add_argument('--profile', nargs='?', const='', default=None, metavar='DIR',
+                       help='단계별 span(JSONL)과 요약 리포트 저장 (기본 위치: artifacts/profiles/{스크립트}/{시각})')
+    group.add_argument('--profile-cprofile', action='store_true', help='cProfile 함수 단위 기록 추가 (--profile 포함)')
+    group.add_argument('--profile-memory', action='store_true', help='tracemalloc span별 최대 메모리 + 상위 할당 위치 기록 (--profile 포함)')
+    group.add_argument('--profile-compare', metavar='SUMMARY_JSON', help='이전 summary.json과 단계별 비교 (--profile 포함)')
+    return group
@@ -5,15 +5,44 @@ MVP 5개 규칙에 따라 K-CODE와 EDI 매핑 후 Excel 작업용 데이터 생
 
 Created: 2025-10-22
 Purpose: K-CODE와 EDI 매핑하여 Excel 작업용 데이터 준비
-Usage: python prepare_drug_selection.py
+Usage: python prepare_drug_selection.py [--engine vectorized|loop] [--check-parity] [--no-cache]
+       python prepare_drug_selection.py --usage-source '/home/max16/drug_list/exports/*.xlsx' --workers 4
+       python prepare_drug_selection.py --profile [--profile-cprofile] [--profile-memory]   # 단계별 소요 시간 리포트
 """
 
+import argparse
 import json
+import sys
 import pandas as pd
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from input_cache import InputCache
+from instrumentation import Profiler, add_profile_arguments, span
+from usage_stream import stream_edi_totals
+from incremental_selection import (
+    diff_drug_lists, input_fingerprint, load_state, print_changeset,
+    ranking_to_drugs, rerank_incremental, save_state, write_changeset
+)
+
+# 입력/출력 경로
+SINGLE_LIST_PATH = Path('/home/max16/drug_list/single_list.xlsx')
+KCODE_LABEL_MAP_PATH = Path('/home/max16/pillsnap_inference/mapping/kcode_label_map.json')
+DRUGS_MASTER_PATH = Path('/home/max16/pillsnap_bff/migrations/drugs_master.csv')
+ACTUAL_LIST_PATH = Path('/home/max16/drug_list/actual_list.xlsx')
+OUTPUT_PATH = Path('/home/max16/pillsnap-narrow-model/artifacts/drug_selection_workspace.xlsx')
+CACHE_DIR = OUTPUT_PATH.parent / 'cache' / 'inputs'
+STATE_PATH = OUTPUT_PATH.parent / 'selection_state.json'
+CHANGESET_PATH = OUTPUT_PATH.parent / 'selection_changeset.json'
+
+RESULT_COLUMNS = ['K-CODE', 'EDI', 'Drug_Name', 'Manufacturer', 'Usage_Count', 'Mapping_Source', 'In_Dataset']
+
+# int()가 허용하는 정수 문자열 (앞뒤 공백, 부호, 숫자 사이 '_')
+KCODE_NUMBER_PATTERN = r'^\s*[+-]?\d+(?:_\d+)*\s*$'
+INT64_SAFE_DIGITS = 18
+
+
 def normalize_kcode(kcode):
     """K-CODE를 K-000000 형식으로 정규화"""
     if pd.isna(kcode) or kcode == '':
@@ -35,56 +64,121 @@ def normalize_kcode(kcode):
         print(f"Warning: Invalid K-CODE format: {kcode}")
         return None
 
-def main():
-    print("🔄 약품 선정 데이터 준비 시작...")
 
-    # 1. single_list.xlsx에서 K-CODE 추출 (2개 시트)
-    print("\n📊 single_list.xlsx 읽기...")
-    single_list_path = Path('/home/max16/drug_list/single_list.xlsx')
+def normalize_kcode_series(values):
+    """normalize_kcode의 벡터화 버전 (str accessor 기반, 무효 값은 None)"""
+    values = pd.Series(values, dtype=object)
+    result = pd.Series(None, index=values.index, dtype=object)
 
-    # 두 시트를 모두 읽기
-    sheet1_df = pd.read_excel(single_list_path, sheet_name=0)
-    sheet2_df = pd.read_excel(single_list_path, sheet_name=1)
+    present = values.notna() & values.ne('')
+    if not present.any():
+        return result
 
-    print(f"  Sheet 1: {len(sheet1_df)} rows, columns: {list(sheet1_df.columns)}")
-    print(f"  Sheet 2: {len(sheet2_df)} rows, columns: {list(sheet2_df.columns)}")
+    # K- 또는 K 접두어 제거
+    stripped = values[present].astype(str).str.strip().str.upper()
+    body = stripped.str.replace(r'^K-?', '', regex=True)
 
-    # K-CODE 컬럼 찾기 및 추출
-    all_kcodes = set()
+    valid = body.str.match(KCODE_NUMBER_PATTERN)
+    for invalid in body[~valid]:
+        print(f"Warning: Invalid K-CODE format: {invalid}")
 
-    for df, sheet_name in [(sheet1_df, 'Sheet1'), (sheet2_df, 'Sheet2')]:
-        # K-CODE가 포함된 컬럼 찾기
-        kcode_cols = [col for col in df.columns if 'K' in str(col).upper() or 'CODE' in str(col).upper()]
-
-        if kcode_cols:
-            print(f"  {sheet_name}에서 K-CODE 컬럼 발견: {kcode_cols[0]}")
-            for kcode in df[kcode_cols[0]].dropna():
-                normalized = normalize_kcode(kcode)
-                if normalized:
-                    all_kcodes.add(normalized)
-        else:
-            # 첫 번째 컬럼이 K-CODE일 가능성 확인
-            first_col = df.iloc[:, 0].dropna()
-            if any('K' in str(val).upper() for val in first_col.head()):
-                print(f"  {sheet_name}의 첫 번째 컬럼을 K-CODE로 사용")
-                for kcode in first_col:
-                    normalized = normalize_kcode(kcode)
-                    if normalized:
-                        all_kcodes.add(normalized)
+    # 6자리 패딩 (음수는 f'{n:06d}'와 동일하게 부호 포함 6자리)
+    digits = body[valid].str.strip().str.replace('_', '', regex=False)
+    # int64 범위(18자리 이하)만 벡터화, 더 긴 숫자열은 int()로 처리 (overflow 방지)
+    short = digits.str.lstrip('+-').str.len() <= INT64_SAFE_DIGITS
+    numbers = digits[short].astype('int64')
+    result[numbers.index] = 'K-' + numbers.astype(str).str.zfill(6)
+    for index, value in digits[~short].items():
+        result[index] = f'K-{int(value):06d}'
+    return result
 
-    print(f"\n✅ 총 {len(all_kcodes)}개의 고유 K-CODE 추출")
 
-    # 2. K-CODE → EDI 매핑 로드 (우선순위: kcode_label_map.json → drugs_master.csv)
-    print("\n📚 매핑 파일 로드...")
+def load_single_list():
+    """single_list.xlsx의 두 시트 읽기"""
+    sheet1_df = pd.read_excel(SINGLE_LIST_PATH, sheet_name=0)
+    sheet2_df = pd.read_excel(SINGLE_LIST_PATH, sheet_name=1)
+    return [(sheet1_df, 'Sheet1'), (sheet2_df, 'Sheet2')]
 
-    # kcode_label_map.json 로드
-    kcode_to_edi = {}
-    kcode_label_map_path = Path('/home/max16/pillsnap_inference/mapping/kcode_label_map.json')
 
-    if kcode_label_map_path.exists():
-        with open(kcode_label_map_path, 'r', encoding='utf-8') as f:
-            label_map = json.load(f)
+def load_label_map():
+    """kcode_label_map.json 로드 (없으면 None)"""
+    if not KCODE_LABEL_MAP_PATH.exists():
+        return None
+    with open(KCODE_LABEL_MAP_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 
+def load_drugs_master():
+    """drugs_master.csv 로드 - 문자형으로 읽어 선행 0 보존 (없으면 None)"""
+    if not DRUGS_MASTER_PATH.exists():
+        return None
+    return pd.read_csv(DRUGS_MASTER_PATH, dtype=str, keep_default_na=False)
+
+
+def load_actual_list():
+    """actual_list.xlsx 로드 후 약품명/EDI/수량 컬럼 정리"""
+    # Excel 파일을 읽되, 데이터는 5행부터 시작 (헤더행 제외, 0-indexed로는 4)
+    actual_df = pd.read_excel(ACTUAL_LIST_PATH, header=None, skiprows=4, dtype=str)
+    print(f"  총 {len(actual_df)} 행 로드")
+
+    # 컬럼 설정: 0=약품명, 1=EDI코드, 6=수량
+    if len(actual_df.columns) >= 7:
+        actual_df = actual_df[[0, 1, 6]]  # 필요한 컬럼만 선택
+        actual_df.columns = ['drug_name', 'edi', 'quantity']
+    else:
+        print("  경고: 예상과 다른 컬럼 구조")
+        actual_df.columns = ['drug_name', 'edi'] if len(actual_df.columns) >= 2 else ['drug_name']
+
+    print(f"  컬럼: {list(actual_df.columns)}")
+
+    # 수량을 숫자로 변환
+    if 'quantity' in actual_df.columns:
+        actual_df['quantity'] = pd.to_numeric(actual_df['quantity'], errors='coerce').fillna(0)
+
+    return actual_df
+
+
+def find_kcode_column(df, sheet_name):
+    """시트에서 K-CODE 컬럼을 찾아 Series로 반환 (없으면 None)"""
+    # K-CODE가 포함된 컬럼 찾기
+    kcode_cols = [col for col in df.columns if 'K' in str(col).upper() or 'CODE' in str(col).upper()]
+
+    if kcode_cols:
+        print(f"  {sheet_name}에서 K-CODE 컬럼 발견: {kcode_cols[0]}")
+        return df[kcode_cols[0]].dropna()
+
+    # 첫 번째 컬럼이 K-CODE일 가능성 확인
+    first_col = df.iloc[:, 0].dropna()
+    if any('K' in str(val).upper() for val in first_col.head()):
+        print(f"  {sheet_name}의 첫 번째 컬럼을 K-CODE로 사용")
+        return first_col
+
+    return None
+
+
+# ---------------------------------------------------------------------------
+# 루프 버전 (기준 구현)
+# ---------------------------------------------------------------------------
+
+def extract_kcodes_loop(sheets):
+    """시트별 K-CODE를 셀 단위로 정규화하여 집합으로 반환"""
+    all_kcodes = set()
+    for df, sheet_name in sheets:
+        column = find_kcode_column(df, sheet_name)
+        if column is None:
+            continue
+        for kcode in column:
+            normalized = normalize_kcode(kcode)
+            if normalized:
+                all_kcodes.add(normalized)
+    return all_kcodes
+
+
+def build_kcode_mapping_loop(label_map, drugs_master):
+    """K-CODE → EDI 매핑 dict 생성 (우선순위: kcode_label_map.json → drugs_master.csv)"""
+    kcode_to_edi = {}
+
+    if label_map is not None:
         # label_map에서 K-CODE와 EDI 정보 추출
         for kcode, info in label_map.items():
             normalized = normalize_kcode(kcode)
@@ -102,12 +196,7 @@ def main():
                         }
         print(f"  kcode_label_map.json: {len(kcode_to_edi)}개 매핑")
 
-    # drugs_master.csv 로드 (보조 매핑) - 문자형으로 읽어 선행 0 보존
-    drugs_master_path = Path('/home/max16/pillsnap_bff/migrations/drugs_master.csv')
-
-    if drugs_master_path.exists():
-        drugs_master = pd.read_csv(drugs_master_path, dtype=str, keep_default_na=False)
-
+    if drugs_master is not None:
         # drugs_master에서 K-CODE → EDI 매핑 추가 (기존 매핑이 없는 경우만)
         for _, row in drugs_master.iterrows():
             kcode = normalize_kcode(row.get('kcode') or row.get('K-CODE') or row.get('k_code'))
@@ -123,48 +212,32 @@ def main():
 
         print(f"  drugs_master.csv 추가: 총 {len(kcode_to_edi)}개 매핑")
 
-    # 3. actual_list.xlsx에서 EDI별 사용량 계산
-    print("\n💊 actual_list.xlsx에서 EDI 사용량 분석...")
-    actual_list_path = Path('/home/max16/drug_list/actual_list.xlsx')
-
-    # Excel 파일을 읽되, 데이터는 5행부터 시작 (헤더행 제외, 0-indexed로는 4)
-    # 헤더를 건너뛰고 읽기
-    actual_df = pd.read_excel(actual_list_path, header=None, skiprows=4, dtype=str)
-    print(f"  총 {len(actual_df)} 행 로드")
-
-    # 컬럼 설정: 0=약품명, 1=EDI코드, 6=수량
-    if len(actual_df.columns) >= 7:
-        actual_df = actual_df[[0, 1, 6]]  # 필요한 컬럼만 선택
-        actual_df.columns = ['drug_name', 'edi', 'quantity']
-    else:
-        print("  경고: 예상과 다른 컬럼 구조")
-        actual_df.columns = ['drug_name', 'edi'] if len(actual_df.columns) >= 2 else ['drug_name']
+    return kcode_to_edi
 
-    print(f"  컬럼: {list(actual_df.columns)}")
 
-    # 수량을 숫자로 변환
-    if 'quantity' in actual_df.columns:
-        actual_df['quantity'] = pd.to_numeric(actual_df['quantity'], errors='coerce').fillna(0)
-
-    # EDI별 사용량 집계 (EDI 코드가 있는 행만)
-    edi_usage = {}
+def aggregate_edi_quantity(actual_df):
+    """EDI별 수량 합계 (EDI 코드가 있는 행만, 사용량 내림차순)"""
     if 'quantity' in actual_df.columns:
         # 수량 컬럼이 있으면 합계 계산
-        edi_grouped = actual_df[actual_df['edi'].notna()].groupby('edi')['quantity'].sum().sort_values(ascending=False)
-    else:
-        # 수량 컬럼이 없으면 빈도로 계산
-        edi_grouped = actual_df['edi'].dropna().value_counts()
+        return actual_df[actual_df['edi'].notna()].groupby('edi')['quantity'].sum().sort_values(ascending=False, kind='stable')
+    # 수량 컬럼이 없으면 빈도로 계산
+    return actual_df['edi'].dropna().value_counts()
 
+
+def compute_edi_usage_loop(edi_grouped):
+    """EDI별 사용량 dict 계산"""
+    edi_usage = {}
     for edi, count in edi_grouped.items():
         edi_usage[str(edi).strip()] = int(count)
 
-    print(f"  총 {len(edi_usage)}개 EDI의 사용량 계산 완료")
+    return edi_usage
 
-    # 4. 통합 데이터프레임 생성
-    print("\n🔄 통합 데이터 생성...")
 
+def build_result_loop(all_kcodes, kcode_to_edi, edi_usage):
+    """K-CODE별 행을 하나씩 만들어 통합 DataFrame 생성"""
     rows = []
-    for kcode in all_kcodes:
+    # 동점 정렬 순서를 고정하기 위해 정렬된 순서로 순회
+    for kcode in sorted(all_kcodes):
         row = {
             'K-CODE': kcode,
             'EDI': '',
@@ -189,12 +262,122 @@ def main():
 
         rows.append(row)
 
-    # DataFrame 생성 및 정렬
-    result_df = pd.DataFrame(rows)
-    result_df = result_df.sort_values('Usage_Count', ascending=False)
-
-    # EDI 중복 제거 (동일 EDI가 여러 K-CODE에 매핑된 경우 사용량 높은 것만 유지)
-    print("\n🔄 EDI 중복 제거 중...")
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+# ---------------------------------------------------------------------------
+# 벡터화 버전
+# ---------------------------------------------------------------------------
+
+def extract_kcodes_vectorized(sheets):
+    """시트별 K-CODE 컬럼을 한 번에 정규화하여 집합으로 반환"""
+    columns = []
+    for df, sheet_name in sheets:
+        column = find_kcode_column(df, sheet_name)
+        if column is not None:
+            columns.append(column.astype(object))
+
+    if not columns:
+        return set()
+
+    normalized = normalize_kcode_series(pd.concat(columns, ignore_index=True))
+    return set(normalized.dropna())
+
+
+def _first_present(df, columns):
+    """row.get(a) or row.get(b) or ... 를 컬럼 단위로 계산"""
+    result = pd.Series(None, index=df.index, dtype=object)
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = df[col].astype(object)
+        result = result.where(result.notna() & result.ne(''), values)
+    return result
+
+
+def build_kcode_mapping_vectorized(label_map, drugs_master):
+    """merge용 K-CODE → EDI 매핑 DataFrame 생성 (kcode_label_map 우선)"""
+    frames = []
+
+    if label_map is not None:
+        entries = [
+            (kcode, info['edi_codes'][0], info.get('name_kr'), info.get('company'))
+            for kcode, info in label_map.items()
+            if isinstance(info, dict) and info.get('edi_codes')
+        ]
+        label_df = pd.DataFrame(entries, columns=['raw_kcode', 'edi', 'drug_name', 'manufacturer'], dtype=object)
+        label_df['kcode'] = normalize_kcode_series(label_df['raw_kcode'])
+        label_df['edi'] = label_df['edi'].astype(str).str.strip()
+        label_df = label_df[label_df['kcode'].notna() & label_df['edi'].ne('')].copy()
+        # 같은 K-CODE로 정규화되는 키는 뒤의 항목이 덮어씀 (dict 대입과 동일)
+        label_df = label_df.drop_duplicates('kcode', keep='last')
+        label_df['source'] = 'kcode_label_map'
+        frames.append(label_df)
+        print(f"  kcode_label_map.json: {len(label_df)}개 매핑")
+
+    if drugs_master is not None:
+        master_df = pd.DataFrame({
+            'kcode': normalize_kcode_series(_first_present(drugs_master, ['kcode', 'K-CODE', 'k_code'])),
+            'edi': _first_present(drugs_master, ['edi_code', 'EDI', 'edi']),
+            'drug_name': drugs_master['item_name'] if 'item_name' in drugs_master.columns else None,
+            'manufacturer': drugs_master['entp_name'] if 'entp_name' in drugs_master.columns else None,
+        })
+        master_df = master_df[master_df['kcode'].notna() & master_df['edi'].notna() & master_df['edi'].ne('')].copy()
+        master_df['edi'] = master_df['edi'].astype(str).str.strip()
+        # drugs_master 내 중복은 첫 행 유지
+        master_df = master_df.drop_duplicates('kcode', keep='first')
+        master_df['source'] = 'drugs_master'
+        frames.append(master_df)
+
+    columns = ['kcode', 'edi', 'source', 'drug_name', 'manufacturer']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    mapping_df = pd.concat([frame[columns] for frame in frames], ignore_index=True)
+    # kcode_label_map이 먼저 concat되므로 keep='first'가 우선순위를 유지
+    mapping_df = mapping_df.drop_duplicates('kcode', keep='first')
+    for col in ['drug_name', 'manufacturer']:
+        mapping_df[col] = mapping_df[col].fillna('').astype(str).str.strip()
+
+    if drugs_master is not None:
+        print(f"  drugs_master.csv 추가: 총 {len(mapping_df)}개 매핑")
+
+    return mapping_df.reset_index(drop=True)
+
+
+def compute_edi_usage_vectorized(edi_grouped):
+    """EDI별 사용량 Series 계산 (index=정리된 EDI, 값=int 사용량)"""
+    edi_grouped = edi_grouped.copy()
+    edi_grouped.index = edi_grouped.index.astype(str).str.strip()
+    # 공백만 다른 EDI는 dict 대입과 같이 마지막 값 유지
+    edi_grouped = edi_grouped[~edi_grouped.index.duplicated(keep='last')]
+    return edi_grouped.astype('int64')
+
+
+def build_result_vectorized(all_kcodes, mapping_df, edi_usage):
+    """K-CODE 목록에 매핑을 merge하고 사용량을 map으로 붙여 통합 DataFrame 생성"""
+    kcodes_df = pd.DataFrame({'K-CODE': sorted(all_kcodes)}, dtype=object)
+    merged = kcodes_df.merge(mapping_df, how='left', left_on='K-CODE', right_on='kcode', sort=False)
+
+    result_df = pd.DataFrame({
+        'K-CODE': merged['K-CODE'],
+        'EDI': merged['edi'].fillna(''),
+        'Drug_Name': merged['drug_name'].fillna(''),
+        'Manufacturer': merged['manufacturer'].fillna(''),
+        'Usage_Count': merged['edi'].map(edi_usage).fillna(0).astype('int64'),
+        'Mapping_Source': merged['source'].fillna('none'),
+        'In_Dataset': 'Y',
+    }, columns=RESULT_COLUMNS)
+    return result_df
+
+
+# ---------------------------------------------------------------------------
+# 공통 처리
+# ---------------------------------------------------------------------------
+
+def dedup_by_edi(result_df):
+    """EDI 중복 제거 (동일 EDI가 여러 K-CODE에 매핑된 경우 사용량 높은 것만 유지)"""
+    result_df = result_df.sort_values('Usage_Count', ascending=False, kind='stable')
     before_dedup = len(result_df)
 
     # 빈 EDI는 유지, 실제 EDI만 중복 제거
@@ -202,12 +385,189 @@ def main():
     df_without_edi = result_df[result_df['EDI'] == '']
 
     df_dedup = df_with_edi.drop_duplicates(subset=['EDI'], keep='first')
-    result_df = pd.concat([df_dedup, df_without_edi]).sort_values('Usage_Count', ascending=False)
+    result_df = pd.concat([df_dedup, df_without_edi]).sort_values('Usage_Count', ascending=False, kind='stable')
 
     after_dedup = len(result_df)
-    print(f"  중복 제거: {before_dedup}개 → {after_dedup}개 (제거된 중복: {before_dedup - after_dedup}개)")
+    return result_df, before_dedup - after_dedup
 
-    # 5. 통계 출력
+
+# 엔진별 (K-CODE 추출, 매핑, EDI 사용량, 결과 조립) 구현
+ENGINES = {
+    'loop': (extract_kcodes_loop, build_kcode_mapping_loop, compute_edi_usage_loop, build_result_loop),
+    'vectorized': (extract_kcodes_vectorized, build_kcode_mapping_vectorized,
+                   compute_edi_usage_vectorized, build_result_vectorized),
+}
+
+
+def build_selection(inputs, engine='vectorized'):
+    """입력 데이터로 선정용 통합 테이블 생성
+
+    Args:
+        inputs: load_inputs()가 반환한 dict
+        engine: 'vectorized' (기본) 또는 'loop' (기준 구현)
+
+    Returns:
+        (result_df, removed_duplicates)
+    """
+    print(f"\n⚙️  엔진: {engine}")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    extract_kcodes, build_mapping, compute_edi_usage, build_result = ENGINES[engine]
+
+    with span('extract_kcodes', engine=engine) as s:
+        all_kcodes = extract_kcodes(inputs['sheets'])
+        s.add(rows=len(all_kcodes))
+    print(f"\n✅ 총 {len(all_kcodes)}개의 고유 K-CODE 추출")
+
+    with span('mapping', engine=engine) as s:
+        mapping = build_mapping(inputs['label_map'], inputs['drugs_master'])
+        s.add(rows=len(mapping))
+
+    with span('edi_usage', engine=engine) as s:
+        edi_usage = compute_edi_usage(inputs['edi_totals'])
+        s.add(rows=len(edi_usage))
+    print(f"  총 {len(edi_usage)}개 EDI의 사용량 계산 완료")
+
+    with span('build_result', engine=engine) as s:
+        result_df = build_result(all_kcodes, mapping, edi_usage)
+        s.add(rows=len(result_df))
+
+    print("\n🔄 EDI 중복 제거 중...")
+    with span('dedup') as s:
+        result_df, removed = dedup_by_edi(result_df)
+        s.add(rows=len(result_df) + removed).set(removed=removed)
+    print(f"  중복 제거: {len(result_df) + removed}개 → {len(result_df)}개 (제거된 중복: {removed}개)")
+    return result_df, removed
+
+
+def check_parity(inputs):
+    """루프 버전과 벡터화 버전의 결과가 동일한지 검증"""
+    print("\n🧪 루프/벡터화 결과 비교...")
+    with span('loop'):
+        loop_df, loop_removed = build_selection(inputs, engine='loop')
+    with span('vectorized'):
+        vec_df, vec_removed = build_selection(inputs, engine='vectorized')
+
+    if loop_removed != vec_removed:
+        print(f"❌ 중복 제거 수 불일치: loop={loop_removed}, vectorized={vec_removed}")
+        return False
+
+    try:
+        pd.testing.assert_frame_equal(
+            loop_df.reset_index(drop=True),
+            vec_df.reset_index(drop=True),
+            check_dtype=False
+        )
+    except AssertionError as e:
+        print(f"❌ 결과 불일치:\n{e}")
+        return False
+
+    print(f"✅ 결과 일치: {len(vec_df)}행, 제거된 중복 {vec_removed}개")
+    return True
+
+
+def mapping_inputs():
+    """K-CODE 목록/매핑 입력 파일 (바뀌면 증분 재선정 불가)"""
+    return {
+        'single_list': SINGLE_LIST_PATH,
+        'kcode_label_map': KCODE_LABEL_MAP_PATH,
+        'drugs_master': DRUGS_MASTER_PATH,
+    }
+
+
+def load_usage_totals(cache, usage_source=None, usage_workers=None):
+    """EDI별 수량 합계 로드 (usage_source 지정 시 스트리밍 집계)"""
+    if usage_source is not None:
+        print(f"\n💊 {usage_source}에서 EDI 사용량 스트리밍 집계...")
+        with span('usage.stream', workers=usage_workers) as s:
+            edi_totals = stream_edi_totals(usage_source, workers=usage_workers)
+            s.add(rows=len(edi_totals))
+        return edi_totals
+
+    print("\n💊 actual_list.xlsx에서 EDI 사용량 분석...")
+    with span('parse.actual_list') as s:
+        actual_df = cache.load('actual_list', ACTUAL_LIST_PATH, load_actual_list)
+        s.add(rows=len(actual_df), bytes=_file_size(ACTUAL_LIST_PATH)).set(cache=cache.status('actual_list'))
+    with span('usage.aggregate') as s:
+        edi_totals = aggregate_edi_quantity(actual_df)
+        s.add(rows=len(actual_df))
+    return edi_totals
+
+
+def check_incremental_parity(inputs, previous):
+    """증분 재배치 결과가 전체 재계산 결과와 같은지 검증"""
+    print("\n🧪 증분/전체 재계산 결과 비교...")
+    full_df, _ = build_selection(inputs, engine='vectorized')
+    edi_usage = compute_edi_usage_vectorized(inputs['edi_totals'])
+    incremental_df, changed = rerank_incremental(previous['ranking'], edi_usage)
+
+    try:
+        pd.testing.assert_frame_equal(
+            full_df.reset_index(drop=True),
+            incremental_df.reset_index(drop=True),
+            check_dtype=False
+        )
+    except AssertionError as e:
+        print(f"❌ 증분 결과 불일치:\n{e}")
+        return False
+
+    print(f"✅ 증분 결과 일치: 사용량 변경 {changed}개")
+    return True
+
+
+def _file_size(path):
+    """처리량 계산용 입력 파일 크기 (없으면 0)"""
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return 0
+
+
+def load_inputs(cache=None, usage_source=None, usage_workers=None):
+    """single_list / 매핑 파일 / 사용량 데이터 로드
+
+    Args:
+        cache: InputCache (있으면 파싱 결과 재사용)
+        usage_source: 사용량 export 파일/디렉토리/glob (지정 시 스트리밍 집계)
+        usage_workers: 스트리밍 집계 프로세스 수
+    """
+    cache = cache or InputCache(CACHE_DIR, enabled=False)
+
+    # 1. single_list.xlsx에서 K-CODE 추출 (2개 시트)
+    print("\n📊 single_list.xlsx 읽기...")
+    with span('parse.single_list') as s:
+        sheet_dfs = cache.load('single_list', SINGLE_LIST_PATH, lambda: [df for df, _ in load_single_list()])
+        s.add(rows=sum(len(df) for df in sheet_dfs), bytes=_file_size(SINGLE_LIST_PATH)).set(cache=cache.status('single_list'))
+    sheets = list(zip(sheet_dfs, ['Sheet1', 'Sheet2']))
+    for df, sheet_name in sheets:
+        print(f"  {sheet_name}: {len(df)} rows, columns: {list(df.columns)}")
+
+    # 2. K-CODE → EDI 매핑 로드 (우선순위: kcode_label_map.json → drugs_master.csv)
+    print("\n📚 매핑 파일 로드...")
+    with span('parse.label_map') as s:
+        label_map = load_label_map()
+        s.add(rows=len(label_map or ()), bytes=_file_size(KCODE_LABEL_MAP_PATH))
+    drugs_master = None
+    if DRUGS_MASTER_PATH.exists():
+        with span('parse.drugs_master') as s:
+            drugs_master = cache.load('drugs_master', DRUGS_MASTER_PATH, load_drugs_master)
+            s.add(rows=len(drugs_master), bytes=_file_size(DRUGS_MASTER_PATH)).set(cache=cache.status('drugs_master'))
+
+    # 3. actual_list.xlsx (또는 여러 export 파일)에서 EDI별 사용량 계산
+    edi_totals = load_usage_totals(cache, usage_source, usage_workers)
+
+    cache.print_report()
+
+    return {
+        'sheets': sheets,
+        'label_map': label_map,
+        'drugs_master': drugs_master,
+        'edi_totals': edi_totals,
+    }
+
+
+def print_statistics(result_df):
+    """매핑 통계 및 상위 10개 미리보기 출력"""
     print("\n📊 매핑 통계:")
     print(f"  총 K-CODE 수: {len(result_df)}")
     print(f"  EDI 매핑된 K-CODE: {len(result_df[result_df['EDI'] != ''])}")
@@ -221,8 +581,9 @@ def main():
     for idx, row in top10.iterrows():
         print(f"  {row['K-CODE']}: {row['Drug_Name'][:20]} (EDI: {row['EDI']}, 사용량: {row['Usage_Count']:,})")
 
-    # 6. Excel 파일로 저장
-    output_path = Path('/home/max16/pillsnap-narrow-model/artifacts/drug_selection_workspace.xlsx')
+
+def write_workspace(result_df, removed_duplicates, output_path):
+    """drug_selection_workspace.xlsx 저장"""
     output_path.parent.mkdir(exist_ok=True)
 
     with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
@@ -267,13 +628,111 @@ def main():
                 len(result_df[result_df['EDI'] == '']),
                 unique_edi,
                 total_usage,
-                before_dedup - after_dedup
+                removed_duplicates
             ]
         }
         stats_df = pd.DataFrame(stats_data)
         stats_df.to_excel(writer, sheet_name='Statistics', index=False)
 
     print(f"\n✅ Excel 파일 생성 완료: {output_path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='약품 선정용 K-CODE/EDI 매핑 데이터 생성')
+    parser.add_argument('--engine', choices=['vectorized', 'loop'], default='vectorized',
+                        help='매핑/집계 엔진 (기본: vectorized)')
+    parser.add_argument('--check-parity', action='store_true',
+                        help='루프 버전과 벡터화 버전 결과 비교 후 종료')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='입력 파일 Parquet 캐시 사용 안 함')
+    parser.add_argument('--refresh-cache', action='store_true',
+                        help='캐시를 무시하고 입력 파일을 다시 파싱하여 저장')
+    parser.add_argument('--usage-source', default=None,
+                        help='사용량 export 파일/디렉토리/glob - 청크 단위 스트리밍 집계 (기본: actual_list.xlsx 전체 로드)')
+    parser.add_argument('--stream', action='store_true',
+                        help='actual_list.xlsx도 스트리밍으로 집계')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='스트리밍 집계 프로세스 수 (기본: CPU 수)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='이전 순위 테이블에서 사용량이 바뀐 EDI만 재배치하고 상위 목록 changeset 생성')
+    parser.add_argument('--top-n', type=int, default=100,
+                        help='changeset 기준 상위 약품 수 (기본: 100)')
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with Profiler.from_args('prepare_drug_selection', args):
+        run(args)
+
+
+def run(args):
+    print("🔄 약품 선정 데이터 준비 시작...")
+
+    cache = InputCache(CACHE_DIR, enabled=not args.no_cache, refresh=args.refresh_cache)
+    usage_source = args.usage_source or (ACTUAL_LIST_PATH if args.stream else None)
+
+    fingerprint = input_fingerprint(mapping_inputs())
+    previous = load_state(STATE_PATH) if args.incremental else None
+    if args.incremental and previous is None:
+        print(f"\n⚠️  이전 순위 테이블 없음 ({STATE_PATH}) - 전체 재계산")
+
+    if previous is not None and previous['inputs'] == fingerprint and not args.check_parity:
+        # 4-a. 증분 재선정: K-CODE/매핑 입력이 같으면 사용량만 다시 집계
+        print("\n♻️  매핑 입력 변경 없음 - 사용량이 바뀐 EDI만 재배치")
+        with span('load_inputs', mode='incremental'):
+            edi_totals = load_usage_totals(cache, usage_source, args.workers)
+        cache.print_report()
+        with span('rerank_incremental') as s:
+            edi_usage = compute_edi_usage_vectorized(edi_totals)
+            result_df, changed = rerank_incremental(previous['ranking'], edi_usage)
+            s.add(rows=len(result_df)).set(changed=changed)
+        removed_duplicates = previous['removed_duplicates']
+        print(f"  사용량 변경 {changed}개 / 전체 {len(result_df)}개")
+    else:
+        if previous is not None and previous['inputs'] != fingerprint:
+            print("\n⚠️  K-CODE/매핑 입력 변경 - 전체 재계산")
+
+        with span('load_inputs', mode='full'):
+            inputs = load_inputs(cache, usage_source=usage_source, usage_workers=args.workers)
+
+        if args.check_parity:
+            with span('check_parity'):
+                ok = check_parity(inputs)
+                if previous is not None and previous['inputs'] == fingerprint:
+                    ok = check_incremental_parity(inputs, previous) and ok
+            sys.exit(0 if ok else 1)
+
+        # 4. 통합 데이터 생성
+        print("\n🔄 통합 데이터 생성...")
+        with span('build_selection', engine=args.engine) as s:
+            result_df, removed_duplicates = build_selection(inputs, engine=args.engine)
+            s.add(rows=len(result_df))
+
+    with span('save_state') as s:
+        save_state(STATE_PATH, result_df, fingerprint, removed_duplicates)
+        s.add(rows=len(result_df), bytes=_file_size(STATE_PATH))
+
+    if previous is not None:
+        with span('changeset') as s:
+            changeset = diff_drug_lists(
+                ranking_to_drugs(previous['ranking'], args.top_n),
+                ranking_to_drugs(result_df, args.top_n)
+            )
+            write_changeset(CHANGESET_PATH, changeset, args.top_n, previous['created_at'])
+            s.add(rows=sum(len(changeset[k]) for k in ('entering', 'leaving', 'usage_changed')))
+        print_changeset(changeset)
+        print(f"  changeset 저장: {CHANGESET_PATH}")
+
+    # 5. 통계 출력
+    print_statistics(result_df)
+
+    # 6. Excel 파일로 저장
+    with span('write_workspace') as s:
+        write_workspace(result_df, removed_duplicates, OUTPUT_PATH)
+        s.add(rows=len(result_df), bytes=_file_size(OUTPUT_PATH))
+
     print("\n📝 다음 단계:")
     print("  1. Excel 파일 열기: drug_selection_workspace.xlsx")
     print("  2. Top_200 시트에서 촬영 가능한 약품 100개 선택")
@@ -282,4 +741,4 @@ def main():
     print("  5. 최종 100개 리스트를 top_100_drugs.csv로 저장")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
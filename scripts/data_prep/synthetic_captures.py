@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+합성 촬영 데이터 생성기
+약품 N개 × 배경 5 × LED 3 × 회전 8 × 면 2 (약품당 240장)를 파일명 규칙에 맞춰 생성
+
+- 약품마다 시드 고정된 절차적 알약 모양(원형/타원/캡슐), 색상, 각인선
+- 배경 텍스처(손바닥/나무/흰색/검은색/체크 패턴)와 LED 밝기, 회전각 반영
+- 약품 단위로 프로세스 풀에서 생성하여 디스크에 바로 쓰거나 메모리 저장소로 반환
+- 같은 --seed면 파일 내용까지 동일 (--checksum으로 확인)
+
+Created: 2025-10-28
+Purpose: 실사진 없이 업로드/인덱싱/학습 파이프라인 벤치마크 (2.4만 ~ 230만 장)
+Usage:
+    python synthetic_captures.py /tmp/captures --drugs 100 --workers 8
+    python synthetic_captures.py /tmp/studio --drugs 4523 --session 0 --workers 16
+    python synthetic_captures.py --memory --drugs 10 --checksum
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from capture_catalog import BACKGROUNDS, LED_LEVELS, ROTATIONS, SIDES
+
+DEFAULT_SIZE = 200
+DEFAULT_SEED = 20251028
+FIRST_KCODE = 900000       # 실제 K-CODE와 겹치지 않는 범위
+JPEG_QUALITY = 90
+
+LED_GAIN = {3: 0.8, 5: 1.0, 8: 1.2}
+PILL_SHAPES = ('round', 'oval', 'capsule')
+
+
+# ============================================================
+# 1. 배경 / 알약 그리기
+# ============================================================
+
+def make_backgrounds(size, seed):
+    """배경 코드별 텍스처 (len(BACKGROUNDS), size, size, 3) float32"""
+    rng = np.random.default_rng([seed, 0])
+    yy, xx = np.mgrid[:size, :size].astype(np.float32) / size
+    textures = np.empty((len(BACKGROUNDS), size, size, 3), dtype=np.float32)
+
+    # 0: 손바닥 - 피부색 + 부드러운 음영
+    shade = 1.0 - 0.15 * ((xx - 0.5) ** 2 + (yy - 0.4) ** 2)
+    textures[0] = np.array([224, 172, 140], np.float32) * shade[..., None]
+    # 1: 나무 테이블 - 갈색 + 나뭇결
+    grain = 0.85 + 0.15 * np.sin(yy * 60 + 4 * np.sin(xx * 6))
+    textures[1] = np.array([139, 69, 19], np.float32) * grain[..., None]
+    # 2: 흰색 / 3: 검은색
+    textures[2] = 235
+    textures[3] = 25
+    # 4: 체크 패턴 (#CCCCCC 기반)
+    check = ((xx * 10).astype(int) + (yy * 10).astype(int)) % 2
+    textures[4] = np.where(check[..., None] == 1, 204, 170)
+
+    textures += rng.normal(0, 3, textures.shape).astype(np.float32)
+    return textures
+
+
+def drug_profile(kcode_num, seed):
+    """약품별 고정 외형 (모양, 색상, 크기, 각인 각도)"""
+    rng = np.random.default_rng([seed, kcode_num])
+    shape = PILL_SHAPES[rng.integers(len(PILL_SHAPES))]
+    radius = rng.uniform(0.16, 0.24)
+    return {
+        'shape': shape,
+        'form': 1 if shape == 'capsule' else 0,
+        'rx': float(radius * (1.0 if shape == 'round' else rng.uniform(1.3, 1.7))),
+        'ry': float(radius * (1.0 if shape == 'round' else rng.uniform(0.6, 0.8))),
+        'color': rng.uniform(60, 250, 3).astype(np.float32),
+        'back_color': rng.uniform(60, 250, 3).astype(np.float32),
+        'imprint': float(rng.uniform(0, np.pi)),
+    }
+
+
+def render(profile, background, noise, led, side, rotation, rng):
+    """배경 텍스처 위에 알약 합성 → (size, size, 3) uint8
+
+    알약 관련 연산은 알약을 감싸는 영역에서만 수행하고,
+    센서 노이즈는 미리 만든 노이즈 타일에서 임의 위치를 잘라 쓴다.
+    """
+    size = background.shape[0]
+    gain = LED_GAIN[led]
+    cx, cy = (0.5 + rng.normal(0, 0.03, 2)) * size
+    rx, ry = profile['rx'] * size, profile['ry'] * size
+    theta = np.deg2rad(rotation) + profile['imprint']
+    cos, sin = float(np.cos(theta)), float(np.sin(theta))
+
+    # 알약 bounding box
+    reach = max(rx, ry) + 2
+    y0, y1 = max(int(cy - reach), 0), min(int(cy + reach) + 1, size)
+    x0, x1 = max(int(cx - reach), 0), min(int(cx + reach) + 1, size)
+    yy = np.arange(y0, y1, dtype=np.float32)[:, None] - np.float32(cy)
+    xx = np.arange(x0, x1, dtype=np.float32)[None, :] - np.float32(cx)
+    u = (xx * cos + yy * sin) / np.float32(rx)
+    v = (yy * cos - xx * sin) / np.float32(ry)
+
+    if profile['shape'] == 'capsule':
+        body = np.maximum(np.abs(u) - 0.6, 0) / 0.4
+        dist = body * body + v * v
+    else:
+        dist = u * u + v * v
+    pill = np.clip((1.0 - dist) * 8, 0, 1)[..., None]            # 경계 안티앨리어싱
+
+    color = profile['color'] if side == 0 else profile['back_color']
+    shading = (0.75 + 0.25 * np.sqrt(np.clip(1 - dist, 0, 1)))[..., None]
+    pill_rgb = color * shading
+    if side == 1:
+        # 뒷면: 분할선
+        pill_rgb *= np.where(np.abs(u) < 0.04, 0.6, 1.0).astype(np.float32)[..., None]
+    elif profile['shape'] == 'capsule':
+        # 캡슐 앞면: 두 색 캡
+        pill_rgb = np.where((u > 0)[..., None], profile['back_color'] * shading, pill_rgb)
+
+    # LED 반사광
+    hx, hy = -0.3 * rx, -0.3 * ry
+    spread = np.float32(0.002 * gain * size * size)
+    highlight = np.exp(-((xx - hx) ** 2 + (yy - hy) ** 2) / spread)[..., None] * pill * np.float32(60 * (gain - 0.5))
+
+    image = background.copy()
+    region = image[y0:y1, x0:x1]
+    region += pill * (pill_rgb - region)
+    region *= np.float32(gain)
+    region += highlight
+    image[:y0] *= gain
+    image[y1:] *= gain
+    image[y0:y1, :x0] *= gain
+    image[y0:y1, x1:] *= gain
+
+    oy, ox = rng.integers(0, noise.shape[0] - size, 2)
+    image += noise[oy:oy + size, ox:ox + size]
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def capture_filename(kcode, bg, led, side, form, rotation, size):
+    """docs/20251024_storage_structure.md 파일명 규칙"""
+    return f"{kcode}_{bg}_{led}_{SIDES[side]}_{form}_90_{rotation:03d}_{size}.jpg"
+
+
+def encode_jpeg(image):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='JPEG', quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+# ============================================================
+# 2. 약품 단위 생성 (워커)
+# ============================================================
+
+_BACKGROUND_CACHE = {}  # (size, seed) → (배경 텍스처, 노이즈 타일)
+
+
+def iter_drug_captures(kcode_num, seed=DEFAULT_SEED, size=DEFAULT_SIZE):
+    """약품 1개의 240장 생성
+
+    Yields:
+        (kcode, filename, jpeg bytes)
+    """
+    key = (size, seed)
+    if key not in _BACKGROUND_CACHE:
+        noise_rng = np.random.default_rng([seed, 1])
+        _BACKGROUND_CACHE[key] = (
+            make_backgrounds(size, seed),
+            noise_rng.normal(0, 2.5, (2 * size, 2 * size, 3)).astype(np.float32),
+        )
+    backgrounds, noise = _BACKGROUND_CACHE[key]
+
+    kcode = f"K-{kcode_num:06d}"
+    profile = drug_profile(kcode_num, seed)
+    for bg in range(len(BACKGROUNDS)):
+        for led in LED_LEVELS:
+            for side in range(len(SIDES)):
+                for rotation in ROTATIONS:
+                    rng = np.random.default_rng([seed, kcode_num, bg, led, side, rotation])
+                    image = render(profile, backgrounds[bg], noise, led, side, rotation, rng)
+                    filename = capture_filename(kcode, bg, led, side, profile['form'], rotation, size)
+                    yield kcode, filename, encode_jpeg(image)
+
+
+def generate_drug(task):
+    """워커: 약품 1개 생성 후 디스크 저장 또는 메모리 반환
+
+    Args:
+        task: (kcode_num, output_dir 또는 None, seed, size)
+
+    Returns:
+        (파일 수, 바이트 수, sha256 hex, [(relpath, bytes)] 또는 None)
+    """
+    kcode_num, output_dir, seed, size = task
+    digest = hashlib.sha256()
+    count = 0
+    total_bytes = 0
+    items = [] if output_dir is None else None
+
+    for kcode, filename, data in iter_drug_captures(kcode_num, seed, size):
+        digest.update(filename.encode())
+        digest.update(data)
+        count += 1
+        total_bytes += len(data)
+        if output_dir is None:
+            items.append((f"{kcode}/{filename}", data))
+        else:
+            drug_dir = os.path.join(output_dir, kcode)
+            os.makedirs(drug_dir, exist_ok=True)
+            with open(os.path.join(drug_dir, filename), 'wb') as f:
+                f.write(data)
+
+    return count, total_bytes, digest.hexdigest(), items
+
+
+def generate(n_drugs, output_root=None, session=1, workers=None, seed=DEFAULT_SEED,
+             size=DEFAULT_SIZE, first_kcode=FIRST_KCODE):
+    """합성 촬영 트리 생성
+
+    Args:
+        output_root: 출력 루트 (None이면 메모리 저장소 반환)
+        session: CS_{session}_single 아래에 생성 (0이면 루트 바로 아래, 스튜디오 형식)
+
+    Returns:
+        {'files', 'bytes', 'checksum', 'store'}  - store: {relpath: bytes} (메모리 모드)
+    """
+    output_dir = None
+    if output_root is not None:
+        output_dir = str(Path(output_root) / f"CS_{session}_single") if session else str(output_root)
+        os.makedirs(output_dir, exist_ok=True)
+
+    tasks = [(first_kcode + i, output_dir, seed, size) for i in range(n_drugs)]
+    workers = workers or os.cpu_count()
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(generate_drug, tasks))
+    else:
+        results = [generate_drug(task) for task in tasks]
+
+    # 약품별 digest를 순서대로 합쳐 전체 checksum (실행 환경과 무관하게 동일)
+    checksum = hashlib.sha256()
+    store = {} if output_root is None else None
+    prefix = f"CS_{session}_single/" if session else ''
+    for _, _, drug_digest, items in results:
+        checksum.update(bytes.fromhex(drug_digest))
+        if store is not None:
+            store.update((prefix + relpath, data) for relpath, data in items)
+
+    return {
+        'files': sum(r[0] for r in results),
+        'bytes': sum(r[1] for r in results),
+        'checksum': checksum.hexdigest(),
+        'store': store,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='합성 촬영 데이터 생성')
+    parser.add_argument('output', nargs='?', help='출력 루트 폴더 (--memory면 생략)')
+    parser.add_argument('--drugs', type=int, default=100, help='약품 수 (약품당 240장)')
+    parser.add_argument('--session', type=int, default=1, help='CS_{N}_single 세션 번호 (0=스튜디오 형식)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='프로세스 수')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help='이미지 크기 (정사각형)')
+    parser.add_argument('--first-kcode', type=int, default=FIRST_KCODE, help='첫 K-CODE 번호')
+    parser.add_argument('--memory', action='store_true', help='디스크 대신 메모리에 생성 (처리량 측정)')
+    parser.add_argument('--checksum', action='store_true', help='전체 내용 SHA-256 출력 (재현성 확인)')
+    args = parser.parse_args()
+
+    if not args.memory and not args.output:
+        parser.error('output 또는 --memory가 필요합니다')
+
+    per_drug = len(BACKGROUNDS) * len(LED_LEVELS) * len(SIDES) * len(ROTATIONS)
+    target = '메모리' if args.memory else args.output
+    print(f"🧪 합성 촬영 데이터 생성: 약품 {args.drugs:,}개 × {per_drug}장 = {args.drugs * per_drug:,}장 → {target}")
+    print(f"  - seed={args.seed}, size={args.size}, workers={args.workers}")
+
+    started = time.perf_counter()
+    result = generate(
+        args.drugs, None if args.memory else args.output, session=args.session,
+        workers=args.workers, seed=args.seed, size=args.size, first_kcode=args.first_kcode,
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"\n✅ 생성 완료: {result['files']:,}장 ({result['bytes'] / 1e6:,.1f} MB)")
+    print(f"  - 소요 시간: {elapsed:.2f}s ({result['files'] / max(elapsed, 1e-9):,.0f} files/s)")
+    if args.checksum:
+        print(f"  - checksum: {result['checksum']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+"""
+학습용 memory-mapped 샤드 생성 / 로더
+splits.json(create_manifest 입력)의 이미지를 모델 해상도 uint8 배열로 미리 디코딩하여
+고정 크기 .npy 샤드에 저장하고, np.memmap으로 복사 없이 읽는 Dataset 제공
+
+샤드 구조 (artifacts/datasets/shards/{split}/):
+    shard-00000.npy ...          (shard_size, S, S, 3) uint8  - 중앙 크롭 + 리사이즈 완료
+    shard-00000.labels.npy ...   (shard_size,) int16          - 샤드별 레이블 인덱스
+    index.json            샤드 목록, 해상도, 전처리 설정, 원본 경로
+
+Created: 2025-10-28
+Purpose: 샘플마다 JPEG open/decode 하던 NarrowModelDataset 대신 CPU 학습 처리량 확보
+Usage:
+    python training_shards.py --build --splits artifacts/datasets/splits.json --workers 8
+    python training_shards.py --benchmark 2000 --split train
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from torch.utils.data import Dataset
+except ImportError:  # torch 없이도 샤드 생성/벤치마크 가능
+    Dataset = object
+
+BASE = Path(__file__).resolve().parents[2]
+DATASET_DIR = BASE / 'artifacts' / 'datasets'
+DEFAULT_SPLITS_PATH = DATASET_DIR / 'splits.json'
+DEFAULT_MANIFEST_PATH = DATASET_DIR / 'manifest.json'
+DEFAULT_SHARD_DIR = DATASET_DIR / 'shards'
+
+DEFAULT_TARGET_SIZE = 512        # UnifiedPreprocessor 기본값
+DEFAULT_SHARD_SIZE = 1024
+WRITE_CHUNK = 64
+SHARD_VERSION = 1
+
+
+# ============================================================
+# 1. 이미지 로드 (UnifiedPreprocessor._center_crop_and_resize와 동일)
+# ============================================================
+
+def resize_backend():
+    try:
+        import cv2  # noqa: F401
+        return 'cv2'
+    except ImportError:
+        return 'pil'
+
+
+def load_resized(path, target_size):
+    """이미지 로드 → RGB 중앙 정사각형 크롭 → target_size 리사이즈 (uint8 HWC)
+
+    cv2가 있으면 UnifiedPreprocessor와 같은 cv2.INTER_LINEAR, 없으면 Pillow BILINEAR.
+
+    Raises:
+        ValueError: 파일이 없거나 디코딩할 수 없는 이미지 (cv2.imread는 예외 없이 None을 반환)
+    """
+    try:
+        import cv2
+    except ImportError:
+        cv2 = None
+
+    if cv2 is not None:
+        image = cv2.imread(str(path))
+        if image is None:
+            raise ValueError(f"이미지를 읽을 수 없습니다: {path}")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    else:
+        from PIL import Image
+        try:
+            with Image.open(path) as img:
+                image = np.asarray(img.convert('RGB'))
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ValueError(f"이미지를 읽을 수 없습니다: {path} ({e})") from e
+
+    h, w = image.shape[:2]
+    min_dim = min(h, w)
+    start_h = (h - min_dim) // 2
+    start_w = (w - min_dim) // 2
+    cropped = image[start_h:start_h + min_dim, start_w:start_w + min_dim]
+
+    if cv2 is not None:
+        return cv2.resize(cropped, (target_size, target_size), interpolation=cv2.INTER_LINEAR)
+
+    from PIL import Image
+    return np.asarray(Image.fromarray(cropped).resize((target_size, target_size), Image.BILINEAR))
+
+
+# ============================================================
+# 2. 샤드 생성
+# ============================================================
+
+def _fill_shard(task):
+    """워커: 샤드 파일의 [start, start + len(paths)) 구간을 채움"""
+    shard_path, start, paths, target_size = task
+    shard = np.load(shard_path, mmap_mode='r+')
+    for i, path in enumerate(paths):
+        shard[start + i] = load_resized(path, target_size)
+    shard.flush()
+    del shard
+    return len(paths)
+
+
+def write_split_shards(items, out_dir, target_size, shard_size=DEFAULT_SHARD_SIZE, workers=None):
+    """split 1개를 샤드로 저장
+
+    Args:
+        items: splits.json의 [{'path', 'label', 'kcode'}, ...]
+
+    Returns:
+        index dict
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    shards = []
+    tasks = []
+    for shard_id, begin in enumerate(range(0, len(items), shard_size)):
+        count = min(shard_size, len(items) - begin)
+        filename = f'shard-{shard_id:05d}.npy'
+        # 헤더 + 전체 크기를 먼저 할당하고 워커들이 구간별로 채움
+        np.lib.format.open_memmap(
+            out_dir / filename, mode='w+', dtype=np.uint8, shape=(count, target_size, target_size, 3)
+        ).flush()
+        labels = np.array([item['label'] for item in items[begin:begin + count]], dtype=np.int16)
+        np.save(out_dir / filename.replace('.npy', '.labels.npy'), labels)
+        shards.append({'file': filename, 'count': count, 'classes': int(len(np.unique(labels)))})
+        for offset in range(0, count, WRITE_CHUNK):
+            end = begin + min(offset + WRITE_CHUNK, count)
+            paths = [item['path'] for item in items[begin + offset:end]]
+            tasks.append((str(out_dir / filename), offset, paths, target_size))
+
+    workers = workers or os.cpu_count()
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            written = sum(executor.map(_fill_shard, tasks))
+    else:
+        written = sum(_fill_shard(task) for task in tasks)
+
+    index = {
+        'version': SHARD_VERSION,
+        'num_samples': written,
+        'target_size': target_size,
+        'shard_size': shard_size,
+        'resize': resize_backend(),
+        'shards': shards,
+        'sources': [item['path'] for item in items],
+        'kcodes': [item['kcode'] for item in items],
+    }
+    with open(out_dir / 'index.json', 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    return index
+
+
+def load_target_size(manifest_path):
+    """manifest.json의 preprocessing.target_size (없으면 기본값)"""
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return DEFAULT_TARGET_SIZE
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return int(manifest.get('preprocessing', {}).get('target_size', DEFAULT_TARGET_SIZE))
+
+
+# ============================================================
+# 3. Dataset
+# ============================================================
+
+class ShardDataset(Dataset):
+    """샤드 기반 Dataset (NarrowModelDataset 대체)
+
+    __getitem__은 memmap의 view(uint8 HWC)를 그대로 넘기고, transform이 있으면 적용한다.
+    memmap은 DataLoader 워커 프로세스 안에서 처음 접근할 때 연다.
+    """
+
+    def __init__(self, split='train', shard_dir=DEFAULT_SHARD_DIR, transform=None):
+        self.split_dir = Path(shard_dir) / split
+        with open(self.split_dir / 'index.json', 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+
+        self.labels = np.concatenate([
+            np.load(self.split_dir / shard['file'].replace('.npy', '.labels.npy'))
+            for shard in self.index['shards']
+        ]) if self.index['shards'] else np.zeros(0, dtype=np.int16)
+        self.shard_size = self.index['shard_size']
+        self.transform = transform
+        self._shards = None
+
+    def __len__(self):
+        return self.index['num_samples']
+
+    def _open(self):
+        self._shards = [np.load(self.split_dir / shard['file'], mmap_mode='r') for shard in self.index['shards']]
+
+    def __getitem__(self, idx):
+        if self._shards is None:
+            self._open()
+        image = self._shards[idx // self.shard_size][idx % self.shard_size]
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, int(self.labels[idx])
+
+    def __getstate__(self):
+        # 워커로 넘길 때 memmap 핸들은 제외
+        state = self.__dict__.copy()
+        state['_shards'] = None
+        return state
+
+
+class FileDataset(Dataset):
+    """파일 단위 로드 (기존 NarrowModelDataset 경로, 벤치마크 비교용)"""
+
+    def __init__(self, items, target_size, transform=None):
+        self.items = items
+        self.target_size = target_size
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, idx):
+        item = self.items[idx]
+        image = load_resized(item['path'], self.target_size)
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, item['label']
+
+
+# ============================================================
+# 4. 벤치마크
+# ============================================================
+
+def benchmark(dataset, n, seed=0):
+    """무작위 순서로 n개 샘플을 읽는 처리량 (samples/sec)"""
+    order = list(range(len(dataset)))
+    random.Random(seed).shuffle(order)
+    order = (order * (n // max(len(order), 1) + 1))[:n]
+
+    checksum = 0
+    started = time.perf_counter()
+    for idx in order:
+        image, label = dataset[idx]
+        checksum += int(np.array(image, copy=True).sum()) + label   # 텐서 변환처럼 샘플 전체를 읽음
+    elapsed = time.perf_counter() - started
+    return n / max(elapsed, 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='학습용 memory-mapped 샤드 생성/벤치마크')
+    parser.add_argument('--build', action='store_true', help='splits.json으로 샤드 생성')
+    parser.add_argument('--splits', default=str(DEFAULT_SPLITS_PATH), help='splits.json 또는 manifest.parquet')
+    parser.add_argument('--manifest', default=str(DEFAULT_MANIFEST_PATH), help='manifest.json (target_size)')
+    parser.add_argument('--output', default=str(DEFAULT_SHARD_DIR), help='샤드 루트 폴더')
+    parser.add_argument('--target-size', type=int, help='해상도 (기본: manifest의 preprocessing.target_size)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='샤드당 샘플 수')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='디코딩 프로세스 수')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='샤드 vs 파일 단위 로드 samples/sec 비교')
+    parser.add_argument('--split', default='train', help='벤치마크 대상 split')
+    args = parser.parse_args()
+
+    if Path(args.splits).suffix == '.parquet':
+        from build_manifest import load_splits   # pandas/pyarrow 필요
+        splits = load_splits(args.splits)
+    else:
+        with open(args.splits, 'r', encoding='utf-8') as f:
+            splits = json.load(f)
+
+    if args.build:
+        target_size = args.target_size or load_target_size(args.manifest)
+        print(f"📦 샤드 생성: {args.splits} → {args.output}")
+        print(f"  - 해상도: {target_size}, 샤드당 {args.shard_size}개, resize={resize_backend()}, workers={args.workers}")
+        for split, items in splits.items():
+            started = time.perf_counter()
+            index = write_split_shards(items, Path(args.output) / split, target_size,
+                                       shard_size=args.shard_size, workers=args.workers)
+            elapsed = time.perf_counter() - started
+            size_mb = index['num_samples'] * target_size * target_size * 3 / 1e6
+            print(f"  ✅ {split}: {index['num_samples']:,}개, 샤드 {len(index['shards'])}개 "
+                  f"({size_mb:,.0f} MB, {elapsed:.1f}s)")
+
+    if args.benchmark:
+        shard_dataset = ShardDataset(args.split, shard_dir=args.output)
+        file_dataset = FileDataset(splits[args.split], shard_dataset.index['target_size'])
+
+        print(f"\n⏱️  로드 벤치마크 ({args.split}, 무작위 순서 {args.benchmark:,}개, "
+              f"{shard_dataset.index['target_size']}px)")
+        file_rate = benchmark(file_dataset, min(args.benchmark, len(file_dataset) * 2))
+        print(f"  - 파일 단위 (open + decode + resize): {file_rate:,.0f} samples/sec")
+        shard_rate = benchmark(shard_dataset, args.benchmark)
+        print(f"  - memmap 샤드: {shard_rate:,.0f} samples/sec ({shard_rate / max(file_rate, 1e-9):.1f}배)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+약국 조제 내역 스트리밍 집계
+여러 약국/여러 달의 CSV/XLSX export를 청크 단위로 읽어 EDI별 수량 합계 계산
+
+Created: 2025-10-28
+Purpose: actual_list.xlsx 전체 로드 없이 대용량 사용량 데이터 집계
+Usage:
+    python usage_stream.py /home/max16/drug_list/exports/ --workers 4
+    python usage_stream.py '/home/max16/drug_list/exports/*.csv' --verify
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import pandas as pd
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# actual_list.xlsx 형식: 4행 헤더, 0=약품명, 1=EDI코드, 6=수량
+HEADER_ROWS = 4
+EDI_COL = 1
+QUANTITY_COL = 6
+DEFAULT_CHUNKSIZE = 100_000
+SUPPORTED_SUFFIXES = ('.xlsx', '.xlsm', '.csv')
+
+# pd.read_excel/read_csv 기본 na_values (keep_default_na=True) - 이 문자열 셀은 결측으로 취급
+DEFAULT_NA_VALUES = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+
+
+def resolve_usage_files(source):
+    """파일/디렉토리/glob 패턴을 정렬된 파일 목록으로 변환"""
+    path = Path(source)
+    if path.is_dir():
+        files = [p for p in path.iterdir() if p.suffix.lower() in SUPPORTED_SUFFIXES]
+    elif path.is_file():
+        files = [path]
+    else:
+        files = [Path(p) for p in glob.glob(str(source)) if Path(p).suffix.lower() in SUPPORTED_SUFFIXES]
+
+    # Excel 잠금 파일 (~$...) 제외
+    return sorted(p for p in files if not p.name.startswith('~$'))
+
+
+def _cell_to_str(value):
+    """pd.read_excel(dtype=str)과 같은 규칙으로 셀 값을 문자열화 (정수형 float은 int로, 기본 NA 문자열은 None)"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            return str(int(value))
+    if isinstance(value, str) and value in DEFAULT_NA_VALUES:
+        return None
+    return str(value)
+
+
+def _iter_xlsx_chunks(path, chunksize):
+    """openpyxl read_only 모드로 (edi, quantity) 청크 생성"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # dimension 정보가 없는 파일은 수량 컬럼이 있다고 가정 (빈 셀은 0)
+        has_quantity = sheet.max_column is None or sheet.max_column > QUANTITY_COL
+
+        edis, quantities = [], []
+        for row in sheet.iter_rows(min_row=HEADER_ROWS + 1, values_only=True):
+            edis.append(_cell_to_str(row[EDI_COL]) if len(row) > EDI_COL else None)
+            if has_quantity:
+                quantities.append(_cell_to_str(row[QUANTITY_COL]) if len(row) > QUANTITY_COL else None)
+            if len(edis) >= chunksize:
+                yield _make_chunk(edis, quantities if has_quantity else None)
+                edis, quantities = [], []
+        if edis:
+            yield _make_chunk(edis, quantities if has_quantity else None)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_chunks(path, chunksize, encoding):
+    """pandas chunksize로 (edi, quantity) 청크 생성"""
+    reader = pd.read_csv(path, header=None, skiprows=HEADER_ROWS, dtype=str,
+                         chunksize=chunksize, encoding=encoding, keep_default_na=True)
+    for chunk in reader:
+        has_quantity = len(chunk.columns) > QUANTITY_COL
+        yield _make_chunk(
+            chunk[EDI_COL].tolist() if len(chunk.columns) > EDI_COL else [None] * len(chunk),
+            chunk[QUANTITY_COL].tolist() if has_quantity else None
+        )
+
+
+def _make_chunk(edis, quantities):
+    chunk = pd.DataFrame({'edi': pd.Series(edis, dtype=object)})
+    if quantities is not None:
+        # load_actual_list()와 동일: 숫자가 아닌 수량은 0
+        chunk['quantity'] = pd.to_numeric(pd.Series(quantities, dtype=object), errors='coerce').fillna(0)
+    return chunk
+
+
+def aggregate_file(path, chunksize=DEFAULT_CHUNKSIZE, encoding='utf-8'):
+    """단일 파일의 EDI별 수량 합계 (수량 컬럼이 없으면 행 수)
+
+    Returns:
+        (Counter{edi: 합계}, 처리 행 수)
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        chunks = _iter_csv_chunks(path, chunksize, encoding)
+    else:
+        chunks = _iter_xlsx_chunks(path, chunksize)
+
+    totals = Counter()
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        chunk = chunk[chunk['edi'].notna()]
+        if 'quantity' in chunk.columns:
+            grouped = chunk.groupby('edi')['quantity'].sum()
+        else:
+            grouped = chunk['edi'].value_counts()
+        totals.update(grouped.to_dict())
+    return totals, rows
+
+
+def _aggregate_file_job(args):
+    path, chunksize, encoding = args
+    return str(path), *aggregate_file(path, chunksize, encoding)
+
+
+def stream_edi_totals(source, workers=None, chunksize=DEFAULT_CHUNKSIZE, encoding='utf-8'):
+    """여러 export 파일을 스트리밍으로 읽어 EDI별 수량 합계 Series 반환
+
+    파일 단위로 프로세스 풀에 분배하고 부분 합계를 병합한다.
+    메모리 사용량은 청크 크기와 고유 EDI 수에만 비례한다.
+
+    Args:
+        source: 파일, 디렉토리 또는 glob 패턴
+        workers: 프로세스 수 (None이면 CPU 수와 파일 수 중 작은 값, 1이면 단일 프로세스)
+        chunksize: 청크당 행 수
+        encoding: CSV 인코딩
+
+    Returns:
+        pd.Series (index=원본 EDI 문자열, 값=합계), 사용량 내림차순 정렬
+    """
+    files = resolve_usage_files(source)
+    if not files:
+        raise FileNotFoundError(f"사용량 파일을 찾을 수 없습니다: {source}")
+
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    print(f"  {len(files)}개 파일 스트리밍 집계 (workers={workers}, chunksize={chunksize:,})")
+
+    started = time.perf_counter()
+    jobs = [(path, chunksize, encoding) for path in files]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_aggregate_file_job, jobs))
+    else:
+        results = [_aggregate_file_job(job) for job in jobs]
+
+    totals = Counter()
+    total_rows = 0
+    for path, file_totals, rows in results:
+        print(f"    {Path(path).name}: {rows:,} 행, {len(file_totals):,}개 EDI")
+        totals.update(file_totals)
+        total_rows += rows
+
+    elapsed = time.perf_counter() - started
+    print(f"  총 {total_rows:,} 행 처리 ({elapsed:.1f}s, {total_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    return pd.Series(totals, dtype='float64').sort_values(ascending=False, kind='stable')
+
+
+def load_in_memory_totals(path):
+    """기존 방식(전체 로드 후 groupby)의 EDI별 합계 - 검증용"""
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        df = pd.read_csv(path, header=None, skiprows=HEADER_ROWS, dtype=str)
+    else:
+        df = pd.read_excel(path, header=None, skiprows=HEADER_ROWS, dtype=str)
+
+    if len(df.columns) > QUANTITY_COL:
+        df = df[[EDI_COL, QUANTITY_COL]]
+        df.columns = ['edi', 'quantity']
+        df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0)
+        return df[df['edi'].notna()].groupby('edi')['quantity'].sum()
+    return df[EDI_COL].dropna().value_counts()
+
+
+def verify_against_in_memory(source, streamed):
+    """스트리밍 합계와 파일별 전체 로드 합계 비교"""
+    expected = Counter()
+    for path in resolve_usage_files(source):
+        expected.update(load_in_memory_totals(path).to_dict())
+    expected = pd.Series(expected, dtype='float64')
+
+    streamed = streamed.sort_index()
+    expected = expected.sort_index()
+    if not streamed.index.equals(expected.index):
+        print(f"❌ EDI 불일치: streamed={len(streamed)}, in-memory={len(expected)}")
+        return False
+    if not (streamed.astype('int64') == expected.astype('int64')).all():
+        print("❌ 합계 불일치")
+        return False
+    print(f"✅ 스트리밍 합계 일치: {len(streamed):,}개 EDI")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='약국 사용량 export 스트리밍 집계')
+    parser.add_argument('source', help='파일, 디렉토리 또는 glob 패턴')
+    parser.add_argument('--workers', type=int, default=None, help='프로세스 수 (기본: CPU 수)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='청크당 행 수')
+    parser.add_argument('--encoding', default='utf-8', help='CSV 인코딩 (예: cp949)')
+    parser.add_argument('--verify', action='store_true', help='전체 로드 방식 결과와 비교')
+    parser.add_argument('--top', type=int, default=10, help='출력할 상위 EDI 수')
+    args = parser.parse_args()
+
+    print("💊 EDI 사용량 스트리밍 집계...")
+    totals = stream_edi_totals(args.source, args.workers, args.chunksize, args.encoding)
+
+    print(f"\n🏆 사용량 상위 {args.top}개 EDI:")
+    for edi, count in totals.head(args.top).items():
+        print(f"  {edi}: {int(count):,}")
+
+    if args.verify and not verify_against_in_memory(args.source, totals):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+실사진/스튜디오 정확도 스트리밍 평가 (RealPhotoTester 대체)
+이미지를 한 장씩 POST하고 결과를 리스트에 모은 뒤 집계하던 test_accuracy / analyze_per_class 대신,
+결과가 도착하는 대로 혼동 행렬과 조건별 정확도를 NumPy 배열에 누적
+
+- 평가 세트: capture_catalog 카탈로그(.npz, --roots로 스캔) 또는 build_manifest의 manifest.parquet (--split)
+    파일명의 배경/LED/면/회전각과 세션(스튜디오/실사진)을 조건으로 사용
+- 백엔드: --backend local  ONNX 세션 워커 프로세스 (스레드 고정, 배치 추론)
+          --backend http   추론 API (httpx keep-alive 풀, /batch_predict 최대 10장씩)
+- 순서: 시드 고정 무작위 순서로 평가 → 중간에 멈춰도 앞부분이 균등 표본
+- TTA 비교: --tta-policies 정책마다 같은 디코딩 결과로 추론하여 정책별 Top-1/Top-5, 호출 지연 분위수,
+    TTA 적용 비율(조기 종료되지 않은 이미지), 회전각별 Top-1을 함께 기록
+- 조기 종료: Top-1 95% Wilson 신뢰구간 반폭 <= --ci, --max-images, --time-budget 중 먼저 도달
+    (230만 장 스튜디오 세트도 CPU에서 수 분 안에 ±0.5%p 추정)
+
+Created: 2025-10-28
+Purpose: 실사진 정확도 테스트(phase5 Task 7)를 병렬/스트리밍으로, 전체 세트를 다 돌지 않고도 신뢰구간과 함께
+Usage:
+    python evaluate_real_photos.py --roots /data/captures --session real --model models/pillsnap_narrow_model.onnx
+    python evaluate_real_photos.py --manifest artifacts/datasets/manifest.parquet --split test --workers 8
+    python evaluate_real_photos.py --catalog artifacts/capture_catalog.npz --session studio --ci 0.005
+    python evaluate_real_photos.py --roots /data/captures --backend http --url http://localhost:8000 --concurrency 16
+    python evaluate_real_photos.py --roots /data/captures --tta-policies none,flip,rot4,rot8 --batch-size 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'data_prep'))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from capture_catalog import DEFAULT_INDEX_PATH, STUDIO_SESSION, CaptureCatalog, build_catalog  # noqa: E402
+from inference.narrow_model import DEFAULT_TTA_THRESHOLD, TTA_POLICIES  # noqa: E402
+
+TOP_K = 5
+Z_95 = 1.959964
+CONDITIONS = ('source', 'bg', 'led', 'side', 'rot')
+SIDE_NAMES = {-1: 'unknown', 0: 'front', 1: 'back'}
+BATCH_PREDICT_PATH = '/v1/narrow/batch_predict'
+MAX_BATCH_FILES = 10
+DEFAULT_OUTPUT = 'artifacts/evaluation/real_photos.json'
+
+
+# ============================================================
+# 1. 평가 세트
+# ============================================================
+
+def load_class_mapping(path) -> List[str]:
+    """idx → K-CODE 목록"""
+    with open(path, 'r', encoding='utf-8') as f:
+        idx_to_class = json.load(f)['idx_to_class']
+    return [idx_to_class[str(i)] for i in range(len(idx_to_class))]
+
+
+class EvalSet:
+    """평가 이미지: 경로 조회 + 정답 레이블(매핑 밖 K-CODE는 -1) + 조건 값 배열
+
+    워커 프로세스에서는 spec으로 다시 생성 (경로 문자열 수백만 개를 pickle로 넘기지 않음)
+    """
+
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        kcodes = load_class_mapping(spec['class_mapping'])
+        if spec['kind'] == 'manifest':
+            import pandas as pd
+            frame = pd.read_parquet(spec['path'])
+            if spec.get('split'):
+                frame = frame[frame['split'] == spec['split']]
+            self._paths = frame['path'].to_numpy()
+            self.kcode_numbers = frame['kcode'].astype(str).str[2:].astype(np.int64).to_numpy()
+            fields = {name: frame[name].to_numpy() for name in ('session', 'bg', 'led', 'side', 'rot')}
+            self._catalog = None
+        else:
+            catalog = CaptureCatalog.load(spec['path'])
+            records = catalog.records
+            if spec.get('session') == 'real':
+                records = records[records['session'] != STUDIO_SESSION]
+            elif spec.get('session') == 'studio':
+                records = records[records['session'] == STUDIO_SESSION]
+            self._catalog = CaptureCatalog(records, catalog.dirs)
+            self._paths = None
+            self.kcode_numbers = records['kcode'].astype(np.int64)
+            fields = {name: records[name] for name in ('session', 'bg', 'led', 'side', 'rot')}
+
+        numbers = np.array([int(k[2:]) for k in kcodes], dtype=np.int64)
+        order = np.argsort(numbers)
+        pos = np.clip(np.searchsorted(numbers[order], self.kcode_numbers), 0, len(numbers) - 1)
+        found = numbers[order][pos] == self.kcode_numbers
+        self.labels = np.where(found, order[pos], -1).astype(np.int32)
+        self.kcodes = kcodes
+
+        self.conditions = {
+            'source': np.where(fields['session'] == STUDIO_SESSION, 'studio', 'real'),
+            'bg': fields['bg'].astype(np.int64),
+            'led': fields['led'].astype(np.int64),
+            'side': np.array([SIDE_NAMES[int(s)] for s in (-1, 0, 1)])[fields['side'].astype(np.int64) + 1],
+            'rot': fields['rot'].astype(np.int64),
+        }
+
+    def __len__(self):
+        return len(self.labels)
+
+    def path_of(self, i: int) -> str:
+        if self._catalog is not None:
+            return self._catalog.path_of(i)
+        return self._paths[i]
+
+
+# ============================================================
+# 2. 스트리밍 집계
+# ============================================================
+
+def wilson_interval(correct: int, total: int, z: float = Z_95) -> Tuple[float, float]:
+    """이항 비율의 Wilson 신뢰구간"""
+    if total == 0:
+        return 0.0, 1.0
+    p = correct / total
+    denom = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denom
+    half = z * np.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class StreamingAccuracy:
+    """결과가 도착할 때마다 갱신하는 혼동 행렬 + 클래스/조건별 Top-1·Top-5 집계
+
+    혼동 행렬은 (C, C + 1): 마지막 열은 매핑 밖 K-CODE 예측 (HTTP 응답의 예측 인덱스 -1)
+    """
+
+    def __init__(self, num_classes: int, conditions: Dict[str, np.ndarray]):
+        self.num_classes = num_classes
+        self.confusion = np.zeros((num_classes, num_classes + 1), dtype=np.int64)
+        self.class_top5 = np.zeros(num_classes, dtype=np.int64)
+        # 조건 값 → 코드 (전체 평가 세트 기준으로 한 번만)
+        self.condition_values = {}
+        self.condition_codes = {}
+        self.condition_counts = {}   # (값 수, 2): [평가 수, Top-1 정답 수]
+        for name, values in conditions.items():
+            uniques, codes = np.unique(values, return_inverse=True)
+            self.condition_values[name] = uniques
+            self.condition_codes[name] = codes.astype(np.int32)
+            self.condition_counts[name] = np.zeros((len(uniques), 2), dtype=np.int64)
+        self.errors = 0
+
+    def update(self, rows: np.ndarray, labels: np.ndarray, topk: np.ndarray):
+        """rows: 평가 세트 인덱스, labels: 정답, topk: (n, K) 예측 인덱스 (순위순, 매핑 밖 -1)"""
+        top1 = topk[:, 0]
+        np.add.at(self.confusion, (labels, np.where(top1 < 0, self.num_classes, top1)), 1)
+        in_top5 = (topk == labels[:, None]).any(axis=1)
+        self.class_top5 += np.bincount(labels[in_top5], minlength=self.num_classes)
+        correct = (top1 == labels).astype(np.int64)
+        for name, codes in self.condition_codes.items():
+            counts = self.condition_counts[name]
+            np.add.at(counts[:, 0], codes[rows], 1)
+            np.add.at(counts[:, 1], codes[rows], correct)
+
+    @property
+    def total(self) -> int:
+        return int(self.confusion.sum())
+
+    @property
+    def top1_correct(self) -> int:
+        return int(np.trace(self.confusion[:, :self.num_classes]))
+
+    def top1_interval(self) -> Tuple[float, float]:
+        return wilson_interval(self.top1_correct, self.total)
+
+    def summary(self) -> Dict:
+        total = max(self.total, 1)
+        low, high = self.top1_interval()
+        return {
+            'evaluated': self.total,
+            'errors': self.errors,
+            'top1': self.top1_correct / total,
+            'top1_ci95': [low, high],
+            'top5': int(self.class_top5.sum()) / total,
+        }
+
+    def per_class(self, kcodes: Sequence[str]) -> List[Dict]:
+        support = self.confusion.sum(axis=1)
+        rows = []
+        for idx in np.flatnonzero(support):
+            n = int(support[idx])
+            rows.append({'kcode': kcodes[idx], 'samples': n,
+                         'top1': int(self.confusion[idx, idx]) / n,
+                         'top5': int(self.class_top5[idx]) / n})
+        return sorted(rows, key=lambda r: r['top1'])
+
+    def per_condition(self) -> Dict[str, List[Dict]]:
+        report = {}
+        for name, counts in self.condition_counts.items():
+            report[name] = [
+                {'value': value.item(), 'samples': int(n), 'top1': int(c) / int(n)}
+                for value, (n, c) in zip(self.condition_values[name], counts) if n
+            ]
+        return report
+
+    def confused_pairs(self, kcodes: Sequence[str], limit: int = 20) -> List[Dict]:
+        """가장 많이 혼동된 (정답, 예측) 쌍"""
+        off = self.confusion.copy()
+        np.fill_diagonal(off, 0)
+        kcodes = list(kcodes) + ['other']
+        flat = np.argsort(off, axis=None)[::-1][:limit]
+        pairs = []
+        for true, pred in zip(*np.unravel_index(flat, off.shape)):
+            if off[true, pred] == 0:
+                break
+            pairs.append({'true': kcodes[true], 'predicted': kcodes[pred], 'count': int(off[true, pred])})
+        return pairs
+
+
+# ============================================================
+# 3. 백엔드: 로컬 ONNX 워커
+# ============================================================
+
+_ENGINE = None
+_EVAL_SET = None
+_TTA = None
+
+
+def _init_worker(engine_kwargs: Dict, workers: int, spec: Dict, batch_size: int, tta_policies: Sequence[str],
+                 tta_threshold: float):
+    global _ENGINE, _EVAL_SET, _TTA
+    from inference.narrow_model import NarrowModelInference
+    from inference.serving import session_options
+
+    _ENGINE = NarrowModelInference(**engine_kwargs, providers=['CPUExecutionProvider'],
+                                   sess_options=session_options(workers, shared_weights=False))
+    _ENGINE.warmup([batch_size])   # 첫 정책의 지연에 초기화 비용이 섞이지 않도록
+    _EVAL_SET = EvalSet(spec)
+    _TTA = (tta_policies, tta_threshold)
+
+
+def _predict_rows(rows: np.ndarray) -> Tuple[np.ndarray, Dict]:
+    """워커: 행들의 Top-K 예측 (디코딩 실패 행은 제외), TTA 정책마다 같은 디코딩 결과로 추론
+
+    Returns:
+        (성공한 rows, {정책: ((n, K) 예측 인덱스, 전처리+추론 초, TTA 적용 이미지 수)})
+    """
+    images, ok = [], []
+    for row in rows:
+        try:
+            with open(_EVAL_SET.path_of(row), 'rb') as f:
+                images.append(_ENGINE.decode(f.read()))
+            ok.append(row)
+        except (OSError, ValueError):
+            continue
+    policies, threshold = _TTA
+    results = {}
+    for policy in policies:
+        if not images:
+            results[policy] = (np.zeros((0, TOP_K), dtype=np.int32), 0.0, 0)
+            continue
+        started = time.perf_counter()
+        batch = _ENGINE.preprocessor.process_batch_numpy(images)
+        logits = _ENGINE.session.run([_ENGINE.output_names[0]], {_ENGINE.input_name: batch})[0]
+        logits, applied = _ENGINE.apply_tta(batch, logits, policy, threshold)
+        elapsed = time.perf_counter() - started
+        topk = np.argsort(-logits, axis=1)[:, :TOP_K].astype(np.int32)
+        results[policy] = (topk, elapsed, int(applied.sum()))
+    return np.asarray(ok, dtype=np.int64), results
+
+
+class PolicyTimings:
+    """TTA 정책별 호출 지연 (배치 = --batch-size) + TTA 적용 비율"""
+
+    def __init__(self):
+        self.call_ms = []
+        self.images = 0
+        self.applied = 0
+
+    def add(self, n: int, elapsed: float, applied: int):
+        if n:
+            self.call_ms.append(elapsed * 1000)
+            self.images += n
+            self.applied += applied
+
+    def summary(self) -> Dict:
+        times = np.asarray(self.call_ms) if self.call_ms else np.zeros(1)
+        return {
+            'call_ms': {f'p{p}': round(float(np.percentile(times, p)), 3) for p in (50, 90, 99)},
+            'ms_per_image': round(float(times.sum()) / max(self.images, 1), 3),
+            'tta_rate': self.applied / max(self.images, 1),
+        }
+
+
+def run_local(args, eval_set: EvalSet, order: np.ndarray, stats: Dict[str, StreamingAccuracy],
+              timings: Dict[str, PolicyTimings], monitor) -> str:
+    engine_kwargs = {'model_path': args.model, 'class_mapping_path': args.class_mapping,
+                     'metadata_path': args.metadata}
+    worker_args = (eval_set.spec, args.batch_size, list(stats), args.tta_threshold)
+    chunks = (order[i:i + args.batch_size] for i in range(0, len(order), args.batch_size))
+
+    def consume(rows, result):
+        ok, by_policy = result
+        for policy, (topk, elapsed, applied) in by_policy.items():
+            stats[policy].errors += len(rows) - len(ok)
+            stats[policy].update(ok, eval_set.labels[ok], topk)
+            timings[policy].add(len(ok), elapsed, applied)
+
+    if args.workers <= 1:
+        _init_worker(engine_kwargs, 1, *worker_args)
+        for rows in chunks:
+            consume(rows, _predict_rows(rows))
+            reason = monitor()
+            if reason:
+                return reason
+        return 'completed'
+
+    # 진행 중 작업을 워커 수의 2배로 제한 (조기 종료 시 버리는 작업 최소화)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(engine_kwargs, args.workers, *worker_args)) as executor:
+        pending = {}
+        reason = 'completed'
+        for rows in chunks:
+            pending[executor.submit(_predict_rows, rows)] = rows
+            if len(pending) < 2 * args.workers:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                consume(pending.pop(future), future.result())
+            reason = monitor()
+            if reason:
+                break
+        if reason and reason != 'completed':
+            for future in pending:
+                future.cancel()
+        else:
+            for future in list(pending):
+                consume(pending.pop(future), future.result())
+            reason = monitor() or 'completed'
+    return reason
+
+
+# ============================================================
+# 4. 백엔드: HTTP API
+# ============================================================
+
+async def _run_http(args, eval_set: EvalSet, order: np.ndarray, stats: Dict[str, StreamingAccuracy],
+                    timings: Dict[str, PolicyTimings], monitor) -> str:
+    try:
+        import httpx
+    except ImportError:
+        print("❌ httpx가 필요합니다: pip install httpx")
+        sys.exit(1)
+
+    index_of = {kcode: i for i, kcode in enumerate(eval_set.kcodes)}
+    batch_size = min(args.batch_size, MAX_BATCH_FILES)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    stop = asyncio.Event()
+    reason = 'completed'
+    stats, timings = stats['server'], timings['server']   # TTA는 서버 설정
+
+    async def evaluate(client, rows):
+        nonlocal reason
+        try:
+            files = []
+            for row in rows:
+                with open(eval_set.path_of(row), 'rb') as f:
+                    files.append(('files', (f'{row}.jpg', f.read(), 'image/jpeg')))
+            started = time.perf_counter()
+            response = await client.post(BATCH_PREDICT_PATH, files=files)
+            response.raise_for_status()
+            results = response.json()['results']
+            topk = np.array([[index_of.get(r['kcode'], -1) for r in result['results'][:TOP_K]]
+                             + [-1] * (TOP_K - len(result['results'][:TOP_K])) for result in results],
+                            dtype=np.int32)
+            stats.update(rows, eval_set.labels[rows], topk)
+            timings.add(len(rows), time.perf_counter() - started,
+                        sum(1 for result in results if result.get('tta', {}).get('applied')))
+        except (OSError, httpx.HTTPError, KeyError, ValueError):
+            stats.errors += len(rows)
+        finally:
+            semaphore.release()
+        result = monitor()
+        if result and not stop.is_set():
+            reason = result
+            stop.set()
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=httpx.Timeout(args.timeout)) as client:
+        tasks = set()
+        for start in range(0, len(order), batch_size):
+            await semaphore.acquire()
+            if stop.is_set():
+                semaphore.release()
+                break
+            task = asyncio.create_task(evaluate(client, order[start:start + batch_size]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    return reason
+
+
+def run_http(args, eval_set: EvalSet, order: np.ndarray, stats: Dict[str, StreamingAccuracy],
+             timings: Dict[str, PolicyTimings], monitor) -> str:
+    return asyncio.run(_run_http(args, eval_set, order, stats, timings, monitor))
+
+
+# ============================================================
+# 5. 실행
+# ============================================================
+
+def make_monitor(args, stats: StreamingAccuracy, started: float):
+    """진행 출력 + 조기 종료 판정 (종료 사유 문자열 또는 None)"""
+    last_print = [started]
+
+    def monitor() -> Optional[str]:
+        now = time.perf_counter()
+        n = stats.total
+        low, high = stats.top1_interval()
+        if now - last_print[0] >= args.progress_every:
+            last_print[0] = now
+            print(f"  ... {n:,}장 ({n / (now - started):,.0f} img/s) Top-1 {stats.top1_correct / max(n, 1):.2%} "
+                  f"[{low:.2%}, {high:.2%}]")
+        if args.max_images and n >= args.max_images:
+            return 'max_images'
+        if args.time_budget and now - started >= args.time_budget:
+            return 'time_budget'
+        if args.ci and n >= args.min_images and (high - low) / 2 <= args.ci:
+            return 'confidence_interval'
+        return None
+
+    return monitor
+
+
+def resolve_spec(args) -> Dict:
+    if args.manifest:
+        return {'kind': 'manifest', 'path': args.manifest, 'split': args.split,
+                'class_mapping': args.class_mapping}
+    catalog_path = Path(args.catalog)
+    if args.roots:
+        records, dirs, invalid = build_catalog(args.roots, workers=args.workers)
+        if invalid:
+            print(f"⚠️  파일명 규칙 위반 {len(invalid):,}개 제외")
+        CaptureCatalog(records, dirs).save(catalog_path)
+    elif not catalog_path.exists():
+        print(f"❌ 카탈로그가 없습니다: {catalog_path} (--roots 또는 --manifest 지정)")
+        sys.exit(1)
+    return {'kind': 'catalog', 'path': str(catalog_path), 'session': args.session,
+            'class_mapping': args.class_mapping}
+
+
+def print_report(report: Dict):
+    summary = report['summary']
+    low, high = summary['top1_ci95']
+    print(f"\n📊 평가 결과 ({report['stopped']}, {report['elapsed_s']:.1f}초, {report['throughput']:,.0f} img/s)")
+    print(f"  - 평가: {summary['evaluated']:,} / {report['candidates']:,}장, 오류 {summary['errors']:,}")
+    print(f"  - Top-1: {summary['top1']:.2%} (95% CI {low:.2%} ~ {high:.2%})")
+    print(f"  - Top-5: {summary['top5']:.2%}")
+
+    print("\n🔴 Worst 5 classes:")
+    for item in report['per_class'][:5]:
+        print(f"  {item['kcode']}: {item['top1']:.1%} ({item['samples']} samples)")
+    print("\n🟢 Best 5 classes:")
+    for item in report['per_class'][-5:]:
+        print(f"  {item['kcode']}: {item['top1']:.1%} ({item['samples']} samples)")
+
+    print("\n📋 조건별 Top-1:")
+    for name, rows in report['conditions'].items():
+        cells = ', '.join(f"{row['value']}={row['top1']:.1%}({row['samples']})" for row in rows)
+        print(f"  {name:>6}: {cells}")
+    if report['confused_pairs']:
+        print("\n🔀 자주 혼동된 쌍:")
+        for pair in report['confused_pairs'][:5]:
+            print(f"  {pair['true']} → {pair['predicted']}: {pair['count']}회")
+
+    if len(report['tta']) > 1 or 'none' not in report['tta']:
+        print(f"\n🔄 TTA 정책별 (배치 {report['batch_size']}, 조기 종료 확신도 {report['tta_threshold']}, "
+              f"조건별 rot Top-1은 JSON):")
+        print(f"  {'정책':<10} {'Top-1':>8} {'Top-5':>8} {'p50 ms':>9} {'p99 ms':>9} {'ms/장':>8} {'TTA 적용':>9}")
+        for policy, row in report['tta'].items():
+            print(f"  {policy:<10} {row['top1']:>8.2%} {row['top5']:>8.2%} {row['call_ms']['p50']:>9.2f} "
+                  f"{row['call_ms']['p99']:>9.2f} {row['ms_per_image']:>8.2f} {row['tta_rate']:>9.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='실사진/스튜디오 정확도 스트리밍 평가')
+    source = parser.add_argument_group('평가 세트')
+    source.add_argument('--roots', nargs='+', help='스캔할 촬영 폴더 (카탈로그를 새로 만듦)')
+    source.add_argument('--catalog', default=str(DEFAULT_INDEX_PATH), help='capture_catalog .npz')
+    source.add_argument('--session', choices=('real', 'studio', 'all'), default='real', help='카탈로그 세션 필터')
+    source.add_argument('--manifest', help='build_manifest.py의 manifest.parquet')
+    source.add_argument('--split', default='test', help='manifest split (빈 문자열이면 전체)')
+    parser.add_argument('--backend', choices=('local', 'http'), default='local')
+    parser.add_argument('--model', default='models/pillsnap_narrow_model.onnx')
+    parser.add_argument('--class-mapping', default='models/class_mapping.json')
+    parser.add_argument('--metadata', default='models/model_metadata.json')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='local: 추론 프로세스 수')
+    parser.add_argument('--batch-size', type=int, default=32, help='local: 추론 배치, http: 요청당 이미지 (최대 10)')
+    parser.add_argument('--url', default='http://localhost:8000', help='http: 추론 API')
+    parser.add_argument('--concurrency', type=int, default=16, help='http: 동시 요청 (연결 풀 크기)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--tta-policies', default='none',
+                        help=f"local: 비교할 TTA 정책 (쉼표 구분, {', '.join(TTA_POLICIES)}) - 첫 정책 기준으로 집계/조기 종료")
+    parser.add_argument('--tta-threshold', type=float, default=DEFAULT_TTA_THRESHOLD,
+                        help='원본 Top-1 확신도가 이 값 이상이면 TTA 생략')
+    stopping = parser.add_argument_group('조기 종료')
+    stopping.add_argument('--ci', type=float, help='Top-1 95%% 신뢰구간 반폭 목표 (예: 0.005 = ±0.5%%p)')
+    stopping.add_argument('--min-images', type=int, default=1000, help='--ci 판정 전 최소 평가 수')
+    stopping.add_argument('--max-images', type=int)
+    stopping.add_argument('--time-budget', type=float, help='초')
+    parser.add_argument('--seed', type=int, default=0, help='평가 순서 시드')
+    parser.add_argument('--progress-every', type=float, default=10.0, help='진행 출력 간격 (초)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='결과 JSON (혼동 행렬은 같은 이름 .npy)')
+    args = parser.parse_args()
+
+    policies = [p.strip() for p in args.tta_policies.split(',') if p.strip()]
+    unknown = [p for p in policies if p not in TTA_POLICIES]
+    if unknown:
+        parser.error(f"알 수 없는 TTA 정책: {', '.join(unknown)}")
+    if args.backend == 'http':
+        policies = ['server']   # TTA는 추론서버 설정 (NARROW_TTA_POLICY)
+
+    spec = resolve_spec(args)
+    eval_set = EvalSet(spec)
+    candidates = np.flatnonzero(eval_set.labels >= 0)
+    skipped = len(eval_set) - len(candidates)
+    order = np.random.default_rng(args.seed).permutation(candidates)
+    print(f"🧪 평가 세트: {len(candidates):,}장 ({spec['kind']}: {spec['path']}"
+          f"{', 매핑 밖 K-CODE ' + format(skipped, ',') + '장 제외' if skipped else ''})")
+    print(f"  - 백엔드: {args.backend} "
+          f"({args.model + f', workers={args.workers}' if args.backend == 'local' else args.url}), "
+          f"배치 {args.batch_size}")
+
+    conditions = {name: eval_set.conditions[name] for name in CONDITIONS}
+    by_policy = {policy: StreamingAccuracy(len(eval_set.kcodes), conditions) for policy in policies}
+    timings = {policy: PolicyTimings() for policy in policies}
+    stats = by_policy[policies[0]]
+
+    started = time.perf_counter()
+    monitor = make_monitor(args, stats, started)
+    runner = run_local if args.backend == 'local' else run_http
+    stopped = runner(args, eval_set, order, by_policy, timings, monitor)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'backend': args.backend,
+        'model': args.model if args.backend == 'local' else args.url,
+        'source': spec,
+        'candidates': len(candidates),
+        'stopped': stopped,
+        'elapsed_s': round(elapsed, 2),
+        'throughput': stats.total / max(elapsed, 1e-9),
+        'summary': stats.summary(),
+        'per_class': stats.per_class(eval_set.kcodes),
+        'conditions': stats.per_condition(),
+        'confused_pairs': stats.confused_pairs(eval_set.kcodes),
+        'batch_size': args.batch_size,
+        'tta_threshold': args.tta_threshold,
+        'tta': {policy: {**by_policy[policy].summary(), **timings[policy].summary(),
+                         'rot': by_policy[policy].per_condition()['rot']}
+                for policy in policies},
+    }
+    print_report(report)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    np.save(output.with_suffix('.npy'), stats.confusion)
+    print(f"\n✅ 결과: {output} (혼동 행렬 {output.with_suffix('.npy')})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,64 @@
 #!/usr/bin/env python
 """
 100개 선정 약품을 Supabase에 로드하는 스크립트
+
+Usage:
+    python load_drugs_to_supabase.py                              # 전체 로드 SQL
+    python load_drugs_to_supabase.py --changeset ../artifacts/selection_changeset.json
+    python load_drugs_to_supabase.py --previous old_top_100_metadata_final.json
+    python load_drugs_to_supabase.py --profile                    # 단계별 소요 시간 리포트 (artifacts/profiles/)
 """
 
+import argparse
 import json
+import sys
 from pathlib import Path
 
 # 경로 설정 (실행 위치 상관없이 동작)
 BASE = Path(__file__).resolve().parent
 json_path = BASE.parent / 'artifacts' / 'top_100_metadata_final.json'
 output_path = BASE / 'supabase_load_drugs.sql'
+update_output_path = BASE / 'supabase_update_drugs.sql'
 checklist_path = BASE / 'capture_checklist.csv'
 
+sys.path.insert(0, str(BASE / 'data_prep'))
+
+from instrumentation import Profiler, add_profile_arguments, span  # noqa: E402
+
 def sql_str(s):
     """SQL 문자열 처리 - NULL 또는 escape된 문자열 반환"""
     if s is None or s == '':
         return 'NULL'
     return "'" + str(s).replace("'", "''") + "'"
 
+def drug_values_sql(drug, default_shootable='Y'):
+    """drugs_master INSERT용 VALUES 튜플 문자열"""
+    # 안전한 값 추출
+    kcode = drug.get('kcode', '')
+    edi_code = drug.get('edi_code')  # None 가능
+    drug_name = drug.get('drug_name') or ''  # None 방지
+    manufacturer = drug.get('manufacturer') or ''  # None 방지
+    usage_count = drug.get('usage_count')  # int 또는 None
+    shootable = drug.get('shootable') or default_shootable
+
+    # NULL/문자열 안전 처리
+    kcode_sql = sql_str(kcode)
+    edi_sql = sql_str(edi_code)
+    name_sql = sql_str(drug_name)
+    manu_sql = sql_str(manufacturer)
+    usage_sql = 'NULL' if usage_count in (None, '') else str(int(usage_count))
+    shootable_sql = sql_str(shootable)
+
+    return f"  ({kcode_sql}, {edi_sql}, {name_sql}, {manu_sql}, {usage_sql}, {shootable_sql})"
+
 def generate_supabase_load_script():
     """top_100_metadata_final.json을 읽어서 Supabase 로드용 SQL 생성"""
 
     # JSON 파일 읽기
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with span('read_json') as s:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        s.add(rows=len(data['drugs']), bytes=json_path.stat().st_size)
 
     print(f"📊 총 {data['total_drugs']}개 약품 로드 준비")
     print(f"📈 통계:")
@@ -40,26 +75,9 @@ def generate_supabase_load_script():
     print("INSERT INTO drugs_master (kcode, edi_code, drug_name, manufacturer, usage_count, shootable)")
     print("VALUES")
 
-    values = []
-    for drug in data['drugs']:
-        # 안전한 값 추출
-        kcode = drug.get('kcode', '')
-        edi_code = drug.get('edi_code')  # None 가능
-        drug_name = drug.get('drug_name') or ''  # None 방지
-        manufacturer = drug.get('manufacturer') or ''  # None 방지
-        usage_count = drug.get('usage_count')  # int 또는 None
-        shootable = drug.get('shootable') or 'Y'
-
-        # NULL/문자열 안전 처리
-        kcode_sql = sql_str(kcode)
-        edi_sql = sql_str(edi_code)
-        name_sql = sql_str(drug_name)
-        manu_sql = sql_str(manufacturer)
-        usage_sql = 'NULL' if usage_count in (None, '') else str(int(usage_count))
-        shootable_sql = sql_str(shootable)
-
-        value = f"  ({kcode_sql}, {edi_sql}, {name_sql}, {manu_sql}, {usage_sql}, {shootable_sql})"
-        values.append(value)
+    with span('sql.values') as s:
+        values = [drug_values_sql(drug) for drug in data['drugs']]
+        s.add(rows=len(values), bytes=sum(len(v) for v in values))
 
     # 처음 5개만 출력 (안전하게)
     print(",\n".join(values[:min(5, len(values))]))
@@ -77,16 +95,18 @@ def generate_supabase_load_script():
     print("="*80)
 
     # JSON 배열 생성 (None 값 처리)
-    drugs_json = []
-    for drug in data['drugs']:
-        drugs_json.append({
-            'kcode': drug.get('kcode', ''),
-            'edi_code': drug.get('edi_code', ''),
-            'drug_name': drug.get('drug_name', ''),
-            'manufacturer': drug.get('manufacturer', ''),
-            'usage_count': drug.get('usage_count', 0),
-            'shootable': drug.get('shootable', 'Y')
-        })
+    with span('sql.json_payload') as s:
+        drugs_json = []
+        for drug in data['drugs']:
+            drugs_json.append({
+                'kcode': drug.get('kcode', ''),
+                'edi_code': drug.get('edi_code', ''),
+                'drug_name': drug.get('drug_name', ''),
+                'manufacturer': drug.get('manufacturer', ''),
+                'usage_count': drug.get('usage_count', 0),
+                'shootable': drug.get('shootable', 'Y')
+            })
+        s.add(rows=len(drugs_json))
 
     print("\n-- Supabase SQL Editor에서 실행:")
     print("SELECT load_selected_drugs('")
@@ -96,7 +116,7 @@ def generate_supabase_load_script():
     print("'::jsonb);")
 
     # 3. 전체 SQL 파일 생성
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with span('write_sql') as s, open(output_path, 'w', encoding='utf-8') as f:
         f.write("-- 100개 선정 약품 Supabase 로드 스크립트\n")
         f.write(f"-- 생성일: 2025-10-23\n")
         f.write(f"-- 총 약품 수: {data['total_drugs']}개\n\n")
@@ -119,16 +139,19 @@ def generate_supabase_load_script():
         f.write(json.dumps(drugs_json, ensure_ascii=False))
         f.write("'::jsonb);\n")
         f.write("*/\n")
+        s.add(rows=len(values), bytes=f.tell())
 
     print(f"\n✅ SQL 파일 생성 완료: {output_path}")
 
     # 4. 촬영 진행 체크리스트 생성
-    with open(checklist_path, 'w', encoding='utf-8-sig') as f:
+    with span('write_checklist') as s, open(checklist_path, 'w', encoding='utf-8-sig') as f:
         f.write("K-CODE,약품명,촬영난이도,Front,Back,완료\n")
         for drug in data['drugs'][:min(20, len(data['drugs']))]:  # 상위 20개만 (안전하게)
             drug_name = (drug.get('drug_name', '') or '').replace(',', '/')  # CSV 안전
             shootable = drug.get('shootable', 'Y') or 'Y'
             f.write(f"{drug.get('kcode', '')},{drug_name},{shootable},[],[],[]\n")
+            s.add(rows=1)
+        s.add(bytes=f.tell())
 
     print(f"📋 촬영 체크리스트 생성: {checklist_path}")
 
@@ -169,5 +192,122 @@ def generate_supabase_load_script():
     print(f"  - EDI 코드 있음: {edi_count}개")
     print(f"  - EDI 코드 없음: {len(drugs_json) - edi_count}개")
 
+def build_changeset_sql(changeset):
+    """changeset을 upsert/비활성화/사용량 UPDATE SQL 배치로 변환
+
+    - 진입: upsert 후 is_active = true (shootable이 없으면 기존 값 유지)
+    - 이탈: 삭제하지 않고 is_active = false (촬영 사진 FK 보존)
+    - 사용량 변경: VALUES 조인으로 한 번에 UPDATE
+    """
+    entering = changeset.get('entering', [])
+    leaving = changeset.get('leaving', [])
+    usage_changed = changeset.get('usage_changed', [])
+
+    lines = [
+        "-- 약품 변경분 반영 스크립트",
+        f"-- 진입: {len(entering)}개, 이탈: {len(leaving)}개, 사용량 변경: {len(usage_changed)}개",
+        "",
+        "BEGIN;",
+    ]
+
+    if entering:
+        lines += [
+            "",
+            "-- 1. 신규 진입 약품 upsert (재진입 시 활성화)",
+            "INSERT INTO drugs_master (kcode, edi_code, drug_name, manufacturer, usage_count, shootable)",
+            "VALUES",
+            ",\n".join(drug_values_sql(drug, default_shootable=None) for drug in entering),
+            "ON CONFLICT (kcode) DO UPDATE SET",
+            "  edi_code = EXCLUDED.edi_code,",
+            "  drug_name = EXCLUDED.drug_name,",
+            "  manufacturer = EXCLUDED.manufacturer,",
+            "  usage_count = EXCLUDED.usage_count,",
+            "  shootable = COALESCE(EXCLUDED.shootable, drugs_master.shootable),",
+            "  is_active = true;",
+        ]
+
+    if leaving:
+        kcodes = ", ".join(sql_str(drug['kcode']) for drug in leaving)
+        lines += [
+            "",
+            "-- 2. 이탈 약품 비활성화",
+            f"UPDATE drugs_master SET is_active = false WHERE is_active AND kcode IN ({kcodes});",
+        ]
+
+    if usage_changed:
+        rows = ",\n".join(
+            f"  ({sql_str(item['kcode'])}, "
+            f"{'NULL' if item.get('usage_count') in (None, '') else int(item['usage_count'])})"
+            for item in usage_changed
+        )
+        lines += [
+            "",
+            "-- 3. 사용량 변경",
+            "UPDATE drugs_master AS d",
+            "SET usage_count = v.usage_count",
+            "FROM (VALUES",
+            rows,
+            ") AS v(kcode, usage_count)",
+            "WHERE d.kcode = v.kcode AND d.usage_count IS DISTINCT FROM v.usage_count;",
+        ]
+
+    lines += ["", "COMMIT;", ""]
+    return "\n".join(lines)
+
+
+def generate_changeset_script(changeset_file=None, previous_file=None):
+    """changeset JSON 또는 이전 메타데이터와의 diff로 변경분 SQL 생성"""
+    if changeset_file:
+        with span('read_json', source='changeset') as s:
+            with open(changeset_file, 'r', encoding='utf-8') as f:
+                changeset = json.load(f)
+            s.add(bytes=Path(changeset_file).stat().st_size)
+        print(f"📊 changeset 로드: {changeset_file}")
+    else:
+        from incremental_selection import diff_drug_lists
+
+        with span('read_json', source='previous') as s:
+            with open(previous_file, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            with open(json_path, 'r', encoding='utf-8') as f:
+                current = json.load(f)
+            s.add(rows=len(previous['drugs']) + len(current['drugs']),
+                  bytes=Path(previous_file).stat().st_size + json_path.stat().st_size)
+        with span('diff') as s:
+            changeset = diff_drug_lists(previous['drugs'], current['drugs'])
+            s.add(rows=len(current['drugs']))
+        print(f"📊 메타데이터 비교: {previous_file} → {json_path}")
+
+    total = len(changeset.get('entering', [])) + len(changeset.get('leaving', [])) + len(changeset.get('usage_changed', []))
+    print(f"  진입: {len(changeset.get('entering', []))}개")
+    print(f"  이탈: {len(changeset.get('leaving', []))}개")
+    print(f"  사용량 변경: {len(changeset.get('usage_changed', []))}개")
+
+    if total == 0:
+        print("\n✅ 변경 사항 없음 - SQL 생성 생략")
+        return
+
+    with span('sql.changeset') as s:
+        sql = build_changeset_sql(changeset)
+        s.add(rows=total, bytes=len(sql.encode('utf-8')))
+    with span('write_sql') as s, open(update_output_path, 'w', encoding='utf-8') as f:
+        f.write(sql)
+        s.add(rows=total, bytes=f.tell())
+
+    print(f"\n✅ 변경분 SQL 파일 생성 완료: {update_output_path}")
+    print("   Supabase SQL Editor에서 실행")
+
+
 if __name__ == "__main__":
-    generate_supabase_load_script()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='선정 약품 Supabase 로드 SQL 생성')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--changeset', help='prepare_drug_selection.py --incremental이 만든 changeset JSON')
+    group.add_argument('--previous', help='이전 top_100_metadata_final.json (현재 파일과 비교)')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with Profiler.from_args('load_drugs_to_supabase', args):
+        if args.changeset or args.previous:
+            generate_changeset_script(args.changeset, args.previous)
+        else:
+            generate_supabase_load_script()
\ No newline at end of file
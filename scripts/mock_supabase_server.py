@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+로컬 Supabase Storage/PostgREST mock 서버
+업로더/인덱서 테스트와 벤치마크를 실제 프로젝트 없이 실행하기 위한 최소 구현
+
+지원 엔드포인트:
+- POST/PUT /storage/v1/object/{bucket}/{path}   (multipart 업로드, x-upsert)
+- GET      /storage/v1/object/{bucket}/{path}   (다운로드)
+- POST     /storage/v1/object/list/{bucket}     (prefix 목록, limit/offset)
+- POST     /rest/v1/{table}                     (단일/다중 행 insert)
+- GET      /rest/v1/{table}?col=eq.value        (eq/in/like 필터 select, limit/offset)
+- PATCH    /rest/v1/{table}?col=eq.value        (필터에 맞는 행 update)
+- GET      /__stats                             (요청 수 통계)
+
+Usage:
+    python mock_supabase_server.py --port 54321 --fail-rate 0.05 --latency-ms 20
+    업로더: --supabase-url http://127.0.0.1:54321 --supabase-key mock
+"""
+
+import argparse
+import email.parser
+import fnmatch
+import email.policy
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class MockStore:
+    """Storage 객체와 테이블 행을 메모리에 보관"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}  # (bucket, path) → {'data', 'content_type', 'id', 'created_at'}
+        self.tables = {}   # table → [row, ...]
+        self.stats = {'requests': 0, 'uploads': 0, 'inserts': 0, 'rows_inserted': 0,
+                      'updates': 0, 'rows_updated': 0, 'lists': 0, 'injected_failures': 0}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+
+def _parse_multipart(content_type, body):
+    """multipart/form-data 본문에서 'file' 파트의 (bytes, content_type) 추출"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+    )
+    for part in message.iter_parts():
+        if part.get_param('name', header='content-disposition') == 'file':
+            return part.get_payload(decode=True), part.get_content_type()
+    return body, content_type
+
+
+def _filter_rows(rows, query):
+    """PostgREST 필터(eq/in/like) 적용 - 원본 행 객체 그대로 반환"""
+    rows = list(rows)
+    for column, values in query.items():
+        op, _, value = values[0].partition('.')
+        if op == 'eq':
+            rows = [row for row in rows if str(row.get(column)) == value]
+        elif op == 'in':
+            allowed = {v.strip('"') for v in value.strip('()').split(',')}
+            rows = [row for row in rows if str(row.get(column)) in allowed]
+        elif op == 'like':
+            pattern = value.replace('%', '*')
+            rows = [row for row in rows if fnmatch.fnmatchcase(str(row.get(column)), pattern)]
+    return rows
+
+
+def make_handler(store, fail_rate=0.0, latency_ms=0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        # -- 공통 -------------------------------------------------------------
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def _send(self, status, payload=None, raw=None, content_type='application/json'):
+            data = raw if raw is not None else (b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode())
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _before(self):
+            store.count('requests')
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if fail_rate and random.random() < fail_rate and not self.path.startswith('/__'):
+                store.count('injected_failures')
+                self._body()
+                self._send(503, {'statusCode': '503', 'error': 'Service Unavailable', 'message': 'injected failure'})
+                return False
+            return True
+
+        def _route(self):
+            parsed = urlparse(self.path)
+            return [unquote(p) for p in parsed.path.strip('/').split('/')], parse_qs(parsed.query)
+
+        # -- HTTP 메서드 ------------------------------------------------------
+        def do_GET(self):
+            if not self._before():
+                return
+            parts, query = self._route()
+            if parts == ['__stats']:
+                with store.lock:
+                    self._send(200, {**store.stats, 'objects': len(store.objects),
+                                     'rows': {t: len(r) for t, r in store.tables.items()}})
+            elif parts[:3] == ['storage', 'v1', 'object'] and len(parts) > 4:
+                self._download(parts[3], '/'.join(parts[4:]))
+            elif parts[:2] == ['rest', 'v1'] and len(parts) == 3:
+                self._select(parts[2], query)
+            else:
+                self._send(404, {'message': 'not found'})
+
+        def do_POST(self):
+            if not self._before():
+                return
+            parts, _ = self._route()
+            if parts[:4] == ['storage', 'v1', 'object', 'list'] and len(parts) == 5:
+                self._list(parts[4])
+            elif parts[:3] == ['storage', 'v1', 'object'] and len(parts) > 4:
+                upsert = (self.headers.get('x-upsert') or '').lower() == 'true'
+                self._upload(parts[3], '/'.join(parts[4:]), upsert)
+            elif parts[:2] == ['rest', 'v1'] and len(parts) == 3:
+                self._insert(parts[2])
+            else:
+                self._body()
+                self._send(404, {'message': 'not found'})
+
+        def do_PUT(self):
+            if not self._before():
+                return
+            parts, _ = self._route()
+            if parts[:3] == ['storage', 'v1', 'object'] and len(parts) > 4:
+                self._upload(parts[3], '/'.join(parts[4:]), upsert=True)
+            else:
+                self._body()
+                self._send(404, {'message': 'not found'})
+
+        def do_PATCH(self):
+            if not self._before():
+                return
+            parts, query = self._route()
+            if parts[:2] == ['rest', 'v1'] and len(parts) == 3:
+                self._update(parts[2], query)
+            else:
+                self._body()
+                self._send(404, {'message': 'not found'})
+
+        # -- Storage ---------------------------------------------------------
+        def _upload(self, bucket, path, upsert):
+            data, content_type = _parse_multipart(self.headers.get('Content-Type', ''), self._body())
+            key = (bucket, path)
+            with store.lock:
+                if key in store.objects and not upsert:
+                    duplicate = True
+                else:
+                    duplicate = False
+                    store.objects[key] = {
+                        'data': data,
+                        'content_type': content_type,
+                        'id': str(uuid.uuid4()),
+                        'created_at': datetime.now().isoformat(),
+                    }
+            if duplicate:
+                self._send(400, {'statusCode': '409', 'error': 'Duplicate', 'message': 'The resource already exists'})
+                return
+            store.count('uploads')
+            self._send(200, {'Key': f'{bucket}/{path}', 'Id': store.objects[key]['id']})
+
+        def _download(self, bucket, path):
+            obj = store.objects.get((bucket, path))
+            if obj is None:
+                self._send(404, {'statusCode': '404', 'error': 'not_found', 'message': 'Object not found'})
+                return
+            self._send(200, raw=obj['data'], content_type=obj['content_type'])
+
+        def _list(self, bucket):
+            store.count('lists')
+            options = json.loads(self._body() or b'{}')
+            prefix = (options.get('prefix') or '').strip('/')
+            limit = int(options.get('limit', 100))
+            offset = int(options.get('offset', 0))
+
+            entries = {}
+            with store.lock:
+                for (b, path), obj in store.objects.items():
+                    if b != bucket:
+                        continue
+                    if prefix and not path.startswith(prefix + '/'):
+                        continue
+                    rest = path[len(prefix) + 1:] if prefix else path
+                    name, sep, _ = rest.partition('/')
+                    if sep:
+                        entries.setdefault(name, {'name': name, 'id': None, 'metadata': None})
+                    else:
+                        entries[name] = {
+                            'name': name,
+                            'id': obj['id'],
+                            'created_at': obj['created_at'],
+                            'metadata': {'size': len(obj['data']), 'mimetype': obj['content_type']},
+                        }
+            items = [entries[name] for name in sorted(entries)]
+            self._send(200, items[offset:offset + limit])
+
+        # -- PostgREST -------------------------------------------------------
+        def _insert(self, table):
+            payload = json.loads(self._body() or b'[]')
+            rows = payload if isinstance(payload, list) else [payload]
+            created = []
+            with store.lock:
+                target = store.tables.setdefault(table, [])
+                for row in rows:
+                    row = {'id': str(uuid.uuid4()), 'created_at': datetime.now().isoformat(), **row}
+                    target.append(row)
+                    created.append(row)
+            store.count('inserts')
+            store.count('rows_inserted', len(created))
+
+            if 'return=representation' in (self.headers.get('Prefer') or ''):
+                self._send(201, created)
+            else:
+                self._send(201)
+
+        def _select(self, table, query):
+            limit = int(query.pop('limit', ['0'])[0]) or None
+            offset = int(query.pop('offset', ['0'])[0])
+            query.pop('select', None)
+            query.pop('order', None)
+
+            with store.lock:
+                rows = _filter_rows(store.tables.get(table, []), query)
+            rows = rows[offset:offset + limit if limit else None]
+            self._send(200, rows)
+
+        def _update(self, table, query):
+            changes = json.loads(self._body() or b'{}')
+            query.pop('select', None)
+            if not query:
+                self._send(400, {'message': 'UPDATE requires a WHERE clause'})
+                return
+            with store.lock:
+                rows = _filter_rows(store.tables.get(table, []), query)
+                for row in rows:
+                    row.update(changes)
+                updated = [dict(row) for row in rows]
+            store.count('updates')
+            store.count('rows_updated', len(updated))
+
+            if 'return=representation' in (self.headers.get('Prefer') or ''):
+                self._send(200, updated)
+            else:
+                self._send(204, raw=b'')
+
+    return Handler
+
+
+def start_mock_server(host='127.0.0.1', port=0, fail_rate=0.0, latency_ms=0):
+    """백그라운드 스레드에서 mock 서버 시작
+
+    Returns:
+        (server, base_url, store)  - 종료 시 server.shutdown()
+    """
+    store = MockStore()
+    server = ThreadingHTTPServer((host, port), make_handler(store, fail_rate, latency_ms))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}', store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='로컬 Supabase Storage/PostgREST mock 서버')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='503 응답을 주입할 요청 비율 (재시도 테스트용)')
+    parser.add_argument('--latency-ms', type=int, default=0, help='요청당 인위적 지연 (ms)')
+    args = parser.parse_args()
+
+    server, url, _ = start_mock_server(args.host, args.port, args.fail_rate, args.latency_ms)
+    print(f"🧪 Mock Supabase 서버 실행 중: {url}")
+    print(f"   fail_rate={args.fail_rate}, latency={args.latency_ms}ms")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n👋 종료")
+
+
+if __name__ == "__main__":
+    main()
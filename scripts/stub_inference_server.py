@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+로컬 추론서버 stub (Narrow 모델 엔드포인트)
+부하 테스트(benchmark_inference.py)를 GPU/모델 파일/FastAPI 없이 실행하기 위한 최소 구현
+
+- 엔드포인트는 planning/phase5_deployment.md의 라우터와 같은 경로/응답 형식
+- 요청은 실제 서버와 같이 MicroBatcher로 묶여 처리 (큐잉/배치 동작이 지연에 그대로 반영)
+- 모델: 비용 모델(호출당 고정 비용 + 샘플당 비용만큼 sleep, 이미지 해시로 결정적인 Top-5)
+    --model을 주면 NarrowModelInference로 실제 ONNX 추론
+
+지원 엔드포인트:
+- POST /v1/narrow/predict         (multipart 'file')
+- POST /v1/narrow/batch_predict   (multipart 'files', 최대 10개)
+- GET  /v1/narrow/metrics         (배처 지표)
+- GET  /health
+
+Created: 2025-10-28
+Purpose: 추론 API 부하 테스트를 오프라인으로 재현
+Usage:
+    python stub_inference_server.py --port 8080 --overhead-ms 8 --per-item-ms 1.5
+    python stub_inference_server.py --port 8080 --model models/pillsnap_narrow_model_quantized.onnx
+"""
+
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import json
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from inference.micro_batcher import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, MicroBatcher  # noqa: E402
+
+MAX_BATCH_FILES = 10
+MAX_FILE_SIZE = 10 * 1024 * 1024
+NUM_CLASSES = 100
+
+
+def _parse_files(content_type, body, field):
+    """multipart/form-data 본문에서 field 이름의 파트 bytes 목록"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+    )
+    if not message.is_multipart():
+        return []
+    return [part.get_payload(decode=True) for part in message.iter_parts()
+            if part.get_param('name', header='content-disposition') == field]
+
+
+def stub_model(overhead_ms, per_item_ms):
+    """session.run 비용 모델 + 결정적 Top-5 (NarrowModelInference._format과 같은 형식)"""
+
+    def run_batch(images):
+        time.sleep((overhead_ms + per_item_ms * len(images)) / 1000)
+        results = []
+        for image in images:
+            seed = zlib.crc32(image)
+            top = [(seed + i * 37) % NUM_CLASSES for i in range(5)]
+            ranked = [{'rank': rank + 1, 'kcode': f'K-{idx:06d}', 'drug_name': f'stub-{idx}',
+                       'confidence': round(0.5 / (rank + 1), 4), 'manufacturer': ''}
+                      for rank, idx in enumerate(top)]
+            results.append({'success': True, 'model_version': 'stub', 'num_classes': NUM_CLASSES,
+                            'results': ranked, 'top1': ranked[0], 'processing_time_ms': 0})
+        return results
+
+    return run_batch
+
+
+def onnx_model(args):
+    from inference.narrow_model import NarrowModelInference
+
+    engine = NarrowModelInference(args.model, args.class_mapping, args.metadata)
+    engine.warmup(range(1, args.max_batch_size + 1))
+    return lambda images: engine.predict_batch(images, return_exceptions=True)
+
+
+class BatcherThread:
+    """HTTP 핸들러 스레드 → 별도 이벤트 루프의 MicroBatcher"""
+
+    def __init__(self, run_batch, max_batch_size, max_wait_ms):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='batcher-loop', daemon=True)
+        self.thread.start()
+        self.batcher = MicroBatcher(run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self._call(self.batcher.start())
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def predict(self, images):
+        """이미지들을 배처에 넣고 결과를 기다림 (실패한 이미지는 예외 객체)"""
+        futures = [self._call(self.batcher.submit(image)) for image in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def metrics(self):
+        return self._call(self._metrics()).result()
+
+    async def _metrics(self):
+        return self.batcher.metrics()
+
+    def stop(self):
+        self._call(self.batcher.stop()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def make_handler(backend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # keep-alive
+
+        def log_message(self, format, *args):
+            pass
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def _send(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, {'status': 'ok'})
+            elif self.path == '/v1/narrow/metrics':
+                self._send(200, backend.metrics())
+            else:
+                self._send(404, {'detail': 'Not Found'})
+
+        def do_POST(self):
+            started = time.perf_counter()
+            body = self._body()
+            content_type = self.headers.get('Content-Type', '')
+            if self.path == '/v1/narrow/predict':
+                files = _parse_files(content_type, body, 'file')[:1]
+            elif self.path == '/v1/narrow/batch_predict':
+                files = _parse_files(content_type, body, 'files')
+                if len(files) > MAX_BATCH_FILES:
+                    return self._send(400, {'detail': f'Maximum {MAX_BATCH_FILES} images per batch'})
+            else:
+                return self._send(404, {'detail': 'Not Found'})
+
+            if not files:
+                return self._send(422, {'detail': 'file required'})
+            if any(len(data) > MAX_FILE_SIZE for data in files):
+                return self._send(400, {'detail': 'File size exceeds 10MB'})
+
+            results = backend.predict(files)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                status = 400 if isinstance(errors[0], ValueError) else 500
+                return self._send(status, {'detail': f'Prediction failed: {errors[0]}'})
+
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            if self.path == '/v1/narrow/predict':
+                self._send(200, {**results[0], 'processing_time_ms': elapsed_ms})
+            else:
+                self._send(200, {'success': True, 'batch_size': len(results), 'results': results})
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256   # 부하 테스트 시작 시 동시 연결
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Narrow 모델 추론서버 stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--overhead-ms', type=float, default=8.0, help='stub: 배치당 고정 비용')
+    parser.add_argument('--per-item-ms', type=float, default=1.5, help='stub: 이미지당 비용')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--model', help='실제 ONNX 모델 (없으면 stub 비용 모델)')
+    parser.add_argument('--class-mapping', default='models/class_mapping.json')
+    parser.add_argument('--metadata', default='models/model_metadata.json')
+    args = parser.parse_args()
+
+    if args.model:
+        run_batch = onnx_model(args)
+        source = args.model
+    else:
+        run_batch = stub_model(args.overhead_ms, args.per_item_ms)
+        source = f'stub ({args.overhead_ms}ms + {args.per_item_ms}ms/이미지)'
+
+    backend = BatcherThread(run_batch, args.max_batch_size, args.max_wait_ms)
+    server = StubServer((args.host, args.port), make_handler(backend))
+    print(f"🚀 Stub inference server: http://{args.host}:{args.port} - {source}, "
+          f"배치 최대 {args.max_batch_size} / {args.max_wait_ms}ms")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        backend.stop()
+
+
+if __name__ == "__main__":
+    main()
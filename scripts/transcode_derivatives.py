@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+"""
+촬영 원본 파생 이미지(derivative) 생성기
+Galaxy S21 원본(4000×3000 JPEG, 수 MB)에서 모델 해상도 JPEG과 미리보기 WebP 썸네일을
+여러 코어에서 병렬 생성하고, Storage의 평행 prefix(derived/{variant}/...)에 올린 뒤
+capture_real_photos 행에 원본/파생 크기를 기록
+
+    CS_1_single/K-030864/K-030864_0_3_front_0_90_000_200.jpg            (원본)
+    derived/model/CS_1_single/K-030864/K-030864_0_3_front_0_90_000_200.jpg   (중앙 크롭 200×200)
+    derived/thumb/CS_1_single/K-030864/K-030864_0_3_front_0_90_000_200.webp  (긴 변 256)
+
+로컬 미러의 derived/.meta/{원본 경로}.json(sidecar)에 변환 결과와 업로드 완료 여부를 기록하여
+재실행 시 최신 파생 파일은 다시 변환하지 않고, --upload면 아직 올리지 않은 것만 업로드
+
+Created: 2025-10-28
+Purpose: 학습 다운로드/앱 미리보기가 원본 대신 파생 이미지를 받도록 변환 단계 추가 + 기존 세션 일괄 백필
+Usage:
+    # 로컬 촬영 트리 → 파생 이미지 (artifacts/derived 미러) 생성 + 처리량 리포트
+    python transcode_derivatives.py /data/captures/CS_1_single --workers 8
+
+    # 생성 후 Storage 업로드 + capture_real_photos.derivatives 갱신
+    python transcode_derivatives.py /data/captures --upload
+
+    # 기존 세션 백필: Storage 원본을 내려받아 변환/업로드 (로컬 원본 없음)
+    python transcode_derivatives.py CS_1_single CS_2_single --from-storage --upload --report backfill.json
+
+    # draft(JPEG DCT 축소 디코드) 효과 비교
+    python transcode_derivatives.py /data/captures/CS_1_single --no-draft --dry-run
+
+    # 로컬 mock 서버로 테스트
+    python mock_supabase_server.py --port 54321 &
+    python transcode_derivatives.py /tmp/captures --upload --supabase-url http://127.0.0.1:54321 --supabase-key mock
+
+Note:
+    Pillow API만 사용하므로 Pillow-SIMD(`pip install pillow-simd`)로 교체하면 리사이즈/색변환이
+    코드 변경 없이 SIMD 경로로 실행됨. DB 컬럼은 add_photo_derivatives.sql로 추가.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'data_prep'))
+
+from test_storage_upload import BUCKET, PHOTOS_TABLE, SUPABASE_ANON_KEY, SUPABASE_URL, create_client  # noqa: E402
+from upload_capture_photos import KCODE_PATTERN, SESSION_PATTERN, UploadStats, iter_capture_files, with_retry  # noqa: E402
+from upload_manifest import list_storage_objects  # noqa: E402
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DERIVED_PREFIX = 'derived'
+SIDECAR_DIR = '.meta'          # 로컬 미러 전용 (업로드하지 않음)
+SIDECAR_KEYS = ('storage_path', 'original_bytes', 'width', 'height', 'variants')
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / 'artifacts' / 'derived'
+DEFAULT_WORKERS = os.cpu_count() or 4
+DEFAULT_IO_WORKERS = 8
+DEFAULT_RETRIES = 4
+
+# 파일명 SIZE 필드(200)와 같은 모델 해상도 - 학습 preprocessing.target_size와 맞춰서 사용
+DEFAULT_MODEL_SIZE = 200
+DEFAULT_THUMB_SIZE = 256
+
+# draft는 목표 크기의 DRAFT_MARGIN배 이상으로만 축소 디코드 (이후 LANCZOS로 최종 축소해 계단 현상 방지)
+DRAFT_MARGIN = 2
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+# ============================================================
+# 1. 파생 이미지 규격
+# ============================================================
+
+def make_variants(model_size=DEFAULT_MODEL_SIZE, thumb_size=DEFAULT_THUMB_SIZE,
+                  model_quality=95, thumb_quality=80):
+    """variant 이름 → 변환 규격
+
+    - model: 중앙 정사각형 크롭 후 size×size (UnifiedPreprocessor와 같은 기하 변환)
+    - thumb: 비율 유지, 긴 변 size (앱 목록/미리보기)
+    """
+    return {
+        'model': {'fit': 'crop', 'size': model_size, 'format': 'JPEG', 'ext': 'jpg',
+                  'save': {'quality': model_quality, 'subsampling': 0, 'optimize': True}},
+        'thumb': {'fit': 'contain', 'size': thumb_size, 'format': 'WEBP', 'ext': 'webp',
+                  'save': {'quality': thumb_quality, 'method': 4}},
+    }
+
+
+def derived_path(storage_path, variant, spec):
+    """원본 Storage 경로 → 평행 prefix의 파생 경로 (확장자는 variant 포맷)"""
+    stem = os.path.splitext(storage_path)[0]
+    return f"{DERIVED_PREFIX}/{variant}/{stem}.{spec['ext']}"
+
+
+def sidecar_path(output_dir, storage_path):
+    """원본 Storage 경로 → 로컬 미러의 sidecar 파일 (변환 결과 + 업로드 완료 여부)"""
+    return os.path.join(output_dir, DERIVED_PREFIX, SIDECAR_DIR, os.path.splitext(storage_path)[0] + '.json')
+
+
+def write_sidecar(output_dir, result, published=False):
+    """변환 결과를 sidecar에 기록 (변환 워커 프로세스 / 업로드 스레드에서 호출, 원자적 교체)"""
+    file = sidecar_path(output_dir, result['storage_path'])
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({**{key: result[key] for key in SIDECAR_KEYS}, 'published': published}, f, ensure_ascii=False)
+    os.replace(tmp, file)
+
+
+def read_sidecar(output_dir, storage_path):
+    """sidecar 내용 (없거나 깨졌으면 None)"""
+    try:
+        with open(sidecar_path(output_dir, storage_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _draft_size(width, height, variants):
+    """모든 variant를 DRAFT_MARGIN배 여유로 만들 수 있는 최소 디코드 크기"""
+    scale = 0.0
+    for spec in variants.values():
+        side = min(width, height) if spec['fit'] == 'crop' else max(width, height)
+        scale = max(scale, DRAFT_MARGIN * spec['size'] / side)
+    scale = min(scale, 1.0)
+    return max(1, int(width * scale + 0.5)), max(1, int(height * scale + 0.5))
+
+
+def _resize(image, spec):
+    size = spec['size']
+    if spec['fit'] == 'crop':
+        w, h = image.size
+        side = min(w, h)
+        left, top = (w - side) // 2, (h - side) // 2
+        return image.resize((size, size), Image.LANCZOS, box=(left, top, left + side, top + side), reducing_gap=3.0)
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+# ============================================================
+# 2. 변환 워커 (프로세스 풀)
+# ============================================================
+
+def transcode(storage_path, source, variants, output_dir, draft=True):
+    """원본 1장 → 모든 variant 생성 후 output_dir 미러에 저장 + sidecar 기록 (워커 프로세스)
+
+    Args:
+        source: 로컬 경로 또는 다운로드한 bytes
+
+    Returns:
+        {'storage_path', 'original_bytes', 'width', 'height', 'decode_s', 'encode_s',
+         'variants': {name: {path, file, bytes, width, height, format}}}
+    """
+    started = time.perf_counter()
+    if isinstance(source, (bytes, bytearray)):
+        original_bytes = len(source)
+        image = Image.open(io.BytesIO(source))
+    else:
+        original_bytes = os.path.getsize(source)
+        image = Image.open(source)
+
+    width, height = image.size
+    orientation = image.getexif().get(0x0112, 1)
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    if draft and image.format == 'JPEG':
+        image.draft('RGB', _draft_size(image.size[0], image.size[1], variants))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    decoded = time.perf_counter()
+
+    results = {}
+    for name, spec in variants.items():
+        path = derived_path(storage_path, name, spec)
+        out = _resize(image, spec)
+        buffer = io.BytesIO()
+        out.save(buffer, spec['format'], **spec['save'])
+        data = buffer.getvalue()
+
+        file = os.path.join(output_dir, path)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, file)
+        results[name] = {'path': path, 'file': file, 'bytes': len(data),
+                         'width': out.size[0], 'height': out.size[1], 'format': spec['format'].lower()}
+
+    result = {
+        'storage_path': storage_path,
+        'original_bytes': original_bytes,
+        'width': width,
+        'height': height,
+        'decode_s': decoded - started,
+        'encode_s': time.perf_counter() - decoded,
+        'variants': results,
+    }
+    write_sidecar(output_dir, result)   # 새로 변환했으므로 업로드 전 상태
+    return result
+
+
+def _transcode_task(args):
+    storage_path, source = args[:2]
+    if isinstance(source, dict):
+        # 미러의 파생 파일이 최신이고 업로드만 남은 항목: 변환 없이 sidecar 결과 그대로
+        return source
+    return transcode(*args)
+
+
+# ============================================================
+# 3. 스트리밍 파이프라인
+# ============================================================
+
+def bounded_map(executor, func, items, limit):
+    """in-flight 작업 수를 limit로 제한한 executor.map (완료 순서로 yield)
+
+    입력 iterator는 빈자리가 생길 때만 당겨 쓰므로 단계를 generator로 이어도
+    다운로드 → 변환 → 업로드 사이에 쌓이는 원본 bytes는 limit개 이하.
+
+    Yields:
+        (item, result, error)
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < limit:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[executor.submit(func, item)] = item
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            error = future.exception()
+            yield item, (None if error else future.result()), error
+
+
+class DerivativePipeline:
+    """원본 수집 → (다운로드) → 변환 → (업로드 + 행 갱신)
+
+    - 변환은 ProcessPoolExecutor(workers): PIL 디코드/리사이즈/인코딩은 코어 단위로 확장
+    - 다운로드/업로드는 스레드 풀(io_workers): 스레드마다 Supabase 클라이언트 1개
+    - 로컬 미러에 원본보다 새로운 파생 파일 + sidecar가 있으면 변환 생략 (재실행 시 이어서 진행)
+        업로드 모드에서는 sidecar에 업로드 완료로 기록된 것만 건너뛰고, 나머지는 변환 없이 업로드
+    """
+
+    def __init__(self, variants, output_dir=DEFAULT_OUTPUT_DIR, workers=DEFAULT_WORKERS,
+                 io_workers=DEFAULT_IO_WORKERS, draft=True, url=None, key=None,
+                 upload=False, retries=DEFAULT_RETRIES, force=False):
+        self.variants = variants
+        self.output_dir = str(output_dir)
+        self.workers = workers
+        self.io_workers = io_workers
+        self.draft = draft
+        self.url = url
+        self.key = key
+        self.upload = upload
+        self.retries = retries
+        self.force = force
+        self.stats = UploadStats()
+        self.report = ThroughputReport(variants)
+        self._local = threading.local()
+
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = create_client(self.url, self.key)
+        return self._local.client
+
+    # -- 원본 수집 -----------------------------------------------------------
+    def cached_result(self, storage_path, mtime):
+        """모든 variant 파일이 로컬 미러에 있고 원본보다 새로우면 sidecar의 변환 결과, 아니면 None"""
+        if self.force:
+            return None
+        for name, spec in self.variants.items():
+            file = os.path.join(self.output_dir, derived_path(storage_path, name, spec))
+            try:
+                if os.stat(file).st_mtime < mtime:
+                    return None
+            except FileNotFoundError:
+                return None
+        result = read_sidecar(self.output_dir, storage_path)
+        if result is None or set(result['variants']) != set(self.variants):
+            return None
+        return {**result, 'cached': True}
+
+    def is_done(self, cached):
+        """더 할 일이 없는 항목 (변환 최신 + 업로드 모드면 업로드까지 완료)"""
+        return cached is not None and (not self.upload or cached['published'])
+
+    def local_sources(self, roots):
+        """로컬 촬영 트리 → (storage_path, local_path | 업로드만 남은 변환 결과)"""
+        for root in roots:
+            for local_path, storage_path, _, _, mtime in iter_capture_files(root):
+                cached = self.cached_result(storage_path, mtime)
+                if self.is_done(cached):
+                    self.stats.add('unchanged')
+                    continue
+                yield storage_path, cached or local_path
+
+    def storage_sources(self, prefixes):
+        """Storage 원본 목록 → (storage_path, bytes | 업로드만 남은 변환 결과) (스레드 풀에서 다운로드)"""
+        paths = []
+        for prefix in prefixes:
+            objects = list_storage_objects(self.client(), BUCKET, prefix)
+            paths.extend(sorted(p for p in objects if self._is_capture_path(p)))
+        print(f"☁️  Storage 원본: {len(paths):,}장")
+
+        def download(storage_path):
+            return with_retry(lambda: self.client().storage.from_(BUCKET).download(storage_path),
+                              self.retries, self.stats)
+
+        # Storage 경로만으로는 원본 갱신 시각을 알 수 없으므로 미러에 있으면 최신으로 간주 (다운로드 생략)
+        missing = []
+        for storage_path in paths:
+            cached = self.cached_result(storage_path, 0)
+            if cached is None:
+                missing.append(storage_path)
+            elif self.is_done(cached):
+                self.stats.add('unchanged')
+            else:
+                yield storage_path, cached
+        paths = missing
+        with ThreadPoolExecutor(max_workers=self.io_workers) as executor:
+            for storage_path, data, error in bounded_map(executor, download, paths, self.io_workers * 2):
+                if error is not None:
+                    self.stats.fail(storage_path, error)
+                    continue
+                self.report.add_download(len(data))
+                yield storage_path, data
+
+    @staticmethod
+    def _is_capture_path(path):
+        parts = path.split('/')
+        return (len(parts) == 3 and SESSION_PATTERN.match(parts[0]) and KCODE_PATTERN.match(parts[1])
+                and parts[2].lower().endswith(SOURCE_EXTENSIONS))
+
+    # -- 업로드 --------------------------------------------------------------
+    def publish(self, result):
+        """파생 파일 업로드 후 capture_real_photos 행에 크기 기록 (워커 스레드)
+
+        행까지 갱신되면 sidecar에 업로드 완료 기록 (실패/행 없음이면 다음 실행에서 다시 업로드)
+        """
+        bucket = self.client().storage.from_(BUCKET)
+        derivatives = {}
+        for name, info in result['variants'].items():
+            with open(info['file'], 'rb') as f:
+                data = f.read()
+            with_retry(lambda: bucket.upload(info['path'], data, {
+                'content-type': CONTENT_TYPES[info['format'].upper()],
+                'cache-control': '86400',
+                'upsert': 'true',
+            }), self.retries, self.stats)
+            derivatives[name] = {k: info[k] for k in ('path', 'bytes', 'width', 'height', 'format')}
+
+        response = with_retry(
+            lambda: self.client().table(PHOTOS_TABLE).update({
+                'original_bytes': result['original_bytes'],
+                'original_width': result['width'],
+                'original_height': result['height'],
+                'derivatives': derivatives,
+            }).eq('photo_url', result['storage_path']).execute(),
+            self.retries, self.stats
+        )
+        matched = len(response.data or [])
+        if matched:
+            write_sidecar(self.output_dir, result, published=True)
+        return matched
+
+    # -- 실행 ----------------------------------------------------------------
+    def run(self, sources, progress_every=500):
+        """sources: (storage_path, local_path | bytes | 업로드만 남은 변환 결과 dict) iterator"""
+        self.report.start()
+        tasks = ((path, source, self.variants, self.output_dir, self.draft) for path, source in sources)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as processes, \
+                ThreadPoolExecutor(max_workers=self.io_workers) as threads:
+            transcoded = self._transcoded(bounded_map(processes, _transcode_task, tasks, self.workers * 2))
+            if self.upload:
+                for result, matched, error in bounded_map(threads, self.publish, transcoded, self.io_workers * 2):
+                    if error is not None:
+                        self.stats.fail(result['storage_path'], error)
+                        continue
+                    self.stats.add('uploaded')
+                    self.stats.add('rows', matched)
+                    if not matched:
+                        self.stats.add('skipped')   # DB 행 없음 (업로더 미실행 세션)
+                    self._progress(self.stats.counts['uploaded'], progress_every)
+            else:
+                for _ in transcoded:
+                    self._progress(self.report.images, progress_every)
+
+        self.report.stop()
+        return self.stats
+
+    def _transcoded(self, results):
+        for task, result, error in results:
+            if error is not None:
+                self.stats.fail(task[0], error)
+                continue
+            if not result.get('cached'):
+                self.report.add(result)
+            yield result
+
+    def _progress(self, done, every):
+        if done % every == 0:
+            rate = done / max(self.stats.elapsed, 1e-9)
+            print(f"   ... {done:,}장 처리 (변환 {self.report.images:,}장, {rate:.1f} img/s, "
+                  f"실패 {self.stats.counts['failed']})")
+
+
+# ============================================================
+# 4. 처리량 리포트
+# ============================================================
+
+class ThroughputReport:
+    """변환 처리량 / variant별 크기 / 압축률 집계 (메인 스레드에서만 갱신)"""
+
+    def __init__(self, variants):
+        self.variants = variants
+        self.images = 0
+        self.original_bytes = 0
+        self.download_bytes = 0
+        self.downloads = 0
+        self.decode_s = 0.0
+        self.encode_s = 0.0
+        self.variant_bytes = {name: 0 for name in variants}
+        self.started = self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def add(self, result):
+        self.images += 1
+        self.original_bytes += result['original_bytes']
+        self.decode_s += result['decode_s']
+        self.encode_s += result['encode_s']
+        for name, info in result['variants'].items():
+            self.variant_bytes[name] += info['bytes']
+
+    def add_download(self, size):
+        self.downloads += 1
+        self.download_bytes += size
+
+    def summary(self, stats=None, workers=None, draft=None):
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        n = max(self.images, 1)
+        mb = 1024 * 1024
+        summary = {
+            'images': self.images,
+            'wall_s': round(wall, 3),
+            'images_per_s': round(self.images / max(wall, 1e-9), 2),
+            'input_mb_per_s': round(self.original_bytes / mb / max(wall, 1e-9), 2),
+            'workers': workers,
+            'draft': draft,
+            # 워커 CPU 시간 합 기준 장당 비용 (wall × workers와 비교하면 병렬 효율)
+            'cpu_ms_per_image': {'decode': round(1000 * self.decode_s / n, 2),
+                                 'encode': round(1000 * self.encode_s / n, 2)},
+            'original': {'total_mb': round(self.original_bytes / mb, 2),
+                         'avg_kb': round(self.original_bytes / n / 1024, 1)},
+            'variants': {},
+        }
+        for name, total in self.variant_bytes.items():
+            spec = self.variants[name]
+            summary['variants'][name] = {
+                'format': spec['format'].lower(),
+                'size': spec['size'],
+                'total_mb': round(total / mb, 3),
+                'avg_kb': round(total / n / 1024, 2),
+                'ratio': round(self.original_bytes / total, 1) if total else None,
+            }
+        if self.downloads:
+            summary['download'] = {'files': self.downloads, 'total_mb': round(self.download_bytes / mb, 2)}
+        if stats is not None:
+            summary['counts'] = dict(stats.counts)
+            summary['failures'] = stats.failures[:20]
+        return summary
+
+
+def print_report(summary):
+    print("\n" + "=" * 60)
+    print("📊 파생 이미지 변환 결과")
+    print("=" * 60)
+    print(f"   변환: {summary['images']:,}장 / {summary['wall_s']:.1f}s "
+          f"→ {summary['images_per_s']:.1f} img/s ({summary['input_mb_per_s']:.1f} MB/s 입력)")
+    print(f"   워커: {summary['workers']}개, draft={'on' if summary['draft'] else 'off'}, "
+          f"장당 CPU decode {summary['cpu_ms_per_image']['decode']:.1f}ms / "
+          f"resize+encode {summary['cpu_ms_per_image']['encode']:.1f}ms")
+    print(f"   원본: {summary['original']['total_mb']:,.1f} MB (평균 {summary['original']['avg_kb']:,.0f} KB)")
+    for name, info in summary['variants'].items():
+        ratio = f"1/{info['ratio']:.0f}" if info['ratio'] else '-'
+        print(f"   {name:>6}: {info['format']} {info['size']}px, {info['total_mb']:,.2f} MB "
+              f"(평균 {info['avg_kb']:.1f} KB, 원본 대비 {ratio})")
+    if 'download' in summary:
+        print(f"   다운로드: {summary['download']['files']:,}개 / {summary['download']['total_mb']:,.1f} MB")
+    counts = summary.get('counts')
+    if counts:
+        print(f"   업로드: {counts['uploaded']:,}장, 행 갱신 {counts['rows']:,}, 행 없음 {counts['skipped']:,}, "
+              f"최신 생략 {counts['unchanged']:,}, 재시도 {counts['retries']:,}, 실패 {counts['failed']:,}")
+        for path, error in summary.get('failures', [])[:5]:
+            print(f"   ❌ {path}: {error}")
+
+
+# ============================================================
+# 5. CLI
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='촬영 원본 → 모델 해상도/썸네일 파생 이미지 생성 및 백필')
+    parser.add_argument('sources', nargs='+',
+                        help='로컬 촬영 폴더 (CS_N_single 또는 상위) / --from-storage면 Storage prefix')
+    parser.add_argument('--from-storage', action='store_true', help='Storage 원본을 내려받아 변환 (기존 세션 백필)')
+    parser.add_argument('--output', default=str(DEFAULT_OUTPUT_DIR), help='파생 이미지 로컬 미러 폴더')
+    parser.add_argument('--upload', action='store_true', help='파생 이미지 업로드 + capture_real_photos 갱신')
+    parser.add_argument('--dry-run', action='store_true', help='변환만 수행 (업로드 없음, 처리량 측정)')
+    parser.add_argument('--force', action='store_true', help='로컬 미러에 최신 파생 파일이 있어도 다시 변환')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='변환 프로세스 수')
+    parser.add_argument('--io-workers', type=int, default=DEFAULT_IO_WORKERS, help='다운로드/업로드 스레드 수')
+    parser.add_argument('--model-size', type=int, default=DEFAULT_MODEL_SIZE,
+                        help='모델 입력 해상도 (학습 preprocessing.target_size와 일치)')
+    parser.add_argument('--thumb-size', type=int, default=DEFAULT_THUMB_SIZE, help='썸네일 긴 변')
+    parser.add_argument('--model-quality', type=int, default=95)
+    parser.add_argument('--thumb-quality', type=int, default=80)
+    parser.add_argument('--no-draft', action='store_true', help='JPEG 축소 디코드 비활성화 (전체 해상도 디코드)')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--report', help='처리량 리포트 JSON 저장 경로')
+    parser.add_argument('--supabase-url', default=SUPABASE_URL)
+    parser.add_argument('--supabase-key', default=SUPABASE_ANON_KEY)
+    args = parser.parse_args()
+
+    if args.dry_run and args.upload:
+        parser.error('--dry-run과 --upload는 함께 쓸 수 없음')
+
+    variants = make_variants(args.model_size, args.thumb_size, args.model_quality, args.thumb_quality)
+    pipeline = DerivativePipeline(
+        variants, output_dir=args.output, workers=args.workers, io_workers=args.io_workers,
+        draft=not args.no_draft, url=args.supabase_url, key=args.supabase_key,
+        upload=args.upload, retries=args.retries, force=args.force,
+    )
+
+    print("🖼️  파생 이미지 변환")
+    for name, spec in variants.items():
+        print(f"   {name:>6}: {spec['format']} {spec['size']}px ({spec['fit']}) → {DERIVED_PREFIX}/{name}/...")
+    print(f"   출력: {args.output}, 워커 {args.workers}개, 업로드={'on' if args.upload else 'off'}")
+
+    if args.from_storage:
+        sources = pipeline.storage_sources(args.sources)
+    else:
+        sources = pipeline.local_sources(args.sources)
+    stats = pipeline.run(sources)
+
+    summary = pipeline.report.summary(stats, workers=args.workers, draft=not args.no_draft)
+    print_report(summary)
+    if args.report:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"💾 리포트 저장: {args.report}")
+
+    sys.exit(1 if stats.counts['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+촬영 세션 사진 일괄 업로더
+CS_{N}_single/K-XXXXXX/*.jpg 트리를 Supabase Storage(pill-photos)에 동시 업로드하고
+capture_real_photos 메타데이터를 다중 행 insert로 묶어 저장
+업로드 결과는 manifest(upload_manifest.py)에 기록되어 재실행 시 완료 파일은 건너뜀
+
+Created: 2025-10-28
+Purpose: 약품 100개 × 240장(24,000장) 세션 업로드를 순차 처리(수 시간) 대신 병렬로 처리
+Usage:
+    python upload_capture_photos.py /data/captures/CS_1_single --workers 16
+    python upload_capture_photos.py /data/captures --batch-size 200 --retries 5
+    python upload_capture_photos.py /data/captures/CS_1_single --reconcile   # Storage 목록과 대조 후 업로드
+    python upload_capture_photos.py /data/captures/CS_1_single --score       # 실측 품질 점수 기록
+
+    # 로컬 mock 서버로 테스트
+    python mock_supabase_server.py --port 54321 --fail-rate 0.05 &
+    python upload_capture_photos.py /tmp/captures --supabase-url http://127.0.0.1:54321 --supabase-key mock
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'data_prep'))
+
+from capture_catalog import metadata_fields  # noqa: E402
+from capture_quality import METADATA_KEYS as QUALITY_COLUMNS, score_files  # noqa: E402
+from test_storage_upload import (  # noqa: E402
+    BUCKET,
+    PHOTOS_TABLE,
+    SUPABASE_ANON_KEY,
+    SUPABASE_URL,
+    build_metadata,
+    create_client,
+    upload_file,
+)
+from upload_manifest import DEFAULT_MANIFEST_PATH, UploadManifest, file_sha256, print_reconcile_report, reconcile  # noqa: E402
+
+SESSION_PATTERN = re.compile(r'^CS_\d+_single$')
+KCODE_PATTERN = re.compile(r'^K-\d{6}$')
+
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 0.5   # 초
+BACKOFF_MAX = 15.0   # 초
+
+
+# ============================================================
+# 1. 업로드 대상 수집
+# ============================================================
+
+def find_sessions(root):
+    """root가 세션 폴더(CS_1_single)면 그대로, 상위 폴더면 하위 세션 폴더 목록"""
+    root = Path(root)
+    if SESSION_PATTERN.match(root.name):
+        return [root]
+    return sorted(
+        Path(entry.path) for entry in os.scandir(root)
+        if entry.is_dir() and SESSION_PATTERN.match(entry.name)
+    )
+
+
+def iter_capture_files(root):
+    """CS_{N}_single/K-XXXXXX/*.jpg 순회
+
+    Yields:
+        (local_path, storage_path, kcode, size, mtime)
+    """
+    for session in find_sessions(root):
+        for drug_dir in sorted(os.scandir(session), key=lambda e: e.name):
+            if not (drug_dir.is_dir() and KCODE_PATTERN.match(drug_dir.name)):
+                continue
+            for entry in sorted(os.scandir(drug_dir.path), key=lambda e: e.name):
+                if entry.is_file() and entry.name.endswith('.jpg'):
+                    storage_path = f"{session.name}/{drug_dir.name}/{entry.name}"
+                    stat = entry.stat()
+                    yield entry.path, storage_path, drug_dir.name, stat.st_size, stat.st_mtime
+
+
+def capture_metadata(kcode, storage_path):
+    """파일명 규칙에서 촬영 조건(면/배경/LED/회전각)을 채운 메타데이터 행
+
+    Raises:
+        ValueError: 파일명 규칙 위반
+    """
+    fields = metadata_fields(os.path.basename(storage_path))
+    if fields is None:
+        raise ValueError(f"파일명 규칙 위반: {os.path.basename(storage_path)}")
+    return build_metadata(kcode, storage_path, **fields)
+
+
+def scored_metadata_fn(files, manifest=None, upsert=False, workers=None):
+    """업로드 대상 파일의 품질 점수를 프로세스 풀로 미리 계산하고 메타데이터에 합치는 함수 반환
+
+    manifest에서 완료된 파일은 메타데이터가 필요 없으므로 점수 계산에서 제외.
+    """
+    targets = [
+        (local_path, storage_path) for local_path, storage_path, _, size, mtime in files
+        if upsert or manifest is None or not manifest.is_complete(storage_path, size, mtime)
+    ]
+    print(f"🔍 품질 점수 계산: {len(targets):,}장")
+    started = time.perf_counter()
+    scores = score_files([local_path for local_path, _ in targets], workers=workers)
+    elapsed = time.perf_counter() - started
+    print(f"  - {elapsed:.2f}s ({len(targets) / max(elapsed, 1e-9):,.0f} images/sec)")
+
+    quality = {
+        storage_path: {key: scores[local_path][key] for key in QUALITY_COLUMNS}
+        for local_path, storage_path in targets
+    }
+    grades = [q['quality_grade'] for q in quality.values()]
+    failed = [local_path for local_path, _ in targets if scores[local_path]['error']]
+    print(f"  - 등급: A {grades.count('A'):,} / B {grades.count('B'):,} / C {grades.count('C'):,}")
+    if failed:
+        # 디코딩 실패 파일은 C등급(점수 0)으로 기록하고 업로드는 계속
+        print(f"  ⚠️  디코딩 실패 {len(failed):,}장 (C등급 처리, 예: {failed[0]})")
+    print()
+
+    def metadata_fn(kcode, storage_path):
+        return {**capture_metadata(kcode, storage_path), **quality[storage_path]}
+
+    return metadata_fn
+
+
+# ============================================================
+# 2. 재시도
+# ============================================================
+
+def _error_status(error):
+    """storage3/postgrest/httpx 예외에서 HTTP 상태 코드 추출 (없으면 None)
+
+    postgrest의 code는 SQLSTATE(예: '23505')일 수도 있으므로 HTTP 범위(100~599)만 인정
+    """
+    response = getattr(error, 'response', None)
+    candidates = [getattr(error, attr, None) for attr in ('status', 'code')]
+    candidates.append(getattr(response, 'status_code', None))
+    for value in candidates:
+        if value is not None and str(value).isdigit() and 100 <= int(value) <= 599:
+            return int(value)
+    return None
+
+
+def is_duplicate(error):
+    """이미 존재하는 객체 업로드 (upsert=false) 여부"""
+    text = str(error)
+    return _error_status(error) == 409 or 'Duplicate' in text or 'already exists' in text
+
+
+def is_transient(error):
+    """재시도 대상 오류 여부 (허용 목록: httpx 전송 오류/타임아웃, 408/429/5xx)
+
+    상태 코드를 알 수 없는 그 외 예외(버그, 인증/설정 오류 등)는 재시도하지 않는다.
+    """
+    if isinstance(error, (httpx.TransportError, httpx.TimeoutException)):
+        return True
+    status = _error_status(error)
+    if status is None:
+        return False
+    return status in (408, 429) or status >= 500
+
+
+def with_retry(func, retries, stats, before_retry=None):
+    """지수 백오프 + jitter 재시도
+
+    중복 오류와 영구 오류(4xx)는 즉시 전달.
+
+    Args:
+        before_retry: 재시도 직전 호출 (응답이 유실된 요청이 서버에 반영됐는지 확인하는 용도)
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if is_duplicate(e) or not is_transient(e) or attempt == retries:
+                raise
+            stats.add('retries')
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            if before_retry is not None:
+                before_retry()
+
+
+# ============================================================
+# 3. 업로더
+# ============================================================
+
+class UploadStats:
+    """스레드 안전 카운터"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {
+            'uploaded': 0, 'exists': 0, 'skipped': 0, 'unchanged': 0, 'failed': 0,
+            'bytes': 0, 'rows': 0, 'retries': 0,
+        }
+        self.failures = []
+        self.started = time.perf_counter()
+
+    def add(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def fail(self, storage_path, error):
+        with self.lock:
+            self.counts['failed'] += 1
+            self.failures.append((storage_path, str(error)))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class CaptureUploader:
+    """스레드 풀 기반 병렬 업로더
+
+    - 스레드마다 Supabase 클라이언트 1개 (httpx 연결 재사용)
+    - 동시에 진행 중인 업로드는 workers × 2개로 제한 (대용량 트리에서도 메모리 일정)
+    - 업로드 성공한 파일의 메타데이터는 batch_size 단위 다중 행 insert
+    - manifest가 있으면 완료 파일은 제출 전에 건너뛰고, 결과는 메인 스레드에서 기록
+    """
+
+    def __init__(self, url, key, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                 retries=DEFAULT_RETRIES, upsert=False, metadata_fn=capture_metadata, manifest=None):
+        self.url = url
+        self.key = key
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.upsert = upsert
+        self.metadata_fn = metadata_fn
+        self.manifest = manifest
+        self.stats = UploadStats()
+        self._local = threading.local()
+        self._pending_rows = []
+
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = create_client(self.url, self.key)
+        return self._local.client
+
+    def find_row_id(self, storage_path):
+        """이미 저장된 메타데이터 행 ID 조회 (중단 지점 복구용, 없으면 None)"""
+        response = with_retry(
+            lambda: self.client().table(PHOTOS_TABLE).select('id').eq('photo_url', storage_path).limit(1).execute(),
+            self.retries, self.stats
+        )
+        return response.data[0]['id'] if response.data else None
+
+    def find_row_ids(self, storage_paths):
+        """photo_url 목록 중 이미 저장된 행의 {photo_url: id}"""
+        response = with_retry(
+            lambda: self.client().table(PHOTOS_TABLE).select('id,photo_url').in_('photo_url', storage_paths).execute(),
+            self.retries, self.stats
+        )
+        return {row['photo_url']: row['id'] for row in response.data}
+
+    def insert_rows(self, batch):
+        """메타데이터 행 insert (재시도해도 중복 행이 생기지 않음)
+
+        타임아웃 등으로 응답만 유실된 insert는 서버에 이미 반영됐을 수 있으므로
+        재시도 전에 photo_url로 저장된 행을 조회해 대상에서 제외한다.
+
+        Returns:
+            {photo_url: 행 ID}
+        """
+        row_ids = {}
+        pending = list(batch)
+
+        def insert():
+            if not pending:
+                return
+            response = self.client().table(PHOTOS_TABLE).insert(pending).execute()
+            row_ids.update({row['photo_url']: row['id'] for row in response.data})
+
+        def skip_stored():
+            stored = self.find_row_ids([row['photo_url'] for row in pending])
+            row_ids.update(stored)
+            pending[:] = [row for row in pending if row['photo_url'] not in stored]
+
+        with_retry(insert, self.retries, self.stats, before_retry=skip_stored)
+        return row_ids
+
+    def upload_one(self, local_path, storage_path, kcode, size, mtime, entry=None):
+        """파일 1개 처리 (워커 스레드)
+
+        Args:
+            entry: manifest 항목 (없으면 None)
+
+        Returns:
+            manifest 기록용 dict ('metadata'가 있으면 insert 대기열에 추가)
+        """
+        metadata = self.metadata_fn(kcode, storage_path)
+        sha256 = file_sha256(local_path) if self.manifest is not None else None
+        result = {'storage_path': storage_path, 'size': size, 'mtime': mtime,
+                  'sha256': sha256, 'row_id': None, 'metadata': None}
+
+        if entry is not None and entry['sha256'] == sha256 and not self.upsert:
+            # 내용 동일 (mtime만 변경, 또는 DB 행 기록 전 중단)
+            self.stats.add('unchanged')
+            if entry['row_id'] is None:
+                result['row_id'] = self.find_row_id(storage_path)
+                if result['row_id'] is None:
+                    result['metadata'] = metadata
+            return result
+
+        # manifest에 있는데 내용이 바뀐 파일은 덮어쓰기
+        upsert = self.upsert or entry is not None
+        try:
+            with_retry(
+                lambda: upload_file(self.client(), local_path, storage_path, upsert=upsert),
+                self.retries, self.stats
+            )
+        except Exception as e:
+            if not is_duplicate(e):
+                raise
+            self.stats.add('exists')
+            if self.manifest is None:
+                return None
+            # manifest 기록 전에 중단된 업로드: 메타데이터 행이 없을 때만 insert
+            result['row_id'] = self.find_row_id(storage_path)
+            if result['row_id'] is None:
+                result['metadata'] = metadata
+            return result
+
+        self.stats.add('uploaded')
+        self.stats.add('bytes', size)
+        if entry is None or entry['row_id'] is None:
+            result['metadata'] = metadata
+        return result
+
+    def flush_metadata(self, force=False):
+        """대기 중인 메타데이터 행을 batch_size 단위로 insert (행 ID는 manifest에 기록)"""
+        while self._pending_rows and (force or len(self._pending_rows) >= self.batch_size):
+            batch = self._pending_rows[:self.batch_size]
+            try:
+                row_ids = self.insert_rows(batch)
+                self.stats.add('rows', len(batch))
+                if self.manifest is not None:
+                    self.manifest.set_row_ids(row_ids)
+            except Exception as e:
+                for row in batch:
+                    self.stats.fail(row['photo_url'], f"메타데이터 insert 실패: {e}")
+            del self._pending_rows[:len(batch)]
+
+    def run(self, files, progress_every=500):
+        """업로드 실행 (files: iter_capture_files() 결과)"""
+        max_in_flight = self.workers * 2
+        in_flight = {}
+        done_count = 0
+
+        def collect(done):
+            nonlocal done_count
+            records = []
+            for future in done:
+                storage_path = in_flight.pop(future)
+                done_count += 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.stats.fail(storage_path, e)
+                    continue
+                if result is not None:
+                    records.append(result)
+                    if result['metadata'] is not None:
+                        self._pending_rows.append(result['metadata'])
+                if done_count % progress_every == 0:
+                    self.print_progress(done_count)
+            if self.manifest is not None:
+                self.manifest.record(records)
+            self.flush_metadata()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for local_path, storage_path, kcode, size, mtime in files:
+                entry = None
+                if self.manifest is not None:
+                    if not self.upsert and self.manifest.is_complete(storage_path, size, mtime):
+                        self.stats.add('skipped')
+                        continue
+                    entry = self.manifest.get(storage_path)
+
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = executor.submit(self.upload_one, local_path, storage_path, kcode, size, mtime, entry)
+                in_flight[future] = storage_path
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        self.flush_metadata(force=True)
+        return self.stats
+
+    def print_progress(self, done_count):
+        counts = self.stats.counts
+        elapsed = self.stats.elapsed
+        print(f"  {done_count:,}개 처리 | 업로드 {counts['uploaded']:,} / 기존 {counts['exists'] + counts['unchanged']:,} / "
+              f"실패 {counts['failed']:,} | {counts['bytes'] / 1e6 / max(elapsed, 1e-9):.1f} MB/s")
+
+
+def print_report(stats):
+    counts = stats.counts
+    elapsed = stats.elapsed
+    total = sum(counts[key] for key in ('uploaded', 'exists', 'skipped', 'unchanged', 'failed'))
+
+    print("\n" + "=" * 60)
+    print("📊 업로드 결과")
+    print("=" * 60)
+    print(f"  - 대상 파일: {total:,}개")
+    print(f"  - 업로드: {counts['uploaded']:,}개 ({counts['bytes'] / 1e6:,.1f} MB)")
+    print(f"  - 이미 존재(건너뜀): {counts['exists']:,}개")
+    print(f"  - manifest 완료(건너뜀): {counts['skipped']:,}개")
+    print(f"  - 내용 동일(해시 일치): {counts['unchanged']:,}개")
+    print(f"  - 메타데이터 행: {counts['rows']:,}개")
+    print(f"  - 재시도: {counts['retries']:,}회")
+    print(f"  - 실패: {counts['failed']:,}개")
+    print(f"  - 소요 시간: {elapsed:.2f}s")
+    print(f"  - 처리 속도: {total / max(elapsed, 1e-9):,.1f} files/s, "
+          f"{counts['bytes'] / 1e6 / max(elapsed, 1e-9):,.2f} MB/s")
+
+    if stats.failures:
+        print("\n❌ 실패 목록 (최대 20개):")
+        for storage_path, error in stats.failures[:20]:
+            print(f"   - {storage_path}: {error[:120]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='촬영 세션 사진 병렬 업로드')
+    parser.add_argument('root', help='CS_{N}_single 폴더 또는 세션 폴더들의 상위 폴더')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='동시 업로드 수')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='메타데이터 insert 당 행 수')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='일시적 오류 재시도 횟수')
+    parser.add_argument('--upsert', action='store_true', help='기존 객체 덮어쓰기 (기본: 건너뜀)')
+    parser.add_argument('--manifest', default=str(DEFAULT_MANIFEST_PATH), help='업로드 manifest (SQLite) 경로')
+    parser.add_argument('--no-manifest', action='store_true', help='manifest 없이 업로드 (재시작 시 중복 검사만)')
+    parser.add_argument('--reconcile', action='store_true', help='업로드 전 manifest를 Storage 목록/DB 행과 대조')
+    parser.add_argument('--score', action='store_true', help='업로드 전 품질 점수 계산하여 메타데이터에 기록')
+    parser.add_argument('--score-workers', type=int, default=os.cpu_count(), help='품질 점수 프로세스 수')
+    parser.add_argument('--supabase-url', default=os.environ.get('SUPABASE_URL', SUPABASE_URL))
+    parser.add_argument('--supabase-key', default=os.environ.get('SUPABASE_ANON_KEY', SUPABASE_ANON_KEY))
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📤 촬영 사진 업로드")
+    print("=" * 60)
+    print(f"  - 대상: {args.root}")
+    print(f"  - 서버: {args.supabase_url} ({BUCKET})")
+    print(f"  - workers={args.workers}, batch={args.batch_size}, retries={args.retries}, upsert={args.upsert}")
+
+    manifest = None
+    if not args.no_manifest:
+        manifest = UploadManifest(args.manifest)
+        print(f"  - manifest: {args.manifest} ({len(manifest):,}개 기록)")
+    print()
+
+    uploader = CaptureUploader(
+        args.supabase_url, args.supabase_key,
+        workers=args.workers, batch_size=args.batch_size,
+        retries=args.retries, upsert=args.upsert, manifest=manifest,
+    )
+    try:
+        if args.reconcile and manifest is not None:
+            for session in find_sessions(args.root):
+                report = reconcile(manifest, uploader.client(), BUCKET, PHOTOS_TABLE, session.name,
+                                   call=lambda request: with_retry(request, args.retries, uploader.stats))
+                print_reconcile_report(report)
+            print()
+        files = iter_capture_files(args.root)
+        if args.score:
+            files = list(files)
+            uploader.metadata_fn = scored_metadata_fn(files, manifest, args.upsert, args.score_workers)
+        stats = uploader.run(files)
+    finally:
+        if manifest is not None:
+            manifest.close()
+    print_report(stats)
+
+    if stats.counts['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+촬영 사진 업로드 manifest (SQLite)
+업로드 완료된 객체의 Storage 경로, 크기, mtime, SHA-256, capture_real_photos 행 ID 기록
+
+- 재시작 시 크기/mtime이 같고 DB 행까지 기록된 파일은 해시 계산 없이 건너뜀 (dict 조회 O(1))
+- 크기/mtime이 바뀐 파일은 SHA-256 비교 후 내용이 바뀐 경우만 재전송
+- reconcile: Storage 목록(폴더별 페이지 조회)과 DB 행을 한 번에 대조하여 manifest 보정
+
+Created: 2025-10-28
+Purpose: 업로드 중단 후 재실행 시 중복 오류/무작정 재업로드 방지
+Usage:
+    python upload_capture_photos.py /data/captures --manifest artifacts/upload_manifest.sqlite
+    python upload_manifest.py artifacts/upload_manifest.sqlite --reconcile CS_1_single
+    python upload_manifest.py artifacts/upload_manifest.sqlite --summary
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPTS_DIR / 'data_prep'))
+
+from input_cache import file_sha256  # noqa: E402
+from test_storage_upload import BUCKET, PHOTOS_TABLE, SUPABASE_ANON_KEY, SUPABASE_URL, create_client  # noqa: E402
+
+DEFAULT_MANIFEST_PATH = SCRIPTS_DIR.parent / 'artifacts' / 'upload_manifest.sqlite'
+LIST_PAGE_SIZE = 1000
+DB_PAGE_SIZE = 1000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS objects (
+        storage_path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        sha256 TEXT NOT NULL,
+        row_id TEXT,
+        uploaded_at TEXT NOT NULL
+    )
+"""
+
+
+class UploadManifest:
+    """업로드 manifest
+
+    전체 항목을 메모리 dict로 유지하고(조회 O(1)), 변경분은 SQLite에 batch 반영.
+    조회/기록은 업로더의 메인 스레드에서만 호출한다.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+        self.entries = {
+            row[0]: {'size': row[1], 'mtime': row[2], 'sha256': row[3], 'row_id': row[4]}
+            for row in self.conn.execute('SELECT storage_path, size, mtime, sha256, row_id FROM objects')
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, storage_path):
+        return self.entries.get(storage_path)
+
+    def is_complete(self, storage_path, size, mtime):
+        """크기/mtime이 같고 DB 행까지 기록된 항목 여부 (해시 계산 없이 건너뛸 수 있음)"""
+        entry = self.entries.get(storage_path)
+        return (entry is not None and entry['row_id'] is not None
+                and entry['size'] == size and entry['mtime'] == mtime)
+
+    def record(self, records):
+        """업로드 결과 기록
+
+        Args:
+            records: [{'storage_path', 'size', 'mtime', 'sha256', 'row_id'}, ...]
+        """
+        if not records:
+            return
+        now = datetime.now().isoformat()
+        rows = []
+        for rec in records:
+            previous = self.entries.get(rec['storage_path'])
+            row_id = rec.get('row_id') or (previous['row_id'] if previous else None)
+            self.entries[rec['storage_path']] = {
+                'size': rec['size'], 'mtime': rec['mtime'], 'sha256': rec['sha256'], 'row_id': row_id,
+            }
+            rows.append((rec['storage_path'], rec['size'], rec['mtime'], rec['sha256'], row_id, now))
+
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO objects (storage_path, size, mtime, sha256, row_id, uploaded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (storage_path) DO UPDATE SET
+                  size = excluded.size, mtime = excluded.mtime, sha256 = excluded.sha256,
+                  row_id = excluded.row_id, uploaded_at = excluded.uploaded_at
+            """, rows)
+
+    def set_row_ids(self, row_ids):
+        """DB 행 ID 기록 ({storage_path: row_id})"""
+        row_ids = {path: str(row_id) for path, row_id in row_ids.items() if path in self.entries}
+        for path, row_id in row_ids.items():
+            self.entries[path]['row_id'] = row_id
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE objects SET row_id = ? WHERE storage_path = ?',
+                [(row_id, path) for path, row_id in row_ids.items()]
+            )
+
+    def remove(self, storage_paths):
+        storage_paths = [path for path in storage_paths if path in self.entries]
+        for path in storage_paths:
+            del self.entries[path]
+        with self.conn:
+            self.conn.executemany('DELETE FROM objects WHERE storage_path = ?', [(p,) for p in storage_paths])
+
+    def close(self):
+        self.conn.close()
+
+
+# ============================================================
+# Storage / DB 대조
+# ============================================================
+
+def _call(request):
+    return request()
+
+
+def list_storage_objects(client, bucket, prefix, call=_call):
+    """prefix 아래 모든 객체를 폴더별 페이지 조회로 수집
+
+    Storage list API는 한 폴더 단위로만 조회되므로 하위 폴더를 차례로 내려가며
+    폴더당 LIST_PAGE_SIZE 단위로 페이지를 넘긴다 (파일당 요청 없음).
+
+    Returns:
+        {storage_path: size}
+    """
+    objects = {}
+    folders = [prefix.strip('/')]
+    bucket_api = client.storage.from_(bucket)
+
+    while folders:
+        folder = folders.pop()
+        offset = 0
+        while True:
+            page = call(lambda: bucket_api.list(folder, {
+                'limit': LIST_PAGE_SIZE,
+                'offset': offset,
+                'sortBy': {'column': 'name', 'order': 'asc'},
+            }))
+            for item in page:
+                path = f"{folder}/{item['name']}" if folder else item['name']
+                if item.get('id') is None:
+                    folders.append(path)
+                else:
+                    objects[path] = int((item.get('metadata') or {}).get('size') or 0)
+            if len(page) < LIST_PAGE_SIZE:
+                break
+            offset += LIST_PAGE_SIZE
+
+    return objects
+
+
+def list_photo_rows(client, table, prefix, call=_call):
+    """capture_real_photos의 (photo_url → id)를 페이지 단위로 수집"""
+    rows = {}
+    offset = 0
+    while True:
+        response = call(lambda: client.table(table).select('id,photo_url')
+                        .like('photo_url', f'{prefix}%')
+                        .limit(DB_PAGE_SIZE).offset(offset).execute())
+        for row in response.data:
+            rows[row['photo_url']] = row['id']
+        if len(response.data) < DB_PAGE_SIZE:
+            break
+        offset += DB_PAGE_SIZE
+    return rows
+
+
+def reconcile(manifest, client, bucket, table, prefix, call=_call):
+    """manifest를 Storage 목록 + DB 행과 대조
+
+    - Storage에 없거나 크기가 다른 항목 → manifest에서 제거 (다음 실행 때 재업로드)
+    - DB 행 ID가 비어 있는데 DB에 행이 있는 항목 → 행 ID 채움
+    - manifest에 없는 Storage 객체 → 개수만 보고
+
+    Args:
+        call: 요청 실행 함수 (업로더는 재시도 래퍼 전달)
+
+    Returns:
+        리포트 dict
+    """
+    prefix = prefix.strip('/')
+    stored = list_storage_objects(client, bucket, prefix, call)
+    photo_rows = list_photo_rows(client, table, prefix, call)
+
+    tracked = [path for path in manifest.entries if path.startswith(prefix)]
+    missing = [path for path in tracked if path not in stored]
+    size_mismatch = [path for path in tracked
+                     if path in stored and stored[path] and stored[path] != manifest.entries[path]['size']]
+    untracked = [path for path in stored if path not in manifest.entries]
+    row_fill = {path: photo_rows[path] for path in tracked
+                if manifest.entries[path]['row_id'] is None and path in photo_rows}
+
+    manifest.remove(missing + size_mismatch)
+    manifest.set_row_ids(row_fill)
+
+    return {
+        'storage_objects': len(stored),
+        'db_rows': len(photo_rows),
+        'tracked': len(tracked),
+        'missing': missing,
+        'size_mismatch': size_mismatch,
+        'untracked': untracked,
+        'row_ids_filled': len(row_fill),
+    }
+
+
+def print_reconcile_report(report):
+    print("\n🔍 manifest 대조 결과:")
+    print(f"  - Storage 객체: {report['storage_objects']:,}개")
+    print(f"  - DB 행: {report['db_rows']:,}개")
+    print(f"  - manifest 항목: {report['tracked']:,}개")
+    print(f"  - Storage에 없음 (manifest에서 제거): {len(report['missing']):,}개")
+    print(f"  - 크기 불일치 (manifest에서 제거): {len(report['size_mismatch']):,}개")
+    print(f"  - manifest에 없는 Storage 객체: {len(report['untracked']):,}개")
+    print(f"  - DB 행 ID 보충: {report['row_ids_filled']:,}개")
+    for path in (report['missing'] + report['size_mismatch'])[:10]:
+        print(f"    - {path}")
+
+
+def print_summary(manifest):
+    complete = sum(1 for entry in manifest.entries.values() if entry['row_id'] is not None)
+    total_bytes = sum(entry['size'] for entry in manifest.entries.values())
+    sessions = {}
+    for path in manifest.entries:
+        session = path.split('/', 1)[0]
+        sessions[session] = sessions.get(session, 0) + 1
+
+    print(f"📒 manifest: {manifest.path}")
+    print(f"  - 항목: {len(manifest):,}개 ({total_bytes / 1e6:,.1f} MB)")
+    print(f"  - DB 행 기록 완료: {complete:,}개")
+    print(f"  - DB 행 미기록: {len(manifest) - complete:,}개")
+    for session, count in sorted(sessions.items()):
+        print(f"    {session}: {count:,}개")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='업로드 manifest 조회/대조')
+    parser.add_argument('manifest', nargs='?', default=str(DEFAULT_MANIFEST_PATH))
+    parser.add_argument('--summary', action='store_true', help='manifest 요약 출력')
+    parser.add_argument('--reconcile', metavar='PREFIX', help='Storage 목록/DB 행과 대조 (예: CS_1_single)')
+    parser.add_argument('--supabase-url', default=os.environ.get('SUPABASE_URL', SUPABASE_URL))
+    parser.add_argument('--supabase-key', default=os.environ.get('SUPABASE_ANON_KEY', SUPABASE_ANON_KEY))
+    args = parser.parse_args()
+
+    manifest = UploadManifest(args.manifest)
+    try:
+        if args.reconcile:
+            client = create_client(args.supabase_url, args.supabase_key)
+            report = reconcile(manifest, client, BUCKET, PHOTOS_TABLE, args.reconcile)
+            print_reconcile_report(report)
+        if args.summary or not args.reconcile:
+            print_summary(manifest)
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    main()
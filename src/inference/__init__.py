@@ -0,0 +1,3 @@
+"""
+100개 클래스 전용 ONNX 추론 (엔진 + 마이크로 배처)
+"""
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+"""
+임베딩 인덱스 (Open-set 거부 + 유사 약품 Top-k)
+100개 클래스 밖의 약품이 들어와도 softmax Top-5는 항상 100개 중 하나를 고르므로,
+분류기 직전(penultimate) 특징을 두 번째 ONNX 출력 'embedding'으로 내보내고
+학습 이미지의 클래스별 prototype과 코사인 유사도로 비교
+
+- add_embedding_output: 기존 ONNX 모델의 분류기(Gemm/MatMul) 입력을 'embedding' 출력으로 추가
+    (새로 export할 때는 planning/phase5_deployment.md의 export_to_onnx처럼 두 출력으로 export)
+- EmbeddingIndex: L2 정규화 prototype 행렬 (클래스당 1개 centroid 또는 k-means k개)
+    - flat: 질의 × prototype 행렬곱 한 번 (100 클래스 수 µs)
+    - ivf: prototype을 nlist개 목록으로 군집화, 질의마다 nprobe개 목록만 비교 (전체 4,523 클래스 카탈로그용)
+    - 클래스별 거부 임계값: 학습 이미지의 자기 클래스 유사도 하위 백분위 (샘플이 적으면 전체 기준)
+- 인덱스 파일(.npz)에 모델 식별자를 저장 → 다른 모델의 임베딩과 섞이지 않게 엔진에서 확인
+    식별자는 모델 파일 해시이므로 인덱스는 서빙하는 바로 그 모델 파일로 --build 해야 함
+    (서빙 파일과 다른 원본 모델, 인덱스 생성 후 양자화한 모델 등으로 만든 인덱스는 엔진이 사용하지 않음)
+    --model 기본값은 --add-output 결과 <stem>_embedding.onnx (feature_cache.py의 DEFAULT_MODEL_PATH와 같음)
+
+Created: 2025-10-28
+Purpose: 현장의 미등록 약품 거부 및 외형이 비슷한 약품 순위 제공
+Usage:
+    python src/inference/embedding_index.py --add-output models/pillsnap_narrow_model.onnx
+    python src/inference/embedding_index.py --build --model models/pillsnap_narrow_model_embedding.onnx \\
+        --splits artifacts/datasets/splits.json --output models/embedding_index.npz --prototypes 2
+    python src/inference/embedding_index.py --benchmark --classes 100,4523 --dim 1280
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+EMBEDDING_OUTPUT = 'embedding'
+INDEX_VERSION = 1
+DEFAULT_THRESHOLD_PERCENTILE = 5.0
+MIN_THRESHOLD_SAMPLES = 10     # 이보다 적은 클래스는 전체 백분위 임계값 사용
+KMEANS_ITERATIONS = 20
+DEFAULT_MODEL_PATH = 'models/pillsnap_narrow_model_embedding.onnx'   # --add-output 결과 (<stem>_embedding.onnx)
+
+
+# ============================================================
+# 1. ONNX 모델에 임베딩 출력 추가
+# ============================================================
+
+def find_classifier_input(graph) -> str:
+    """첫 번째 출력(logits)을 만드는 분류기 노드의 특징 입력 이름 (Gemm / MatMul / MatMul + Add)"""
+    producers = {output: node for node in graph.node for output in node.output}
+    node = producers.get(graph.output[0].name)
+    if node is not None and node.op_type == 'Add':
+        node = next((producers[name] for name in node.input
+                     if name in producers and producers[name].op_type == 'MatMul'), None)
+    if node is None or node.op_type not in ('Gemm', 'MatMul'):
+        raise ValueError('분류기(Gemm/MatMul) 노드를 찾지 못했습니다 - --tensor로 특징 텐서 이름을 지정하세요')
+    return node.input[0]
+
+
+def add_embedding_output(model_path, output_path=None, tensor: Optional[str] = None) -> Path:
+    """분류기 입력 텐서를 Identity로 'embedding' 출력에 연결한 모델 저장
+
+    양자화 모델은 분류기가 MatMulInteger 등으로 바뀌므로 FP32 모델에 추가한 뒤 양자화할 것.
+    """
+    try:
+        import onnx
+        from onnx import helper
+    except ImportError:
+        print("❌ onnx가 필요합니다: pip install onnx")
+        sys.exit(1)
+
+    model_path = Path(model_path)
+    output_path = Path(output_path) if output_path else model_path.with_name(model_path.stem + '_embedding.onnx')
+    model = onnx.load(str(model_path))
+    graph = model.graph
+    if any(output.name == EMBEDDING_OUTPUT for output in graph.output):
+        onnx.save(model, str(output_path))
+        return output_path
+
+    tensor = tensor or find_classifier_input(graph)
+    graph.node.append(helper.make_node('Identity', [tensor], [EMBEDDING_OUTPUT], name='embedding_output'))
+    batch_dim = graph.output[0].type.tensor_type.shape.dim[0]
+    graph.output.append(helper.make_tensor_value_info(
+        EMBEDDING_OUTPUT, onnx.TensorProto.FLOAT, [batch_dim.dim_param or batch_dim.dim_value or None, None]
+    ))
+    onnx.checker.check_model(model)
+    onnx.save(model, str(output_path))
+    return output_path
+
+
+# ============================================================
+# 2. 인덱스
+# ============================================================
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, seed: int = 0,
+                     iterations: int = KMEANS_ITERATIONS) -> Tuple[np.ndarray, np.ndarray]:
+    """정규화된 벡터의 k-means (코사인 유사도 기준) → (중심 (k,D), 할당 (N,))"""
+    k = min(k, len(vectors))
+    rng = np.random.default_rng(seed)
+    centers = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    assignment = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        assignment = (vectors @ centers.T).argmax(axis=1)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, assignment, vectors)
+        empty = ~np.bincount(assignment, minlength=k).astype(bool)
+        sums[empty] = centers[empty]   # 빈 군집은 이전 중심 유지
+        centers = l2_normalize(sums)
+    return centers, (vectors @ centers.T).argmax(axis=1)
+
+
+class EmbeddingIndex:
+    """클래스별 prototype 코사인 유사도 인덱스
+
+    vectors: (P, D) L2 정규화 prototype, labels: (P,) 클래스 번호 (오름차순 정렬)
+    kcodes: 클래스 번호 → K-code, thresholds: (C,) 클래스별 거부 임계값
+    """
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, kcodes: Sequence[str], thresholds: np.ndarray,
+                 model_key: Optional[str] = None, meta: Optional[Dict] = None):
+        order = np.argsort(labels, kind='stable')
+        self.vectors = np.ascontiguousarray(l2_normalize(vectors)[order])
+        self.labels = np.asarray(labels, dtype=np.int64)[order]
+        self.kcodes = list(kcodes)
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.model_key = model_key
+        self.meta = meta or {}
+        self.num_classes = len(self.kcodes)
+        self.classes = np.unique(self.labels)   # prototype이 있는 클래스 (검색 결과 열 순서)
+        self.single_prototype = len(self.labels) == len(self.classes)
+        self._starts = np.searchsorted(self.labels, self.classes)   # 클래스별 첫 prototype
+        self.ivf = None
+
+    # -- 생성 ---------------------------------------------------------------
+    @classmethod
+    def build(cls, embeddings: np.ndarray, labels: np.ndarray, kcodes: Sequence[str], prototypes: int = 1,
+              threshold_percentile: float = DEFAULT_THRESHOLD_PERCENTILE, model_key: Optional[str] = None):
+        """학습 임베딩 → 클래스별 prototype + 임계값
+
+        Args:
+            prototypes: 클래스당 prototype 수 (1이면 centroid, 2 이상이면 클래스 내 k-means - 앞/뒷면 등)
+            threshold_percentile: 자기 클래스 유사도의 이 백분위 미만이면 미등록 약품으로 거부
+        """
+        embeddings = l2_normalize(embeddings)
+        labels = np.asarray(labels, dtype=np.int64)
+        vectors, vector_labels = [], []
+        own = np.full(len(embeddings), -1.0, dtype=np.float32)   # 학습 샘플의 자기 클래스 유사도
+        for label in range(len(kcodes)):
+            members_idx = np.flatnonzero(labels == label)
+            if not len(members_idx):
+                continue
+            members = embeddings[members_idx]
+            if prototypes > 1 and len(members) > prototypes:
+                _, assignment = spherical_kmeans(members, prototypes, seed=label)
+            else:
+                assignment = np.zeros(len(members), dtype=np.int64)
+            sums = np.zeros((assignment.max() + 1, members.shape[1]), dtype=np.float32)
+            np.add.at(sums, assignment, members)
+            sums = sums[np.bincount(assignment) > 0]
+            assignment = np.unique(assignment, return_inverse=True)[1]
+            centers = l2_normalize(sums)
+
+            # leave-one-out: 자기 자신을 뺀 prototype과의 유사도 (자기 포함 시 임계값이 높게 잡힘)
+            scores = members @ centers.T
+            loo = sums[assignment] - members
+            loo_norm = np.linalg.norm(loo, axis=1)
+            rows = np.arange(len(members))
+            scores[rows, assignment] = np.where(loo_norm > 1e-6,
+                                                np.einsum('ij,ij->i', members, loo) / np.maximum(loo_norm, 1e-6),
+                                                -1.0)
+            own[members_idx] = scores.max(axis=1)
+            vectors.append(centers)
+            vector_labels.extend([label] * len(centers))
+        vectors, vector_labels = np.concatenate(vectors), np.array(vector_labels)
+
+        global_threshold = float(np.percentile(own, threshold_percentile))
+        thresholds = np.full(len(kcodes), global_threshold, dtype=np.float32)
+        for label in range(len(kcodes)):
+            scores = own[labels == label]
+            if len(scores) >= MIN_THRESHOLD_SAMPLES:
+                thresholds[label] = np.percentile(scores, threshold_percentile)
+
+        meta = {'prototypes': prototypes, 'threshold_percentile': threshold_percentile,
+                'num_samples': int(len(embeddings)), 'global_threshold': round(global_threshold, 4)}
+        return cls(vectors, vector_labels, kcodes, thresholds, model_key, meta)
+
+    def build_ivf(self, nlist: Optional[int] = None, nprobe: int = 8, seed: int = 0):
+        """prototype을 nlist개 목록으로 군집화 (목록별로 연속 저장 → 목록마다 행렬곱 한 번)"""
+        nlist = nlist or max(1, int(np.sqrt(len(self.vectors))))
+        centers, assignment = spherical_kmeans(self.vectors, nlist, seed=seed)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(len(centers) + 1))
+        self.ivf = {
+            'centers': centers,
+            'vectors': np.ascontiguousarray(self.vectors[order]),
+            'labels': self.labels[order],
+            'bounds': bounds,
+            'nprobe': min(nprobe, len(centers)),
+        }
+        return self
+
+    # -- 검색 ---------------------------------------------------------------
+    def search(self, queries: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """질의 임베딩 (N,D) → 클래스별 최대 유사도 상위 k (유사도 (N,k), 클래스 번호 (N,k))"""
+        queries = l2_normalize(np.atleast_2d(queries))
+        k = min(k, len(self.classes))
+        if self.ivf is not None:
+            return self._search_ivf(queries, k)
+
+        scores = queries @ self.vectors.T
+        if not self.single_prototype:
+            scores = np.maximum.reduceat(scores, self._starts, axis=1)
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), self.classes[np.take_along_axis(top, order, axis=1)]
+
+    def _search_ivf(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ivf = self.ivf
+        probes = np.argsort(-(queries @ ivf['centers'].T), axis=1)[:, :ivf['nprobe']]
+        all_scores = np.full((len(queries), k), -1.0, dtype=np.float32)
+        all_labels = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            scores, labels = [], []
+            for probe in probes[i]:
+                begin, end = ivf['bounds'][probe], ivf['bounds'][probe + 1]
+                scores.append(ivf['vectors'][begin:end] @ query)
+                labels.append(ivf['labels'][begin:end])
+            scores, labels = np.concatenate(scores), np.concatenate(labels)
+            # 클래스별 최댓값: 유사도 내림차순에서 처음 나온 클래스만
+            order = np.argsort(-scores)
+            _, first = np.unique(labels[order], return_index=True)
+            best = order[np.sort(first)][:k]
+            all_scores[i, :len(best)] = scores[best]
+            all_labels[i, :len(best)] = labels[best]
+        return all_scores, all_labels
+
+    def classify(self, queries: np.ndarray, k: int = 5) -> List[Dict]:
+        """질의마다 등록 약품 여부 + 가장 가까운 약품 k개"""
+        scores, labels = self.search(queries, k)
+        results = []
+        for row_scores, row_labels in zip(scores, labels):
+            top = int(row_labels[0])
+            threshold = float(self.thresholds[top])
+            results.append({
+                'known': bool(row_scores[0] >= threshold),
+                'similarity': round(float(row_scores[0]), 4),
+                'threshold': round(threshold, 4),
+                'nearest': [{'kcode': self.kcodes[label], 'similarity': round(float(score), 4)}
+                            for score, label in zip(row_scores, row_labels) if label >= 0],
+            })
+        return results
+
+    # -- 저장 ---------------------------------------------------------------
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {**self.meta, 'version': INDEX_VERSION, 'model_key': self.model_key, 'kcodes': self.kcodes}
+        np.savez(path, vectors=self.vectors, labels=self.labels, thresholds=self.thresholds,
+                 meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'EmbeddingIndex':
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['vectors'], data['labels'], meta.pop('kcodes'), data['thresholds'],
+                       meta.pop('model_key'), meta)
+
+    def fingerprint(self) -> str:
+        return hashlib.sha256(self.vectors.tobytes() + self.thresholds.tobytes()).hexdigest()[:16]
+
+
+# ============================================================
+# 3. 학습 manifest로 인덱스 생성
+# ============================================================
+
+def embed_items(engine, items: Sequence[Dict], batch_size: int) -> np.ndarray:
+    """splits.json 항목 [{path, label, kcode}] → 임베딩 (N,D)"""
+    embeddings = []
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        embeddings.append(engine.embed_batch([Path(item['path']).read_bytes() for item in chunk]))
+        print(f"\r  임베딩 {min(start + batch_size, len(items)):,}/{len(items):,}", end='', flush=True)
+    print()
+    return np.concatenate(embeddings)
+
+
+def build_from_splits(args) -> EmbeddingIndex:
+    from inference.narrow_model import NarrowModelInference
+
+    engine = NarrowModelInference(args.model, args.class_mapping, args.metadata)
+    if engine.embedding_output is None:
+        print(f"❌ 모델에 '{EMBEDDING_OUTPUT}' 출력이 없습니다: --add-output으로 먼저 추가하세요")
+        sys.exit(1)
+
+    with open(args.splits, 'r', encoding='utf-8') as f:
+        items = json.load(f)[args.split]
+    if args.catalog:
+        # 분류기 밖 약품 포함: K-code 순서대로 클래스 번호 부여
+        kcodes = sorted({item['kcode'] for item in items})
+    else:
+        kcodes = [engine.class_mapping['idx_to_class'][str(i)]
+                  for i in range(len(engine.class_mapping['idx_to_class']))]
+    label_of = {kcode: i for i, kcode in enumerate(kcodes)}
+    items = [item for item in items if item['kcode'] in label_of]
+
+    started = time.perf_counter()
+    embeddings = embed_items(engine, items, args.batch_size)
+    labels = np.array([label_of[item['kcode']] for item in items])
+    index = EmbeddingIndex.build(embeddings, labels, kcodes, prototypes=args.prototypes,
+                                 threshold_percentile=args.threshold_percentile, model_key=engine.model_key)
+    print(f"✅ 인덱스 생성: 클래스 {index.num_classes:,}개, prototype {len(index.vectors):,}개, "
+          f"차원 {index.vectors.shape[1]}, 임베딩 {len(items):,}장 ({time.perf_counter() - started:.1f}초)")
+    return index
+
+
+# ============================================================
+# 4. 벤치마크 (합성 임베딩)
+# ============================================================
+
+def synthetic_index(num_classes: int, dim: int, per_class: int = 20, seed: int = 0):
+    """클래스 중심 + 잡음 임베딩 → (인덱스, 등록 질의, 미등록 질의)"""
+    rng = np.random.default_rng(seed)
+    centers = l2_normalize(rng.standard_normal((num_classes, dim)))
+    noise = 0.6 / np.sqrt(dim)
+    embeddings = np.repeat(centers, per_class, axis=0) + rng.standard_normal((num_classes * per_class, dim)) * noise
+    labels = np.repeat(np.arange(num_classes), per_class)
+    index = EmbeddingIndex.build(embeddings, labels, [f'K-{i:06d}' for i in range(num_classes)])
+    known = centers[rng.integers(0, num_classes, 1000)] + rng.standard_normal((1000, dim)) * noise
+    unknown = rng.standard_normal((1000, dim))
+    return index, known, unknown
+
+
+def time_queries(index: EmbeddingIndex, queries: np.ndarray, k: int = 5) -> Tuple[float, float]:
+    """(질의 1개씩 평균 ms, 1,000개 배치의 질의당 ms)"""
+    started = time.perf_counter()
+    for query in queries[:200]:
+        index.search(query, k)
+    single = (time.perf_counter() - started) / 200 * 1000
+    started = time.perf_counter()
+    index.search(queries, k)
+    batched = (time.perf_counter() - started) / len(queries) * 1000
+    return single, batched
+
+
+def run_benchmark(args):
+    print(f"⏱️  임베딩 인덱스 벤치마크 (차원 {args.dim}, top-{args.k})")
+    print(f"  {'classes':>7} {'backend':>14} {'1 query':>10} {'batched':>10} {'recall@1':>9} "
+          f"{'known acc':>9} {'reject':>7}")
+    for num_classes in parse_ints(args.classes):
+        index, known, unknown = synthetic_index(num_classes, args.dim)
+        flat_labels = index.search(known, 1)[1][:, 0]
+        backends = [('flat', None)]
+        if num_classes >= 1000:
+            backends.append((f'ivf({args.nprobe}/{int(np.sqrt(num_classes))})', args.nprobe))
+        for name, nprobe in backends:
+            index.ivf = None
+            if nprobe:
+                index.build_ivf(nprobe=nprobe)
+            single, batched = time_queries(index, known, args.k)
+            labels = index.search(known, 1)[1][:, 0]
+            known_acc = np.mean([r['known'] for r in index.classify(known[:200])])
+            rejected = np.mean([not r['known'] for r in index.classify(unknown[:200])])
+            print(f"  {num_classes:>7,} {name:>14} {single:>8.3f}ms {batched:>8.4f}ms "
+                  f"{np.mean(labels == flat_labels):>9.3f} {known_acc:>9.3f} {rejected:>7.3f}")
+
+
+def parse_ints(spec: str) -> List[int]:
+    return [int(value) for value in spec.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='임베딩 인덱스 (Open-set 거부 + 유사 약품 검색)')
+    parser.add_argument('--add-output', metavar='MODEL', help="ONNX 모델에 'embedding' 출력 추가")
+    parser.add_argument('--tensor', help='임베딩으로 쓸 텐서 이름 (기본: 분류기 입력)')
+    parser.add_argument('--build', action='store_true', help='splits.json 학습 이미지로 인덱스 생성')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH,
+                        help="'embedding' 출력이 있고 서빙에 쓰는 것과 같은 ONNX 모델 파일")
+    parser.add_argument('--class-mapping', default='models/class_mapping.json')
+    parser.add_argument('--metadata', default='models/model_metadata.json')
+    parser.add_argument('--splits', default='artifacts/datasets/splits.json')
+    parser.add_argument('--split', default='train')
+    parser.add_argument('--catalog', action='store_true', help='class_mapping 밖의 K-code도 포함 (전체 카탈로그)')
+    parser.add_argument('--prototypes', type=int, default=1, help='클래스당 prototype 수')
+    parser.add_argument('--threshold-percentile', type=float, default=DEFAULT_THRESHOLD_PERCENTILE)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output', default='models/embedding_index.npz')
+    parser.add_argument('--benchmark', action='store_true', help='합성 임베딩으로 검색 지연/거부율 측정')
+    parser.add_argument('--classes', default='100,4523')
+    parser.add_argument('--dim', type=int, default=1280, help='임베딩 차원 (EfficientNetV2-S: 1280)')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nprobe', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.add_output:
+        path = add_embedding_output(args.add_output, tensor=args.tensor)
+        print(f"✅ 임베딩 출력 추가: {path}")
+
+    if args.build:
+        index = build_from_splits(args)
+        print(f"✅ 저장: {index.save(args.output)}")
+
+    if args.benchmark:
+        run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""
+비동기 마이크로 배처 (ONNX 세션 앞단)
+동시에 들어온 요청을 max_batch_size 또는 max_wait_ms까지 모아 한 번의 dynamic-batch 추론으로
+워커 스레드에서 실행하고, 결과를 요청별로 돌려줌
+
+- 이벤트 루프에서는 session.run을 호출하지 않음 (run_in_executor)
+- 배치 실행 중 도착한 요청은 다음 배치로 모임 → 부하가 클수록 배치가 커짐
+- 지표: 큐 깊이, 배치 크기 히스토그램, 요청 지연 p50/p99
+
+Created: 2025-10-28
+Purpose: /predict 요청마다 session.run(배치 1)을 돌리던 구조의 처리량 한계 해소
+Usage:
+    python src/inference/micro_batcher.py --requests 2000 --concurrency 64
+    python src/inference/micro_batcher.py --model models/pillsnap_narrow_model_quantized.onnx --requests 200
+"""
+
+import argparse
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5.0
+LATENCY_WINDOW = 10000
+
+
+class BatcherMetrics:
+    """배처 지표 (이벤트 루프 스레드에서만 갱신)"""
+
+    def __init__(self, max_batch_size: int, window: int = LATENCY_WINDOW):
+        self.batch_sizes = np.zeros(max_batch_size + 1, dtype=np.int64)
+        self.latencies = deque(maxlen=window)   # 최근 요청 지연 (초)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record(self, size: int, latencies: Sequence[float], errors: int = 0):
+        self.batch_sizes[size] += 1
+        self.latencies.extend(latencies)
+        self.requests += size
+        self.batches += 1
+        self.errors += errors
+
+    def snapshot(self, queue_depth: int, in_flight: int) -> dict:
+        if self.latencies:
+            p50, p99 = np.percentile(np.fromiter(self.latencies, dtype=np.float64), [50, 99]) * 1000
+        else:
+            p50 = p99 = 0.0
+        return {
+            'queue_depth': queue_depth,
+            'in_flight_batches': in_flight,
+            'requests': self.requests,
+            'batches': self.batches,
+            'errors': self.errors,
+            'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'batch_size_histogram': {int(size): int(count)
+                                     for size, count in enumerate(self.batch_sizes) if count},
+            'latency_ms': {'p50': round(float(p50), 2), 'p99': round(float(p99), 2)},
+        }
+
+
+class MicroBatcher:
+    """요청 단위 submit → 배치 단위 run_batch
+
+    Args:
+        run_batch: 입력 리스트를 받아 같은 길이의 결과 리스트를 반환 (워커 스레드에서 실행)
+            결과 자리에 예외 객체를 넣으면 해당 요청만 실패 처리
+        max_batch_size: 배치 최대 크기 (ONNX 모델의 dynamic batch 범위 이내)
+        max_wait_ms: 첫 요청 도착 후 배치를 채우기 위해 기다리는 최대 시간
+        max_concurrent_batches: 동시에 실행할 배치 수 (세션 1개면 1)
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        max_concurrent_batches: int = 1,
+        executor=None,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max_concurrent_batches
+        self.executor = executor
+        self._own_executor = executor is None
+        self.metrics_data = BatcherMetrics(max_batch_size)
+
+        self.queue = None
+        self._workers = []
+        self._in_flight = 0
+
+    async def start(self):
+        if self._workers:
+            return
+        self.queue = asyncio.Queue()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                               thread_name_prefix='micro-batcher')
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent_batches)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # 남은 요청은 실패 처리
+        while self.queue is not None and not self.queue.empty():
+            _, future, _ = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError('micro-batcher stopped'))
+
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def submit(self, item: Any) -> Any:
+        """요청 1건 추가 후 해당 결과를 기다림"""
+        if not self._workers:
+            raise RuntimeError('micro-batcher not started')
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    def metrics(self) -> dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            **self.metrics_data.snapshot(self.queue.qsize() if self.queue else 0, self._in_flight),
+        }
+
+    async def _collect(self) -> list:
+        """첫 요청을 기다린 뒤 max_batch_size 또는 max_wait까지 모음"""
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # 이미 대기 중인 요청은 기다림 없이 가져옴
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # 클라이언트가 끊긴(취소된) 요청은 제외
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            self._in_flight += 1
+            errors = 0
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, [entry[0] for entry in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f'run_batch returned {len(results)} results for {len(batch)} inputs')
+                for (_, future, _), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        errors += 1
+                        if not future.done():
+                            future.set_exception(result)
+                    elif not future.done():
+                        future.set_result(result)
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError('micro-batcher stopped'))
+                raise
+            except Exception as e:
+                errors = len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._in_flight -= 1
+
+            done_at = time.perf_counter()
+            self.metrics_data.record(len(batch), [done_at - entry[2] for entry in batch], errors)
+
+
+# ============================================================
+# 벤치마크
+# ============================================================
+
+def simulated_session(overhead_ms: float, per_item_ms: float):
+    """session.run 비용 모델: 호출당 고정 비용 + 샘플당 비용 (GIL 해제 구간)"""
+
+    def run_batch(items):
+        time.sleep((overhead_ms + per_item_ms * len(items)) / 1000)
+        return [int(item) for item in items]
+
+    return run_batch
+
+
+def onnx_session(model_path: str):
+    """실제 ONNX 모델 (입력: 요청마다 같은 무작위 텐서)"""
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    shape = [dim if isinstance(dim, int) else 1 for dim in model_input.shape[1:]]
+    sample = np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+
+    def run_batch(items):
+        batch = np.broadcast_to(sample, (len(items), *shape)).copy()
+        outputs = session.run(None, {model_input.name: batch})[0]
+        return [int(row.argmax()) for row in outputs]
+
+    return run_batch
+
+
+async def run_load(run_batch, requests: int, concurrency: int, max_batch_size: int, max_wait_ms: float) -> dict:
+    batcher = MicroBatcher(run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    await batcher.start()
+
+    counter = iter(range(requests))
+
+    async def client():
+        for i in counter:
+            await batcher.submit(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    metrics = batcher.metrics()
+    await batcher.stop()
+    metrics['throughput'] = requests / elapsed
+    return metrics
+
+
+def print_metrics(label: str, metrics: dict):
+    print(f"  - {label}: {metrics['throughput']:,.1f} req/s, "
+          f"p50 {metrics['latency_ms']['p50']:.1f}ms, p99 {metrics['latency_ms']['p99']:.1f}ms, "
+          f"평균 배치 {metrics['avg_batch_size']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='마이크로 배처 처리량/지연 벤치마크')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64, help='동시 클라이언트 수')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--model', help='ONNX 모델 경로 (없으면 비용 모델로 시뮬레이션)')
+    parser.add_argument('--overhead-ms', type=float, default=8.0, help='시뮬레이션: 호출당 고정 비용')
+    parser.add_argument('--per-item-ms', type=float, default=1.5, help='시뮬레이션: 샘플당 비용')
+    args = parser.parse_args()
+
+    if args.model:
+        run_batch = onnx_session(args.model)
+        source = args.model
+    else:
+        run_batch = simulated_session(args.overhead_ms, args.per_item_ms)
+        source = f'시뮬레이션 ({args.overhead_ms}ms + {args.per_item_ms}ms/샘플)'
+
+    print(f"⏱️  마이크로 배처 벤치마크: {source}")
+    print(f"  요청 {args.requests:,}개, 동시 클라이언트 {args.concurrency}")
+
+    unbatched = asyncio.run(run_load(run_batch, args.requests, args.concurrency, 1, 0))
+    print_metrics('요청별 실행 (batch=1)', unbatched)
+
+    batched = asyncio.run(run_load(run_batch, args.requests, args.concurrency,
+                                   args.max_batch_size, args.max_wait_ms))
+    print_metrics(f'마이크로 배치 (max {args.max_batch_size}, {args.max_wait_ms}ms)', batched)
+    print(f"  - 처리량 {batched['throughput'] / unbatched['throughput']:.1f}배")
+    print(f"  - 배치 크기 분포: {batched['batch_size_histogram']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+"""
+100개 클래스 전용 ONNX 추론 엔진
+planning/phase5_deployment.md Task 2의 NarrowModelInference (FastAPI 라우터는 추론서버 저장소)
+
+- predict: 이미지 1장 → Top-5 결과
+- predict_batch: 여러 장을 UnifiedPreprocessor.process_batch + session.run 한 번으로 처리
+  (MicroBatcher의 run_batch로 사용)
+- cache: PredictionCache를 넘기면 같은 이미지 바이트는 전처리/추론 없이 반환, reload 시 자동 무효화
+- 콜드 스타트: cv2/onnxruntime/전처리기는 모델 로드 시점에 import,
+  optimized_model_dir를 주면 ORT 그래프 최적화 결과를 한 번 저장해 재사용,
+  warmup으로 서비스하는 모든 배치 크기를 미리 실행
+- embedding_index: 모델에 'embedding' 출력이 있으면 결과에 open_set(등록 약품 여부 + 유사 약품 Top-5) 추가
+- tta_policy: 회전/반전 TTA (원본 Top-1 확신도가 tta_threshold 이상이면 생략, 나머지 이미지의 변형 전체를
+  session.run 한 번으로 추론하여 로짓 평균)
+
+Created: 2025-10-28
+Purpose: 추론서버 엔드포인트가 공유하는 모델 로드/전처리/후처리
+Usage:
+    from inference.narrow_model import NarrowModelInference
+    narrow_model = NarrowModelInference('models/pillsnap_narrow_model_quantized.onnx')
+    result = narrow_model.predict(image_bytes)
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference.embedding_index import EMBEDDING_OUTPUT, EmbeddingIndex  # noqa: E402
+from inference.prediction_cache import model_fingerprint  # noqa: E402
+from inference.startup import process_uptime  # noqa: E402
+
+DEFAULT_MODEL_PATH = 'models/pillsnap_narrow_model_quantized.onnx'
+DEFAULT_CLASS_MAPPING_PATH = 'models/class_mapping.json'
+DEFAULT_METADATA_PATH = 'models/model_metadata.json'
+TOP_K = 5
+OPTIMIZED_MODEL_NAME = 'model.onnx'
+
+# TTA 정책: 원본에 추가로 추론할 변형 (rotN = 시계 반대 방향 N도, flip = 좌우 반전)
+# 촬영은 턴테이블 45° 간격 8방향이므로 rot8이 촬영 조건 전체
+TTA_POLICIES = {
+    'none': (),
+    'flip': ('flip',),
+    'rot4': ('rot90', 'rot180', 'rot270'),
+    'rot4flip': ('rot90', 'rot180', 'rot270', 'flip'),
+    'rot8': ('rot45', 'rot90', 'rot135', 'rot180', 'rot225', 'rot270', 'rot315'),
+}
+DEFAULT_TTA_THRESHOLD = 0.9
+
+
+def _import(module: str):
+    """무거운 의존성은 처음 쓰는 시점에 import (앱 import/컨테이너 시작 시간 단축)"""
+    try:
+        return __import__(module)
+    except ImportError as e:
+        # 추론서버 프로세스를 종료하지 않고 호출자에게 전달
+        package = {'cv2': 'opencv-python-headless'}.get(module, module)
+        raise ImportError(f"추론 의존성이 필요합니다: pip install {package}") from e
+
+
+def tta_views(batch: np.ndarray, transforms: Sequence[str]) -> np.ndarray:
+    """전처리된 배치 (N, 3, S, S) → 변형 배치 (len(transforms) * N, 3, S, S), 변형 순서대로
+
+    90° 배수와 반전은 축 연산, 45° 회전은 cv2.warpAffine (바깥 영역은 정규화 공간의 0 = 평균색)
+    """
+    n, channels, size, _ = batch.shape
+    views = np.empty((len(transforms) * n, channels, size, size), dtype=np.float32)
+    for v, transform in enumerate(transforms):
+        out = views[v * n:(v + 1) * n]
+        if transform == 'flip':
+            out[:] = batch[..., ::-1]
+            continue
+        angle = int(transform[3:])
+        if angle % 90 == 0:
+            out[:] = np.rot90(batch, angle // 90, axes=(2, 3))
+            continue
+        cv2 = _import('cv2')
+        matrix = cv2.getRotationMatrix2D(((size - 1) / 2, (size - 1) / 2), angle, 1.0)
+        for i in range(n):
+            # (3, S, S) → (S, S, 3)로 한 번에 회전 후 다시 CHW
+            rotated = cv2.warpAffine(np.ascontiguousarray(batch[i].transpose(1, 2, 0)), matrix, (size, size),
+                                     flags=cv2.INTER_LINEAR, borderValue=(0, 0, 0))
+            out[i] = rotated.transpose(2, 0, 1)
+    return views
+
+
+class NarrowModelInference:
+    def __init__(
+        self,
+        model_path: str = DEFAULT_MODEL_PATH,
+        class_mapping_path: str = DEFAULT_CLASS_MAPPING_PATH,
+        metadata_path: Optional[str] = DEFAULT_METADATA_PATH,
+        providers: Optional[List[str]] = None,
+        cache=None,
+        sess_options=None,
+        optimized_model_dir: Optional[str] = None,
+        embedding_index=None,
+        tta_policy: str = 'none',
+        tta_threshold: float = DEFAULT_TTA_THRESHOLD,
+    ):
+        self.model_path = model_path
+        self.class_mapping_path = class_mapping_path
+        self.metadata_path = metadata_path
+        self.providers = providers or ['CUDAExecutionProvider', 'CPUExecutionProvider']
+        self.cache = cache
+        self.sess_options = sess_options   # 워커별 스레드 수 등 (serving.session_options)
+        self.optimized_model_dir = Path(optimized_model_dir) if optimized_model_dir else None
+        self.embedding_index_source = embedding_index   # .npz 경로 또는 EmbeddingIndex
+        if tta_policy not in TTA_POLICIES:
+            raise ValueError(f"알 수 없는 TTA 정책: {tta_policy} ({', '.join(TTA_POLICIES)})")
+        self.tta_policy = tta_policy
+        self.tta_threshold = tta_threshold
+        self.startup = {}
+        self.reload()
+
+    def reload(self):
+        """클래스 매핑/메타데이터/모델 (재)로드 - 모델이 바뀌면 예측 캐시 무효화"""
+        # 클래스 매핑 로드
+        with open(self.class_mapping_path, 'r', encoding='utf-8') as f:
+            self.class_mapping = json.load(f)
+
+        # 모델 메타데이터 (create_metadata 출력, 없으면 기본값)
+        self.metadata = {}
+        if self.metadata_path and Path(self.metadata_path).exists():
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                self.metadata = json.load(f)
+        self.model_version = self.metadata.get('model_version', '1.0.0')
+        self.model_key = model_fingerprint(self.model_path, self.model_version)
+
+        started = time.perf_counter()
+        self.session = self._load_model()
+        self.startup['model_load_s'] = round(time.perf_counter() - started, 3)
+        self.ready = False
+        self.time_to_first_prediction = None
+        self.input_name = self.session.get_inputs()[0].name
+        input_size = self.session.get_inputs()[0].shape[-1]
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.embedding_output = EMBEDDING_OUTPUT if EMBEDDING_OUTPUT in self.output_names else None
+        self.embedding_index = self._load_embedding_index()
+
+        # 전처리기 (모델 입력 크기에 맞춤)
+        preprocessing = dict(self.metadata.get('preprocessing', {}))
+        preprocessing.pop('version', None)
+        if isinstance(input_size, int):
+            preprocessing['target_size'] = input_size
+        from preprocessing import UnifiedPreprocessor
+        self.preprocessor = UnifiedPreprocessor(**preprocessing)
+
+        if self.cache is not None:
+            # 인덱스가 바뀌어도 open_set 결과가 달라지므로 캐시 식별자에 포함
+            index_key = f'+{self.embedding_index.fingerprint()}' if self.embedding_index is not None else ''
+            tta_key = f'+tta:{self.tta_policy}@{self.tta_threshold}' if self.tta_policy != 'none' else ''
+            self.cache.set_model(self.model_key + index_key + tta_key)
+
+    def _load_embedding_index(self) -> Optional[EmbeddingIndex]:
+        """임베딩 인덱스 로드 (모델에 embedding 출력이 없거나 다른 모델로 만든 인덱스면 사용 안 함)"""
+        source = self.embedding_index_source
+        if source is None:
+            return None
+        index = source if isinstance(source, EmbeddingIndex) else EmbeddingIndex.load(source)
+        if self.embedding_output is None:
+            print(f"⚠️  모델에 '{EMBEDDING_OUTPUT}' 출력이 없어 임베딩 인덱스를 사용하지 않습니다")
+            return None
+        if index.model_key != self.model_key:
+            print(f"⚠️  임베딩 인덱스의 모델({index.model_key})이 현재 모델({self.model_key})과 달라 사용하지 않습니다")
+            return None
+        return index
+
+    def _load_model(self):
+        """ONNX 모델 로드 (optimized_model_dir가 있으면 최적화된 그래프 저장/재사용)"""
+        ort = _import('onnxruntime')
+        providers = [p for p in self.providers if p in ort.get_available_providers()]
+        options = self.sess_options or ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.optimized_model_filepath = ''
+
+        model_path = self.model_path
+        optimized_dir = self._optimized_model_path(ort) if self.optimized_model_dir else None
+        staging_dir = None
+        if optimized_dir is not None and (optimized_dir / OPTIMIZED_MODEL_NAME).exists():
+            # 이미 최적화된 그래프 → 최적화 단계 생략
+            model_path = str(optimized_dir / OPTIMIZED_MODEL_NAME)
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        elif optimized_dir is not None:
+            # 워커별 임시 폴더에 저장 후 rename (여러 워커가 동시에 시작해도 안전)
+            staging_dir = optimized_dir.with_name(f'{optimized_dir.name}.tmp{os.getpid()}')
+            staging_dir.mkdir(parents=True, exist_ok=True)
+            options.optimized_model_filepath = str(staging_dir / OPTIMIZED_MODEL_NAME)
+            # 가중치는 external data로 저장해 mmap 공유 유지 (serving.prepare_shared_model)
+            options.add_session_config_entry('session.optimized_model_external_initializers_file_name',
+                                             OPTIMIZED_MODEL_NAME + '.data')
+            options.add_session_config_entry('session.optimized_model_external_initializers_min_size_in_bytes',
+                                             '1024')
+
+        session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=providers
+        )
+        options.optimized_model_filepath = ''
+        self.startup['optimized_model'] = model_path if model_path != self.model_path else None
+
+        if staging_dir is not None:
+            try:
+                staging_dir.rename(optimized_dir)
+            except OSError:   # 다른 워커가 먼저 저장함
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+        print(f"✅ Narrow model loaded: {model_path}")
+        return session
+
+    def _optimized_model_path(self, ort) -> Path:
+        """모델 식별자 + ORT 버전별 최적화 모델 폴더 (ENABLE_ALL 결과는 같은 환경에서만 재사용)"""
+        version, digest = self.model_key.split(':')
+        name = f'{Path(self.model_path).stem}-{version}-{digest}-ort{ort.__version__}'
+        return self.optimized_model_dir / name
+
+    def warmup(self, batch_sizes: Sequence[int]) -> float:
+        """서비스하는 모든 배치 크기로 전처리 + session.run을 미리 실행 (완료 후 ready)
+
+        Returns:
+            소요 시간 (초)
+        """
+        started = time.perf_counter()
+        size = self.preprocessor.target_size
+        frames = np.zeros((max(batch_sizes), size, size, 3), dtype=np.uint8)
+        self.decode(_import('cv2').imencode('.jpg', frames[0])[1].tobytes())
+
+        for n in sorted(set(batch_sizes)):
+            batch = self.preprocessor.process_batch_numpy(frames[:n])
+            self.session.run(None, {self.input_name: batch})
+            if self.tta_policy != 'none':
+                # TTA 변형 배치 크기 (변형 수 × n)도 미리 실행
+                self.apply_tta(batch, self.session.run([self.output_names[0]], {self.input_name: batch})[0],
+                               threshold=1.1)
+
+        elapsed = time.perf_counter() - started
+        self.startup.update({
+            'warmup_s': round(elapsed, 3),
+            'warmup_batch_sizes': sorted(set(batch_sizes)),
+            'ready_s': round(process_uptime(), 3),
+        })
+        self.ready = True
+        return elapsed
+
+    @staticmethod
+    def decode(image_bytes: bytes) -> np.ndarray:
+        """이미지 바이트 → RGB 배열"""
+        cv2 = _import('cv2')
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError('이미지 디코딩 실패')
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def cache_key(self, image_bytes: bytes) -> Optional[str]:
+        return self.cache.key(image_bytes) if self.cache is not None else None
+
+    def lookup(self, key: Optional[str]) -> Optional[Dict]:
+        """캐시된 결과 (캐시 없음/미스면 None) - 엔드포인트에서 배처에 넣기 전에 확인"""
+        if key is None:
+            return None
+        result = self.cache.get(key)
+        if result is not None:
+            result['cached'] = True
+        return result
+
+    def predict(self, image_bytes: bytes) -> Dict:
+        """단일 이미지 추론"""
+        key = self.cache_key(image_bytes)
+        return self.lookup(key) or self.predict_batch([image_bytes], keys=[key])[0]
+
+    def predict_batch(self, image_list: Sequence[bytes], return_exceptions: bool = False,
+                      keys: Optional[Sequence[Optional[str]]] = None) -> List[Dict]:
+        """여러 이미지를 dynamic batch 한 번으로 추론 (요청 순서대로 결과 반환)
+
+        Args:
+            return_exceptions: 디코딩/전처리 실패 이미지를 예외 객체로 반환하고 나머지는 계속 추론
+                (MicroBatcher에서 다른 요청까지 실패하지 않도록 사용)
+            keys: 이미 계산한 캐시 키 (없으면 여기서 계산, 캐시 조회는 하지 않고 결과만 저장)
+        """
+        if keys is None:
+            keys = [self.cache_key(image_bytes) for image_bytes in image_list]
+
+        # 이미지 단위로 격리할 예외 (return_exceptions=False면 빈 튜플 → 그대로 전파)
+        errors = (ValueError, OSError, _import('cv2').error) if return_exceptions else ()
+        results = [None] * len(image_list)
+        images, positions = [], []
+        for i, image_bytes in enumerate(image_list):
+            try:
+                images.append(self.decode(image_bytes))
+                positions.append(i)
+            except errors as e:
+                results[i] = e
+
+        if images:
+            batch, positions = self._preprocess(images, positions, results, errors)
+
+        if positions:
+            # 추론
+            outputs = self.session.run(None, {self.input_name: batch})
+            logits, tta_applied = self.apply_tta(batch, outputs[0])
+            open_set = [None] * len(positions)
+            if self.embedding_index is not None:
+                open_set = self._open_set(outputs[self.output_names.index(EMBEDDING_OUTPUT)])
+            for i, probs, matches, applied in zip(positions, self._softmax(logits), open_set, tta_applied):
+                results[i] = self._format(probs)
+                if matches is not None:
+                    results[i]['open_set'] = matches
+                if self.tta_policy != 'none':
+                    results[i]['tta'] = {'policy': self.tta_policy, 'applied': bool(applied)}
+                if keys[i] is not None:
+                    self.cache.put(keys[i], results[i])
+            if self.time_to_first_prediction is None:
+                self.time_to_first_prediction = round(process_uptime(), 3)
+        return results
+
+    def _preprocess(self, images: List[np.ndarray], positions: List[int], results: List, errors: tuple):
+        """배치 전처리 (실패하면 이미지별로 다시 처리해 실패한 이미지만 예외로 기록)
+
+        Returns:
+            (배치, 배치에 포함된 요청 위치)
+        """
+        try:
+            return self.preprocessor.process_batch_numpy(images), positions
+        except errors:
+            pass
+
+        arrays, kept = [], []
+        for image, i in zip(images, positions):
+            try:
+                arrays.append(self.preprocessor.process_batch_numpy([image]))
+                kept.append(i)
+            except errors as e:
+                results[i] = e
+        return (np.concatenate(arrays) if arrays else None), kept
+
+    def apply_tta(self, batch: np.ndarray, logits: np.ndarray, policy: Optional[str] = None,
+                  threshold: Optional[float] = None):
+        """원본 로짓의 Top-1 확신도가 threshold 미만인 이미지만 변형을 추론하여 로짓 평균 (조기 종료)
+
+        Returns:
+            (로짓, TTA 적용 여부 (N,) bool)
+        """
+        transforms = TTA_POLICIES[policy or self.tta_policy]
+        threshold = self.tta_threshold if threshold is None else threshold
+        uncertain = self._softmax(logits).max(axis=1) < threshold if transforms else np.zeros(len(logits), bool)
+        if not uncertain.any():
+            return logits, uncertain
+
+        # 확신도 낮은 이미지들의 모든 변형을 session.run 한 번으로
+        views = tta_views(batch[uncertain], transforms)
+        view_logits = self.session.run([self.output_names[0]], {self.input_name: views})[0]
+        view_logits = view_logits.reshape(len(transforms), int(uncertain.sum()), -1)
+        logits = logits.copy()
+        logits[uncertain] = (logits[uncertain] + view_logits.sum(axis=0)) / (len(transforms) + 1)
+        return logits, uncertain
+
+    def embed_batch(self, image_list: Sequence[bytes]) -> np.ndarray:
+        """이미지들의 penultimate 임베딩 (N, D) - 인덱스 생성용"""
+        if self.embedding_output is None:
+            raise ValueError(f"모델에 '{EMBEDDING_OUTPUT}' 출력이 없습니다")
+        batch = self.preprocessor.process_batch_numpy([self.decode(image_bytes) for image_bytes in image_list])
+        return self.session.run([EMBEDDING_OUTPUT], {self.input_name: batch})[0]
+
+    def _open_set(self, embeddings: np.ndarray) -> List[Dict]:
+        """등록 약품 여부 + 임베딩 기준 유사 약품 (분류기 밖 카탈로그 약품 포함 가능)"""
+        metadata = self.class_mapping['metadata']
+        matches = self.embedding_index.classify(embeddings, TOP_K)
+        for match in matches:
+            for neighbor in match['nearest']:
+                neighbor['drug_name'] = metadata.get(neighbor['kcode'], {}).get('drug_name', '')
+        return matches
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def _format(self, probs: np.ndarray) -> Dict:
+        # Top-5 결과
+        top_idx = np.argsort(probs)[-TOP_K:][::-1]
+
+        results = []
+        for idx in top_idx:
+            kcode = self.class_mapping['idx_to_class'][str(idx)]
+            metadata = self.class_mapping['metadata'][kcode]
+
+            results.append({
+                'rank': len(results) + 1,
+                'kcode': kcode,
+                'drug_name': metadata['drug_name'],
+                'confidence': float(probs[idx]),
+                'manufacturer': metadata.get('manufacturer', '')
+            })
+
+        return {
+            'success': True,
+            'model_version': self.model_version,
+            'num_classes': len(probs),
+            'results': results,
+            'top1': results[0] if results else None,
+            'processing_time_ms': 0  # Will be filled by middleware
+        }
+
+    def model_info(self) -> Dict:
+        """모델 정보 + 예측 캐시 지표 (/info 응답)"""
+        return {
+            'model_type': 'narrow',
+            'architecture': self.metadata.get('architecture', 'EfficientNetV2-S'),
+            'num_classes': len(self.class_mapping['idx_to_class']),
+            'input_size': self.preprocessor.target_size,
+            'model_version': self.model_version,
+            'model_key': self.model_key,
+            'file_size_mb': round(Path(self.model_path).stat().st_size / 1e6, 1),
+            'cache': self.cache.stats() if self.cache is not None else None,
+            'embedding_index': ({'classes': len(self.embedding_index.classes),
+                                 'num_prototypes': len(self.embedding_index.vectors),
+                                 **self.embedding_index.meta}
+                                if self.embedding_index is not None else None),
+            'tta': {'policy': self.tta_policy, 'threshold': self.tta_threshold},
+            'startup': {**self.startup, 'ready': self.ready,
+                        'time_to_first_prediction_s': self.time_to_first_prediction},
+        }
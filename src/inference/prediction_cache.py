@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+예측 결과 캐시 (이미지 바이트 해시 + 모델 식별자)
+약국 클라이언트의 재시도/중복 제출(네트워크 끊김, Flutter 더블탭)에서 전처리/추론 재실행 방지
+
+- 메모리: LRU + TTL (스레드 안전)
+- 디스크(선택): SQLite WAL 파일을 같은 서버의 여러 워커 프로세스가 공유
+- 모델 식별자(model_version + 모델 파일 해시)가 바뀌면 메모리/디스크 항목 모두 무효화
+- 지표: 메모리/디스크 적중, 미스, 만료, 제거, 적중률
+
+Created: 2025-10-28
+Purpose: 같은 사진 재요청 시 추론 비용 제거
+Usage:
+    cache = PredictionCache(max_entries=4096, ttl_seconds=600, disk_path='/tmp/pillsnap_cache.sqlite')
+    cache.set_model(model_key)
+    key = cache.key(image_bytes)
+    result = cache.get(key)
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import xxhash
+except ImportError:  # 없으면 hashlib.sha256 (SHA-NI 가속 CPU에서 충분히 빠름)
+    xxhash = None
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 600
+PRUNE_EVERY = 256   # 디스크 만료 항목 정리 주기 (put 횟수)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS predictions (
+        key TEXT PRIMARY KEY,
+        model_key TEXT NOT NULL,
+        result TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at);
+"""
+
+
+def content_hash(data: bytes) -> str:
+    """이미지 바이트 해시 (xxh3-128, 없으면 SHA-256)"""
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def model_fingerprint(model_path, model_version: str) -> str:
+    """모델 식별자: 버전 + 모델 파일 SHA-256 앞 16자리 (같은 버전으로 재학습해도 구분)
+
+    external data 형식(serving.prepare_shared_model)이면 가중치 파일(<모델>.data)도 포함.
+    """
+    model_path = Path(model_path)
+    sha256 = hashlib.sha256()
+    for path in (model_path, model_path.with_name(model_path.name + '.data')):
+        if not path.exists():
+            continue
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(chunk)
+    return f"{model_version}:{sha256.hexdigest()[:16]}"
+
+
+class PredictionCache:
+    """LRU + TTL 예측 캐시
+
+    결과는 JSON 문자열로 보관하고 조회 때마다 새 dict로 돌려준다
+    (호출 측에서 processing_time_ms 등을 채워도 캐시 항목은 바뀌지 않음).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.model_key = None
+        self._entries = OrderedDict()   # key → (expires_at, result_json)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+        self.disk_path = Path(disk_path) if disk_path else None
+        self._conn = None
+        if self.disk_path:
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=5)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        self._puts = 0
+
+    def set_model(self, model_key: str):
+        """모델 로드/재로드 시 호출 - 식별자가 바뀌면 기존 항목 전체 무효화"""
+        with self._lock:
+            if model_key == self.model_key:
+                return
+            if self.model_key is not None:
+                self._stats['invalidations'] += 1
+            self.model_key = model_key
+            self._entries.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('DELETE FROM predictions WHERE model_key != ?', (model_key,))
+
+    def key(self, image_bytes: bytes) -> str:
+        return content_hash(image_bytes)
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return json.loads(entry[1])
+                del self._entries[key]
+                self._stats['expired'] += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT result, created_at FROM predictions WHERE key = ? AND model_key = ?',
+                    (key, self.model_key)
+                ).fetchone()
+                if row is not None and row[1] + self.ttl > now:
+                    # 다른 워커가 계산한 결과 → 메모리에도 올림
+                    self._put_memory(key, row[0], row[1] + self.ttl)
+                    self._stats['disk_hits'] += 1
+                    return json.loads(row[0])
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key: str, result: Dict):
+        now = time.time()
+        result_json = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._put_memory(key, result_json, now + self.ttl)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO predictions (key, model_key, result, created_at) VALUES (?, ?, ?, ?)',
+                        (key, self.model_key, result_json, now)
+                    )
+                    self._puts += 1
+                    if self._puts % PRUNE_EVERY == 0:
+                        self._conn.execute('DELETE FROM predictions WHERE created_at < ?', (now - self.ttl,))
+
+    def _put_memory(self, key: str, result_json: str, expires_at: float):
+        self._entries[key] = (expires_at, result_json)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['disk_hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'shared_store': str(self.disk_path) if self.disk_path else None,
+                'hit_rate': round((self._stats['hits'] + self._stats['disk_hits']) / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
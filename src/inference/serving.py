@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+멀티 워커 ONNX 서빙 (가중치 공유 + 워커별 스레드 고정)
+
+uvicorn 워커마다 pillsnap_narrow_model_quantized.onnx를 따로 올리면 가중치가 워커 수만큼 복제되고,
+세션마다 코어 수만큼 intra-op 스레드를 띄워 코어가 과다 할당된다.
+
+- prepare_shared_model: 모델을 external data 형식(.onnx + .onnx.data)으로 한 번 저장
+    → ORT가 가중치 파일을 mmap하므로 prepacking을 끄면 워커들이 같은 page cache를 공유
+- thread_plan / session_options: 코어 수 ÷ 워커 수로 intra-op 스레드 고정, inter-op 1, 스핀 대기 끔
+- WorkerPool: 단일 async 프론트엔드(MicroBatcher) 뒤에서 배치를 처리하는 프로세스 풀
+    (각 워커가 디코딩/전처리/추론까지 수행, spawn으로 시작하여 ORT 스레드 풀 fork 문제 회피)
+- 벤치마크: 워커 수별 워커당 RSS/PSS, 처리량
+
+Created: 2025-10-28
+Purpose: 한 서버에서 여러 워커로 추론 시 메모리 복제/코어 과다 할당 방지
+Usage:
+    python src/inference/serving.py --prepare models/pillsnap_narrow_model_quantized.onnx
+    python src/inference/serving.py --benchmark models/pillsnap_narrow_model_quantized.onnx --max-workers 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference.micro_batcher import MicroBatcher  # noqa: E402
+
+SHARED_SUFFIX = '.shared.onnx'
+EXTERNAL_DATA_THRESHOLD = 1024   # 이보다 큰 텐서만 외부 파일로 (작은 bias 등은 모델 안에)
+
+
+# ============================================================
+# 1. 가중치 공유 모델 / 세션 옵션
+# ============================================================
+
+def shared_model_path(model_path) -> Path:
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + SHARED_SUFFIX)
+
+
+def prepare_shared_model(model_path, output_path=None) -> Path:
+    """모델을 external data 형식으로 저장 (이미 최신이면 그대로 사용)
+
+    Returns:
+        external data 모델 경로 (가중치: 같은 폴더의 <이름>.data)
+    """
+    model_path = Path(model_path)
+    output_path = Path(output_path) if output_path else shared_model_path(model_path)
+    data_name = output_path.name + '.data'
+    data_path = output_path.with_name(data_name)
+
+    if (output_path.exists() and data_path.exists()
+            and output_path.stat().st_mtime >= model_path.stat().st_mtime):
+        return output_path
+
+    try:
+        import onnx
+    except ImportError as e:
+        # 서버/학습 프로세스를 종료하지 않고 호출자에게 전달 (종료는 main에서만)
+        raise ImportError("onnx가 필요합니다: pip install onnx") from e
+
+    model = onnx.load(str(model_path))
+    data_path.unlink(missing_ok=True)   # save_model은 기존 .data 뒤에 이어 씀
+    onnx.save_model(
+        model, str(output_path),
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=data_name,
+        size_threshold=EXTERNAL_DATA_THRESHOLD,
+    )
+    return output_path
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def thread_plan(workers: int, cores: Optional[int] = None) -> Dict[str, int]:
+    """워커당 intra-op / inter-op 스레드 수 (코어 과다 할당 방지)"""
+    cores = cores or available_cores()
+    return {'intra_op': max(1, cores // max(workers, 1)), 'inter_op': 1}
+
+
+def session_options(workers: int = 1, cores: Optional[int] = None, shared_weights: bool = True):
+    """워커 수에 맞춘 SessionOptions
+
+    Args:
+        shared_weights: prepacking 비활성화 (prepack된 가중치는 워커별 복사본이 되어 공유 불가)
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise ImportError("onnxruntime이 필요합니다: pip install onnxruntime") from e
+
+    plan = thread_plan(workers, cores)
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = plan['intra_op']
+    options.inter_op_num_threads = plan['inter_op']
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if workers > 1:
+        # 다른 워커가 쓸 코어를 스핀 대기로 잡아먹지 않도록
+        options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+    if shared_weights:
+        options.add_session_config_entry('session.disable_prepacking', '1')
+    return options
+
+
+# ============================================================
+# 2. 프로세스 풀 백엔드
+# ============================================================
+
+_ENGINE = None
+
+
+def _init_worker(engine_kwargs: dict, workers: int, cores: Optional[int], shared_weights: bool,
+                 warmup_batch_sizes: Sequence[int]):
+    """워커 프로세스 초기화: 스레드 고정 세션으로 엔진 생성 + 워밍업 (예측 캐시는 프론트엔드에서)"""
+    global _ENGINE
+    from inference.narrow_model import NarrowModelInference
+
+    _ENGINE = NarrowModelInference(
+        **engine_kwargs,
+        sess_options=session_options(workers, cores, shared_weights),
+    )
+    _ENGINE.warmup(warmup_batch_sizes)
+
+
+def _predict_batch(images: List[bytes]) -> list:
+    return _ENGINE.predict_batch(images, return_exceptions=True)
+
+
+def _worker_ready(_=None) -> int:
+    time.sleep(0.2)   # 모든 워커가 하나씩 작업을 받도록 잠시 점유
+    return os.getpid()
+
+
+class WorkerPool:
+    """단일 async 프론트엔드 + 추론 워커 프로세스 풀
+
+    MicroBatcher가 모은 배치를 워커에 분배 (동시 배치 수 = 워커 수).
+    """
+
+    def __init__(self, model_path: str, class_mapping_path: str, metadata_path: Optional[str] = None,
+                 workers: int = 2, cores: Optional[int] = None, shared_weights: bool = True,
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0, optimized_model_dir: Optional[str] = None):
+        if shared_weights:
+            model_path = str(prepare_shared_model(model_path))
+        self.model_path = model_path
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=({'model_path': model_path, 'class_mapping_path': class_mapping_path,
+                       'metadata_path': metadata_path, 'optimized_model_dir': optimized_model_dir},
+                      workers, cores, shared_weights, list(range(1, max_batch_size + 1))),
+        )
+        self.batcher = MicroBatcher(_predict_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                    max_concurrent_batches=workers, executor=self.executor)
+
+    async def start(self):
+        """워커를 모두 띄우고 모델 로드 + 워밍업까지 기다림"""
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(loop.run_in_executor(self.executor, _worker_ready)
+                                      for _ in range(self.workers)))
+        await self.batcher.start()
+        return sorted(set(pids))
+
+    async def predict(self, image_bytes: bytes) -> Dict:
+        return await self.batcher.submit(image_bytes)
+
+    def metrics(self) -> Dict:
+        return {'workers': self.workers, 'model_path': self.model_path, **self.batcher.metrics()}
+
+    async def stop(self):
+        await self.batcher.stop()
+        self.executor.shutdown(wait=True)
+
+
+# ============================================================
+# 3. 벤치마크
+# ============================================================
+
+def process_memory_mb(pid: int) -> Dict[str, float]:
+    """RSS / PSS (공유 페이지는 PSS에서 프로세스 수로 나뉨)"""
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key.lower()] = int(value.split()[0]) / 1024
+    return memory
+
+
+def benchmark_images(n: int, size: int = 640) -> Sequence[bytes]:
+    import cv2
+    from preprocessing.unified_preprocessor import synthetic_images
+
+    return [cv2.imencode('.jpg', image)[1].tobytes() for image in synthetic_images(n, size, size)]
+
+
+async def run_pool(args, workers: int, shared_weights: bool, images: Sequence[bytes]) -> Dict:
+    pool = WorkerPool(args.benchmark, args.class_mapping, args.metadata, workers=workers,
+                      shared_weights=shared_weights, max_batch_size=args.batch_size)
+    pids = await pool.start()
+    await asyncio.gather(*(pool.predict(image) for image in images[:workers * args.batch_size]))   # 워밍업
+    memory = [process_memory_mb(pid) for pid in pids]
+
+    counter = iter(range(args.requests))
+
+    async def client():
+        for i in counter:
+            await pool.predict(images[i % len(images)])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(workers * args.batch_size * 2)))
+    elapsed = time.perf_counter() - started
+    metrics = pool.metrics()
+    await pool.stop()
+
+    return {
+        'workers': workers,
+        'rss_mb': float(np.mean([m['rss'] for m in memory])),
+        'pss_mb': float(np.mean([m['pss'] for m in memory])),
+        'throughput': args.requests / elapsed,
+        'p99_ms': metrics['latency_ms']['p99'],
+        'intra_op': thread_plan(workers)['intra_op'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='멀티 워커 ONNX 서빙 준비/벤치마크')
+    parser.add_argument('--prepare', metavar='MODEL', help='가중치 공유용 external data 모델 생성')
+    parser.add_argument('--benchmark', metavar='MODEL', help='워커 수별 메모리/처리량 측정')
+    parser.add_argument('--class-mapping', default='models/class_mapping.json')
+    parser.add_argument('--metadata', default='models/model_metadata.json')
+    parser.add_argument('--max-workers', type=int, default=available_cores())
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--image-size', type=int, default=640, help='합성 JPEG 한 변 크기')
+    parser.add_argument('--no-shared', action='store_true', help='비교용: 가중치 공유 없이 (prepacking 사용)')
+    args = parser.parse_args()
+
+    if args.prepare:
+        try:
+            path = prepare_shared_model(args.prepare)
+        except ImportError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        data_mb = path.with_name(path.name + '.data').stat().st_size / 1e6
+        print(f"✅ 가중치 공유 모델: {path} (+ .data {data_mb:,.1f} MB)")
+
+    if args.benchmark:
+        try:
+            session_options()
+        except ImportError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        images = benchmark_images(32, args.image_size)
+        shared = not args.no_shared
+        print(f"⏱️  멀티 워커 벤치마크: {args.benchmark} (코어 {available_cores()}, "
+              f"가중치 공유 {'ON' if shared else 'OFF'}, 요청 {args.requests}, 배치 {args.batch_size})")
+        print(f"  {'workers':>7} {'intra':>5} {'RSS/worker':>11} {'PSS/worker':>11} {'req/s':>8} {'p99 ms':>8}")
+        for workers in range(1, args.max_workers + 1):
+            result = asyncio.run(run_pool(args, workers, shared, images))
+            print(f"  {result['workers']:>7} {result['intra_op']:>5} {result['rss_mb']:>9.1f}MB "
+                  f"{result['pss_mb']:>9.1f}MB {result['throughput']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
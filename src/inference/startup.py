@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+추론서버 콜드 스타트 측정
+프로세스 시작 → import → 모델 로드 → 워밍업(ready) → 첫 예측까지의 시간
+
+- process_uptime: 프로세스 시작 이후 경과 시간 (/proc 기준, 인터프리터 기동 시간 포함)
+- 시작 벤치마크: 새 프로세스를 띄워 최적화 모델 캐시가 없을 때(cold) / 있을 때(cached)를 비교
+
+Created: 2025-10-28
+Purpose: 컨테이너 시작/오토스케일링 시간 단축 효과 확인
+Usage:
+    python src/inference/startup.py --model models/pillsnap_narrow_model_quantized.onnx \\
+        --optimized-dir /tmp/pillsnap_ort_cache --batch-sizes 1-16
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+_IMPORTED_AT = time.time()
+
+
+def process_uptime() -> float:
+    """프로세스 시작 이후 경과 시간 (초)
+
+    Linux에서는 /proc/self/stat의 시작 시각을 사용하고, 그 외에는 이 모듈 import 시각 기준.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            system_uptime = float(f.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time() - _IMPORTED_AT
+
+
+def parse_batch_sizes(spec: str) -> List[int]:
+    """'1-16' 또는 '1,2,4,8' → 배치 크기 목록"""
+    sizes = set()
+    for part in spec.split(','):
+        if '-' in part:
+            low, high = part.split('-')
+            sizes.update(range(int(low), int(high) + 1))
+        else:
+            sizes.add(int(part))
+    return sorted(sizes)
+
+
+# ============================================================
+# 시작 벤치마크
+# ============================================================
+
+def measure_startup(args) -> dict:
+    """(자식 프로세스) import → 로드 → 워밍업 → 첫 예측 시간 측정"""
+    started = time.perf_counter()
+    from inference.narrow_model import NarrowModelInference
+    import_s = time.perf_counter() - started
+
+    engine = NarrowModelInference(args.model, args.class_mapping, args.metadata,
+                                  optimized_model_dir=args.optimized_dir)
+    engine.warmup(parse_batch_sizes(args.batch_sizes))
+
+    import cv2
+    import numpy as np
+    image = np.full((640, 480, 3), 128, dtype=np.uint8)
+    engine.predict(cv2.imencode('.jpg', image)[1].tobytes())
+
+    return {'import_s': round(import_s, 3), **engine.model_info()['startup']}
+
+
+def run_child(args, optimized_dir: str) -> dict:
+    command = [sys.executable, __file__, '--child', '--model', args.model,
+               '--class-mapping', args.class_mapping, '--metadata', args.metadata,
+               '--optimized-dir', optimized_dir, '--batch-sizes', args.batch_sizes]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='추론서버 콜드 스타트 벤치마크')
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--class-mapping', default='models/class_mapping.json')
+    parser.add_argument('--metadata', default='models/model_metadata.json')
+    parser.add_argument('--optimized-dir', help='최적화 모델 캐시 폴더 (비어 있어야 함, 기본: 임시 폴더)')
+    parser.add_argument('--batch-sizes', default='1-16', help='워밍업 배치 크기 (예: 1-16 또는 1,4,8)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+        print(json.dumps(measure_startup(args)))
+        return
+
+    # 캐시가 이미 있으면 첫 실행도 cached가 되어 비교가 무의미
+    if args.optimized_dir and Path(args.optimized_dir).is_dir() and any(Path(args.optimized_dir).iterdir()):
+        print(f"❌ --optimized-dir가 비어 있지 않습니다: {args.optimized_dir} (빈 폴더를 지정하거나 생략)")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        optimized_dir = args.optimized_dir or tmp
+        print(f"⏱️  콜드 스타트 벤치마크: {args.model} (워밍업 배치 {args.batch_sizes})")
+        print(f"  {'':>8} {'import':>8} {'load':>8} {'warmup':>8} {'ready':>8} {'first pred':>11}")
+        for label in ('cold', 'cached'):
+            result = run_child(args, optimized_dir)
+            print(f"  {label:>8} {result['import_s']:>7.2f}s {result['model_load_s']:>7.2f}s "
+                  f"{result['warmup_s']:>7.2f}s {result['ready_s']:>7.2f}s "
+                  f"{result['time_to_first_prediction_s']:>10.2f}s")
+            if (label == 'cached') != (result['optimized_model'] is not None):
+                print(f"  ⚠️  {label} 실행의 최적화 모델 캐시 사용 여부가 예상과 다릅니다: {result['optimized_model']}")
+
+
+if __name__ == "__main__":
+    main()
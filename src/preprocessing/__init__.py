@@ -0,0 +1,7 @@
+"""
+통합 전처리 (Flutter / BFF / 추론서버 / 학습 공용)
+"""
+
+from .unified_preprocessor import UnifiedPreprocessor
+
+__all__ = ['UnifiedPreprocessor']
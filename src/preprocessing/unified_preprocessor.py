@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+"""
+통합 전처리기 (UnifiedPreprocessor)
+Flutter → BFF → 추론서버 / 학습 데이터셋이 공유하는 표준 전처리
+(planning/phase4_training.md Task 1)
+
+- process: 단일 이미지 (중앙 크롭/리사이즈 → CLAHE → 정규화 → CHW 텐서)
+- process_batch: (N, H, W, 3) 배치를 한 번에 처리, 단일 경로와 비트 단위 동일
+    * RGB↔LAB 변환은 배치 전체를 한 번의 cvtColor로 처리
+    * CLAHE 객체는 스레드별로 캐시 (cv2 CLAHE는 스레드 안전하지 않음)
+    * 정규화 + HWC→CHW를 채널별 LUT 조회 한 번으로 미리 할당된 출력 버퍼에 기록
+
+Created: 2025-10-28
+Purpose: 서버 배치 추론 / 오프라인 데이터셋 생성의 전처리 처리량 확보
+Usage:
+    python src/preprocessing/unified_preprocessor.py --verify 32
+    python src/preprocessing/unified_preprocessor.py --benchmark 64 --batch-size 16
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError as e:
+    # 라이브러리 모듈이므로 프로세스를 종료하지 않고 호출자에게 전달
+    raise ImportError("opencv-python이 필요합니다: pip install opencv-python-headless") from e
+
+PREPROCESSOR_VERSION = '1.0.0'
+
+
+class UnifiedPreprocessor:
+    """
+    모든 파이프라인에서 사용하는 표준 전처리기
+    Flutter → BFF → Inference 일관성 보장
+    """
+
+    def __init__(
+        self,
+        target_size: int = 512,
+        enable_clahe: bool = True,
+        clahe_clip_limit: float = 2.0,
+        clahe_grid_size: int = 8,
+        normalization_mean: Tuple[float, float, float] = (0.485, 0.456, 0.406),
+        normalization_std: Tuple[float, float, float] = (0.229, 0.224, 0.225)
+    ):
+        self.target_size = target_size
+        self.enable_clahe = enable_clahe
+        self.clahe_clip_limit = clahe_clip_limit
+        self.clahe_grid_size = clahe_grid_size
+        self.mean = normalization_mean
+        self.std = normalization_std
+
+        # CLAHE 객체는 스레드별로 생성/재사용
+        self._local = threading.local()
+
+        # 정규화 LUT: uint8 값 → 정규화 결과 (채널별 256개)
+        # _normalize를 그대로 통과시켜 만들므로 단일 경로와 비트 단위로 같다
+        levels = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)[None]
+        self._lut = np.ascontiguousarray(self._normalize(levels)[0].astype(np.float32).T)
+
+    @property
+    def clahe(self):
+        """현재 스레드의 CLAHE 객체"""
+        clahe = getattr(self._local, 'clahe', None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(
+                clipLimit=self.clahe_clip_limit,
+                tileGridSize=(self.clahe_grid_size, self.clahe_grid_size)
+            )
+            self._local.clahe = clahe
+        return clahe
+
+    # ============================================================
+    # 단일 이미지 경로
+    # ============================================================
+
+    def process(self, image: np.ndarray):
+        """
+        이미지 전처리 파이프라인
+
+        Args:
+            image: RGB 이미지 (H, W, 3)
+
+        Returns:
+            torch.Tensor: 전처리된 텐서 (3, 512, 512)
+        """
+        import torch
+
+        return torch.from_numpy(self.process_numpy(image))
+
+    def process_numpy(self, image: np.ndarray) -> np.ndarray:
+        """process와 동일한 결과를 float32 ndarray (3, S, S)로 반환"""
+        # 1. 크기 조정 (중앙 크롭 후 리사이즈)
+        image = self._center_crop_and_resize(image)
+
+        # 2. CLAHE 적용 (선택적)
+        if self.enable_clahe:
+            image = self._apply_clahe(image)
+
+        # 3. 정규화
+        image = self._normalize(image)
+
+        # 4. CHW 변환
+        return np.ascontiguousarray(image.transpose(2, 0, 1), dtype=np.float32)
+
+    def _center_crop_and_resize(self, image: np.ndarray) -> np.ndarray:
+        """중앙 크롭 후 정사각형 리사이즈"""
+        h, w = image.shape[:2]
+
+        # 정사각형 크롭
+        min_dim = min(h, w)
+        start_h = (h - min_dim) // 2
+        start_w = (w - min_dim) // 2
+        cropped = image[start_h:start_h+min_dim, start_w:start_w+min_dim]
+
+        # 리사이즈
+        resized = cv2.resize(
+            cropped,
+            (self.target_size, self.target_size),
+            interpolation=cv2.INTER_LINEAR
+        )
+
+        return resized
+
+    def _apply_clahe(self, image: np.ndarray) -> np.ndarray:
+        """CLAHE (Contrast Limited Adaptive Histogram Equalization) 적용"""
+        # RGB to LAB
+        lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
+        l, a, b = cv2.split(lab)
+
+        # L 채널에 CLAHE 적용
+        l_clahe = self.clahe.apply(l)
+
+        # LAB to RGB
+        lab_clahe = cv2.merge([l_clahe, a, b])
+        rgb_clahe = cv2.cvtColor(lab_clahe, cv2.COLOR_LAB2RGB)
+
+        return rgb_clahe
+
+    def _normalize(self, image: np.ndarray) -> np.ndarray:
+        """ImageNet 정규화"""
+        image = image.astype(np.float32) / 255.0
+        image = (image - self.mean) / self.std
+        return image
+
+    # ============================================================
+    # 배치 경로
+    # ============================================================
+
+    def process_batch(self, images, workers: int = 1):
+        """배치 전처리 (torch.Tensor (N, 3, S, S))
+
+        Args:
+            images: (N, H, W, 3) uint8 배열 또는 크기가 서로 다른 RGB 이미지 리스트
+            workers: 리사이즈/CLAHE 스레드 수 (cv2는 GIL을 놓으므로 스레드로 병렬화)
+        """
+        import torch
+
+        return torch.from_numpy(self.process_batch_numpy(images, workers=workers))
+
+    def process_batch_numpy(self, images, out: Optional[np.ndarray] = None, workers: int = 1) -> np.ndarray:
+        """process_batch와 동일한 결과를 float32 ndarray (N, 3, S, S)로 반환
+
+        Args:
+            out: 미리 할당된 출력 버퍼 (N, 3, S, S) float32 (재사용 시 할당 없음)
+        """
+        batch = self._resize_batch(images, workers)
+        n = len(batch)
+        size = self.target_size
+
+        if self.enable_clahe:
+            # RGB↔LAB은 픽셀 단위 변환이므로 배치 전체를 (N*S, S, 3) 한 장으로 변환
+            lab = cv2.cvtColor(batch.reshape(n * size, size, 3), cv2.COLOR_RGB2LAB).reshape(n, size, size, 3)
+            self._map(self._clahe_l_channel, lab, workers)
+            batch = cv2.cvtColor(lab.reshape(n * size, size, 3), cv2.COLOR_LAB2RGB).reshape(n, size, size, 3)
+
+        if out is None:
+            out = np.empty((n, 3, size, size), dtype=np.float32)
+        elif out.shape != (n, 3, size, size) or out.dtype != np.float32:
+            raise ValueError(f"출력 버퍼 shape/dtype 불일치: {out.shape} {out.dtype}")
+
+        # 정규화 + HWC→CHW: 채널별 LUT 조회를 출력 버퍼에 바로 기록
+        for c in range(3):
+            np.take(self._lut[c], batch[..., c], out=out[:, c], mode='clip')
+        return out
+
+    def _resize_batch(self, images, workers: int) -> np.ndarray:
+        """(N, S, S, 3) uint8 연속 배열로 크롭/리사이즈 (이미 S×S면 그대로 사용)"""
+        size = self.target_size
+        if isinstance(images, np.ndarray) and images.shape[1:] == (size, size, 3):
+            return np.ascontiguousarray(images, dtype=np.uint8)
+
+        batch = np.empty((len(images), size, size, 3), dtype=np.uint8)
+
+        def resize_into(i):
+            batch[i] = self._center_crop_and_resize(images[i])
+
+        self._map(resize_into, range(len(images)), workers)
+        return batch
+
+    def _clahe_l_channel(self, lab: np.ndarray):
+        """LAB 이미지 1장의 L 채널에 CLAHE 적용 (제자리)"""
+        lab[..., 0] = self.clahe.apply(np.ascontiguousarray(lab[..., 0]))
+
+    @staticmethod
+    def _map(func, items, workers: int):
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(func, items))
+        else:
+            for item in items:
+                func(item)
+
+    def get_config(self) -> dict:
+        """전처리 설정 반환 (다른 시스템과 동기화용)"""
+        return {
+            'target_size': self.target_size,
+            'enable_clahe': self.enable_clahe,
+            'clahe_clip_limit': self.clahe_clip_limit,
+            'clahe_grid_size': self.clahe_grid_size,
+            'normalization_mean': self.mean,
+            'normalization_std': self.std,
+            'version': PREPROCESSOR_VERSION
+        }
+
+
+# ============================================================
+# 검증 / 벤치마크
+# ============================================================
+
+def synthetic_images(n: int, height: int = 720, width: int = 960, seed: int = 0) -> Sequence[np.ndarray]:
+    """그라데이션 + 노이즈 RGB 이미지 (CLAHE가 실제로 동작하도록 명암 변화 포함)"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    images = []
+    for _ in range(n):
+        base = (xx * rng.uniform(0.05, 0.3) + yy * rng.uniform(0.05, 0.3)) % 256
+        image = base[..., None] + rng.integers(-40, 40, (height, width, 3))
+        images.append(np.clip(image, 0, 255).astype(np.uint8))
+    return images
+
+
+def verify(preprocessor: UnifiedPreprocessor, n: int, batch_size: int, workers: int) -> bool:
+    images = synthetic_images(n)
+    single = np.stack([preprocessor.process_numpy(image) for image in images])
+    batched = np.concatenate([
+        preprocessor.process_batch_numpy(images[i:i + batch_size], workers=workers)
+        for i in range(0, n, batch_size)
+    ])
+    # 이미 리사이즈된 (N, S, S, 3) 배열 입력 경로도 확인
+    resized = np.stack([preprocessor._center_crop_and_resize(image) for image in images])
+    from_array = preprocessor.process_batch_numpy(resized, workers=workers)
+
+    exact = single.tobytes() == batched.tobytes() == from_array.tobytes()
+    print(f"{'✅' if exact else '❌'} 배치 경로 비트 일치: {exact} ({n}장, batch={batch_size}, workers={workers})")
+    return exact
+
+
+def run_benchmark(preprocessor: UnifiedPreprocessor, n: int, batch_size: int, workers: int):
+    images = synthetic_images(n)
+    out = np.empty((batch_size, 3, preprocessor.target_size, preprocessor.target_size), dtype=np.float32)
+
+    started = time.perf_counter()
+    for image in images:
+        preprocessor.process_numpy(image)
+    single_rate = n / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(0, n, batch_size):
+        chunk = images[i:i + batch_size]
+        preprocessor.process_batch_numpy(chunk, out=out if len(chunk) == batch_size else None, workers=workers)
+    batch_rate = n / (time.perf_counter() - started)
+
+    print(f"\n⏱️  전처리 벤치마크 ({n}장, {images[0].shape[1]}x{images[0].shape[0]} → {preprocessor.target_size})")
+    print(f"  - 단일 경로: {single_rate:,.1f} img/s")
+    print(f"  - 배치 경로 (batch={batch_size}, workers={workers}): {batch_rate:,.1f} img/s "
+          f"({batch_rate / single_rate:.2f}배)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UnifiedPreprocessor 배치 경로 검증/벤치마크')
+    parser.add_argument('--verify', type=int, metavar='N', help='합성 이미지 N장으로 단일/배치 비트 일치 확인')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='합성 이미지 N장 처리량 비교')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1, help='배치 경로 리사이즈/CLAHE 스레드 수')
+    parser.add_argument('--target-size', type=int, default=512)
+    parser.add_argument('--no-clahe', action='store_true')
+    args = parser.parse_args()
+
+    preprocessor = UnifiedPreprocessor(target_size=args.target_size, enable_clahe=not args.no_clahe)
+    if args.verify and not verify(preprocessor, args.verify, args.batch_size, args.workers):
+        sys.exit(1)
+    if args.benchmark:
+        run_benchmark(preprocessor, args.benchmark, args.batch_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+pytest 공통 설정 - scripts/, scripts/data_prep/, src/, 저장소 루트를 import 경로에 추가 + 공용 fixture
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+for path in (ROOT, ROOT / 'src', ROOT / 'scripts', ROOT / 'scripts' / 'data_prep'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def tiny_model(tmp_path):
+    """onnx로 만든 작은 100클래스 분류 모델 + class_mapping.json (onnx 없으면 skip)
+
+    Returns:
+        {'model': 모델 경로, 'class_mapping': 매핑 경로}
+    """
+    onnx = pytest.importorskip('onnx')
+    from onnx import TensorProto, helper, numpy_helper
+
+    size, num_classes = 64, 100
+    rng = np.random.default_rng(0)
+    weights = [
+        numpy_helper.from_array((rng.standard_normal((8, 3, 3, 3)) * 0.2).astype(np.float32), 'W'),
+        numpy_helper.from_array(np.zeros(8, dtype=np.float32), 'B'),
+        numpy_helper.from_array(rng.standard_normal((8, num_classes)).astype(np.float32), 'G'),
+    ]
+    nodes = [
+        helper.make_node('Conv', ['input', 'W', 'B'], ['conv'], strides=[2, 2], pads=[1, 1, 1, 1]),
+        helper.make_node('Relu', ['conv'], ['relu']),
+        helper.make_node('GlobalAveragePool', ['relu'], ['pool']),
+        helper.make_node('Flatten', ['pool'], ['flat']),
+        helper.make_node('MatMul', ['flat', 'G'], ['output']),
+    ]
+    graph = helper.make_graph(
+        nodes, 'tiny',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch_size', 3, size, size])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['batch_size', num_classes])],
+        weights,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    model_path = tmp_path / 'tiny.onnx'
+    onnx.save(model, str(model_path))
+
+    kcodes = [f'K-{900000 + i:06d}' for i in range(num_classes)]
+    mapping_path = tmp_path / 'class_mapping.json'
+    mapping_path.write_text(json.dumps({
+        'idx_to_class': {str(i): kcode for i, kcode in enumerate(kcodes)},
+        'metadata': {kcode: {'drug_name': kcode, 'manufacturer': ''} for kcode in kcodes},
+    }), encoding='utf-8')
+    return {'model': str(model_path), 'class_mapping': str(mapping_path)}
@@ -0,0 +1,71 @@
+"""
+bulk_load_drugs 테스트 - SQLite stand-in으로 청크 적재/merge 흐름 확인
+"""
+
+import csv
+
+import pytest
+
+import bulk_load_drugs as bld
+
+
+def write_catalog(path, records):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['K-CODE', 'EDI', 'Drug_Name', 'Manufacturer', 'Usage_Count'])
+        writer.writeheader()
+        writer.writerows(records)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / 'catalog.csv'
+    write_catalog(path, [
+        {'K-CODE': 'K-000101', 'EDI': '640000001', 'Drug_Name': '약101', 'Manufacturer': 'A', 'Usage_Count': '10'},
+        {'K-CODE': 'k102', 'EDI': '640000002', 'Drug_Name': '약102', 'Manufacturer': '', 'Usage_Count': '3.0'},
+        {'K-CODE': '103', 'EDI': '', 'Drug_Name': '약103', 'Manufacturer': 'C', 'Usage_Count': 'abc'},
+        {'K-CODE': 'bad', 'EDI': '640000009', 'Drug_Name': '무효', 'Manufacturer': '', 'Usage_Count': '1'},
+        {'K-CODE': 'K-000104', 'EDI': '640000004', 'Drug_Name': '약104', 'Manufacturer': 'D', 'Usage_Count': 'nan'},
+        # 다른 표기의 같은 K-CODE (청크 경계 너머) → 마지막 값 유지
+        {'K-CODE': ' K-101 ', 'EDI': '640000011', 'Drug_Name': '약101-갱신', 'Manufacturer': 'A', 'Usage_Count': '12'},
+    ])
+    return path
+
+
+def test_drug_row_normalizes_and_guards_usage():
+    row = bld.drug_row({'kcode': 'k-12', 'edi_code': '', 'drug_name': None, 'usage_count': 'inf'})
+    assert row == ('K-000012', None, '', None, None, None)
+    assert bld.parse_usage('7.9') == 7
+    assert bld.parse_usage(' ') is None
+
+
+def test_chunks_are_deduped_across_boundaries(catalog):
+    chunks = list(bld.iter_chunks(bld.iter_drugs(catalog), chunk_size=2))
+    kcodes = [row[0] for rows in chunks for row in rows]
+    assert kcodes == ['K-000101', 'K-000102', 'K-000103', 'K-000104']
+    assert [len(rows) for rows in chunks] == [2, 2]
+
+
+def test_sqlite_load_and_reload_is_idempotent(catalog, tmp_path):
+    db_path = tmp_path / 'drugs.db'
+    for _ in range(2):
+        loader = bld.SQLiteLoader(str(db_path))
+        try:
+            total, _ = bld.run_load(loader, bld.iter_chunks(bld.iter_drugs(catalog), chunk_size=2))
+            rows = loader.conn.execute(
+                "SELECT kcode, edi_code, drug_name, manufacturer, usage_count FROM drugs_master ORDER BY kcode"
+            ).fetchall()
+        finally:
+            loader.close()
+        assert total == 4
+
+    assert rows == [
+        ('K-000101', '640000011', '약101-갱신', 'A', 12),
+        ('K-000102', '640000002', '약102', None, 3),
+        ('K-000103', None, '약103', 'C', None),
+        ('K-000104', '640000004', '약104', 'D', None),
+    ]
+
+
+def test_dry_run_default_does_not_target_committed_sql():
+    from load_drugs_to_supabase import output_path
+    assert bld.DRY_RUN_OUTPUT_PATH != output_path
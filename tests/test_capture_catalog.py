@@ -0,0 +1,69 @@
+"""
+capture_catalog 파일명 규칙 테스트 - 카탈로그에서 복원한 경로가 실제 파일과 같은지 확인
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import capture_catalog as cc
+
+CANONICAL = [
+    'K-030864_0_3_front_0_90_000_200.jpg',
+    'K-030864_4_8_back_0_90_315_200.jpg',
+    'K-030864_0_0_0_0_90_045_200.png',     # 기존 스튜디오 (숫자형 면)
+    'K-030864_0_0_1_0_90_000_200.jpg',     # 촬영 프로토콜 문서의 숫자형 back
+    'K-030864_0_1_9_0_90_1000_200.jpg',
+]
+NON_CANONICAL = [
+    'K-030864_0_3_front_0_90_45_200.jpg',  # 회전각 3자리 아님
+    'K-030864_0_3_front_0_090_000_200.jpg',  # 앙각 앞자리 0
+    'K-030864_00_3_front_0_90_000_200.jpg',
+    'K-030864_0_3_01_0_90_000_200.jpg',
+    'K-030864_0_3_front_0_90_0450_200.jpg',
+    'K-030864_300_3_front_0_90_000_200.jpg',  # u1 범위 초과
+    'K-030864_0_3_front_0_256_000_200.jpg',
+    'K-030864_0_3_front_0_90_000_70000.jpg',  # u2 범위 초과
+]
+
+
+@pytest.mark.parametrize('name', CANONICAL)
+def test_parse_format_round_trip(name):
+    fields = cc.parse_filename(name)
+    assert fields is not None
+    assert cc.format_filename(fields) == name
+
+
+@pytest.mark.parametrize('name', NON_CANONICAL)
+def test_non_canonical_names_rejected(name):
+    assert cc.parse_filename(name) is None
+
+
+def test_numeric_side_keeps_original_token():
+    assert cc.parse_filename('K-030864_0_0_1_0_90_000_200.jpg')['side_num'] == 1
+    assert cc.parse_filename('K-030864_0_3_back_0_90_000_200.jpg')['side'] == 1
+
+
+def test_catalog_paths_resolve_to_real_files(tmp_path):
+    kcode_dir = tmp_path / 'CS_1_single' / 'K-030864'
+    kcode_dir.mkdir(parents=True)
+    for name in CANONICAL + NON_CANONICAL:
+        (kcode_dir / name).write_bytes(b'')
+
+    records, dirs, invalid = cc.build_catalog([tmp_path], workers=1)
+    catalog = cc.CaptureCatalog(records, dirs)
+
+    assert sorted(os.path.basename(p) for p in invalid) == sorted(NON_CANONICAL)
+    paths = [catalog.path_of(i) for i in range(len(catalog))]
+    assert sorted(paths) == sorted(str(kcode_dir / name) for name in CANONICAL)
+    assert all(os.path.exists(p) for p in paths)
+    assert set(records['session']) == {1}
+
+
+def test_load_rejects_old_index_format(tmp_path):
+    old_dtype = np.dtype([(name, cc.CATALOG_DTYPE[name]) for name in cc.CATALOG_DTYPE.names if name != 'side_num'])
+    path = tmp_path / 'old.npz'
+    np.savez(path, records=np.zeros(1, dtype=old_dtype), dirs=np.array(['x']))
+    with pytest.raises(ValueError):
+        cc.CaptureCatalog.load(path)
@@ -0,0 +1,54 @@
+"""
+capture_quality 테스트 - 원본 해상도 사진을 분석 크기로 줄여 읽고 픽셀 상한 단위로 계산하는지 확인
+"""
+
+import numpy as np
+from PIL import Image
+
+import capture_quality as cq
+
+
+def write_jpegs(tmp_path, n, size):
+    paths = []
+    for i, image in enumerate(cq.synthetic_stack(n, size=200, seed=3)):
+        path = tmp_path / f'{i}.jpg'
+        Image.fromarray(image).resize(size, Image.BILINEAR).save(path, quality=95)
+        paths.append(str(path))
+    return paths
+
+
+def test_large_photos_are_downscaled_on_load(tmp_path):
+    path, = write_jpegs(tmp_path, 1, (2400, 1800))
+    image = cq._load_rgb(path)
+    assert max(image.shape[:2]) == cq.ANALYSIS_SIZE
+    assert image.shape == (768, 1024, 3)
+
+
+def test_small_photos_are_not_upscaled(tmp_path):
+    path, = write_jpegs(tmp_path, 1, (200, 200))
+    assert cq._load_rgb(path).shape == (200, 200, 3)
+
+
+def test_pixel_budget_does_not_change_scores(tmp_path):
+    paths = write_jpegs(tmp_path, 5, (1200, 900))
+    whole = cq.score_paths(paths)
+    split = cq.score_paths(paths, max_pixels=2 * 1024 * 768)   # 2장씩
+    assert [p for p, _, _, _ in whole] == [p for p, _, _, _ in split]
+    np.testing.assert_allclose(np.stack([s for _, s, _, _ in whole]), np.stack([s for _, s, _, _ in split]))
+    assert [g for _, _, g, _ in whole] == [g for _, _, g, _ in split]
+
+
+def test_corrupt_file_does_not_abort_scoring(tmp_path):
+    paths = write_jpegs(tmp_path, 2, (300, 300))
+    truncated = tmp_path / 'truncated.jpg'
+    truncated.write_bytes(open(paths[0], 'rb').read()[:200])
+    garbage = tmp_path / 'garbage.jpg'
+    garbage.write_bytes(b'not a jpeg')
+
+    results = cq.score_files([paths[0], truncated, garbage, paths[1]], workers=1)
+
+    for bad in (truncated, garbage):
+        assert results[str(bad)]['quality_grade'] == 'C'
+        assert results[str(bad)]['blur_score'] == 0.0
+        assert results[str(bad)]['error'].startswith('디코딩 실패')
+    assert results[paths[0]]['error'] is None and results[paths[1]]['error'] is None
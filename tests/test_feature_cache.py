@@ -0,0 +1,66 @@
+"""
+feature_cache 테스트 - 경로 목록이 바뀌면 seed 캐시 재생성, spawn 워커 풀 결과가 단일 프로세스와 같은지 확인
+(onnx / onnxruntime / opencv가 없으면 skip)
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip('cv2')
+pytest.importorskip('onnxruntime')
+
+import feature_cache as fc  # noqa: E402
+
+
+@pytest.fixture
+def build_args(tiny_model, tmp_path):
+    from inference.embedding_index import add_embedding_output
+
+    rng = np.random.default_rng(0)
+    items = []
+    for i in range(4):
+        path = tmp_path / f'{i}.png'
+        Image.fromarray(rng.integers(0, 256, (48, 48, 3), dtype=np.uint8)).save(path)
+        items.append({'path': str(path), 'label': i % 2, 'kcode': f'K-{900000 + i % 2:06d}'})
+    splits_path = tmp_path / 'splits.json'
+    splits_path.write_text(json.dumps({'train': items}), encoding='utf-8')
+
+    return argparse.Namespace(
+        splits=str(splits_path), shards=None, model=str(add_embedding_output(tiny_model['model'])),
+        class_mapping=tiny_model['class_mapping'], metadata=None, output=str(tmp_path / 'features'),
+        seeds=[0, 1], workers=1, batch_size=2,
+    )
+
+
+def test_reordered_paths_invalidate_seeds(build_args):
+    fc.build_cache(build_args)
+    before = np.load(f'{build_args.output}/train/seed-0.npy')
+    assert fc.load_index(build_args.output)['splits']['train']['seeds'] == [0, 1]
+
+    # 같은 레이블끼리 자리만 바꿈 → 수/레이블은 같지만 행마다 다른 이미지
+    with open(build_args.splits, 'r', encoding='utf-8') as f:
+        items = json.load(f)['train']
+    items[0]['path'], items[2]['path'] = items[2]['path'], items[0]['path']
+    with open(build_args.splits, 'w', encoding='utf-8') as f:
+        json.dump({'train': items}, f)
+
+    fc.build_cache(build_args)
+    after = np.load(f'{build_args.output}/train/seed-0.npy')
+    info = fc.load_index(build_args.output)['splits']['train']
+    assert info['paths_sha256'] == fc.paths_digest(item['path'] for item in items)
+    np.testing.assert_array_equal(after[0], before[2])
+    np.testing.assert_array_equal(after[2], before[0])
+
+
+def test_spawned_workers_match_single_process(build_args, tmp_path):
+    fc.build_cache(build_args)
+    single = np.load(f'{build_args.output}/train/seed-1.npy')
+
+    build_args.output, build_args.workers = str(tmp_path / 'features-pool'), 2
+    fc.build_cache(build_args)
+    assert fc._ENGINE is None   # 풀 시작 전에 프로브 세션 해제
+    np.testing.assert_array_equal(np.load(f'{build_args.output}/train/seed-1.npy'), single)
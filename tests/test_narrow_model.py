@@ -0,0 +1,61 @@
+"""
+NarrowModelInference 테스트 - 디코딩/전처리 실패가 같은 배치의 다른 이미지에 영향을 주지 않는지 확인
+(onnxruntime / opencv가 없으면 skip)
+"""
+
+import importlib
+import sys
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def engine(tiny_model):
+    pytest.importorskip('onnxruntime')
+    cv2 = pytest.importorskip('cv2')
+    from inference.narrow_model import NarrowModelInference
+
+    engine = NarrowModelInference(tiny_model['model'], tiny_model['class_mapping'], metadata_path=None,
+                                  providers=['CPUExecutionProvider'])
+    image = np.random.default_rng(0).integers(0, 256, (80, 60, 3), dtype=np.uint8)
+    engine.test_jpeg = cv2.imencode('.jpg', image)[1].tobytes()
+    return engine
+
+
+def test_bad_images_are_isolated(engine):
+    images = [engine.test_jpeg, b'', b'not an image', engine.test_jpeg]
+    results = engine.predict_batch(images, return_exceptions=True)
+
+    assert isinstance(results[1], Exception)   # 빈 바이트 → cv2.error
+    assert isinstance(results[2], ValueError)  # 디코딩 실패
+    assert results[0]['success'] and results[3]['success']
+    assert results[0]['top1'] == results[3]['top1']
+
+
+def test_preprocess_failure_is_isolated(engine, monkeypatch):
+    cv2 = sys.modules['cv2']
+    process = engine.preprocessor.process_batch_numpy
+
+    def fail_on_tiny(images, *args, **kwargs):
+        if any(min(image.shape[:2]) < 2 for image in images):
+            raise cv2.error('too small')
+        return process(images, *args, **kwargs)
+
+    monkeypatch.setattr(engine.preprocessor, 'process_batch_numpy', fail_on_tiny)
+    monkeypatch.setattr(engine, 'decode', lambda data: (
+        np.zeros((1, 1, 3), np.uint8) if data == b'tiny' else type(engine).decode(data)))
+
+    results = engine.predict_batch([engine.test_jpeg, b'tiny'], return_exceptions=True)
+    assert results[0]['success']
+    assert isinstance(results[1], cv2.error)
+
+    with pytest.raises(cv2.error):
+        engine.predict_batch([engine.test_jpeg, b'tiny'])
+
+
+def test_missing_dependency_raises_import_error(monkeypatch):
+    narrow_model = importlib.import_module('inference.narrow_model')
+    monkeypatch.setitem(sys.modules, 'onnxruntime', None)
+    with pytest.raises(ImportError, match='pip install onnxruntime'):
+        narrow_model._import('onnxruntime')
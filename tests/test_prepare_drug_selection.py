@@ -0,0 +1,188 @@
+"""
+prepare_drug_selection 회귀 테스트
+리팩터링 전 스크립트(baseline)의 루프 로직을 그대로 옮긴 baseline_selection()과
+현재 loop/vectorized 엔진 결과를 작은 fixture로 비교
+
+baseline은 set 순회 + 불안정 정렬이라 동점 순서와 "같은 EDI 중 어느 K-CODE가 남는지"가
+실행마다 달라질 수 있다. 현재 엔진은 K-CODE 오름차순 + 안정 정렬로 이를 고정했으므로
+동점 구간은 baseline 후보 중 하나인지로 검증한다.
+"""
+
+import pandas as pd
+import pytest
+
+import prepare_drug_selection as pds
+
+
+# ============================================================
+# baseline (리팩터링 전 main()의 1~4단계 + 중복 제거)
+# ============================================================
+
+def baseline_selection(sheets, label_map, drugs_master, actual_df):
+    normalize_kcode = pds.normalize_kcode
+
+    all_kcodes = set()
+    for df, sheet_name in sheets:
+        kcode_cols = [col for col in df.columns if 'K' in str(col).upper() or 'CODE' in str(col).upper()]
+        if kcode_cols:
+            for kcode in df[kcode_cols[0]].dropna():
+                normalized = normalize_kcode(kcode)
+                if normalized:
+                    all_kcodes.add(normalized)
+        else:
+            first_col = df.iloc[:, 0].dropna()
+            if any('K' in str(val).upper() for val in first_col.head()):
+                for kcode in first_col:
+                    normalized = normalize_kcode(kcode)
+                    if normalized:
+                        all_kcodes.add(normalized)
+
+    kcode_to_edi = {}
+    for kcode, info in label_map.items():
+        normalized = normalize_kcode(kcode)
+        if normalized and isinstance(info, dict):
+            if 'edi_codes' in info and info['edi_codes']:
+                edi_code = str(info['edi_codes'][0]).strip() if info['edi_codes'] else ''
+                if edi_code:
+                    kcode_to_edi[normalized] = {
+                        'edi': edi_code,
+                        'source': 'kcode_label_map',
+                        'drug_name': (info.get('name_kr') or '').strip(),
+                        'manufacturer': (info.get('company') or '').strip()
+                    }
+
+    for _, row in drugs_master.iterrows():
+        kcode = normalize_kcode(row.get('kcode') or row.get('K-CODE') or row.get('k_code'))
+        edi = row.get('edi_code') or row.get('EDI') or row.get('edi')
+        if kcode and edi and kcode not in kcode_to_edi:
+            kcode_to_edi[kcode] = {
+                'edi': str(edi).strip(),
+                'source': 'drugs_master',
+                'drug_name': (row.get('item_name') or '').strip(),
+                'manufacturer': (row.get('entp_name') or '').strip()
+            }
+
+    edi_usage = {}
+    edi_grouped = actual_df[actual_df['edi'].notna()].groupby('edi')['quantity'].sum().sort_values(ascending=False)
+    for edi, count in edi_grouped.items():
+        edi_usage[str(edi).strip()] = int(count)
+
+    rows = []
+    for kcode in all_kcodes:
+        row = {'K-CODE': kcode, 'EDI': '', 'Drug_Name': '', 'Manufacturer': '',
+               'Usage_Count': 0, 'Mapping_Source': 'none', 'In_Dataset': 'Y'}
+        if kcode in kcode_to_edi:
+            mapping = kcode_to_edi[kcode]
+            row['EDI'] = mapping['edi']
+            row['Drug_Name'] = mapping['drug_name']
+            row['Manufacturer'] = mapping['manufacturer']
+            row['Mapping_Source'] = mapping['source']
+            if mapping['edi'] in edi_usage:
+                row['Usage_Count'] = edi_usage[mapping['edi']]
+        rows.append(row)
+
+    candidates = pd.DataFrame(rows).sort_values('Usage_Count', ascending=False)
+    before_dedup = len(candidates)
+    df_with_edi = candidates[candidates['EDI'] != '']
+    df_without_edi = candidates[candidates['EDI'] == '']
+    df_dedup = df_with_edi.drop_duplicates(subset=['EDI'], keep='first')
+    result_df = pd.concat([df_dedup, df_without_edi]).sort_values('Usage_Count', ascending=False)
+    return candidates, result_df, before_dedup - len(result_df)
+
+
+# ============================================================
+# fixture
+# ============================================================
+
+@pytest.fixture
+def inputs():
+    # 시트 1: K-CODE 컬럼 (접두어/공백/소문자/숫자형/무효 값 혼합)
+    sheet1 = pd.DataFrame({'K-CODE': ['K-000101', 'K102', '103', 104, ' k-000105 ', 'bad', None,
+                                      'K-000106', 'K-000107', 'K-000108', 'K-000109', 'K-000110']})
+    # 시트 2: K-CODE 컬럼명 없음 → 첫 컬럼 사용, 시트 1과 일부 중복
+    sheet2 = pd.DataFrame({'name': ['K-000101', 'K-000111', 'K-000112', 'K-000113'], 'x': 1})
+
+    label_map = {
+        'K-000101': {'edi_codes': ['640000001'], 'name_kr': '약101 ', 'company': 'A'},
+        '102': {'edi_codes': [' 640000002 '], 'name_kr': None, 'company': 'B'},
+        'K-000103': {'edi_codes': [], 'name_kr': '빈EDI'},
+        'K-000104': {'edi_codes': ['640000004'], 'name_kr': '약104'},
+        '104': {'edi_codes': ['640000044'], 'name_kr': '약104-덮어씀'},   # 같은 K-CODE → 뒤 항목 우선
+        'K-000106': {'edi_codes': ['640000006'], 'name_kr': '공유EDI-a'},
+        'K-000107': {'edi_codes': ['640000006'], 'name_kr': '공유EDI-b'},   # 같은 EDI → 중복 제거 대상
+        'junk': {'edi_codes': ['1']},
+    }
+    drugs_master = pd.DataFrame({
+        'kcode': ['K-000103', '', 'K-000108', 'K-000109', 'K-000101', 'K-000110', 'K-000108'],
+        'K-CODE': ['', '105', '', '', '', '', ''],
+        'edi_code': ['640000003', '640000005', '640000008', '', '649999999', '640000010', '640000088'],
+        'EDI': ['', '', '', '640000009', '', '', ''],
+        'item_name': ['약103', '약105 ', '약108', '약109', '무시', '약110', '중복-무시'],
+        'entp_name': ['C', 'D', 'E', 'F', 'G', 'H', 'I'],
+    }, dtype=str)
+    actual_df = pd.DataFrame({
+        'drug_name': ['x'] * 11,
+        'edi': ['640000001', '640000002', '640000002', ' 640000004', '640000044', '640000005',
+                '640000006', '640000008', '640000009', None, '640000010'],
+        'quantity': [5.0, 3.0, 4.0, 9.0, 7.0, 7.0, 2.0, 0.0, 5.0, 100.0, 3.5],
+    })
+
+    return {
+        'sheets': [(sheet1, 'Sheet1'), (sheet2, 'Sheet2')],
+        'label_map': label_map,
+        'drugs_master': drugs_master,
+        'actual_df': actual_df,
+        'edi_totals': pds.aggregate_edi_quantity(actual_df),
+    }
+
+
+# ============================================================
+# 테스트
+# ============================================================
+
+@pytest.mark.parametrize('engine', ['loop', 'vectorized'])
+def test_matches_baseline(inputs, engine):
+    candidates, baseline_df, baseline_removed = baseline_selection(
+        inputs['sheets'], inputs['label_map'], inputs['drugs_master'], inputs['actual_df'])
+    result_df, removed = pds.build_selection(inputs, engine=engine)
+
+    assert removed == baseline_removed
+    assert list(result_df.columns) == list(baseline_df.columns)
+    # 사용량 내림차순 순서 자체는 동일
+    assert list(result_df['Usage_Count']) == list(baseline_df['Usage_Count'])
+
+    # EDI 없는 행은 완전히 동일 (순서만 K-CODE로 고정)
+    def without_edi(df):
+        return df[df['EDI'] == ''].sort_values('K-CODE').reset_index(drop=True)
+    pd.testing.assert_frame_equal(without_edi(result_df), without_edi(baseline_df), check_dtype=False)
+
+    # EDI 있는 행: 남은 EDI 집합이 같고, 남은 행은 baseline의 같은 EDI 후보 중 하나
+    result_edi = result_df[result_df['EDI'] != '']
+    assert set(result_edi['EDI']) == set(baseline_df.loc[baseline_df['EDI'] != '', 'EDI'])
+    for row in result_edi.to_dict('records'):
+        options = candidates[candidates['EDI'] == row['EDI']].to_dict('records')
+        assert row in options
+
+
+def test_shared_edi_keeps_lowest_kcode(inputs):
+    """의도한 순서 변경: 같은 EDI 중에는 K-CODE가 가장 작은 행이 남고, 동점은 K-CODE 오름차순"""
+    result_df, _ = pds.build_selection(inputs, engine='vectorized')
+    shared = result_df[result_df['EDI'] == '640000006']
+    assert list(shared['K-CODE']) == ['K-000106']
+
+    for _, group in result_df[result_df['EDI'] != ''].groupby('Usage_Count'):
+        assert list(group['K-CODE']) == sorted(group['K-CODE'])
+
+
+def test_loop_and_vectorized_identical(inputs):
+    loop_df, loop_removed = pds.build_selection(inputs, engine='loop')
+    vec_df, vec_removed = pds.build_selection(inputs, engine='vectorized')
+    assert loop_removed == vec_removed
+    pd.testing.assert_frame_equal(loop_df.reset_index(drop=True), vec_df.reset_index(drop=True), check_dtype=False)
+
+
+def test_normalize_kcode_series_matches_scalar():
+    values = ['K-12', 'k-000123', 'K1_000', ' 7 ', '-5', '+42', 104, 'bad', None, '',
+              '99999999999999999999999', 'K-0000000000000000000000000321']
+    vectorized = [None if pd.isna(v) else v for v in pds.normalize_kcode_series(values)]
+    assert vectorized == [pds.normalize_kcode(v) for v in values]
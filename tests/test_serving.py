@@ -0,0 +1,23 @@
+"""
+serving 헬퍼 테스트 - onnx / onnxruntime이 없으면 프로세스를 종료하지 않고 ImportError로 알림
+"""
+
+import sys
+
+import pytest
+
+from inference import serving
+
+
+def test_session_options_missing_onnxruntime_raises_import_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'onnxruntime', None)   # import onnxruntime → ImportError
+    with pytest.raises(ImportError, match='pip install onnxruntime'):
+        serving.session_options(workers=2)
+
+
+def test_prepare_shared_model_missing_onnx_raises_import_error(monkeypatch, tmp_path):
+    monkeypatch.setitem(sys.modules, 'onnx', None)
+    model_path = tmp_path / 'model.onnx'
+    model_path.write_bytes(b'')
+    with pytest.raises(ImportError, match='pip install onnx'):
+        serving.prepare_shared_model(model_path)
@@ -0,0 +1,41 @@
+"""
+콜드 스타트 벤치마크 테스트 - 두 번째 시작에서 최적화 모델 캐시를 재사용하는지 확인
+(onnxruntime / opencv가 없으면 skip)
+"""
+
+import argparse
+
+import pytest
+
+from inference import startup
+
+
+@pytest.fixture
+def startup_args(tiny_model, tmp_path):
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('cv2')
+    return argparse.Namespace(model=tiny_model['model'], class_mapping=tiny_model['class_mapping'],
+                              metadata=str(tmp_path / 'missing_metadata.json'), batch_sizes='1,2')
+
+
+def test_second_start_reuses_optimized_model(startup_args, tmp_path):
+    optimized_dir = tmp_path / 'ort_cache'
+
+    cold = startup.run_child(startup_args, str(optimized_dir))
+    cached = startup.run_child(startup_args, str(optimized_dir))
+
+    assert cold['optimized_model'] is None
+    assert cached['optimized_model'] is not None
+    assert cached['optimized_model'].startswith(str(optimized_dir))
+    for result in (cold, cached):
+        assert result['time_to_first_prediction_s'] > 0
+        assert result['ready_s'] <= result['time_to_first_prediction_s']
+
+
+def test_refuses_non_empty_optimized_dir(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'stale').mkdir()
+    monkeypatch.setattr('sys.argv', ['startup.py', '--model', 'x.onnx', '--optimized-dir', str(tmp_path)])
+    with pytest.raises(SystemExit) as exc:
+        startup.main()
+    assert exc.value.code == 1
+    assert '비어 있지 않습니다' in capsys.readouterr().out
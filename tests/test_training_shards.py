@@ -0,0 +1,43 @@
+"""
+training_shards 이미지 로드 테스트 - 읽을 수 없는 파일은 경로가 담긴 ValueError
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import training_shards as ts
+
+
+def test_load_resized_crops_and_resizes(tmp_path):
+    path = tmp_path / 'wide.png'
+    Image.fromarray(np.full((60, 100, 3), 200, dtype=np.uint8)).save(path)
+    image = ts.load_resized(path, 32)
+    assert image.shape == (32, 32, 3) and image.dtype == np.uint8
+
+
+@pytest.mark.parametrize('name, data', [
+    ('garbage.jpg', b'not a jpeg'),
+    ('empty.jpg', b''),
+])
+def test_unreadable_image_raises_value_error(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    with pytest.raises(ValueError, match=name):
+        ts.load_resized(path, 32)
+
+
+def test_missing_file_raises_value_error(tmp_path):
+    with pytest.raises(ValueError, match='missing.jpg'):
+        ts.load_resized(tmp_path / 'missing.jpg', 32)
+
+
+def test_unreadable_image_fails_shard_writing_with_path(tmp_path):
+    good = tmp_path / 'good.png'
+    Image.fromarray(np.zeros((40, 40, 3), dtype=np.uint8)).save(good)
+    bad = tmp_path / 'bad.jpg'
+    bad.write_bytes(b'not a jpeg')
+    items = [{'path': str(good), 'label': 0, 'kcode': 'K-000001'},
+             {'path': str(bad), 'label': 1, 'kcode': 'K-000002'}]
+    with pytest.raises(ValueError, match='bad.jpg'):
+        ts.write_split_shards(items, tmp_path / 'shards', 32, workers=1)
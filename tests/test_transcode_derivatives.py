@@ -0,0 +1,81 @@
+"""
+transcode_derivatives 재실행 테스트 - mock Supabase 서버 기준
+로컬 변환만 한 미러로 --upload를 실행하면 다시 변환하지 않고 업로드하고, 실패한 업로드는 다음 실행에서 재시도
+"""
+
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import transcode_derivatives as td
+import upload_capture_photos as ucp
+from mock_supabase_server import start_mock_server
+
+NAMES = ['K-000001_0_3_front_0_90_000_200.jpg', 'K-000001_0_3_back_0_90_045_200.jpg']
+
+
+@pytest.fixture
+def capture_root(tmp_path):
+    drug_dir = tmp_path / 'captures' / 'CS_1_single' / 'K-000001'
+    drug_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for name in NAMES:
+        Image.fromarray(rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)).save(drug_dir / name, quality=90)
+    return tmp_path / 'captures'
+
+
+@pytest.fixture
+def mock_server():
+    server, url, store = start_mock_server()
+    store.tables[td.PHOTOS_TABLE] = [{'id': str(i), 'photo_url': f'CS_1_single/K-000001/{name}'}
+                                     for i, name in enumerate(NAMES)]
+    yield url, store
+    server.shutdown()
+
+
+def run(capture_root, output_dir, url=None, upload=False, retries=0):
+    pipeline = td.DerivativePipeline(td.make_variants(), output_dir=output_dir, workers=1, io_workers=2,
+                                     url=url, key='mock', upload=upload, retries=retries)
+    return pipeline, pipeline.run(pipeline.local_sources([capture_root]))
+
+
+def derived_objects(store):
+    return sorted(path for _, path in store.objects if path.startswith(td.DERIVED_PREFIX))
+
+
+def test_upload_after_local_run_publishes_without_retranscoding(capture_root, mock_server, tmp_path):
+    url, store = mock_server
+    output_dir = tmp_path / 'derived'
+
+    pipeline, stats = run(capture_root, output_dir)
+    assert pipeline.report.images == 2 and stats.counts['uploaded'] == 0
+    mtimes = {path: os.stat(path).st_mtime_ns for path in output_dir.rglob('*.jpg')}
+
+    pipeline, stats = run(capture_root, output_dir, url, upload=True)
+    assert pipeline.report.images == 0                       # 변환 없이 업로드만
+    assert stats.counts['uploaded'] == 2 and stats.counts['rows'] == 2 and stats.counts['failed'] == 0
+    assert len(derived_objects(store)) == 2 * len(td.make_variants())
+    assert all(set(row['derivatives']) == {'model', 'thumb'} for row in store.tables[td.PHOTOS_TABLE])
+    assert mtimes == {path: os.stat(path).st_mtime_ns for path in output_dir.rglob('*.jpg')}
+
+    pipeline, stats = run(capture_root, output_dir, url, upload=True)
+    assert stats.counts['unchanged'] == 2 and stats.counts['uploaded'] == 0
+
+
+def test_failed_upload_is_retried_on_next_run(capture_root, mock_server, tmp_path, monkeypatch):
+    url, store = mock_server
+    monkeypatch.setattr(ucp, 'BACKOFF_BASE', 0.0)
+    output_dir = tmp_path / 'derived'
+    broken, broken_url, _ = start_mock_server(fail_rate=1.0)
+    try:
+        _, stats = run(capture_root, output_dir, broken_url, upload=True)
+    finally:
+        broken.shutdown()
+    assert stats.counts['failed'] == 2 and stats.counts['uploaded'] == 0
+
+    pipeline, stats = run(capture_root, output_dir, url, upload=True)
+    assert pipeline.report.images == 0
+    assert stats.counts['uploaded'] == 2 and stats.counts['failed'] == 0
+    assert len(derived_objects(store)) == 2 * len(td.make_variants())
@@ -0,0 +1,17 @@
+"""
+unified_preprocessor import 테스트 - cv2가 없으면 프로세스를 종료하지 않고 ImportError로 알림
+"""
+
+import importlib
+import sys
+
+import pytest
+
+
+def test_missing_cv2_raises_import_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'cv2', None)   # import cv2 → ImportError
+    monkeypatch.delitem(sys.modules, 'preprocessing.unified_preprocessor', raising=False)
+    monkeypatch.delitem(sys.modules, 'preprocessing', raising=False)
+
+    with pytest.raises(ImportError, match='opencv-python-headless'):
+        importlib.import_module('preprocessing.unified_preprocessor')
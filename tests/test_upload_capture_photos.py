@@ -0,0 +1,90 @@
+"""
+upload_capture_photos 재시도 테스트 - mock Supabase 서버 기준
+"""
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from storage3.exceptions import StorageApiError
+
+import upload_capture_photos as ucp
+from mock_supabase_server import start_mock_server
+
+
+@pytest.fixture
+def mock_server():
+    server, url, store = start_mock_server()
+    yield url, store
+    server.shutdown()
+
+
+@pytest.mark.parametrize('error, expected', [
+    (httpx.ConnectError('refused'), True),
+    (httpx.ReadTimeout('timeout'), True),
+    (APIError({'message': 'unavailable', 'code': 503}), True),
+    (StorageApiError('busy', 'Too Many Requests', '429'), True),
+    (APIError({'message': 'duplicate key', 'code': '23505'}), False),   # SQLSTATE는 HTTP 상태가 아님
+    (APIError({'message': 'bad request', 'code': 400}), False),
+    (ValueError('bug'), False),
+    (KeyError('id'), False),
+])
+def test_is_transient_allow_list(error, expected):
+    assert ucp.is_transient(error) is expected
+
+
+def test_with_retry_does_not_retry_unknown_errors():
+    stats = ucp.UploadStats()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise RuntimeError('not transient')
+
+    with pytest.raises(RuntimeError):
+        ucp.with_retry(fail, retries=3, stats=stats)
+    assert len(calls) == 1 and stats.counts['retries'] == 0
+
+
+class LostResponseClient:
+    """첫 insert는 서버에 반영된 뒤 응답만 유실(ReadTimeout)되는 클라이언트"""
+
+    def __init__(self, client):
+        self.client = client
+        self.lost = False
+
+    def table(self, name):
+        builder = self.client.table(name)
+        outer = self
+
+        class Table:
+            def insert(self, rows):
+                request = builder.insert(rows)
+
+                class Request:
+                    def execute(self):
+                        response = request.execute()
+                        if not outer.lost:
+                            outer.lost = True
+                            raise httpx.ReadTimeout('response lost')
+                        return response
+                return Request()
+
+            def __getattr__(self, attr):
+                return getattr(builder, attr)
+        return Table()
+
+
+def test_insert_rows_is_idempotent_after_lost_response(mock_server, monkeypatch):
+    url, store = mock_server
+    monkeypatch.setattr(ucp, 'BACKOFF_BASE', 0.0)
+    uploader = ucp.CaptureUploader(url, 'mock', retries=2)
+    flaky = LostResponseClient(ucp.create_client(url, 'mock'))
+    uploader.client = lambda: flaky
+
+    batch = [{'kcode': 'K-000001', 'photo_url': f'CS_1_single/K-000001/{i}.jpg'} for i in range(3)]
+    row_ids = uploader.insert_rows(batch)
+
+    rows = store.tables[ucp.PHOTOS_TABLE]
+    assert len(rows) == 3
+    assert row_ids == {row['photo_url']: row['id'] for row in rows}
+    assert uploader.stats.counts['retries'] == 1
@@ -0,0 +1,49 @@
+"""
+usage_stream 회귀 테스트
+openpyxl 스트리밍 집계와 기존 pd.read_excel 전체 로드 집계가 결측 문자열까지 같은 결과를 내는지 확인
+"""
+
+import pandas as pd
+import pytest
+
+import usage_stream
+
+
+def write_usage_xlsx(path, rows):
+    """actual_list.xlsx 형식(4행 헤더, 1=EDI, 6=수량)으로 저장"""
+    header = [['header'] + [None] * 6 for _ in range(usage_stream.HEADER_ROWS)]
+    body = [['약품', edi, None, None, None, None, qty] for edi, qty in rows]
+    pd.DataFrame(header + body).to_excel(path, header=False, index=False)
+
+
+@pytest.fixture
+def usage_xlsx(tmp_path):
+    path = tmp_path / 'usage.xlsx'
+    write_usage_xlsx(path, [
+        ('640000001', 5), (640000001, 2.0), ('640000002', '3'),
+        ('NA', 7), ('N/A', 1), ('', 4), ('null', 9), ('#N/A', 2), (None, 8),
+        ('640000003', 'NA'), ('640000003', 'n/a'), ('640000003', 6), ('640000004', 'abc'),
+    ])
+    return path
+
+
+def test_xlsx_stream_matches_read_excel(usage_xlsx):
+    totals, rows = usage_stream.aggregate_file(usage_xlsx, chunksize=4)
+    expected = usage_stream.load_in_memory_totals(usage_xlsx)
+
+    assert rows == 13
+    assert 'NA' not in totals and 'N/A' not in totals and 'null' not in totals
+    assert dict(totals) == expected.to_dict()
+
+
+def test_verify_against_in_memory(usage_xlsx):
+    streamed = usage_stream.stream_edi_totals(usage_xlsx, workers=1, chunksize=4)
+    assert usage_stream.verify_against_in_memory(usage_xlsx, streamed)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None), (float('nan'), None), (640000001.0, '640000001'), (1.5, '1.5'),
+    ('NA', None), ('', None), ('#N/A', None), (' NA ', ' NA '), ('640000001', '640000001'),
+])
+def test_cell_to_str(value, expected):
+    assert usage_stream._cell_to_str(value) == expected